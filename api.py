@@ -4,14 +4,25 @@ PHASE 4: FastAPI server for AttentionOS agent.
 Provides HTTP endpoints to access agent data.
 """
 
+import hmac
 import sqlite3
 import os
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from storage import iso_column
+from compression import CompressionMiddleware
+from profiling import (DEFAULT_INTERVAL_SECONDS, AllocationTracker, ProfilerBusy, ProfilerError,
+                       folded, profile_cpu, summarise)
 
 # Database path
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "data", "attentionos.db")
+DB_PATH = os.getenv("ATTENTIONOS_DB_PATH", os.path.join(BASE_DIR, "data", "attentionos.db"))
+
+# Bearer token required by /api/admin endpoints, as on the backend; unset,
+# they only answer clients on this machine (the API listens on every interface)
+ADMIN_TOKEN = os.getenv("ATTENTIONOS_ADMIN_TOKEN", "")
+LOOPBACK_HOSTS = ("127.0.0.1", "::1")
 
 # Create FastAPI app
 app = FastAPI(
@@ -20,6 +31,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Compress responses for remote collectors; see compression.py for the settings
+app.add_middleware(CompressionMiddleware)
+
 
 @app.get("/")
 def root():
@@ -29,7 +43,9 @@ def root():
         "version": "1.0.0",
         "endpoints": [
             "/api/agent/status",
-            "/api/agent/focus-score"
+            "/api/agent/focus-score",
+            "/api/admin/profile/cpu",
+            "/api/admin/profile/memory"
         ]
     }
 
@@ -45,10 +61,14 @@ def get_agent_status():
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT timestamp, app_name, is_idle, window_title, bundle_id
-            FROM timeline
-            ORDER BY timestamp DESC
+        cursor.execute(f'''
+            SELECT {iso_column("t.timestamp")}, a.name AS app_name, t.is_idle,
+                   w.title AS window_title, b.identifier AS bundle_id
+            FROM timeline t
+            JOIN apps a ON a.id = t.app_id
+            LEFT JOIN window_titles w ON w.id = t.title_id
+            LEFT JOIN bundles b ON b.id = t.bundle_key
+            ORDER BY t.timestamp DESC
             LIMIT 10
         ''')
         
@@ -90,11 +110,11 @@ def get_focus_score():
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT start_time, end_time, total_active_seconds, 
-                   total_idle_seconds, app_switches, focus_score
-            FROM sessions
-            ORDER BY end_time DESC
+        cursor.execute(f'''
+            SELECT {iso_column("s.start_time")}, {iso_column("s.end_time")},
+                   s.total_active_seconds, s.total_idle_seconds, s.app_switches, s.focus_score
+            FROM sessions s
+            ORDER BY s.end_time DESC
             LIMIT 1
         ''')
         
@@ -127,6 +147,93 @@ def get_focus_score():
         )
 
 
+# Profiling: when started by main.py the API shares the tracker's process,
+# so profiles and allocation diffs include the tracker loop (see profiling.py)
+allocation_tracker = AllocationTracker()
+
+
+def admin_denied(request: Request) -> Optional[JSONResponse]:
+    """A 401 response unless the request carries the admin token (or, with none set, comes from loopback)."""
+    if ADMIN_TOKEN:
+        supplied = request.headers.get("authorization", "").encode()
+        if hmac.compare_digest(supplied, f"Bearer {ADMIN_TOKEN}".encode()):
+            return None
+    elif request.client is not None and request.client.host in LOOPBACK_HOSTS:
+        return None
+    return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid admin token"})
+
+
+def profiler_error(e: ProfilerError) -> JSONResponse:
+    return JSONResponse(
+        status_code=409 if isinstance(e, ProfilerBusy) else 400,
+        content={"status": "error", "message": str(e)}
+    )
+
+
+@app.post("/api/admin/profile/cpu")
+def profile_agent_cpu(request: Request, seconds: float = 10, interval_ms: float = DEFAULT_INTERVAL_SECONDS * 1000,
+                      mode: str = "cpu", format: str = "folded"):
+    """
+    Sample every thread's stack for `seconds`.
+    Returns folded stacks (flamegraph.pl, speedscope), or a summary with format=json.
+    """
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    if format not in ("folded", "json"):
+        return JSONResponse(status_code=400, content={"status": "error", "message": "format must be 'folded' or 'json'"})
+    try:
+        profile = profile_cpu(seconds, interval_ms / 1000, mode)
+    except ProfilerError as e:
+        return profiler_error(e)
+    if format == "json":
+        return summarise(profile)
+    return PlainTextResponse(folded(profile), headers={"X-Profile-Samples": str(profile["samples"])})
+
+
+@app.get("/api/admin/profile/memory")
+def get_allocation_tracking(request: Request):
+    """tracemalloc status and the kept snapshots."""
+    return admin_denied(request) or allocation_tracker.status()
+
+
+@app.post("/api/admin/profile/memory/start")
+def start_allocation_tracking(request: Request, frames: int = 10):
+    """Start tracing allocations."""
+    return admin_denied(request) or allocation_tracker.start(frames)
+
+
+@app.post("/api/admin/profile/memory/stop")
+def stop_allocation_tracking(request: Request):
+    """Stop tracing allocations and drop the snapshots."""
+    return admin_denied(request) or allocation_tracker.stop()
+
+
+@app.post("/api/admin/profile/memory/snapshot")
+def take_allocation_snapshot(request: Request, limit: int = 20, group_by: str = "lineno"):
+    """Snapshot traced allocations; returns its id and the largest allocation sites."""
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    try:
+        return allocation_tracker.snapshot(limit, group_by)
+    except ProfilerError as e:
+        return profiler_error(e)
+
+
+@app.get("/api/admin/profile/memory/diff")
+def diff_allocation_snapshots(request: Request, base: int, target: Optional[int] = None,
+                              limit: int = 20, group_by: str = "lineno"):
+    """Allocation growth from snapshot base to target (a new snapshot if omitted)."""
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    try:
+        return allocation_tracker.diff(base, target, limit, group_by)
+    except ProfilerError as e:
+        return profiler_error(e)
+
+
 if __name__ == "__main__":
     import uvicorn
     print("Starting AttentionOS Agent API on http://localhost:8001")
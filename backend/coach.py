@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Focus Coach providers.
+
+The AI endpoints ask a provider for an answer of some kind ("explain",
+"deep-analysis" or "chat"), handing it both the prompt written for a
+language model and the structured data the prompt was built from (or a
+callable returning it, so that data only the local coach reads is loaded
+only when a local answer is needed):
+
+    RemoteCoach  - sends the prompt to Gemini (through a generate callable)
+    LocalCoach   - deterministic templates over the data; answers in
+                   milliseconds, needs no key or network, and is the
+                   stand-in used for local development and tests
+    HedgedCoach  - asks the remote coach, but answers locally if it has
+                   not replied within a latency budget (or fails); the
+                   remote call carries on in the background, so its
+                   result can be cached for the next identical request.
+                   With MAX_REMOTE_CALLS already in flight it answers
+                   locally without queueing another
+
+make_coach() picks one from ATTENTIONOS_COACH (see backend/main.py).
+pack_prompts() and unpack_reply() fold several single-session prompts
+into one model call for /api/ai/explain/batch.
+"""
+
+import json
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from threading import Lock
+
+# text is None when a provider had nothing to say (e.g. an empty model reply)
+CoachAnswer = namedtuple("CoachAnswer", ["text", "provider"])
+
+COACH_MODES = ("auto", "gemini", "local", "hedged")
+
+
+class RemoteCoach:
+    """Answers with a language model: generate(kind, prompt, max_output_tokens) -> text."""
+
+    name = "gemini"
+
+    def __init__(self, generate):
+        self.generate = generate
+
+    def answer(self, kind, prompt, data, max_output_tokens):
+        return CoachAnswer(self.generate(kind, prompt, max_output_tokens), self.name)
+
+
+class HedgedCoach:
+    """Remote answer within budget_seconds, otherwise the local one."""
+
+    name = "hedged"
+    MAX_REMOTE_CALLS = 4
+
+    def __init__(self, remote, local, budget_seconds):
+        self.remote = remote
+        self.local = local
+        self.budget_seconds = budget_seconds
+        self._executor = None
+        self._in_flight = 0
+        self._lock = Lock()
+
+    def _call_finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def answer(self, kind, prompt, data, max_output_tokens):
+        with self._lock:
+            # A slow remote would otherwise build an unbounded queue of
+            # calls that finish long after their answers were served
+            if self._in_flight >= self.MAX_REMOTE_CALLS:
+                return self.local.answer(kind, prompt, data, max_output_tokens)
+            self._in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.MAX_REMOTE_CALLS, thread_name_prefix="coach-remote"
+                )
+        future = self._executor.submit(self.remote.answer, kind, prompt, data, max_output_tokens)
+        future.add_done_callback(self._call_finished)
+        try:
+            answer = future.result(timeout=self.budget_seconds)
+            if answer.text:
+                return answer
+        except FutureTimeout:
+            pass
+        except Exception as e:
+            print(f"⚠️ Remote coach failed, answering locally: {str(e)}")
+        return self.local.answer(kind, prompt, data, max_output_tokens)
+
+
+def make_coach(mode, generate, has_key, budget_seconds):
+    """
+    Build the coach for a mode: "gemini", "local", "hedged", or "auto"
+    (Gemini when an API key is configured, local otherwise).
+    """
+    if mode not in COACH_MODES:
+        raise ValueError(f"ATTENTIONOS_COACH must be one of {list(COACH_MODES)}")
+    local = LocalCoach()
+    if mode == "local" or (mode == "auto" and not has_key):
+        return local
+    remote = RemoteCoach(generate)
+    if mode == "hedged":
+        return HedgedCoach(remote, local, budget_seconds)
+    return remote
+
+
+# ============================================
+# BATCHES
+# ============================================
+
+def pack_prompts(prompts):
+    """
+    One prompt answering several: prompts maps a key to the prompt that
+    would be sent on its own, and the model is asked for a JSON object
+    mapping each key to its answer.
+    """
+    parts = [
+        "You will answer several independent requests in one reply. Treat each one "
+        "exactly as if it had been sent on its own.",
+        "Reply with only a JSON object mapping each request key to your full markdown "
+        "answer for it as a string, for example {\"a\": \"...\", \"b\": \"...\"}.",
+    ]
+    for key, prompt in prompts.items():
+        parts.append(f"=== REQUEST {key} ===\n{prompt}")
+    parts.append(f"Request keys: {', '.join(prompts)}")
+    return "\n\n".join(parts)
+
+
+def unpack_reply(text, keys):
+    """
+    The answers in a reply to pack_prompts(), by key. Keys the model left
+    out (or a reply that is not valid JSON) are missing from the result.
+    """
+    # Models often wrap JSON in a ```json fence despite being asked not to
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        answers = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+    return {key: answers[key].strip() for key in keys
+            if isinstance(answers.get(key), str) and answers[key].strip()}
+
+
+# ============================================
+# LOCAL COACH
+# ============================================
+
+def _minutes(seconds):
+    return f"{seconds / 60:.0f} min"
+
+
+def _switch_rate(switches, active_minutes):
+    """App switches per active hour."""
+    return switches / (active_minutes / 60) if active_minutes > 0 else 0.0
+
+
+class LocalCoach:
+    """
+    Rule- and template-based coaching from the same data the prompts carry.
+
+    Deterministic: the same data always gives the same answer, so it can
+    stand in for the model in tests and is safe to cache.
+    """
+
+    name = "local"
+
+    # Thresholds the rules below compare against
+    GOOD_FOCUS = 80
+    FAIR_FOCUS = 60
+    HIGH_SWITCH_RATE = 40      # switches per active hour
+    HIGH_IDLE_SHARE = 0.25
+    LOW_FLOW_SHARE = 0.2
+
+    def answer(self, kind, prompt, data, max_output_tokens):
+        if callable(data):
+            data = data()
+        handler = {
+            "explain": self.explain,
+            "deep-analysis": self.deep_analysis,
+            "chat": self.chat,
+        }[kind]
+        return CoachAnswer(handler(data), self.name)
+
+    # --- single session ---------------------------------------------------
+
+    def explain(self, session):
+        focus = session["focus_score"]
+        duration = session["duration_minutes"]
+        active = session["active_time_minutes"]
+        idle = session["idle_time_minutes"]
+        switches = session["app_switches"]
+        rate = _switch_rate(switches, active)
+        idle_share = idle / duration if duration else 0.0
+        apps = session.get("top_apps") or []
+
+        if focus >= self.GOOD_FOCUS:
+            summary = f"🎯 **Strong session.** {focus:.0f}% focus over {duration:.0f} minutes is deep-work territory."
+        elif focus >= self.FAIR_FOCUS:
+            summary = f"👍 **Solid session.** {focus:.0f}% focus over {duration:.0f} minutes, with room to sharpen."
+        else:
+            summary = f"🔄 **A scattered session.** {focus:.0f}% focus over {duration:.0f} minutes; attention was pulled in several directions."
+
+        went_well = []
+        if focus >= self.FAIR_FOCUS:
+            went_well.append(f"Focus held at {focus:.0f}% for most of the session")
+        if rate < self.HIGH_SWITCH_RATE:
+            went_well.append(f"Context switching stayed moderate ({switches} switches, {rate:.0f}/hour)")
+        if idle_share < self.HIGH_IDLE_SHARE:
+            went_well.append(f"You were active for {active:.0f} of {duration:.0f} minutes")
+        if apps:
+            went_well.append(f"Most time went to {', '.join(apps[:2])}")
+        if not went_well:
+            went_well.append(f"You showed up and logged {duration:.0f} minutes — the data gives you a baseline to beat")
+
+        improve = []
+        if rate >= self.HIGH_SWITCH_RATE:
+            improve.append(f"{switches} app switches ({rate:.0f}/hour) fragment attention — batch messages and tabs")
+        if idle_share >= self.HIGH_IDLE_SHARE:
+            improve.append(f"{idle:.0f} idle minutes ({idle_share:.0%}) suggest the task stalled — define the next step before starting")
+        if focus < self.GOOD_FOCUS:
+            improve.append(f"Closing the gap from {focus:.0f}% to {self.GOOD_FOCUS}% means protecting longer unbroken stretches")
+        if duration < 25:
+            improve.append("Short sessions rarely reach flow — aim for at least 25 minutes")
+        improve = improve or ["Keep the same setup — nothing in this session's numbers needs fixing"]
+
+        # The tip targets the weakest metric
+        if rate >= self.HIGH_SWITCH_RATE:
+            tip = "Turn on Do Not Disturb and keep only the apps for this task open for the first 25 minutes."
+        elif idle_share >= self.HIGH_IDLE_SHARE:
+            tip = "Write the first concrete action on a sticky note before you begin, so there is no warm-up gap."
+        elif duration < 45:
+            tip = "Extend the next session to 45–60 minutes while your focus is this good."
+        else:
+            tip = "Schedule your next deep-work block at the same time of day — this one worked."
+
+        return "\n".join([
+            summary, "",
+            "**What went well:**", *[f"- {item}" for item in went_well[:3]], "",
+            "**Areas to improve:**", *[f"- {item}" for item in improve[:3]], "",
+            f"**Tip for next session:** {tip}",
+        ])
+
+    # --- several sessions -------------------------------------------------
+
+    def _facts(self, data):
+        """Derived numbers shared by deep_analysis and chat."""
+        sessions = data["sessions"]
+        scores = [s["focus_score"] for s in sessions]
+        # Sessions are newest first; compare the older half with the newer half
+        half = len(scores) // 2
+        newer, older = scores[:half] or scores, scores[half:] or scores
+        active_min = sum(s["total_active_seconds"] for s in sessions) / 60
+        idle_min = sum(s["total_idle_seconds"] for s in sessions) / 60
+        switches = sum(s["app_switches"] for s in sessions)
+        categories = {c["category"]: c for c in data.get("categories", [])}
+        patterns = data.get("patterns") or {}
+        return {
+            "count": len(sessions),
+            "avg_focus": sum(scores) / len(scores),
+            "trend": sum(newer) / len(newer) - sum(older) / len(older),
+            "best": max(sessions, key=lambda s: s["focus_score"]),
+            "worst": min(sessions, key=lambda s: s["focus_score"]),
+            "active_min": active_min,
+            "idle_min": idle_min,
+            "switches": switches,
+            "rate": _switch_rate(switches, active_min),
+            "idle_share": idle_min / (active_min + idle_min) if active_min + idle_min else 0.0,
+            "top_apps": data.get("top_apps", []),
+            # All-history transitions from the coach context, else the week's
+            "transitions": data.get("transitions") or (patterns.get("transitions") or {}).get("top", []),
+            "flow": patterns.get("flow"),
+            "bursts": patterns.get("bursts"),
+            "productive": categories.get("productive", {}).get("share", 0.0),
+            "distracting": categories.get("distracting", {}).get("share", 0.0),
+        }
+
+    def _recommendations(self, f):
+        recs = []
+        if f["rate"] >= self.HIGH_SWITCH_RATE:
+            recs.append(f"**Cut switching:** {f['rate']:.0f} switches per active hour is high. Batch chat and email into two or three fixed slots a day.")
+        if f["transitions"]:
+            t = f["transitions"][0]
+            recs.append(f"**Break the {t['from_app']} → {t['to_app']} loop:** it happened {t['count']} times. Close {t['to_app']} during focus blocks.")
+        if f["flow"] and f["flow"]["share_of_active"] < self.LOW_FLOW_SHARE:
+            recs.append(f"**Protect flow:** only {f['flow']['share_of_active']:.0%} of active time was in 25+ minute deep-work stretches. Block 90 minutes with notifications off.")
+        if f["distracting"] >= 0.2:
+            recs.append(f"**Trim distractions:** {f['distracting']:.0%} of tracked time went to distracting apps. Use a site blocker during your best hours.")
+        if f["idle_share"] >= self.HIGH_IDLE_SHARE:
+            recs.append(f"**Reduce stalls:** {f['idle_share']:.0%} of session time was idle. Plan the next action before each session.")
+        best_hour = f["best"]["start_time"][11:13]
+        recs.append(f"**Repeat your best conditions:** your top session ({f['best']['focus_score']:.0f}%) started around {best_hour}:00. Put demanding work there.")
+        return recs[:4]
+
+    def deep_analysis(self, data):
+        f = self._facts(data)
+        if f["trend"] > 2:
+            trend = f"improving — recent sessions average {f['trend']:.1f} points higher than earlier ones"
+        elif f["trend"] < -2:
+            trend = f"slipping — recent sessions average {-f['trend']:.1f} points lower than earlier ones"
+        else:
+            trend = "steady across the period"
+
+        lines = [
+            "# 📊 7-Day Productivity Analysis", "",
+            "## Overview",
+            f"Across {f['count']} sessions your average focus score was **{f['avg_focus']:.1f}%**, "
+            f"with {f['active_min']:.0f} active and {f['idle_min']:.0f} idle minutes. Focus is {trend}.", "",
+            "## 📈 Trends Observed",
+            f"- **Best session:** {f['best']['focus_score']:.1f}% on {f['best']['start_time'][:10]}",
+            f"- **Weakest session:** {f['worst']['focus_score']:.1f}% on {f['worst']['start_time'][:10]}",
+            f"- **Switching:** {f['switches']} app switches, {f['rate']:.0f} per active hour",
+        ]
+        if f["flow"]:
+            lines.append(f"- **Flow this week:** {f['flow']['count']} deep-work stretches totalling {_minutes(f['flow']['total_seconds'])}, "
+                         f"longest {_minutes(f['flow']['longest_seconds'])}")
+        lines += ["", "## 🎯 Key Insights"]
+        if f["top_apps"]:
+            apps = ", ".join(f"{a['app_name']} ({_minutes(a['total_seconds'])})" for a in f["top_apps"][:3])
+            lines.append(f"- **Where time went:** {apps}")
+        if f["productive"] or f["distracting"]:
+            lines.append(f"- **Mix:** {f['productive']:.0%} productive, {f['distracting']:.0%} distracting")
+        if f["transitions"]:
+            t = f["transitions"][0]
+            lines.append(f"- **Most common switch:** {t['from_app']} → {t['to_app']} ({t['count']}x)")
+        if f["bursts"] and f["bursts"]["count"]:
+            lines.append(f"- **Switching bursts:** {f['bursts']['count']} rapid-fire clusters "
+                         f"({f['bursts']['share_of_switches']:.0%} of all switches)")
+        lines += ["", "## 💡 Personalized Recommendations"]
+        lines += [f"{i}. {rec}" for i, rec in enumerate(self._recommendations(f), 1)]
+        target = min(100, round(f["avg_focus"] + 5))
+        lines += ["", "## 🏆 Summary",
+                  f"You have a clear baseline of {f['avg_focus']:.0f}% focus. Aim for **{target}%** next week "
+                  f"by keeping switches under {max(10, round(f['rate'] * 0.8))} per hour. 🚀"]
+        return "\n".join(lines)
+
+    def chat(self, data):
+        """Answer the latest user message from keyword intents over the data."""
+        question = next((m["content"] for m in reversed(data["messages"]) if m["role"] == "user"), "").lower()
+        if not data.get("sessions"):
+            return "I don't have any sessions to look at yet. Track a session (or generate demo data) and ask me again."
+        f = self._facts(data)
+
+        def mentions(*words):
+            return any(word in question for word in words)
+
+        if mentions("switch", "distract", "interrupt", "context"):
+            parts = [f"You switched apps {f['switches']} times across {f['count']} sessions ({f['rate']:.0f} per active hour)."]
+            if f["transitions"]:
+                t = f["transitions"][0]
+                parts.append(f"The most common jump was **{t['from_app']} → {t['to_app']}** ({t['count']}x).")
+            if f["distracting"]:
+                parts.append(f"Distracting apps took {f['distracting']:.0%} of your tracked time.")
+        elif mentions("flow", "deep work", "deep-work", "concentrat"):
+            if f["flow"] and f["flow"]["count"]:
+                parts = [f"You had {f['flow']['count']} flow stretches (25+ minutes of uninterrupted work), "
+                         f"{_minutes(f['flow']['total_seconds'])} in total — {f['flow']['share_of_active']:.0%} of active time. "
+                         f"The longest lasted {_minutes(f['flow']['longest_seconds'])}."]
+            else:
+                parts = ["I didn't find any 25+ minute uninterrupted stretches this week. Try one 45-minute block with notifications off."]
+        elif mentions("why", "low", "bad", "drop", "struggl"):
+            parts = [f"Your weakest session scored {f['worst']['focus_score']:.1f}% on {f['worst']['start_time'][:10]}, "
+                     f"against an average of {f['avg_focus']:.1f}%. Here's what stands out:"]
+            parts += [f"- {rec}" for rec in self._recommendations(f)[:2]]
+            return "\n".join(parts)
+        elif mentions("best", "worst", "when", "time of day", "hour"):
+            parts = [f"Your best session scored {f['best']['focus_score']:.1f}% on {f['best']['start_time'][:10]} "
+                     f"(started {f['best']['start_time'][11:16]}); your weakest scored {f['worst']['focus_score']:.1f}% "
+                     f"on {f['worst']['start_time'][:10]}."]
+        elif mentions("app", "spend", "spent", "where", "category", "categories"):
+            apps = ", ".join(f"{a['app_name']} ({_minutes(a['total_seconds'])})" for a in f["top_apps"][:5]) or "no apps yet"
+            parts = [f"Your top apps: {apps}."]
+            if f["productive"] or f["distracting"]:
+                parts.append(f"Overall {f['productive']:.0%} of time was productive and {f['distracting']:.0%} distracting.")
+        elif mentions("improve", "tip", "should", "better", "advice", "recommend", "how"):
+            parts = ["Here's where I'd start:"] + [f"- {rec}" for rec in self._recommendations(f)[:2]]
+        else:
+            parts = [f"Over {f['count']} sessions you averaged **{f['avg_focus']:.1f}%** focus with "
+                     f"{f['rate']:.0f} app switches per active hour.",
+                     "Ask me about your switching, flow, best times, top apps, or how to improve."]
+        return "\n".join(parts) if parts[0].startswith("Here's") else " ".join(parts)
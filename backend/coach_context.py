@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Coach context: the numbers behind /api/ai/deep-analysis and chat.
+
+Top apps and app-to-app transitions over all history come from the
+coach_app_totals and coach_transitions tables, which triggers keep
+current as activity rows are written and closed and switches are logged
+(see storage.create_coach_context_triggers). The rolling session window
+is the newest SESSION_WINDOW rows of idx_sessions_start. Loading the
+context therefore reads a fixed number of index entries plus one row per
+app or app pair, however many months of activity the database holds.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import iso_column
+
+SESSION_WINDOW = 7
+TOP_APPS = 10
+TOP_TRANSITIONS = 5
+
+
+def _rows(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def window_stats(sessions):
+    """Aggregates over the session window (newest first), or None if it is empty."""
+    if not sessions:
+        return None
+    return {
+        "count": len(sessions),
+        "avg_focus_score": sum(s["focus_score"] for s in sessions) / len(sessions),
+        "total_active_seconds": sum(s["total_active_seconds"] for s in sessions),
+        "total_idle_seconds": sum(s["total_idle_seconds"] for s in sessions),
+        "total_switches": sum(s["app_switches"] for s in sessions),
+        "best": max(sessions, key=lambda s: s["focus_score"]),
+        "worst": min(sessions, key=lambda s: s["focus_score"]),
+    }
+
+
+def load_coach_context(conn, sessions=SESSION_WINDOW, top_apps=TOP_APPS, top_transitions=TOP_TRANSITIONS):
+    """
+    The last `sessions` sessions (newest first) with their aggregates, the
+    top apps by time and the most common transitions over all history.
+    A transition's probability is its share of all switches away from
+    from_app.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT s.id, {iso_column("s.start_time")}, {iso_column("s.end_time")},
+               s.total_active_seconds, s.total_idle_seconds, s.app_switches, s.focus_score
+        FROM sessions s
+        ORDER BY s.start_time DESC
+        LIMIT ?
+    ''', (sessions,))
+    window = _rows(cursor)
+
+    cursor.execute('''
+        SELECT a.name AS app_name, c.seconds AS total_seconds
+        FROM coach_app_totals c
+        JOIN apps a ON a.id = c.app_id
+        WHERE c.seconds > 0
+        ORDER BY c.seconds DESC, a.name
+        LIMIT ?
+    ''', (top_apps,))
+    apps = _rows(cursor)
+
+    cursor.execute('''
+        SELECT f.name AS from_app, t.name AS to_app, c.switches AS count,
+               CAST(c.switches AS REAL) / o.switches_out AS probability
+        FROM coach_transitions c
+        JOIN coach_app_totals o ON o.app_id = c.from_app_id
+        JOIN apps f ON f.id = c.from_app_id
+        JOIN apps t ON t.id = c.to_app_id
+        WHERE c.switches > 0
+        ORDER BY c.switches DESC, f.name, t.name
+        LIMIT ?
+    ''', (top_transitions,))
+    transitions = _rows(cursor)
+
+    return {
+        "sessions": window,
+        "stats": window_stats(window),
+        "top_apps": apps,
+        "transitions": transitions,
+    }
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Day x hour focus heatmap over any range of days.
+
+storage.create_focus_heatmap_triggers keeps one row of sums per local day
+and hour in focus_heatmap as sessions are saved, so a heatmap over years
+reads at most 24 rows a day from the primary key, however many sessions
+they hold. Cells are sums, so shards are merged by adding them. Three
+dense days x 24 matrices are derived from them:
+
+  focus_score     active-time-weighted mean focus score (0-100)
+  active_seconds  active seconds in the hour
+  switch_density  app switches per hour of active time
+
+Besides JSON (nested lists, null for hours without sessions) a heatmap
+can be encoded in a compact little-endian layout that a browser maps
+straight onto typed arrays, with no parsing:
+
+  offset 0   4 bytes        magic b"AOHM"
+         4   uint16         format version (2)
+         6   uint16         hours per day (24)
+         8   int32          first day (local calendar days since 1970-01-01)
+        12   uint32         number of days
+        16   uint32[n]      active_seconds, rounded
+             uint16[n]      switch_density in hundredths, 65535 for no sessions
+             uint8[n]       focus_score, rounded, 255 for no sessions
+
+with n = days x 24 cells, day-major. Each array starts aligned to its
+element size, so Uint16Array(buffer, 16, n) and friends work as is.
+Integers compress better than floats, and a heatmap has no use for more
+precision. active_seconds is 32-bit because cells merged across shards
+sum every user's hour, and 65535 seconds is only 18 busy users.
+"""
+
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+
+MEDIA_TYPE = "application/vnd.attentionos.heatmap"
+MAGIC = b"AOHM"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHiI")
+HOURS = 24
+NO_FOCUS = 255
+NO_DENSITY = 65535
+
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+# Sentinel for an open-ended range of days
+_LAST_DAY = 2 ** 31 - 1
+
+
+def day_number(epoch):
+    """Local calendar day of an epoch second, counted like focus_heatmap.day."""
+    return datetime.fromtimestamp(epoch).toordinal() - EPOCH_ORDINAL
+
+
+def day_date(day):
+    return (datetime(1970, 1, 1) + timedelta(days=day)).date().isoformat()
+
+
+def load_cells(conn, since=0, until=None):
+    """
+    Non-empty focus_heatmap rows (day, hour, sessions, active_seconds,
+    switches, focus_weighted) for the local days overlapping [since, until).
+    """
+    last_day = day_number(until - 1) if until is not None else _LAST_DAY
+    # Plain tuples: they go straight into a NumPy array
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute('''
+        SELECT day, hour, sessions, active_seconds, switches, focus_weighted
+        FROM focus_heatmap
+        WHERE day BETWEEN ? AND ? AND sessions > 0
+        ORDER BY day, hour
+    ''', (day_number(since), last_day)).fetchall()
+
+
+def build_heatmap(cell_lists):
+    """
+    Dense matrices from one or more load_cells results (one per shard),
+    spanning the first to the last day with sessions.
+    """
+    cells = np.array([row for rows in cell_lists for row in rows], dtype=np.float64).reshape(-1, 6)
+    if not len(cells):
+        empty = np.zeros((0, HOURS))
+        return {"first_day": None, "days": 0, "sessions": empty, "active_seconds": empty,
+                "switches": empty, "focus_weighted": empty}
+
+    days = cells[:, 0].astype(np.int64)
+    first_day = int(days.min())
+    shape = (int(days.max()) - first_day + 1, HOURS)
+    index = (days - first_day, cells[:, 1].astype(np.int64))
+    heatmap = {"first_day": first_day, "days": shape[0]}
+    for column, name in enumerate(("sessions", "active_seconds", "switches", "focus_weighted"), start=2):
+        matrix = np.zeros(shape)
+        # Shards may share a cell; add.at sums repeated indexes
+        np.add.at(matrix, index, cells[:, column])
+        heatmap[name] = matrix
+    return heatmap
+
+
+def _derived(heatmap):
+    """(has sessions, focus score, active seconds, switch density) matrices."""
+    active = np.maximum(heatmap["active_seconds"], 0.0)
+    filled = heatmap["sessions"] > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        focus = np.where(active > 0, heatmap["focus_weighted"] / active, 0.0)
+        density = np.where(active > 0, heatmap["switches"] * 3600 / active, 0.0)
+    return filled, focus, active, np.where(filled, density, np.nan)
+
+
+def encode_binary(heatmap):
+    """The heatmap in the typed-array layout described above."""
+    filled, focus, active, density = _derived(heatmap)
+    first_day = heatmap["first_day"] if heatmap["first_day"] is not None else 0
+    density = np.where(filled, np.clip(np.rint(density * 100), 0, NO_DENSITY - 1), NO_DENSITY)
+    focus = np.where(filled, np.clip(np.rint(focus), 0, 100), NO_FOCUS)
+    return b"".join((
+        HEADER.pack(MAGIC, FORMAT_VERSION, HOURS, first_day, heatmap["days"]),
+        np.clip(np.rint(active), 0, 2 ** 32 - 1).astype("<u4").tobytes(),
+        density.astype("<u2").tobytes(),
+        focus.astype(np.uint8).tobytes(),
+    ))
+
+
+def to_json(heatmap):
+    """The heatmap as JSON-ready nested lists, null where an hour has no sessions."""
+    filled, focus, active, density = _derived(heatmap)
+
+    def matrix(values, digits):
+        return [[round(float(value), digits) if has else None for value, has in zip(row, mask)]
+                for row, mask in zip(values, filled)]
+
+    first_day = heatmap["first_day"]
+    return {
+        "first_day": day_date(first_day) if first_day is not None else None,
+        "days": heatmap["days"],
+        "hours": HOURS,
+        "focus_score": matrix(focus, 1),
+        "active_seconds": matrix(active, None),
+        "switch_density": matrix(density, 2),
+    }
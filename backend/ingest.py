@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Batched event ingestion from remote AttentionOS agents.
+
+Agents running uploader.py POST batches shaped like:
+
+    {
+        "device_id": "alice-mbp", "user_id": "alice", "batch_id": "<sha256>",
+        "activity": [{"id", "app_name", "start_time", "end_time",
+                      "duration_seconds", "window_title", "bundle_id"}, ...],
+        "switches": [{"id", "from_app", "to_app", "timestamp"}, ...],
+        "timeline": [{"id", "timestamp", "app_name", "is_idle",
+                      "window_title", "bundle_id"}, ...],
+        "sessions": [{"id", "start_time", "end_time", "total_active_seconds",
+                      "total_idle_seconds", "app_switches", "focus_score"}, ...]
+    }
+
+Times are epoch seconds and "id" is the row id in the agent's local
+database. Activity and timeline rows are categorised here, with the
+backend's rules, rather than trusting a category sent by the agent.
+Events are type-checked against EVENT_FIELDS before anything is written,
+and a body decompressing past ATTENTIONOS_MAX_BATCH_BYTES (default 64 MiB)
+is refused with BatchTooLarge.
+"""
+
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from categories import default_categoriser
+
+try:
+    import brotli
+except ImportError:  # Optional: only needed for Content-Encoding: br uploads
+    brotli = None
+
+_DECODE_ERRORS = (OSError, EOFError, ValueError, zlib.error) + ((brotli.error,) if brotli else ())
+
+
+MAX_DECODED_BYTES = int(os.getenv("ATTENTIONOS_MAX_BATCH_BYTES", str(64 * 1024 * 1024)))
+
+# brotli before 1.2 cannot limit its output, so there compressed input is
+# fed in pieces this size and the output checked after each
+BROTLI_CHUNK = 4096
+
+# Expected type of each event field; "?" marks fields that may be null or absent
+EVENT_FIELDS = {
+    "activity": {"id": "int", "app_name": "str", "start_time": "int", "end_time": "int?",
+                 "duration_seconds": "int?", "window_title": "str?", "bundle_id": "str?"},
+    "switches": {"id": "int", "from_app": "str?", "to_app": "str", "timestamp": "int"},
+    "timeline": {"id": "int", "timestamp": "int", "app_name": "str", "is_idle": "flag",
+                 "window_title": "str?", "bundle_id": "str?"},
+    "sessions": {"id": "int", "start_time": "int", "end_time": "int", "total_active_seconds": "int",
+                 "total_idle_seconds": "int", "app_switches": "int", "focus_score": "number?"},
+}
+_TYPES = {"int": (int,), "number": (int, float), "flag": (bool, int), "str": (str,)}
+
+
+class IngestError(ValueError):
+    """Raised for malformed or undecodable upload batches."""
+
+
+class BatchTooLarge(IngestError):
+    """Raised when an upload body decompresses past the size limit."""
+
+
+def _gunzip(body, max_size):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, max_size + 1)
+    if len(data) > max_size:
+        raise BatchTooLarge(f"batch decompresses past {max_size} bytes")
+    if not decompressor.eof:
+        raise IngestError("could not decode batch: truncated gzip stream")
+    return data
+
+
+def _unbrotli(body, max_size):
+    decompressor = brotli.Decompressor()
+    parts, size = [], 0
+    if hasattr(decompressor, "can_accept_more_data"):
+        # Stops at the limit, keeping the rest of the input for later calls
+        limit = max_size + 1
+        parts.append(decompressor.process(body, output_buffer_limit=limit))
+        size = len(parts[0])
+        while size <= max_size and not decompressor.can_accept_more_data():
+            parts.append(decompressor.process(b"", output_buffer_limit=limit - size))
+            size += len(parts[-1])
+    else:
+        for start in range(0, len(body), BROTLI_CHUNK):
+            parts.append(decompressor.process(body[start:start + BROTLI_CHUNK]))
+            size += len(parts[-1])
+            if size > max_size:
+                break
+    if size > max_size:
+        raise BatchTooLarge(f"batch decompresses past {max_size} bytes")
+    return b"".join(parts)
+
+
+def decode_body(body: bytes, content_encoding: str = "", max_size=MAX_DECODED_BYTES):
+    """Decompress (gzip/br/identity) and parse an upload body of at most max_size bytes."""
+    encoding = (content_encoding or "identity").strip().lower()
+    try:
+        if encoding == "gzip":
+            body = _gunzip(body, max_size)
+        elif encoding == "br":
+            if brotli is None:
+                raise IngestError("brotli uploads need the brotli package on the server")
+            body = _unbrotli(body, max_size)
+        elif encoding != "identity":
+            raise IngestError(f"unsupported Content-Encoding: {encoding}")
+        elif len(body) > max_size:
+            raise BatchTooLarge(f"batch is larger than {max_size} bytes")
+        return json.loads(body)
+    except _DECODE_ERRORS as e:
+        if isinstance(e, IngestError):
+            raise
+        raise IngestError(f"could not decode batch: {e}") from e
+
+
+def check_events(kind, events):
+    """Raise IngestError unless events is a list of objects matching EVENT_FIELDS[kind]."""
+    if not isinstance(events, list):
+        raise IngestError(f"{kind} must be a list")
+    fields = [(field, _TYPES[spec.rstrip("?")], spec.endswith("?")) for field, spec in EVENT_FIELDS[kind].items()]
+    for event in events:
+        if not isinstance(event, dict):
+            raise IngestError(f"{kind} events must be objects")
+        for field, types, optional in fields:
+            value = event.get(field)
+            if value is None:
+                if optional:
+                    continue
+                raise IngestError(f"{kind} event without {field}")
+            # bool is an int subclass, but only flags may be true/false
+            if not isinstance(value, types) or ((value is True or value is False) and bool not in types):
+                raise IngestError(f"{kind} {field} has the wrong type: {value!r}")
+
+
+def ingest_batch(conn, payload, interner, categoriser=None):
+    """
+    Write one upload batch in a single transaction and return counts.
+
+    Idempotent at two levels: a batch_id already seen for the device is
+    skipped outright, and every event is keyed by (device, source row id),
+    so replays and overlapping batches never duplicate rows. Activity rows
+    are upserted because the agent re-sends its still-open row as its end
+    time grows. categoriser defaults to the built-in category rules.
+    """
+    categoriser = categoriser or default_categoriser()
+
+    def category_id(e):
+        return interner.category(conn, categoriser.categorise(
+            e["app_name"], e.get("window_title"), e.get("bundle_id")))
+
+    try:
+        device_uid = str(payload["device_id"])
+        user_uid = payload.get("user_id")
+        batch_id = payload.get("batch_id")
+        activity = payload.get("activity", [])
+        switches = payload.get("switches", [])
+        timeline = payload.get("timeline", [])
+        sessions = payload.get("sessions", [])
+    except (AttributeError, TypeError, KeyError) as e:
+        raise IngestError(f"missing field: {e}") from e
+    if batch_id is not None and not isinstance(batch_id, str):
+        raise IngestError("batch_id must be a string")
+    for kind, events in (("activity", activity), ("switches", switches),
+                         ("timeline", timeline), ("sessions", sessions)):
+        check_events(kind, events)
+
+    events = len(activity) + len(switches) + len(timeline) + len(sessions)
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO devices (device_uid, user_uid) VALUES (?, ?) "
+            "ON CONFLICT(device_uid) DO UPDATE SET user_uid = COALESCE(excluded.user_uid, user_uid)",
+            (device_uid, user_uid),
+        )
+        device_key = conn.execute(
+            "SELECT id FROM devices WHERE device_uid = ?", (device_uid,)
+        ).fetchone()[0]
+
+        if batch_id is not None:
+            seen = conn.execute(
+                "SELECT 1 FROM ingest_batches WHERE device_key = ? AND batch_id = ?",
+                (device_key, batch_id),
+            ).fetchone()
+            if seen:
+                conn.rollback()
+                return {"status": "duplicate", "events": events, "written": 0}
+
+        written = conn.executemany('''
+            INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds,
+                                       title_id, bundle_key, device_key, source_id, category_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_key, source_id) DO UPDATE SET
+                end_time = excluded.end_time,
+                duration_seconds = excluded.duration_seconds
+        ''', [
+            (interner.app(conn, e["app_name"]), e["start_time"], e.get("end_time"),
+             e.get("duration_seconds"), interner.title(conn, e.get("window_title")),
+             interner.bundle(conn, e.get("bundle_id")), device_key, e["id"], category_id(e))
+            for e in activity
+        ]).rowcount
+
+        written += conn.executemany('''
+            INSERT INTO app_switches (from_app_id, to_app_id, timestamp, device_key, source_id)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(device_key, source_id) DO NOTHING
+        ''', [
+            (interner.app(conn, e.get("from_app")), interner.app(conn, e["to_app"]),
+             e["timestamp"], device_key, e["id"])
+            for e in switches
+        ]).rowcount
+
+        written += conn.executemany('''
+            INSERT INTO timeline (timestamp, app_id, is_idle, title_id, bundle_key,
+                                  device_key, source_id, category_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_key, source_id) DO NOTHING
+        ''', [
+            (e["timestamp"], interner.app(conn, e["app_name"]), int(bool(e["is_idle"])),
+             interner.title(conn, e.get("window_title")), interner.bundle(conn, e.get("bundle_id")),
+             device_key, e["id"], category_id(e))
+            for e in timeline
+        ]).rowcount
+
+        written += conn.executemany('''
+            INSERT INTO sessions (start_time, end_time, total_active_seconds, total_idle_seconds,
+                                  app_switches, focus_score, device_key, source_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_key, source_id) DO NOTHING
+        ''', [
+            (e["start_time"], e["end_time"], e["total_active_seconds"], e["total_idle_seconds"],
+             e["app_switches"], e["focus_score"], device_key, e["id"])
+            for e in sessions
+        ]).rowcount
+
+        if batch_id is not None:
+            conn.execute(
+                "INSERT INTO ingest_batches (device_key, batch_id, received_at, events) VALUES (?, ?, ?, ?)",
+                (device_key, batch_id, int(time.time()), events),
+            )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        # Keys interned inside the rolled-back transaction no longer exist
+        interner.clear()
+        if isinstance(e, (TypeError, KeyError)):
+            raise IngestError(f"malformed event: {e}") from e
+        raise
+
+    return {"status": "success", "events": events, "written": written}
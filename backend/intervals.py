@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Point-in-time and overlap queries over activity and sessions.
+
+"What was I doing at 14:32" and "which sessions overlap this meeting" are
+both overlap tests between a query range and the rows' time spans. The
+R*Tree indexes from storage.create_interval_index find the candidate rows
+in logarithmic time; each candidate is then checked against the row
+itself, since the R*Tree's bounds are rounded outward. A row covers
+[start_time, end) as defined by storage.interval_end, so consecutive
+activity never both match one instant. Databases built by an SQLite
+without R*Tree fall back to the start_time index, which reads every row
+that starts before the end of the range.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import has_interval_index, interval_end, iso_column
+
+MAX_LIMIT = 1000
+
+
+def _candidates(conn, table, alias):
+    """(FROM clause, WHERE clause) selecting rows of table whose span overlaps [?, ?)."""
+    exact = f"{alias}.start_time < :end AND {interval_end(alias)} > :start"
+    if has_interval_index(conn):
+        # The R*Tree drives the lookup and narrows it to a few false positives
+        return (f"{table}_intervals r JOIN {table} {alias} ON {alias}.id = r.id",
+                f"r.start_time < :end AND r.end_time > :start AND {exact}")
+    return f"{table} {alias}", exact
+
+
+def _overlap_seconds(alias):
+    return f"MIN({interval_end(alias)}, :end) - MAX({alias}.start_time, :start)"
+
+
+def _activity(conn, start, end, limit):
+    source, where = _candidates(conn, "activity_logs", "l")
+    return conn.execute(f'''
+        SELECT l.id, a.name AS app_name, w.title AS window_title, c.name AS category,
+               {iso_column("l.start_time")}, {iso_column("l.end_time")}, l.duration_seconds,
+               {_overlap_seconds("l")} AS overlap_seconds
+        FROM {source}
+        JOIN apps a ON a.id = l.app_id
+        LEFT JOIN window_titles w ON w.id = l.title_id
+        LEFT JOIN categories c ON c.id = l.category_id
+        WHERE {where}
+        ORDER BY l.start_time, l.id
+        LIMIT :limit
+    ''', {"start": start, "end": end, "limit": limit}).fetchall()
+
+
+def _sessions(conn, start, end, limit):
+    source, where = _candidates(conn, "sessions", "s")
+    return conn.execute(f'''
+        SELECT s.id, {iso_column("s.start_time")}, {iso_column("s.end_time")},
+               s.total_active_seconds, s.total_idle_seconds, s.app_switches, s.focus_score,
+               {_overlap_seconds("s")} AS overlap_seconds
+        FROM {source}
+        WHERE {where}
+        ORDER BY s.start_time, s.id
+        LIMIT :limit
+    ''', {"start": start, "end": end, "limit": limit}).fetchall()
+
+
+def activity_overlapping(conn, start, end, limit=MAX_LIMIT):
+    """
+    Activity and sessions whose spans overlap [start, end) (epoch seconds),
+    earliest first, with the seconds each shares with the range. Each list
+    holds at most `limit` rows; the *_truncated flags say whether more
+    matched.
+    """
+    # One extra row tells a full page from a truncated one
+    activity = _activity(conn, start, end, limit + 1)
+    sessions = _sessions(conn, start, end, limit + 1)
+    return {
+        "activity": [dict(row) for row in activity[:limit]],
+        "activity_truncated": len(activity) > limit,
+        "sessions": [dict(row) for row in sessions[:limit]],
+        "sessions_truncated": len(sessions) > limit,
+    }
+
+
+def activity_at(conn, at, limit=MAX_LIMIT):
+    """Activity and sessions running at the epoch second `at`."""
+    found = activity_overlapping(conn, at, at + 1, limit)
+    for rows in (found["activity"], found["sessions"]):
+        for row in rows:
+            del row["overlap_seconds"]
+    return found
@@ -5,23 +5,102 @@ Serves data from SQLite database via REST API.
 Includes Gemini AI coaching integration using official SDK.
 """
 
-import sqlite3
 import os
+import sys
 import random
+import time
+import hashlib
+import hmac
+import gzip
+import json
+import heapq
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
 from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from contextlib import contextmanager
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from dotenv import load_dotenv
-import google.generativeai as genai
-
-# Load environment variables from .env file
-load_dotenv()
+from serialization import stream_json_rows
+from ingest import BatchTooLarge, IngestError, decode_body, ingest_batch
+from shards import DEFAULT_SHARD, ConnectionPool, ShardLimitError, ShardRouter, ShardState, fan_out
+from workers import SharedCache, interprocess_lock
+from patterns import PatternEngine, compute_patterns
+from search import MAX_LIMIT as SEARCH_MAX_LIMIT, SearchError, search_activity
+from intervals import MAX_LIMIT as INTERVAL_MAX_LIMIT, activity_at, activity_overlapping
+from coach import LocalCoach, make_coach, pack_prompts, unpack_reply
+from coach_context import load_coach_context
+from heatmap import MEDIA_TYPE as HEATMAP_MEDIA_TYPE, build_heatmap, encode_binary, load_cells, to_json
+from scheduler import ActivityMiddleware, Job, RequestActivity, Scheduler
 
 # Database path configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "..", "data", "attentionos.db")
+
+# Load environment variables from backend/.env (no dotenv import without one)
+ENV_FILE = os.path.join(BASE_DIR, ".env")
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+DB_PATH = os.getenv("ATTENTIONOS_DB_PATH", os.path.join(BASE_DIR, "..", "data", "attentionos.db"))
+DATA_DIR = os.path.dirname(DB_PATH)
+SHARD_DIR = os.getenv("ATTENTIONOS_SHARD_DIR", os.path.join(DATA_DIR, "shards"))
+
+# Multi-worker deployments: worker count for `python main.py`, the lock
+# taken around one-time initialisation, and the cache shared by all workers
+WORKERS = int(os.getenv("ATTENTIONOS_WORKERS", "1"))
+INIT_LOCK_PATH = os.path.join(DATA_DIR, ".backend-init.lock")
+CACHE_PATH = os.getenv("ATTENTIONOS_CACHE_PATH", os.path.join(DATA_DIR, "cache.db"))
+AI_CACHE_TTL = int(os.getenv("ATTENTIONOS_AI_CACHE_TTL", "3600"))
+SUMMARY_CACHE_TTL = 24 * 3600
+
+# The schema and middleware are shared with the tracking agent in the repository root
+sys.path.append(os.path.join(BASE_DIR, ".."))
+from storage import Interner, data_version, iso_column, to_epoch
+from categories import RuleError, RulesFile, sync_categories
+from backup import snapshot
+from importer import FORMATS as IMPORT_FORMATS, HistoryImportError, import_history
+from profiling import (DEFAULT_INTERVAL_SECONDS as PROFILE_INTERVAL_SECONDS, AllocationTracker, ProfilerBusy,
+                       ProfilerError, folded, profile_cpu, summarise)
+from retention import RetentionError, apply_retention, describe, ensure_incremental_vacuum, load_policies
+from compression import CompressionMiddleware
+
+# Per-user/team database files behind one bounded connection pool (see shards.py)
+pool = ConnectionPool()
+router = ShardRouter(DB_PATH, SHARD_DIR)
+shard_state = ShardState()
+shared_cache = SharedCache(CACHE_PATH)
+
+# Productivity category rules, shared with the agent (see categories.py);
+# every worker picks up changes to the file on its next write
+CATEGORY_RULES_PATH = os.getenv("ATTENTIONOS_CATEGORY_RULES", os.path.join(DATA_DIR, "categories.json"))
+category_rules = RulesFile(CATEGORY_RULES_PATH)
+
+# Retention policies shared with the agent (see retention.py); the
+# interval is in seconds, 0 turns background retention off
+RETENTION_POLICY_PATH = os.getenv("ATTENTIONOS_RETENTION_POLICY", os.path.join(DATA_DIR, "retention.json"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("ATTENTIONOS_RETENTION_INTERVAL", "3600"))
+RETENTION_LOCK_PATH = os.path.join(DATA_DIR, ".backend-retention.lock")
+
+# Background jobs (see scheduler.py): how often the analytics caches are
+# warmed and query planner statistics refreshed, in seconds (0 = never),
+# and the time a maintenance run may take before it yields until the next
+RETENTION_BUDGET_SECONDS = 300
+WARM_INTERVAL_SECONDS = int(os.getenv("ATTENTIONOS_WARM_INTERVAL", "300"))
+WARM_BUDGET_SECONDS = 30
+OPTIMIZE_INTERVAL_SECONDS = int(os.getenv("ATTENTIONOS_OPTIMIZE_INTERVAL", str(6 * 3600)))
+OPTIMIZE_BUDGET_SECONDS = 60
+OPTIMIZE_ANALYSIS_LIMIT = 1000
+request_activity = RequestActivity()
+scheduler = None
+
+# Opt-in fast serialisation for the large list endpoints (see list_response)
+FAST_JSON = os.getenv("ATTENTIONOS_FAST_JSON", "") == "1"
 
 app = FastAPI(title="AttentionOS API", version="1.0.0")
 
@@ -32,9 +111,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
-# App categories for demo data
+# gzip/brotli negotiated per request; see compression.py for the settings
+app.add_middleware(CompressionMiddleware)
+
+# Requests in flight; background jobs wait for a quiet moment to start
+app.add_middleware(ActivityMiddleware, activity=request_activity)
+
+# App pools for demo data (stored categories come from the category rules)
 PRODUCTIVE_APPS = ["VSCode", "Terminal", "Xcode", "PyCharm", "Figma", "Notion", "Chrome - Docs", "Chrome - GitHub"]
 NEUTRAL_APPS = ["Chrome", "Safari", "Finder", "Notes", "Preview", "Spotify"]
 DISTRACTING_APPS = ["WhatsApp", "Slack", "Discord", "Twitter", "YouTube", "Reddit", "Instagram", "TikTok"]
@@ -44,14 +130,36 @@ ALL_APPS = PRODUCTIVE_APPS + NEUTRAL_APPS + DISTRACTING_APPS
 # GEMINI AI COACH CONFIGURATION
 # ============================================
 
-# Get API key from environment variable and configure SDK
+# Get API key from environment variable; the SDK is configured on first use
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    # Use gemini-2.5-flash for fast responses (2.5-pro quota exhausted on free tier)
-    GEMINI_MODEL = genai.GenerativeModel('gemini-2.5-flash')
-else:
-    GEMINI_MODEL = None
+
+# Which coach answers (see coach.py): auto (Gemini if a key is set, else
+# local), gemini, local, or hedged (Gemini within the budget, else local)
+COACH_MODE = os.getenv("ATTENTIONOS_COACH", "auto")
+COACH_BUDGET_SECONDS = int(os.getenv("ATTENTIONOS_COACH_BUDGET_MS", "2500")) / 1000
+
+# /api/ai/explain/batch: sessions packed into one model call, model calls
+# in flight at once, and sessions accepted per request
+AI_BATCH_SIZE = int(os.getenv("ATTENTIONOS_AI_BATCH_SIZE", "8"))
+AI_BATCH_CONCURRENCY = int(os.getenv("ATTENTIONOS_AI_BATCH_CONCURRENCY", "2"))
+AI_BATCH_MAX_SESSIONS = 100
+_gemini = None
+
+
+def gemini():
+    """
+    Return (genai module, model), importing and configuring the SDK on the
+    first AI call. google.generativeai takes longer to import than the rest
+    of the backend together, and many deployments never call it.
+    """
+    global _gemini
+    if _gemini is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        # Use gemini-2.5-flash for fast responses (2.5-pro quota exhausted on free tier)
+        _gemini = (genai, genai.GenerativeModel('gemini-2.5-flash'))
+    return _gemini
+
 
 # Pydantic model for session data input
 class SessionData(BaseModel):
@@ -65,80 +173,112 @@ class SessionData(BaseModel):
     top_apps: Optional[List[str]] = []
     session_date: Optional[str] = None
 
-# Fallback AI response for demos/errors
-FALLBACK_AI_RESPONSE = """
-🎯 **Great session overall!** Here's my analysis:
+def get_db_connection(shard: str = DEFAULT_SHARD, create: bool = False):
+    """
+    Return a pooled connection to a shard's database (the default one
+    unless sharding is enabled). close() hands it back to the pool.
+    Only writers pass create=True; a missing shard raises UnknownShard,
+    and creating one past ATTENTIONOS_MAX_SHARDS raises ShardLimitError.
+    """
+    if create:
+        router.check_new_shard(shard)
+    return pool.connect(router.path_for(shard), create=create)
 
-**What went well:**
-- You maintained solid focus throughout the session
-- Good balance between deep work and short breaks
-- App switching was within healthy limits
 
-**Areas to improve:**
-- Consider using time-blocking for your most demanding tasks
-- Try the Pomodoro technique (25 min focus + 5 min break) for better sustained attention
-- Minimize browser tabs to reduce distractions
+def require_shard(user: Optional[str]) -> None:
+    """404 for a ?user= whose shard does not exist, before any handler opens it."""
+    if not router.exists(router.shard_for(user)):
+        raise HTTPException(status_code=404, detail="Unknown user")
 
-**Pro tip:** Your brain needs variety! Alternate between creative and analytical tasks to maintain peak performance.
 
-Keep up the great work! 🚀
-"""
+def init_database():
+    """Initialize database tables if they don't exist, upgrading older layouts."""
+    # The pool runs ensure_schema the first time it opens each file
+    get_db_connection(create=True).close()
+    # Categorise rows from before the category column or a rules change
+    apply_category_rules(category_rules.get())
+    # One-off rewrite of files created before incremental vacuum
+    for shard in router.shards():
+        conn = get_db_connection(shard)
+        try:
+            if ensure_incremental_vacuum(conn):
+                print(f"🧹 Enabled incremental vacuum for shard {shard}")
+        finally:
+            conn.close()
 
 
-def get_db_connection():
-    """Create and return a database connection."""
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def apply_retention_policies(should_stop=None) -> Dict[str, Any]:
+    """
+    Expire old rows in every shard per the retention policies. Each batch
+    holds the shard's write lock, so ingestion is delayed by milliseconds
+    at most; the file lock keeps workers from doing the same pass twice.
+    """
+    policies = load_policies(RETENTION_POLICY_PATH)
+    results = {}
+    with interprocess_lock(RETENTION_LOCK_PATH):
+        for shard in router.shards():
+            lock, _ = shard_state.get(shard)
+            conn = get_db_connection(shard)
+            try:
+                results[shard] = apply_retention(conn, policies, should_stop=should_stop, lock=lock)
+            finally:
+                conn.close()
+    return results
+
+
+def _retention_job(should_stop):
+    summaries = {}
+    for shard, result in apply_retention_policies(should_stop).items():
+        summaries[shard] = describe(result)
+        print(f"🧹 Retention ({shard}): {summaries[shard]}")
+    return summaries
+
+
+def optimize_databases(should_stop=None) -> Dict[str, Any]:
+    """
+    Refresh query planner statistics in every shard. PRAGMA optimize only
+    analyses tables whose contents changed enough to matter, reading at
+    most OPTIMIZE_ANALYSIS_LIMIT rows of each index.
+    """
+    optimized = 0
+    for shard in router.shards():
+        if should_stop and should_stop():
+            break
+        lock, _ = shard_state.get(shard)
+        conn = get_db_connection(shard)
+        try:
+            with lock:
+                conn.execute(f"PRAGMA analysis_limit = {OPTIMIZE_ANALYSIS_LIMIT}")
+                conn.execute("PRAGMA optimize")
+                conn.commit()
+        finally:
+            conn.close()
+        optimized += 1
+    return {"shards": optimized}
 
 
-def init_database():
-    """Initialize database tables if they don't exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            start_time TEXT,
-            end_time TEXT,
-            total_active_seconds INTEGER,
-            total_idle_seconds INTEGER,
-            app_switches INTEGER,
-            focus_score REAL
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            app_name TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT,
-            duration_seconds INTEGER
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS app_switches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            from_app TEXT,
-            to_app TEXT NOT NULL,
-            timestamp TEXT NOT NULL
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+def apply_category_rules(categoriser) -> int:
+    """Bring stored categories in every shard up to date; return rows changed."""
+    changed = 0
+    for shard in router.shards():
+        lock, interner = shard_state.get(shard)
+        with lock:
+            conn = get_db_connection(shard)
+            try:
+                changed += sync_categories(conn, categoriser, interner)
+            finally:
+                conn.close()
+    return changed
 
 
 def generate_demo_data():
     """Generate 20-50 fake focus sessions over the last 7 days."""
     conn = get_db_connection()
     cursor = conn.cursor()
+    interner = Interner()
+    categoriser = category_rules.get()
     
-    # Wipe existing data
+    # Wipe existing data (dimension tables are kept so agent caches stay valid)
     cursor.execute("DELETE FROM sessions")
     cursor.execute("DELETE FROM activity_logs")
     cursor.execute("DELETE FROM app_switches")
@@ -208,8 +348,8 @@ def generate_demo_data():
                                       total_idle_seconds, app_switches, focus_score)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (
-                start_time.isoformat(),
-                end_time.isoformat(),
+                to_epoch(start_time),
+                to_epoch(end_time),
                 active_seconds,
                 idle_seconds,
                 app_switches,
@@ -230,13 +370,14 @@ def generate_demo_data():
                     app_pool = PRODUCTIVE_APPS + NEUTRAL_APPS * 2 + DISTRACTING_APPS * 4 + ["Idle"] * 3
                 
                 app_name = random.choice(app_pool)
+                category = categoriser.categorise(app_name)
                 
                 # Duration based on app type
-                if app_name == "Idle":
+                if category == "idle":
                     duration = random.randint(30, 180)
-                elif app_name in PRODUCTIVE_APPS:
+                elif category == "productive":
                     duration = random.randint(120, 600)
-                elif app_name in DISTRACTING_APPS:
+                elif category == "distracting":
                     duration = random.randint(30, 300)
                 else:
                     duration = random.randint(60, 300)
@@ -245,17 +386,19 @@ def generate_demo_data():
                 actual_duration = int((event_end - current_time).total_seconds())
                 
                 if actual_duration > 0:
+                    app_id = interner.app(conn, app_name)
                     cursor.execute('''
-                        INSERT INTO activity_logs (app_name, start_time, end_time, duration_seconds)
-                        VALUES (?, ?, ?, ?)
-                    ''', (app_name, current_time.isoformat(), event_end.isoformat(), actual_duration))
+                        INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds, category_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (app_id, to_epoch(current_time), to_epoch(event_end), actual_duration,
+                          interner.category(conn, category)))
                     
                     # Record app switch
                     if prev_app and prev_app != app_name:
                         cursor.execute('''
-                            INSERT INTO app_switches (from_app, to_app, timestamp)
+                            INSERT INTO app_switches (from_app_id, to_app_id, timestamp)
                             VALUES (?, ?, ?)
-                        ''', (prev_app, app_name, current_time.isoformat()))
+                        ''', (interner.app(conn, prev_app), app_id, to_epoch(current_time)))
                     
                     prev_app = app_name
                 
@@ -285,20 +428,164 @@ def rows_to_dict(rows) -> List[Dict[str, Any]]:
     return [dict(row) for row in rows]
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database and generate demo data if empty."""
-    init_database()
-    conn = get_db_connection()
+def list_response(conn, query: str, headers: Dict[str, str]) -> Response:
+    """
+    Run a list query and return its rows as a JSON array of objects.
+
+    With ATTENTIONOS_FAST_JSON=1 the rows are streamed through stream_json_rows;
+    otherwise they go through the regular rows_to_dict + JSONResponse path.
+    Pooled connections may be used from Starlette's threadpool, where the
+    streaming body is iterated; it returns the connection when drained.
+    """
+    if not FAST_JSON:
+        rows = conn.execute(query).fetchall()
+        conn.close()
+        return JSONResponse(rows_to_dict(rows), headers=headers)
+
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM sessions")
-    count = cursor.fetchone()[0]
-    conn.close()
-    
-    if count == 0:
+    cursor.row_factory = None
+    cursor.execute(query)
+    return StreamingResponse(stream_json_rows(conn, cursor), media_type="application/json", headers=headers)
+
+
+def fan_out_list_response(request: Request, tables, query: str, sort_key: str) -> Response:
+    """
+    Run a list query on every shard in parallel and merge the results,
+    newest first. Rows gain a "shard" field, since ids are only unique
+    within a shard.
+    """
+    headers = fan_out_cache_headers(tables)
+    if is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    results = fan_out(pool, router, lambda conn: rows_to_dict(conn.execute(query).fetchall()))
+    for shard, rows in results:
+        for row in rows:
+            row["shard"] = shard
+    merged = heapq.merge(*(rows for _, rows in results), key=lambda row: row[sort_key] or "", reverse=True)
+    return JSONResponse(list(merged), headers=headers)
+
+
+def sharded_list_response(request: Request, user: Optional[str], tables, query: str, sort_key: str) -> Response:
+    """
+    Serve a list endpoint from one user's shard, or from all shards merged
+    when sharding is enabled and no user was given.
+    """
+    if router.enabled and user is None:
+        return fan_out_list_response(request, tables, query, sort_key)
+
+    conn = get_db_connection(router.shard_for(user))
+    headers = cache_headers(conn, tables)
+    if is_not_modified(request, headers):
+        conn.close()
+        return Response(status_code=304, headers=headers)
+    return list_response(conn, query, headers)
+
+
+def cache_headers(conn, tables, variant: str = "") -> Dict[str, str]:
+    """
+    Build ETag / Last-Modified headers for a response derived from tables.
+
+    The validators come from the change_counters table maintained by
+    triggers, so computing them never touches the data itself. variant
+    distinguishes responses that also depend on something besides the
+    data (e.g. the start of a rolling time window).
+    """
+    version, modified_at = data_version(conn, tables)
+    return validator_headers(version, modified_at, variant)
+
+
+def fan_out_cache_headers(tables, variant: str = "") -> Dict[str, str]:
+    """cache_headers over every shard; any shard changing changes the ETag."""
+    versions = fan_out(pool, router, lambda conn: data_version(conn, tables))
+    combined = "|".join(f"{shard}:{version}" for shard, (version, _) in versions)
+    modified_at = max(modified for _, (_, modified) in versions)
+    return validator_headers(hashlib.sha1(combined.encode()).hexdigest()[:16], modified_at, variant)
+
+
+def validator_headers(version: str, modified_at: int, variant: str = "") -> Dict[str, str]:
+    return {
+        "ETag": f'W/"{version}-{modified_at}{variant}"',
+        "Last-Modified": formatdate(modified_at, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """Check the request's conditional headers against freshly built validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            return parsedate_to_datetime(headers["Last-Modified"]) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _demo_data_job(should_stop):
+    # Every worker schedules this; the first one to get the lock fills an
+    # empty sessions table and the rest find it filled
+    with interprocess_lock(INIT_LOCK_PATH):
+        conn = get_db_connection()
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        finally:
+            conn.close()
+        if count:
+            return {"generated": False}
         print("📊 No sessions found. Generating demo data...")
         result = generate_demo_data()
         print(f"✅ Generated {result['sessions']} sessions, {result['activity_logs']} activity logs, {result['app_switches']} app switches")
+        return {"generated": True, **result}
+
+
+def background_jobs() -> List[Job]:
+    """The jobs the scheduler runs, highest priority first."""
+    jobs = [Job("demo-data", _demo_data_job, priority=30, jitter=0)]
+    if RETENTION_INTERVAL_SECONDS > 0:
+        try:
+            load_policies(RETENTION_POLICY_PATH)
+        except RetentionError as e:
+            print(f"⚠️ Retention disabled: {e}")
+        else:
+            jobs.append(Job("retention", _retention_job, RETENTION_INTERVAL_SECONDS, priority=20,
+                            time_budget=RETENTION_BUDGET_SECONDS, delay_seconds=60))
+    if WARM_INTERVAL_SECONDS > 0:
+        jobs.append(Job("cache-warm", warm_analytics_caches, WARM_INTERVAL_SECONDS, priority=10,
+                        time_budget=WARM_BUDGET_SECONDS, cpu_budget=WARM_BUDGET_SECONDS / 2))
+    if OPTIMIZE_INTERVAL_SECONDS > 0:
+        jobs.append(Job("optimize", optimize_databases, OPTIMIZE_INTERVAL_SECONDS, priority=0,
+                        time_budget=OPTIMIZE_BUDGET_SECONDS, delay_seconds=OPTIMIZE_INTERVAL_SECONDS))
+    return jobs
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize the database and start background jobs (demo data if empty, maintenance, cache warming)."""
+    # Every worker runs this; the first one to get the lock does the work
+    # and the rest find the schema current
+    with interprocess_lock(INIT_LOCK_PATH):
+        init_database()
+    
+    global scheduler
+    scheduler = Scheduler(request_activity)
+    for job in background_jobs():
+        scheduler.add(job)
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background jobs and close pooled database connections."""
+    if scheduler is not None:
+        scheduler.stop()
+    pool.close_all()
 
 
 @app.get("/api/health")
@@ -307,11 +594,18 @@ async def health_check():
     return {"status": "ok"}
 
 
+def _locked_demo_data() -> Dict[str, Any]:
+    with interprocess_lock(INIT_LOCK_PATH):
+        return generate_demo_data()
+
+
 @app.post("/api/dev/generate-demo-data")
 async def regenerate_demo_data():
     """Wipe existing data and regenerate fresh demo data."""
     try:
-        result = generate_demo_data()
+        # The lock may be held by another worker's demo-data job; wait for
+        # it in the threadpool, not on the event loop
+        result = await run_in_threadpool(_locked_demo_data)
         return {
             "status": "success",
             "message": f"Generated {result['sessions']} sessions with {result['activity_logs']} activity logs",
@@ -322,73 +616,1021 @@ async def regenerate_demo_data():
 
 
 @app.get("/api/sessions")
-async def get_sessions():
-    """Get all session summaries."""
+async def get_sessions(request: Request, user: Optional[str] = None):
+    """Get all session summaries (supports If-None-Match / If-Modified-Since)."""
+    require_shard(user)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, start_time, end_time, total_active_seconds, 
-                   total_idle_seconds, app_switches, focus_score
-            FROM sessions
-            ORDER BY start_time DESC
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-        return rows_to_dict(rows)
+        return await run_in_threadpool(sharded_list_response, request, user, ("sessions",), f'''
+            SELECT s.id, {iso_column("s.start_time")}, {iso_column("s.end_time")},
+                   s.total_active_seconds, s.total_idle_seconds, s.app_switches, s.focus_score
+            FROM sessions s
+            ORDER BY s.start_time DESC
+        ''', "start_time")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/timeline")
-async def get_timeline():
+async def get_timeline(request: Request, user: Optional[str] = None):
     """Get all activity logs ordered by start time (descending)."""
+    require_shard(user)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, app_name, start_time, end_time, duration_seconds
-            FROM activity_logs
-            ORDER BY start_time DESC
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-        return rows_to_dict(rows)
+        return await run_in_threadpool(sharded_list_response, request, user, ("activity_logs",), f'''
+            SELECT l.id, a.name AS app_name, {iso_column("l.start_time")}, {iso_column("l.end_time")},
+                   l.duration_seconds, c.name AS category
+            FROM activity_logs l
+            JOIN apps a ON a.id = l.app_id
+            LEFT JOIN categories c ON c.id = l.category_id
+            ORDER BY l.start_time DESC
+        ''', "start_time")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/app-switches")
-async def get_app_switches():
+async def get_app_switches(request: Request, user: Optional[str] = None):
     """Get all app switch events ordered by timestamp (descending)."""
+    require_shard(user)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, from_app, to_app, timestamp
-            FROM app_switches
-            ORDER BY timestamp DESC
-        ''')
-        rows = cursor.fetchall()
+        return await run_in_threadpool(sharded_list_response, request, user, ("app_switches",), f'''
+            SELECT s.id, f.name AS from_app, t.name AS to_app, {iso_column("s.timestamp")}
+            FROM app_switches s
+            LEFT JOIN apps f ON f.id = s.from_app_id
+            JOIN apps t ON t.id = s.to_app_id
+            ORDER BY s.timestamp DESC
+        ''', "timestamp")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# MULTI-DEVICE INGESTION
+# ============================================
+
+# Shared secret expected from uploading agents; unset, only agents on this
+# machine may upload
+INGEST_TOKEN = os.getenv("ATTENTIONOS_INGEST_TOKEN", "")
+# Largest upload body accepted, before decompression
+MAX_INGEST_BYTES = int(os.getenv("ATTENTIONOS_MAX_INGEST_BYTES", str(16 * 1024 * 1024)))
+LOOPBACK_HOSTS = ("127.0.0.1", "::1")
+
+
+def require_token(request: Request, token: str, detail: str) -> None:
+    """
+    Raise 401 unless the request carries "Authorization: Bearer <token>";
+    with no token configured, only loopback clients are let through.
+    """
+    if token:
+        supplied = request.headers.get("authorization", "").encode()
+        if hmac.compare_digest(supplied, f"Bearer {token}".encode()):
+            return
+    elif request.client is not None and request.client.host in LOOPBACK_HOSTS:
+        return
+    raise HTTPException(status_code=401, detail=detail)
+
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """The request body, or 413 as soon as it passes limit bytes."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=413, detail=f"Body larger than {limit} bytes")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Body larger than {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _ingest(body: bytes, content_encoding: str) -> Dict[str, Any]:
+    payload = decode_body(body, content_encoding)
+    if not isinstance(payload, dict):
+        raise IngestError("batch must be a JSON object")
+    shard = router.shard_for(payload.get("user_id"))
+    # SQLite allows one writer per file; serialising per shard avoids
+    # busy-wait churn while different shards write in parallel
+    lock, interner = shard_state.get(shard)
+    with lock:
+        conn = get_db_connection(shard, create=True)
+        try:
+            return ingest_batch(conn, payload, interner, category_rules.get())
+        finally:
+            conn.close()
+
+
+@app.post("/api/ingest")
+async def ingest_events(request: Request):
+    """
+    Accept a batch of activity, switch, timeline and session events from a
+    remote agent (see uploader.py), into the shard of the batch's user_id.
+    Bodies may be gzip or brotli encoded. Replayed batches and events are
+    ignored, so agents can retry freely.
+    """
+    require_token(request, INGEST_TOKEN, "Invalid ingest token")
+    body = await read_body(request, MAX_INGEST_BYTES)
+    try:
+        return await run_in_threadpool(_ingest, body, request.headers.get("content-encoding", ""))
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ShardLimitError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except Exception as e:
+        print(f"⚠️ Ingest error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# ANALYTICS SUMMARY
+# ============================================
+
+# Window name -> number of calendar days covered (None = all history)
+ANALYTICS_WINDOWS = {"day": 1, "week": 7, "month": 30, "all": None}
+
+def window_start(window: str) -> int:
+    """Epoch second at which a window begins (aligned to local midnight)."""
+    days = ANALYTICS_WINDOWS[window]
+    if days is None:
+        return 0
+    midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return to_epoch(midnight - timedelta(days=days - 1))
+
+
+def compute_session_summary(conn, since: int) -> Dict[str, Any]:
+    """Aggregate session statistics for sessions starting at or after since."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) AS total_sessions,
+               COALESCE(AVG(focus_score), 0) AS avg_focus_score,
+               COALESCE(AVG(total_active_seconds), 0) AS avg_active_seconds,
+               COALESCE(AVG(total_active_seconds + total_idle_seconds), 0) AS avg_duration_seconds,
+               COALESCE(AVG(app_switches), 0) AS avg_app_switches
+        FROM sessions
+        WHERE start_time >= ?
+    ''', (since,))
+    summary = dict(cursor.fetchone())
+
+    def extreme(order):
+        cursor.execute(f'''
+            SELECT s.id, {iso_column("s.start_time")}, s.focus_score
+            FROM sessions s
+            WHERE s.start_time >= ?
+            ORDER BY s.focus_score {order}
+            LIMIT 1
+        ''', (since,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    summary["best_session"] = extreme("DESC")
+    summary["worst_session"] = extreme("ASC")
+
+    # Last 10 sessions, oldest first, for the trend charts
+    cursor.execute(f'''
+        SELECT s.id, {iso_column("s.start_time")}, s.focus_score,
+               s.total_active_seconds, s.total_idle_seconds, s.app_switches
+        FROM sessions s
+        WHERE s.start_time >= ?
+        ORDER BY s.start_time DESC
+        LIMIT 10
+    ''', (since,))
+    recent = rows_to_dict(cursor.fetchall())[::-1]
+    summary["recent_sessions"] = recent
+    summary["is_improving"] = is_improving(recent)
+    return summary
+
+
+def is_improving(recent) -> bool:
+    return len(recent) >= 3 and recent[-1]["focus_score"] > recent[0]["focus_score"]
+
+
+def merge_session_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-shard compute_session_summary results into one."""
+    total = sum(s["total_sessions"] for s in summaries)
+    merged: Dict[str, Any] = {"total_sessions": total}
+    for field in ("avg_focus_score", "avg_active_seconds", "avg_duration_seconds", "avg_app_switches"):
+        merged[field] = sum(s[field] * s["total_sessions"] for s in summaries) / total if total else 0
+    
+    best = [s["best_session"] for s in summaries if s["best_session"]]
+    worst = [s["worst_session"] for s in summaries if s["worst_session"]]
+    merged["best_session"] = max(best, key=lambda s: s["focus_score"], default=None)
+    merged["worst_session"] = min(worst, key=lambda s: s["focus_score"], default=None)
+    
+    recent = sorted((r for s in summaries for r in s["recent_sessions"]), key=lambda r: r["start_time"] or "")
+    merged["recent_sessions"] = recent[-10:]
+    merged["is_improving"] = is_improving(merged["recent_sessions"])
+    return merged
+
+
+def analytics_scope(user: Optional[str]) -> str:
+    """"*" for every shard (sharding on and no user), else the user's shard."""
+    return "*" if router.enabled and user is None else router.shard_for(user)
+
+
+@contextmanager
+def analytics_source(scope: str, tables, variant: str = ""):
+    """(connection, validator headers) for a scope; the connection is None for "*"."""
+    if scope == "*":
+        yield None, fan_out_cache_headers(tables, variant=variant)
+        return
+    conn = get_db_connection(scope)
+    try:
+        yield conn, cache_headers(conn, tables, variant=variant)
+    finally:
         conn.close()
-        return rows_to_dict(rows)
+
+
+def cached_session_summary(conn, scope: str, window: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    """compute_session_summary for a window, through the shared cache."""
+    since = window_start(window)
+    
+    def compute():
+        if conn is None:
+            results = fan_out(pool, router, lambda c: compute_session_summary(c, since))
+            return merge_session_summaries([result for _, result in results])
+        return compute_session_summary(conn, since)
+    
+    # Keyed by the data version, so a cached rollup is never stale; all
+    # workers share it through the cache file
+    key = f"summary:{window}:{scope}:{since}:{headers['ETag']}"
+    return shared_cache.get_or_compute(key, compute, SUMMARY_CACHE_TTL)
+
+
+def _analytics_summary(request: Request, window: str, user: Optional[str]) -> Response:
+    scope = analytics_scope(user)
+    with analytics_source(scope, ("sessions",), f"-{window_start(window)}") as (conn, headers):
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        summary = cached_session_summary(conn, scope, window, headers)
+        return JSONResponse({"window": window, **summary}, headers=headers)
+
+
+@app.get("/api/analytics/summary")
+async def get_analytics_summary(request: Request, window: str = "all", user: Optional[str] = None):
+    """
+    Session statistics over a window (day, week, month or all).
+    Replaces downloading every session and aggregating in the browser.
+    With sharding enabled and no user, aggregates across all shards.
+    """
+    require_shard(user)
+    if window not in ANALYTICS_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {list(ANALYTICS_WINDOWS)}")
+    
+    try:
+        return await run_in_threadpool(_analytics_summary, request, window, user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# FOCUS PATTERNS
+# ============================================
+
+PATTERN_TABLES = ("activity_logs", "app_switches")
+
+# NumPy copies of activity_logs/app_switches per shard (see patterns.py)
+pattern_engine = PatternEngine()
+
+
+def load_focus_patterns(conn, shard: str, since: int, until: Optional[int]) -> Dict[str, Any]:
+    """Transitions, dwell times, flow segments and switch bursts for a range."""
+    data = pattern_engine.data(conn, shard, data_version(conn, PATTERN_TABLES))
+    return compute_patterns(data, since, until)
+
+
+def cached_focus_patterns(conn, shard: str, since: int, until: Optional[int],
+                          headers: Dict[str, str]) -> Dict[str, Any]:
+    """load_focus_patterns through the shared cache."""
+    key = f"patterns:{shard}:{since}:{until}:{headers['ETag']}"
+    return shared_cache.get_or_compute(
+        key, lambda: load_focus_patterns(conn, shard, since, until), SUMMARY_CACHE_TTL
+    )
+
+
+def _focus_patterns(request: Request, since: int, until: Optional[int], user: Optional[str]) -> Response:
+    shard = router.shard_for(user)
+    with analytics_source(shard, PATTERN_TABLES, f"-{since}-{until}") as (conn, headers):
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        patterns = cached_focus_patterns(conn, shard, since, until, headers)
+        return JSONResponse({"since": since, "until": until, **patterns}, headers=headers)
+
+
+@app.get("/api/analytics/patterns")
+async def get_focus_patterns(request: Request, window: str = "week", since: Optional[int] = None,
+                             until: Optional[int] = None, user: Optional[str] = None):
+    """
+    Focus patterns over a window (day, week, month or all), or over an explicit
+    [since, until) range in epoch seconds: the app transition matrix, dwell-time
+    distributions, flow (deep work) segments and context-switch bursts.
+    """
+    require_shard(user)
+    if since is None:
+        if window not in ANALYTICS_WINDOWS:
+            raise HTTPException(status_code=400, detail=f"window must be one of {list(ANALYTICS_WINDOWS)}")
+        since = window_start(window)
+    if until is not None and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    
+    try:
+        return await run_in_threadpool(_focus_patterns, request, since, until, user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# FOCUS HEATMAP
+# ============================================
+
+HEATMAP_FORMATS = ("json", "binary")
+
+
+def _focus_heatmap(request: Request, since: int, until: Optional[int], fmt: str, user: Optional[str]) -> Response:
+    fan = router.enabled and user is None
+    variant = f"-{since}-{until}-{fmt}"
+    if fan:
+        conn = None
+        headers = fan_out_cache_headers(("sessions",), variant=variant)
+    else:
+        conn = get_db_connection(router.shard_for(user))
+        headers = cache_headers(conn, ("sessions",), variant=variant)
+    # Without ?format= the representation follows the Accept header
+    headers["Vary"] = "Accept"
+    try:
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
+        if fan:
+            heatmap = build_heatmap([cells for _, cells in fan_out(pool, router, lambda c: load_cells(c, since, until))])
+        else:
+            heatmap = build_heatmap([load_cells(conn, since, until)])
+        if fmt == "binary":
+            return Response(encode_binary(heatmap), media_type=HEATMAP_MEDIA_TYPE, headers=headers)
+        return JSONResponse({"since": since, "until": until, **to_json(heatmap)}, headers=headers)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+@app.get("/api/analytics/heatmap")
+async def get_focus_heatmap(request: Request, window: str = "all", since: Optional[int] = None,
+                            until: Optional[int] = None, format: Optional[str] = None, user: Optional[str] = None):
+    """
+    Focus score, active seconds and switch density per local day and hour,
+    as dense day x 24 matrices over a window (day, week, month or all) or an
+    explicit [since, until) range in epoch seconds, trimmed to the days with
+    sessions. Served as JSON, or in the compact typed-array layout described
+    in heatmap.py with ?format=binary or Accept: application/vnd.attentionos.heatmap.
+    """
+    require_shard(user)
+    if since is None:
+        if window not in ANALYTICS_WINDOWS:
+            raise HTTPException(status_code=400, detail=f"window must be one of {list(ANALYTICS_WINDOWS)}")
+        since = window_start(window)
+    if until is not None and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    if format is None:
+        format = "binary" if HEATMAP_MEDIA_TYPE in request.headers.get("accept", "") else "json"
+    if format not in HEATMAP_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(HEATMAP_FORMATS)}")
+
+    try:
+        return await run_in_threadpool(_focus_heatmap, request, since, until, format, user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# PRODUCTIVITY CATEGORIES
+# ============================================
+
+def compute_category_totals(conn, since: int) -> Dict[str, Any]:
+    """Active time per category for activity starting at or after since."""
+    # Categories are stored with each row, so this reads only idx_activity_logs_category
+    rows = conn.execute('''
+        SELECT c.name AS category, t.seconds, t.activities
+        FROM (
+            SELECT category_id, COALESCE(SUM(duration_seconds), 0) AS seconds, COUNT(*) AS activities
+            FROM activity_logs
+            WHERE start_time >= ? AND category_id IS NOT NULL
+            GROUP BY category_id
+        ) t
+        JOIN categories c ON c.id = t.category_id
+    ''', (since,)).fetchall()
+    return {row["category"]: {"seconds": row["seconds"], "activities": row["activities"]} for row in rows}
+
+
+def merge_category_totals(totals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sum per-shard totals into a list ordered by time, with each category's share."""
+    merged: Dict[str, Dict[str, int]] = {}
+    for shard_totals in totals:
+        for category, values in shard_totals.items():
+            entry = merged.setdefault(category, {"seconds": 0, "activities": 0})
+            entry["seconds"] += values["seconds"]
+            entry["activities"] += values["activities"]
+    
+    total_seconds = sum(entry["seconds"] for entry in merged.values())
+    return sorted((
+        {"category": category, **entry,
+         "share": round(entry["seconds"] / total_seconds, 4) if total_seconds else 0.0}
+        for category, entry in merged.items()
+    ), key=lambda entry: entry["seconds"], reverse=True)
+
+
+def cached_category_totals(conn, scope: str, window: str, headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Merged category totals for a window, through the shared cache."""
+    since = window_start(window)
+    
+    def compute():
+        if conn is None:
+            results = fan_out(pool, router, lambda c: compute_category_totals(c, since))
+            return merge_category_totals([result for _, result in results])
+        return merge_category_totals([compute_category_totals(conn, since)])
+    
+    key = f"categories:{window}:{scope}:{since}:{headers['ETag']}"
+    return shared_cache.get_or_compute(key, compute, SUMMARY_CACHE_TTL)
+
+
+def _category_totals(request: Request, window: str, user: Optional[str]) -> Response:
+    scope = analytics_scope(user)
+    with analytics_source(scope, ("activity_logs",), f"-{window_start(window)}") as (conn, headers):
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        categories = cached_category_totals(conn, scope, window, headers)
+        return JSONResponse({"window": window, "categories": categories}, headers=headers)
+
+
+@app.get("/api/analytics/categories")
+async def get_category_totals(request: Request, window: str = "week", user: Optional[str] = None):
+    """
+    Active time and activity count per productivity category over a window
+    (day, week, month or all), largest first.
+    """
+    require_shard(user)
+    if window not in ANALYTICS_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {list(ANALYTICS_WINDOWS)}")
+    
+    try:
+        return await run_in_threadpool(_category_totals, request, window, user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class CategoryRules(BaseModel):
+    """Category rule set, in the format of data/categories.json."""
+    rules: List[Dict[str, Any]]
+    default: str = "neutral"
+
+
+@app.get("/api/categories")
+async def get_category_rules():
+    """The category rules in effect, with their fingerprint."""
+    return category_rules.get().to_dict()
+
+
+def _save_category_rules(config: CategoryRules) -> Dict[str, Any]:
+    # One rules change at a time across workers; the file is replaced atomically
+    with interprocess_lock(INIT_LOCK_PATH):
+        categoriser = category_rules.save(config.rules, config.default)
+        changed = apply_category_rules(categoriser)
+    return {"status": "success", "fingerprint": categoriser.fingerprint, "recategorised": changed}
+
+
+@app.put("/api/categories")
+async def update_category_rules(request: Request, config: CategoryRules):
+    """
+    Replace the category rules and re-categorise stored activity in every
+    shard. Rules are validated (and their regexes compiled) before anything
+    is written. Needs the admin token, like /api/admin.
+    """
+    require_admin(request)
+    try:
+        return await run_in_threadpool(_save_category_rules, config)
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# SEARCH
+# ============================================
+
+def merge_search_results(results: List[Dict[str, Any]], limit: int, offset: int) -> Dict[str, Any]:
+    """Combine per-shard search_activity pages (each fetched from offset 0) into one page."""
+    rows = sorted(
+        (row for result in results for row in result["results"]),
+        key=lambda row: (-row["relevance"], -row["seconds"]),
+    )
+    return {
+        "results": rows[offset:offset + limit],
+        "total_results": sum(result["total_results"] for result in results),
+        "total_seconds": sum(result["total_seconds"] for result in results),
+        "total_activities": sum(result["total_activities"] for result in results),
+    }
+
+
+def _search(request: Request, q: str, since: int, until: Optional[int], limit: int, offset: int,
+            user: Optional[str]) -> Response:
+    fan = router.enabled and user is None
+    variant = "-" + hashlib.sha1(f"{q}|{since}|{until}|{limit}|{offset}".encode()).hexdigest()[:12]
+    if fan:
+        conn = None
+        headers = fan_out_cache_headers(("activity_logs",), variant=variant)
+    else:
+        conn = get_db_connection(router.shard_for(user))
+        headers = cache_headers(conn, ("activity_logs",), variant=variant)
+    try:
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        
+        if fan:
+            # Every shard's top offset+limit results are enough to build the page
+            results = fan_out(pool, router, lambda c: search_activity(c, q, since, until, offset + limit))
+            for shard, result in results:
+                for row in result["results"]:
+                    row["shard"] = shard
+            found = merge_search_results([result for _, result in results], limit, offset)
+        else:
+            found = search_activity(conn, q, since, until, limit, offset)
+        return JSONResponse({
+            "query": q, "since": since, "until": until, "limit": limit, "offset": offset,
+            "has_more": offset + len(found["results"]) < found["total_results"],
+            **found,
+        }, headers=headers)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+@app.get("/api/search")
+async def search(request: Request, q: str, window: str = "all", since: Optional[int] = None,
+                 until: Optional[int] = None, limit: int = 20, offset: int = 0, user: Optional[str] = None):
+    """
+    Full-text search over window titles and app names. Results are grouped
+    per (app, title) with the time spent, most relevant first, and come with
+    totals over all matches. Filter by window (day, week, month or all) or by
+    an explicit [since, until) range in epoch seconds; page with limit/offset.
+    """
+    require_shard(user)
+    if since is None:
+        if window not in ANALYTICS_WINDOWS:
+            raise HTTPException(status_code=400, detail=f"window must be one of {list(ANALYTICS_WINDOWS)}")
+        since = window_start(window)
+    if until is not None and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    if not 1 <= limit <= SEARCH_MAX_LIMIT or offset < 0:
+        raise HTTPException(status_code=400, detail=f"limit must be 1-{SEARCH_MAX_LIMIT} and offset >= 0")
+    
+    try:
+        return await run_in_threadpool(_search, request, q, since, until, limit, offset, user)
+    except SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# POINT-IN-TIME AND OVERLAP QUERIES
+# ============================================
+
+def merge_interval_results(results: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """Combine per-shard activity_overlapping results into one, earliest first."""
+    merged = {}
+    for key in ("activity", "sessions"):
+        rows = list(heapq.merge(*(result[key] for result in results), key=lambda row: row["start_time"] or ""))
+        merged[key] = rows[:limit]
+        merged[f"{key}_truncated"] = len(rows) > limit or any(result[f"{key}_truncated"] for result in results)
+    return merged
+
+
+def _intervals(request: Request, query, start: int, end: int, limit: int, user: Optional[str],
+               echo: Dict[str, Any]) -> Response:
+    fan = router.enabled and user is None
+    tables = ("activity_logs", "sessions")
+    variant = f"-{start}-{end}-{limit}"
+    if fan:
+        conn = None
+        headers = fan_out_cache_headers(tables, variant=variant)
+    else:
+        conn = get_db_connection(router.shard_for(user))
+        headers = cache_headers(conn, tables, variant=variant)
+    try:
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
+        if fan:
+            results = fan_out(pool, router, lambda c: query(c, start, end, limit))
+            for shard, result in results:
+                for row in result["activity"] + result["sessions"]:
+                    row["shard"] = shard
+            found = merge_interval_results([result for _, result in results], limit)
+        else:
+            found = query(conn, start, end, limit)
+        return JSONResponse({**echo, "limit": limit, **found}, headers=headers)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def check_interval_limit(limit: int):
+    if not 1 <= limit <= INTERVAL_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be 1-{INTERVAL_MAX_LIMIT}")
+
+
+@app.get("/api/activity/at")
+async def get_activity_at(request: Request, at: Optional[int] = None, limit: int = 100, user: Optional[str] = None):
+    """
+    What was running at one instant (epoch seconds, default now): the
+    activity and the session covering it, answered from the interval index.
+    """
+    require_shard(user)
+    check_interval_limit(limit)
+    at = int(time.time()) if at is None else at
+    try:
+        return await run_in_threadpool(
+            _intervals, request, lambda conn, start, _, n: activity_at(conn, start, n),
+            at, at + 1, limit, user, {"at": at},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/activity/overlap")
+async def get_activity_overlap(request: Request, start: int, end: int, limit: int = 100, user: Optional[str] = None):
+    """
+    Activity and sessions overlapping [start, end) in epoch seconds, e.g. a
+    meeting, earliest first, each with the seconds it shares with the range.
+    """
+    require_shard(user)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    check_interval_limit(limit)
+    try:
+        return await run_in_threadpool(
+            _intervals, request, activity_overlapping, start, end, limit, user, {"start": start, "end": end},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# ADMIN: SNAPSHOTS
+# ============================================
+
+# Bearer token required by /api/admin endpoints; unset, they only answer
+# clients on this machine (the server itself listens on every interface)
+ADMIN_TOKEN = os.getenv("ATTENTIONOS_ADMIN_TOKEN", "")
+SNAPSHOT_DIR = os.getenv("ATTENTIONOS_SNAPSHOT_DIR", os.path.join(DATA_DIR, "snapshots"))
+# Snapshot job state lives in the shared cache, so any worker can report it
+SNAPSHOT_JOB_TTL = 24 * 3600
+SNAPSHOT_PROGRESS_INTERVAL = 0.25
+
+
+def require_admin(request: Request) -> None:
+    require_token(request, ADMIN_TOKEN, "Invalid admin token")
+
+
+def run_snapshot_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Take the snapshot described by job, publishing progress as it goes."""
+    key = f"snapshot:{job['id']}"
+    last_published = 0.0
+    
+    def progress(copied: int, total: int):
+        nonlocal last_published
+        now = time.monotonic()
+        if now - last_published >= SNAPSHOT_PROGRESS_INTERVAL or copied == total:
+            job.update(copied_pages=copied, total_pages=total, percent=round(100 * copied / total, 1) if total else 100.0)
+            shared_cache.set(key, job, SNAPSHOT_JOB_TTL)
+            last_published = now
+    
+    try:
+        job.update(status="done", **snapshot(router.path_for(job["shard"]), SNAPSHOT_DIR,
+                                             compress=job["compressed"], progress=progress))
+    except Exception as e:
+        print(f"⚠️ Snapshot {job['id']} failed: {str(e)}")
+        job.update(status="error", error=str(e))
+    job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    shared_cache.set(key, job, SNAPSHOT_JOB_TTL)
+    return job
+
+
+@app.post("/api/admin/snapshot", status_code=202)
+async def create_snapshot(request: Request, compress: bool = False, wait: bool = False, user: Optional[str] = None):
+    """
+    Snapshot the database (the user's shard, if sharded) with SQLite's
+    online backup, while tracking and ingestion carry on (see backup.py).
+    Returns at once with a job to poll at status_url; wait=true returns
+    when the snapshot is written instead.
+    """
+    require_admin(request)
+    require_shard(user)
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "status": "running",
+        "shard": router.shard_for(user),
+        "compressed": compress,
+        "copied_pages": 0,
+        "total_pages": None,
+        "percent": 0.0,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    job["status_url"] = f"/api/admin/snapshot/{job['id']}"
+    shared_cache.set(f"snapshot:{job['id']}", job, SNAPSHOT_JOB_TTL)
+    
+    if wait:
+        job = await run_in_threadpool(run_snapshot_job, job)
+        if job["status"] == "error":
+            raise HTTPException(status_code=500, detail=job["error"])
+        return JSONResponse(job)
+    Thread(target=run_snapshot_job, args=(dict(job),), daemon=True, name=f"snapshot-{job['id']}").start()
+    return job
+
+
+@app.get("/api/admin/snapshot/{job_id}")
+async def get_snapshot(job_id: str, request: Request):
+    """Progress or result of a snapshot job."""
+    require_admin(request)
+    job = await run_in_threadpool(shared_cache.get, f"snapshot:{job_id}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown snapshot job")
+    return job
+
+
+# ============================================
+# ADMIN: BULK IMPORT
+# ============================================
+
+# Request bodies are spooled to disk past this size, so imports of any size
+# stream through a bounded amount of memory
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def _import_history(body, fmt: str, source: str, user: Optional[str], derive: bool) -> Dict[str, Any]:
+    shard = router.shard_for(user)
+    # Holds the shard's write lock until the import commits: ingestion into
+    # this shard waits, other shards carry on
+    lock, interner = shard_state.get(shard)
+    with lock:
+        conn = get_db_connection(shard, create=True)
+        try:
+            return import_history(conn, body, fmt, interner, category_rules.get(), source=source,
+                                  user_uid=user, derive=derive)
+        finally:
+            conn.close()
+
+
+@app.post("/api/admin/import")
+async def import_activity_history(request: Request, format: Optional[str] = None, source: str = "import",
+                                  user: Optional[str] = None, derive: bool = True):
+    """
+    Bulk-import history exported from another tracker (see importer.py)
+    into the user's shard: CSV, JSON or NDJSON records in the body, gzip
+    allowed. format defaults from the Content-Type. Switches and sessions
+    missing from the input are derived unless derive=false; a body already
+    imported under the same source is reported as a duplicate.
+    """
+    require_admin(request)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    fmt = format or IMPORT_CONTENT_TYPES.get(content_type)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding not in ("identity", "gzip"):
+        raise HTTPException(status_code=400, detail=f"unsupported Content-Encoding: {encoding}")
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        body = gzip.GzipFile(fileobj=spool, mode="rb") if encoding == "gzip" else spool
+        return await run_in_threadpool(_import_history, body, fmt, source, user, derive)
+    except (HistoryImportError, gzip.BadGzipFile, EOFError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ShardLimitError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except Exception as e:
+        print(f"⚠️ Import error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        spool.close()
+
+
+# ============================================
+# ADMIN: PROFILING
+# ============================================
+
+# Per process: with several workers, each request profiles the one that
+# serves it (responses carry its pid)
+allocation_tracker = AllocationTracker()
+
+
+def profiler_error(e: ProfilerError) -> HTTPException:
+    return HTTPException(status_code=409 if isinstance(e, ProfilerBusy) else 400, detail=str(e))
+
+
+@app.post("/api/admin/profile/cpu")
+async def profile_backend_cpu(request: Request, seconds: float = 10, interval_ms: float = PROFILE_INTERVAL_SECONDS * 1000,
+                              mode: str = "cpu", format: str = "folded"):
+    """
+    Sample every thread's stack for `seconds` (see profiling.py). Returns
+    folded stacks for flamegraph.pl or speedscope, or with format=json the
+    heaviest functions as well.
+    """
+    require_admin(request)
+    if format not in ("folded", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'folded' or 'json'")
+    try:
+        profile = await run_in_threadpool(profile_cpu, seconds, interval_ms / 1000, mode)
+    except ProfilerError as e:
+        raise profiler_error(e)
+    if format == "json":
+        return summarise(profile)
+    return Response(folded(profile), media_type="text/plain; charset=utf-8",
+                    headers={"X-Profile-Samples": str(profile["samples"]), "X-Profile-Pid": str(profile["pid"])})
+
+
+@app.get("/api/admin/profile/memory")
+async def get_allocation_tracking(request: Request):
+    """Whether tracemalloc is tracing, memory traced so far and the kept snapshots."""
+    require_admin(request)
+    return allocation_tracker.status()
+
+
+@app.post("/api/admin/profile/memory/start")
+async def start_allocation_tracking(request: Request, frames: int = 10):
+    """Start tracing allocations, keeping up to `frames` frames per allocation."""
+    require_admin(request)
+    return allocation_tracker.start(frames)
+
+
+@app.post("/api/admin/profile/memory/stop")
+async def stop_allocation_tracking(request: Request):
+    """Stop tracing and drop the kept snapshots."""
+    require_admin(request)
+    return allocation_tracker.stop()
+
+
+@app.post("/api/admin/profile/memory/snapshot")
+async def take_allocation_snapshot(request: Request, limit: int = 20, group_by: str = "lineno"):
+    """Snapshot traced allocations; returns its id and the largest allocation sites."""
+    require_admin(request)
+    try:
+        return await run_in_threadpool(allocation_tracker.snapshot, limit, group_by)
+    except ProfilerError as e:
+        raise profiler_error(e)
+
+
+@app.get("/api/admin/profile/memory/diff")
+async def diff_allocation_snapshots(request: Request, base: int, target: Optional[int] = None,
+                                    limit: int = 20, group_by: str = "lineno"):
+    """Allocation growth from snapshot `base` to `target` (a new snapshot if omitted)."""
+    require_admin(request)
+    try:
+        return await run_in_threadpool(allocation_tracker.diff, base, target, limit, group_by)
+    except ProfilerError as e:
+        raise profiler_error(e)
+
+
+# ============================================
+# ADMIN: BACKGROUND JOBS
+# ============================================
+
+def warm_analytics_caches(should_stop) -> Dict[str, Any]:
+    """
+    Fill the shared cache with what the dashboard and deep analysis read
+    first: the session summary for every window, then this week's category
+    totals and focus patterns, across all shards and for each one. Entries
+    are keyed by data version, so one that is still current costs a lookup.
+    """
+    top = analytics_scope(None)
+    since = window_start("week")
+    steps = [(top, "summary", window) for window in ANALYTICS_WINDOWS]
+    if top == "*":
+        steps.append((top, "categories", "week"))
+    for shard in router.shards():
+        steps += [(shard, "categories", "week"), (shard, "patterns", "week")]
+
+    warmed = 0
+    for scope, kind, window in steps:
+        if should_stop():
+            break
+        if kind == "summary":
+            with analytics_source(scope, ("sessions",), f"-{window_start(window)}") as (conn, headers):
+                cached_session_summary(conn, scope, window, headers)
+        elif kind == "categories":
+            with analytics_source(scope, ("activity_logs",), f"-{since}") as (conn, headers):
+                cached_category_totals(conn, scope, window, headers)
+        else:
+            with analytics_source(scope, PATTERN_TABLES, f"-{since}-None") as (conn, headers):
+                cached_focus_patterns(conn, scope, since, None, headers)
+        warmed += 1
+    return {"warmed": warmed, "of": len(steps)}
+
+
+@app.get("/api/admin/jobs")
+async def get_background_jobs(request: Request):
+    """
+    State, schedule and last run (duration, CPU time, time spent waiting
+    for requests to finish, error) of this worker's background jobs.
+    """
+    require_admin(request)
+    return {
+        "pid": os.getpid(),
+        "requests_in_flight": request_activity.in_flight,
+        "jobs": scheduler.status() if scheduler is not None else [],
+    }
+
+
+@app.post("/api/admin/jobs/{name}/run", status_code=202)
+async def run_background_job(name: str, request: Request):
+    """Run a background job as soon as requests allow, instead of at its next slot."""
+    require_admin(request)
+    if scheduler is None or not scheduler.run_now(name):
+        raise HTTPException(status_code=404, detail="Unknown background job")
+    return {"status": "scheduled", "name": name, "status_url": "/api/admin/jobs"}
+
+
 # ============================================
 # GEMINI AI COACH ENDPOINT
 # ============================================
 
-@app.post("/api/ai/explain")
-async def get_ai_explanation(session: SessionData):
+def generate_ai_text(kind: str, prompt: str, max_output_tokens: int) -> Optional[str]:
     """
-    Get AI-powered coaching and insights for a focus session.
-    Uses Gemini Pro API with fallback for demos/errors.
+    Ask Gemini for a response to prompt, or None if it returned nothing.
+
+    Successful responses are kept in the shared cache for AI_CACHE_TTL, so
+    identical prompts (same session data, same question) are answered once
+    across all workers. API errors propagate to the caller's fallback.
     """
+    def generate():
+        genai, model = gemini()
+        response = model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.7,
+                max_output_tokens=max_output_tokens,
+                top_p=0.9
+            )
+        )
+        return {"text": response.text if response else None}
     
-    # Build the prompt with session data
-    prompt = f"""You are an AI productivity coach named Focus Coach. Based on the following focus session data, provide clear, helpful feedback. Be encouraging but honest. Use emojis sparingly.
+    return shared_cache.get_or_compute(
+        ai_cache_key(kind, prompt), generate, AI_CACHE_TTL, should_cache=lambda value: bool(value["text"])
+    )["text"]
+
+
+def ai_cache_key(kind: str, prompt: str) -> str:
+    """Shared-cache key of the model's response to prompt."""
+    return f"ai:{kind}:{hashlib.sha256(prompt.encode()).hexdigest()}"
+
+
+coach = make_coach(COACH_MODE, generate_ai_text, bool(GEMINI_API_KEY), COACH_BUDGET_SECONDS)
+local_coach = LocalCoach()
+
+
+def coach_reply(kind: str, prompt: str, data, max_output_tokens: int,
+                success_message: str) -> Dict[str, Any]:
+    """
+    Ask the configured coach. An error or empty reply from the model is
+    answered by the local coach instead, so responses stay data-specific.
+    data is the coach data, or a callable loading it on first use.
+    """
+    try:
+        answer = coach.answer(kind, prompt, data, max_output_tokens)
+        if answer.text:
+            return {
+                "status": "success",
+                "message": success_message,
+                "response": answer.text,
+                "is_cached": False,
+                "provider": answer.provider
+            }
+        message = "AI returned empty response, using the local coach"
+    except Exception as e:
+        print(f"⚠️ Coach exception ({kind}): {str(e)}")
+        message = f"AI service error: {str(e)}"
+    
+    return {
+        "status": "fallback",
+        "message": message,
+        "response": local_coach.answer(kind, prompt, data, max_output_tokens).text,
+        "is_cached": False,
+        "provider": local_coach.name
+    }
+
+
+def explain_prompt(session: SessionData) -> str:
+    """The single-session coaching prompt (also the cache key of its answer)."""
+    return f"""You are an AI productivity coach named Focus Coach. Based on the following focus session data, provide clear, helpful feedback. Be encouraging but honest. Use emojis sparingly.
 
 SESSION DATA:
 - Focus Score: {session.focus_score:.1f}%
@@ -407,52 +1649,203 @@ Analyze this session and respond with:
 
 Keep your response concise and under 200 words. Use markdown formatting."""
 
-    # Check if API key is configured
-    if not GEMINI_API_KEY:
-        print("⚠️ GEMINI_API_KEY not set, using fallback response")
+
+def load_session_metrics(user: Optional[str], session_ids: List[int]) -> Dict[int, SessionData]:
+    """
+    SessionData for stored sessions, by ID, with the three apps used most
+    during each session: one query for all of them. IDs that do not exist
+    are left out.
+    """
+    conn = get_db_connection(router.shard_for(user))
+    try:
+        rows = conn.execute(f'''
+            WITH picked AS (
+                SELECT id, start_time, end_time, total_active_seconds, total_idle_seconds,
+                       app_switches, focus_score
+                FROM sessions
+                WHERE id IN (SELECT value FROM json_each(?))
+            ),
+            usage AS (
+                SELECT p.id AS session_id, l.app_id, SUM(l.duration_seconds) AS seconds
+                FROM picked p
+                JOIN activity_logs l ON l.start_time >= p.start_time AND l.start_time < p.end_time
+                GROUP BY p.id, l.app_id
+            ),
+            ranked AS (
+                SELECT session_id, app_id,
+                       ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY seconds DESC, app_id) AS position
+                FROM usage
+            )
+            SELECT p.id, {iso_column("p.start_time")}, p.total_active_seconds, p.total_idle_seconds,
+                   p.app_switches, p.focus_score, a.name AS app_name
+            FROM picked p
+            LEFT JOIN ranked r ON r.session_id = p.id AND r.position <= 3
+            LEFT JOIN apps a ON a.id = r.app_id
+            ORDER BY p.id, r.position
+        ''', (json.dumps(session_ids),)).fetchall()
+    finally:
+        conn.close()
+    
+    metrics = {}
+    for row in rows:
+        if row["id"] not in metrics:
+            active = row["total_active_seconds"] or 0
+            idle = row["total_idle_seconds"] or 0
+            # Same numbers the dashboard sends for a single session
+            metrics[row["id"]] = SessionData(
+                id=row["id"],
+                focus_score=row["focus_score"] or 0,
+                duration_minutes=(active + idle) / 60,
+                active_time_minutes=active / 60,
+                idle_time_minutes=idle / 60,
+                app_switches=row["app_switches"] or 0,
+                top_apps=[],
+                session_date=row["start_time"].split("T")[0] if row["start_time"] else "Today",
+            )
+        if row["app_name"]:
+            metrics[row["id"]].top_apps.append(row["app_name"])
+    return metrics
+
+
+@app.post("/api/ai/explain")
+async def get_ai_explanation(session: SessionData, user: Optional[str] = None):
+    """
+    Get AI-powered coaching and insights for a focus session, from the
+    configured coach (Gemini or the local coach, see coach.py). A stored
+    session sent without top_apps gets them filled in, as the batch
+    endpoint does, so answers it cached are reused.
+    """
+    require_shard(user)
+    if session.id is not None and not session.top_apps:
+        try:
+            stored = await run_in_threadpool(load_session_metrics, user, [session.id])
+            if session.id in stored:
+                session.top_apps = stored[session.id].top_apps
+        except Exception as e:
+            print(f"⚠️ Could not load top apps for session {session.id}: {str(e)}")
+    
+    return await run_in_threadpool(
+        coach_reply, "explain", explain_prompt(session), dict(session), 2000, "AI analysis complete"
+    )
+
+
+class BatchExplainRequest(BaseModel):
+    """Sessions to coach in one request: stored session IDs and/or session data."""
+    session_ids: List[int] = []
+    sessions: List[SessionData] = []
+
+
+def explain_batch(sessions: List[SessionData]) -> Dict[str, Any]:
+    """
+    Coach many sessions with as few model calls as possible.
+
+    Answers already in the AI cache are used as-is. The rest are packed
+    AI_BATCH_SIZE to a prompt (see coach.pack_prompts) and sent with at most
+    AI_BATCH_CONCURRENCY calls in flight; each answer is then cached under
+    its single-session prompt, so a later /api/ai/explain for the same
+    session is served from the cache. Sessions a call failed or skipped are
+    answered by the local coach. Hedged mode's latency budget does not
+    apply: a batch is a prefetch, and waiting for the model is the point.
+    """
+    def model_result(text: str, is_cached: bool) -> Dict[str, Any]:
         return {
-            "status": "fallback",
-            "message": "AI coaching running in demo mode (API key not configured)",
-            "response": FALLBACK_AI_RESPONSE,
-            "is_cached": True
+            "status": "success",
+            "message": "AI analysis complete",
+            "response": text,
+            "is_cached": is_cached,
+            "provider": "gemini"
         }
     
-    try:
-        # Call Gemini API using official SDK
-        response = GEMINI_MODEL.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=2000,
-                top_p=0.9
-            )
-        )
-        
-        # Extract text from response
-        if response and response.text:
-            return {
-                "status": "success",
-                "message": "AI analysis complete",
-                "response": response.text,
-                "is_cached": False
-            }
+    results: List[Optional[Dict[str, Any]]] = [None] * len(sessions)
+    prompts = [explain_prompt(session) for session in sessions]
+    uses_model = coach.name != local_coach.name
+    pending = {}
+    cached = 0
+    
+    for i, prompt in enumerate(prompts if uses_model else []):
+        hit = shared_cache.get(ai_cache_key("explain", prompt))
+        if hit and hit["text"]:
+            results[i] = model_result(hit["text"], True)
+            cached += 1
         else:
-            # Empty response, use fallback
-            return {
-                "status": "fallback",
-                "message": "AI returned empty response, using cached insights",
-                "response": FALLBACK_AI_RESPONSE,
-                "is_cached": True
+            pending[str(i)] = prompt
+    
+    def answer_chunk(chunk: Dict[str, str]) -> Dict[str, str]:
+        try:
+            if len(chunk) == 1:
+                # A lone session is an ordinary explain call, cached as such
+                (key, prompt), = chunk.items()
+                text = generate_ai_text("explain", prompt, max_output_tokens=2000)
+                return {key: text} if text else {}
+            text = generate_ai_text(
+                "explain-batch", pack_prompts(chunk), max_output_tokens=min(8192, 600 * len(chunk))
+            )
+            answers = unpack_reply(text, list(chunk))
+            for key, answer in answers.items():
+                shared_cache.set(ai_cache_key("explain", chunk[key]), {"text": answer}, AI_CACHE_TTL)
+            return answers
+        except Exception as e:
+            print(f"⚠️ Batch coach call failed for {len(chunk)} sessions: {str(e)}")
+            return {}
+    
+    keys = list(pending)
+    chunks = [{key: pending[key] for key in keys[i:i + AI_BATCH_SIZE]} for i in range(0, len(keys), AI_BATCH_SIZE)]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=AI_BATCH_CONCURRENCY) as executor:
+            for answers in executor.map(answer_chunk, chunks):
+                for key, answer in answers.items():
+                    results[int(key)] = model_result(answer, False)
+    
+    for i, session in enumerate(sessions):
+        if results[i] is None:
+            results[i] = {
+                "status": "fallback" if uses_model else "success",
+                "message": "Answered by the local coach" if uses_model else "AI analysis complete",
+                "response": local_coach.answer("explain", prompts[i], dict(session), 2000).text,
+                "is_cached": False,
+                "provider": local_coach.name
             }
-            
+    return {"results": results, "model_calls": len(chunks), "cached": cached}
+
+
+@app.post("/api/ai/explain/batch")
+async def get_ai_explanations(request: BatchExplainRequest, user: Optional[str] = None):
+    """
+    Coaching for many sessions at once: stored sessions by ID (metrics
+    gathered in one query, from the user's shard if sharded) and/or
+    SessionData objects. Results come back in request order, IDs first;
+    an unknown ID gets a result with status "error".
+    """
+    require_shard(user)
+    count = len(request.session_ids) + len(request.sessions)
+    if not 1 <= count <= AI_BATCH_MAX_SESSIONS:
+        raise HTTPException(status_code=400, detail=f"send 1-{AI_BATCH_MAX_SESSIONS} sessions")
+    
+    try:
+        stored = await run_in_threadpool(load_session_metrics, user, request.session_ids) if request.session_ids else {}
     except Exception as e:
-        print(f"⚠️ Gemini API exception: {str(e)}")
-        return {
-            "status": "fallback",
-            "message": f"AI service error: {str(e)}",
-            "response": FALLBACK_AI_RESPONSE,
-            "is_cached": True
-        }
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    sessions = [stored[i] for i in request.session_ids if i in stored] + list(request.sessions)
+    batch = await run_in_threadpool(explain_batch, sessions)
+    answers = iter(batch["results"])
+    
+    results = []
+    for session_id in request.session_ids:
+        if session_id in stored:
+            results.append({"id": session_id, **next(answers)})
+        else:
+            results.append({"id": session_id, "status": "error", "message": "Session not found",
+                            "response": None, "is_cached": False, "provider": None})
+    results += [{"id": session.id, **next(answers)} for session in request.sessions]
+    
+    return {
+        "status": "success",
+        "message": f"Coached {len(sessions)} sessions with {batch['model_calls']} model calls",
+        "results": results,
+        "model_calls": batch["model_calls"],
+        "cached": batch["cached"]
+    }
 
 
 # Fallback for deep analysis
@@ -483,58 +1876,37 @@ You're building strong productivity habits! Keep tracking your sessions to ident
 """
 
 
+def load_coach_data(user: Optional[str]) -> Dict[str, Any]:
+    """
+    The data behind deep analysis and chat, from the user's shard: the
+    coach context (last 7 sessions, newest first, with their aggregates,
+    and all-time top apps and transitions) plus last week's focus
+    patterns and time per category.
+    """
+    shard = router.shard_for(user)
+    since = window_start("week")
+    conn = get_db_connection(shard)
+    try:
+        # Flow segments and switch bursts over the last 7 days; both come
+        # from the cache entries the dashboard and the cache-warm job fill
+        return {
+            **load_coach_context(conn),
+            "patterns": cached_focus_patterns(conn, shard, since, None,
+                                              cache_headers(conn, PATTERN_TABLES, variant=f"-{since}-None")),
+            "categories": cached_category_totals(conn, shard, "week",
+                                                 cache_headers(conn, ("activity_logs",), variant=f"-{since}")),
+        }
+    finally:
+        conn.close()
+
+
 @app.post("/api/ai/deep-analysis")
-async def get_deep_analysis():
-    """Get in-depth AI analysis of the last 7 sessions using Gemini 2.5 Pro."""
+async def get_deep_analysis(user: Optional[str] = None):
+    """Get in-depth coach analysis of the last 7 sessions (the user's shard, if sharded)."""
+    require_shard(user)
     
-    # Fetch last 7 sessions from database
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get last 7 sessions
-        cursor.execute('''
-            SELECT id, start_time, end_time, total_active_seconds, 
-                   total_idle_seconds, app_switches, focus_score
-            FROM sessions
-            ORDER BY start_time DESC
-            LIMIT 7
-        ''')
-        sessions = rows_to_dict(cursor.fetchall())
-        
-        if not sessions:
-            conn.close()
-            return {
-                "status": "fallback",
-                "message": "No sessions found. Generate demo data first.",
-                "response": FALLBACK_DEEP_ANALYSIS,
-                "is_cached": True,
-                "sessions_analyzed": 0
-            }
-        
-        # Get top apps by total usage
-        cursor.execute('''
-            SELECT app_name, SUM(duration_seconds) as total_seconds
-            FROM activity_logs
-            GROUP BY app_name
-            ORDER BY total_seconds DESC
-            LIMIT 10
-        ''')
-        top_apps = rows_to_dict(cursor.fetchall())
-        
-        # Get recent app switches for pattern analysis
-        cursor.execute('''
-            SELECT from_app, to_app, COUNT(*) as switch_count
-            FROM app_switches
-            WHERE from_app IS NOT NULL
-            GROUP BY from_app, to_app
-            ORDER BY switch_count DESC
-            LIMIT 10
-        ''')
-        switch_patterns = rows_to_dict(cursor.fetchall())
-        
-        conn.close()
-        
+        data = await run_in_threadpool(load_coach_data, user)
     except Exception as e:
         print(f"⚠️ Database error in deep analysis: {str(e)}")
         return {
@@ -545,16 +1917,25 @@ async def get_deep_analysis():
             "sessions_analyzed": 0
         }
     
-    # Calculate aggregated statistics
-    total_sessions = len(sessions)
-    avg_focus_score = sum(s['focus_score'] for s in sessions) / total_sessions
-    total_active_mins = sum(s['total_active_seconds'] for s in sessions) / 60
-    total_idle_mins = sum(s['total_idle_seconds'] for s in sessions) / 60
-    total_switches = sum(s['app_switches'] for s in sessions)
+    sessions = data["sessions"]
+    if not sessions:
+        return {
+            "status": "fallback",
+            "message": "No sessions found. Generate demo data first.",
+            "response": FALLBACK_DEEP_ANALYSIS,
+            "is_cached": True,
+            "sessions_analyzed": 0
+        }
+    top_apps, patterns, categories = data["top_apps"], data["patterns"], data["categories"]
     
-    # Find best and worst sessions
-    best_session = max(sessions, key=lambda s: s['focus_score'])
-    worst_session = min(sessions, key=lambda s: s['focus_score'])
+    # Aggregated statistics over the session window
+    stats = data["stats"]
+    total_sessions = stats["count"]
+    avg_focus_score = stats["avg_focus_score"]
+    total_active_mins = stats["total_active_seconds"] / 60
+    total_idle_mins = stats["total_idle_seconds"] / 60
+    total_switches = stats["total_switches"]
+    best_session, worst_session = stats["best"], stats["worst"]
     
     # Format session summaries
     session_summaries = []
@@ -567,8 +1948,26 @@ async def get_deep_analysis():
     # Format top apps
     top_apps_str = ", ".join([f"{a['app_name']} ({a['total_seconds']//60}min)" for a in top_apps[:5]])
     
-    # Format switch patterns
-    switch_str = ", ".join([f"{p['from_app']}→{p['to_app']} ({p['switch_count']}x)" for p in switch_patterns[:5]])
+    # Format switch patterns (all history)
+    switch_str = ", ".join([
+        f"{p['from_app']}→{p['to_app']} ({p['count']}x, {p['probability']:.0%} of switches away from {p['from_app']})"
+        for p in data["transitions"]
+    ])
+    
+    # Format time per productivity category
+    category_str = ", ".join(
+        f"{c['category']} {c['seconds'] // 60}min ({c['share']:.0%})" for c in categories
+    )
+    
+    # Format flow and context-switch bursts
+    flow, bursts = patterns["flow"], patterns["bursts"]
+    flow_str = (
+        f"- Flow segments (25+ min of uninterrupted deep work): {flow['count']}, "
+        f"{flow['total_seconds'] // 60} min in total, longest {flow['longest_seconds'] // 60} min, "
+        f"{flow['share_of_active']:.0%} of active time\n"
+        f"- Context-switch bursts (5+ switches within 2 min): {bursts['count']}, "
+        f"covering {bursts['share_of_switches']:.0%} of all switches"
+    )
     
     # Build comprehensive prompt
     prompt = f"""You are Focus Coach, an expert AI productivity analyst. Analyze the following 7-day productivity data and provide a comprehensive, actionable analysis.
@@ -587,9 +1986,15 @@ async def get_deep_analysis():
 ## TOP APPS BY USAGE:
 {top_apps_str}
 
+## TIME BY CATEGORY (last 7 days):
+{category_str if category_str else "No categorised activity"}
+
 ## COMMON APP SWITCH PATTERNS:
 {switch_str if switch_str else "No patterns detected"}
 
+## FLOW & CONTEXT SWITCHING:
+{flow_str}
+
 ---
 
 Provide a detailed analysis with the following sections (use markdown formatting):
@@ -615,54 +2020,10 @@ Encouraging closing statement with a key metric to focus on improving.
 
 Keep your response comprehensive but under 400 words. Be specific and reference actual data from the sessions."""
 
-    # Check if API key is configured
-    if not GEMINI_API_KEY or not GEMINI_MODEL:
-        print("⚠️ GEMINI_API_KEY not set, using fallback response")
-        return {
-            "status": "fallback",
-            "message": "AI coaching running in demo mode (API key not configured)",
-            "response": FALLBACK_DEEP_ANALYSIS,
-            "is_cached": True,
-            "sessions_analyzed": total_sessions
-        }
-    
-    try:
-        # Call Gemini 2.5 Pro for deep analysis
-        response = GEMINI_MODEL.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=4000,  # More tokens for detailed analysis
-                top_p=0.9
-            )
-        )
-        
-        if response and response.text:
-            return {
-                "status": "success",
-                "message": "Deep analysis complete",
-                "response": response.text,
-                "is_cached": False,
-                "sessions_analyzed": total_sessions
-            }
-        else:
-            return {
-                "status": "fallback",
-                "message": "AI returned empty response, using cached insights",
-                "response": FALLBACK_DEEP_ANALYSIS,
-                "is_cached": True,
-                "sessions_analyzed": total_sessions
-            }
-            
-    except Exception as e:
-        print(f"⚠️ Gemini API exception in deep analysis: {str(e)}")
-        return {
-            "status": "fallback",
-            "message": f"AI service error: {str(e)}",
-            "response": FALLBACK_DEEP_ANALYSIS,
-            "is_cached": True,
-            "sessions_analyzed": total_sessions
-        }
+    reply = await run_in_threadpool(
+        coach_reply, "deep-analysis", prompt, data, 4000, "Deep analysis complete"
+    )
+    return {**reply, "sessions_analyzed": total_sessions}
 
 
 # Pydantic model for chat messages
@@ -678,16 +2039,9 @@ class ChatRequest(BaseModel):
 
 
 @app.post("/api/ai/chat")
-async def chat_with_ai(request: ChatRequest):
-    """Chat with AI based on previous analysis context."""
-    
-    # Check if API key is configured
-    if not GEMINI_API_KEY or not GEMINI_MODEL:
-        return {
-            "status": "error",
-            "message": "AI service not configured",
-            "response": "I'm currently in demo mode. Please configure the API key to enable chat."
-        }
+async def chat_with_ai(request: ChatRequest, user: Optional[str] = None):
+    """Chat with the coach based on previous analysis context."""
+    require_shard(user)
     
     # Build the system context from the analysis
     system_prompt = f"""You are Focus Coach, a helpful AI productivity assistant. 
@@ -715,36 +2069,20 @@ Use markdown formatting for clarity."""
     # Add final prompt indicator
     full_prompt = "\n".join(conversation_parts) + "\n\nAssistant:"
 
-    try:
-        response = GEMINI_MODEL.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=500,
-                top_p=0.9
-            )
-        )
-        
-        if response and response.text:
-            return {
-                "status": "success",
-                "message": "Chat response generated",
-                "response": response.text
-            }
-        else:
-            return {
-                "status": "error",
-                "message": "Empty response from AI",
-                "response": "I couldn't generate a response. Please try rephrasing your question."
-            }
-            
-    except Exception as e:
-        print(f"⚠️ Chat API exception: {str(e)}")
-        return {
-            "status": "error",
-            "message": f"AI service error: {str(e)}",
-            "response": "I'm having trouble responding right now. Please try again in a moment."
-        }
+    # The local coach answers from the user's data rather than the context
+    # text; it is loaded only if the local coach ends up answering
+    def data():
+        try:
+            coach_data = load_coach_data(user)
+        except Exception as e:
+            print(f"⚠️ Database error in chat: {str(e)}")
+            coach_data = {"sessions": [], "stats": None, "top_apps": [], "transitions": [],
+                          "patterns": None, "categories": []}
+        return {**coach_data, "messages": [dict(message) for message in request.messages]}
+    
+    return await run_in_threadpool(
+        coach_reply, "chat", full_prompt, data, 500, "Chat response generated"
+    )
 
 
 if __name__ == "__main__":
@@ -752,5 +2090,10 @@ if __name__ == "__main__":
     print(f"Database path: {DB_PATH}")
     print("Starting FastAPI server at http://localhost:8000")
     print("API docs available at http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if WORKERS > 1:
+        # Worker processes re-import the app, so it must be passed by name
+        print(f"Running {WORKERS} worker processes")
+        uvicorn.run("main:app", app_dir=BASE_DIR, host="0.0.0.0", port=8000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
 
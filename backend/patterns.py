@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Focus-pattern analytics over activity_logs and app_switches.
+
+Both tables are held in NumPy arrays (refreshed incrementally when the data
+changes) and every statistic is computed with vectorised operations over an
+arbitrary [since, until) range of epoch seconds (until=None: no end):
+
+    transitions  - app-to-app switch counts and probabilities
+    dwell        - how long each visit to an app lasts, overall and per app
+    flow         - uninterrupted deep-work segments
+    bursts       - clusters of rapid context switching
+"""
+
+import itertools
+import os
+import sys
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import from_epoch, rewrite_count
+
+# The agent logs idle time as "IDLE", demo data as "Idle"
+IDLE_APP_NAMES = {"idle"}
+
+# Flow: visits of at least FLOW_MIN_VISIT_SECONDS, back to back (gaps up to
+# FLOW_MAX_GAP_SECONDS), adding up to at least FLOW_MIN_SECONDS. A shorter
+# visit to anything, or going idle, ends the segment.
+FLOW_MIN_SECONDS = 25 * 60
+FLOW_MIN_VISIT_SECONDS = 120
+FLOW_MAX_GAP_SECONDS = 60
+
+# Burst: at least BURST_MIN_SWITCHES app switches within BURST_WINDOW_SECONDS
+BURST_WINDOW_SECONDS = 120
+BURST_MIN_SWITCHES = 5
+
+# Lower edges (seconds) of the dwell-time histogram buckets
+DWELL_BINS = (0, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Apps shown individually in the transition matrix; the rest become "Other"
+MATRIX_APPS = 12
+TOP_ITEMS = 10
+MAX_SEGMENTS = 50
+
+# Rows re-read on every refresh: the agent keeps extending its open activity
+# row, and ingestion upserts the latest row of each device. Updates further
+# back count as rewrites in change_counters and force a full reload, so this
+# must stay above storage.RECENT_ROWS.
+TAIL_ROWS = 256
+
+# Databases whose arrays are kept in memory, least recently used dropped first
+CACHED_DATABASES = int(os.getenv("ATTENTIONOS_PATTERN_CACHE_SIZE", "32"))
+
+
+def _fetch(conn, query, params, columns):
+    """Run query and return its integer rows as an (n, columns) int64 array."""
+    flat = np.fromiter(itertools.chain.from_iterable(conn.execute(query, params)), dtype=np.int64)
+    return flat.reshape(-1, columns)
+
+
+class _TableArray:
+    """One table's rows in id order, refreshed by reading only what changed."""
+
+    def __init__(self, table, query, columns):
+        self.table = table
+        self.query = query
+        self.rows = np.empty((0, columns), dtype=np.int64)
+        self.rewrites = None
+
+    def refresh(self, conn):
+        keep = len(self.rows)
+        # Read before the rows, so a rewrite racing the refresh forces another
+        rewrites = rewrite_count(conn, self.table)
+        if rewrites != self.rewrites:
+            keep = 0
+        elif keep:
+            last_id = int(self.rows[-1, 0])
+            count = conn.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE id <= ?", (last_id,)
+            ).fetchone()[0]
+            # Ids are never reused (AUTOINCREMENT), so fewer rows means deletes
+            keep = max(keep - TAIL_ROWS, 0) if count == keep else 0
+        after_id = int(self.rows[keep - 1, 0]) if keep else 0
+        fresh = _fetch(conn, self.query, (after_id,), self.rows.shape[1])
+        self.rows = np.concatenate([self.rows[:keep], fresh])
+        self.rewrites = rewrites
+
+
+def _time_slice(times, since, until):
+    lo = np.searchsorted(times, since, side="left")
+    hi = len(times) if until is None else np.searchsorted(times, until, side="left")
+    return slice(int(lo), int(max(lo, hi)))
+
+
+def _time_order(times):
+    """Index that sorts rows by time; rows usually arrive sorted already."""
+    if len(times) < 2 or (times[1:] >= times[:-1]).all():
+        return slice(None)
+    return np.argsort(times, kind="stable")
+
+
+class FocusData:
+    """Column arrays of both tables, each sorted by time."""
+
+    def __init__(self, activity_rows, switch_rows, names):
+        order = _time_order(activity_rows[:, 1])
+        self.start = activity_rows[order, 1]
+        self.end = activity_rows[order, 2]
+        self.duration = np.maximum(activity_rows[order, 3], 0)
+        self.app = activity_rows[order, 4]
+
+        order = _time_order(switch_rows[:, 1])
+        self.switch_time = switch_rows[order, 1]
+        self.switch_from = switch_rows[order, 2]
+        self.switch_to = switch_rows[order, 3]
+
+        # names[app_id] -> app name
+        self.names = names
+        idle_ids = [i for i, name in enumerate(names) if name and name.lower() in IDLE_APP_NAMES]
+        self.idle = np.isin(self.app, idle_ids)
+
+    def activity_range(self, since, until):
+        """Slice of activity rows starting in [since, until)."""
+        return _time_slice(self.start, since, until)
+
+    def switch_range(self, since, until):
+        return _time_slice(self.switch_time, since, until)
+
+    def label(self, app_ids):
+        return [self.names[i] for i in app_ids.tolist()]
+
+
+class PatternEngine:
+    """
+    Keeps one FocusData per database, rebuilt when its data version changes,
+    for the max_databases most recently used.
+
+    The rebuild re-reads only new rows and a short tail of recent ones, so
+    after the first load a refresh costs milliseconds even with years of
+    history. Older rows are re-read only after they were updated (a late
+    upsert, re-categorisation), which reloads the table.
+    """
+
+    def __init__(self, max_databases=CACHED_DATABASES):
+        self.max_databases = max_databases
+        self._lock = Lock()
+        self._states = OrderedDict()
+
+    def data(self, conn, key, version):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            else:
+                while self._states and len(self._states) >= self.max_databases:
+                    self._states.popitem(last=False)
+                state = self._states[key] = {
+                    "version": None,
+                    "data": None,
+                    "activity": _TableArray("activity_logs", '''
+                        SELECT id, start_time, COALESCE(end_time, start_time),
+                               COALESCE(duration_seconds, 0), app_id
+                        FROM activity_logs WHERE id > ? ORDER BY id
+                    ''', 5),
+                    "switches": _TableArray("app_switches", '''
+                        SELECT id, timestamp, COALESCE(from_app_id, -1), to_app_id
+                        FROM app_switches WHERE id > ? ORDER BY id
+                    ''', 4),
+                }
+            if state["version"] != version:
+                state["activity"].refresh(conn)
+                state["switches"].refresh(conn)
+                app_rows = conn.execute("SELECT id, name FROM apps").fetchall()
+                names = [None] * (max((row[0] for row in app_rows), default=0) + 1)
+                for app_id, name in app_rows:
+                    names[app_id] = name
+                state["data"] = FocusData(state["activity"].rows, state["switches"].rows, names)
+                state["version"] = version
+            return state["data"]
+
+
+def transitions(data, since, until, top_n=MATRIX_APPS):
+    """Switch counts between apps as a matrix (busiest apps + "Other") and top pairs."""
+    window = data.switch_range(since, until)
+    frm, to = data.switch_from[window], data.switch_to[window]
+    known = frm >= 0
+    frm, to = frm[known], to[known]
+    if not len(frm):
+        return {"apps": [], "matrix": [], "probabilities": [], "top": [], "total": 0}
+
+    ids, dense = np.unique(np.concatenate([frm, to]), return_inverse=True)
+    n = len(ids)
+    f, t = dense[:len(frm)], dense[len(frm):]
+    counts = np.bincount(f * n + t, minlength=n * n).reshape(n, n)
+
+    # Busiest apps by switches in and out; everything else folds into "Other"
+    order = np.argsort(-(counts.sum(axis=0) + counts.sum(axis=1)), kind="stable")
+    keep, rest = order[:top_n], order[top_n:]
+    labels = data.label(ids[keep])
+    if len(rest):
+        matrix = np.zeros((len(keep) + 1, len(keep) + 1), dtype=np.int64)
+        matrix[:-1, :-1] = counts[np.ix_(keep, keep)]
+        matrix[:-1, -1] = counts[np.ix_(keep, rest)].sum(axis=1)
+        matrix[-1, :-1] = counts[np.ix_(rest, keep)].sum(axis=0)
+        matrix[-1, -1] = counts[np.ix_(rest, rest)].sum()
+        labels.append("Other")
+    else:
+        matrix = counts[np.ix_(keep, keep)]
+
+    def normalise(m):
+        totals = m.sum(axis=1, keepdims=True)
+        return np.divide(m, totals, out=np.zeros(m.shape), where=totals > 0)
+
+    flat = counts.ravel()
+    k = min(TOP_ITEMS, int(np.count_nonzero(flat)))
+    top = np.argpartition(-flat, k - 1)[:k]
+    top = top[np.argsort(-flat[top], kind="stable")]
+    probabilities = normalise(counts)
+    return {
+        "apps": labels,
+        "matrix": matrix.tolist(),
+        "probabilities": np.round(normalise(matrix), 4).tolist(),
+        "top": [
+            {
+                "from_app": data.names[ids[i // n]],
+                "to_app": data.names[ids[i % n]],
+                "count": int(flat[i]),
+                "probability": round(float(probabilities.flat[i]), 4),
+            }
+            for i in top.tolist()
+        ],
+        "total": int(len(frm)),
+    }
+
+
+def dwell(data, since, until, top_n=TOP_ITEMS):
+    """Distribution of visit lengths (idle excluded), overall and per app."""
+    window = data.activity_range(since, until)
+    active = ~data.idle[window]
+    app, duration = data.app[window][active], data.duration[window][active]
+    bins = np.asarray(DWELL_BINS)
+    result = {"bins": list(DWELL_BINS), "histogram": [0] * len(bins), "apps": []}
+    if not len(app):
+        return result
+
+    bucket = np.searchsorted(bins, duration, side="right") - 1
+    result["histogram"] = np.bincount(bucket, minlength=len(bins)).tolist()
+
+    ids, group, visits = np.unique(app, return_inverse=True, return_counts=True)
+    total = np.bincount(group, weights=duration)
+    histograms = np.bincount(group * len(bins) + bucket, minlength=len(ids) * len(bins)).reshape(len(ids), len(bins))
+
+    # Percentiles per app: sort by (app, duration) and index into each group
+    ordered = duration[np.lexsort((duration, group))]
+    first = np.concatenate([[0], np.cumsum(visits)[:-1]])
+
+    def percentile(q):
+        return ordered[first + np.floor(q * (visits - 1)).astype(np.int64)]
+
+    p50, p90 = percentile(0.5), percentile(0.9)
+    for i in np.argsort(-total, kind="stable")[:top_n].tolist():
+        result["apps"].append({
+            "app_name": data.names[ids[i]],
+            "visits": int(visits[i]),
+            "total_seconds": int(total[i]),
+            "mean_seconds": round(float(total[i] / visits[i]), 1),
+            "p50_seconds": int(p50[i]),
+            "p90_seconds": int(p90[i]),
+            "histogram": histograms[i].tolist(),
+        })
+    return result
+
+
+def flow(data, since, until):
+    """Deep-work segments (see FLOW_* above), newest first, with totals."""
+    window = data.activity_range(since, until)
+    start, end = data.start[window], data.end[window]
+    duration, app, idle = data.duration[window], data.app[window], data.idle[window]
+    active_seconds = int(duration[~idle].sum())
+    result = {"segments": [], "count": 0, "total_seconds": 0, "longest_seconds": 0,
+              "share_of_active": 0.0, "active_seconds": active_seconds}
+
+    deep = ~idle & (duration >= FLOW_MIN_VISIT_SECONDS)
+    rows = np.flatnonzero(deep)
+    if not len(rows):
+        return result
+
+    # A segment starts at a deep visit that doesn't directly follow another one
+    gap = np.ones(len(rows), dtype=bool)
+    gap[1:] = (np.diff(rows) > 1) | (start[rows[1:]] - end[rows[:-1]] > FLOW_MAX_GAP_SECONDS)
+    first = np.flatnonzero(gap)
+    seg_start = start[rows[first]]
+    seg_end = np.maximum.reduceat(end[rows], first)
+    length = seg_end - seg_start
+    visits = np.diff(np.append(first, len(rows)))
+
+    keep = np.flatnonzero(length >= FLOW_MIN_SECONDS)
+    if not len(keep):
+        return result
+
+    # Main app per kept segment: the app with the most seconds in it
+    segment_of_row = np.repeat(np.arange(len(first)), visits)
+    in_kept = np.isin(segment_of_row, keep)
+    kept_index = np.searchsorted(keep, segment_of_row[in_kept])
+    app_ids, app_group = np.unique(app[rows[in_kept]], return_inverse=True)
+    seconds = np.bincount(kept_index * len(app_ids) + app_group, weights=duration[rows[in_kept]],
+                          minlength=len(keep) * len(app_ids)).reshape(len(keep), len(app_ids))
+    main_app = app_ids[seconds.argmax(axis=1)]
+    apps_used = (seconds > 0).sum(axis=1)
+
+    total = int(length[keep].sum())
+    result.update({
+        "count": int(len(keep)),
+        "total_seconds": total,
+        "longest_seconds": int(length[keep].max()),
+        "share_of_active": round(min(total / active_seconds, 1.0), 4) if active_seconds else 0.0,
+    })
+    for i in range(len(keep) - 1, max(len(keep) - 1 - MAX_SEGMENTS, -1), -1):
+        s = keep[i]
+        result["segments"].append({
+            "start_time": from_epoch(int(seg_start[s])),
+            "end_time": from_epoch(int(seg_end[s])),
+            "duration_seconds": int(length[s]),
+            "visits": int(visits[s]),
+            "apps": int(apps_used[i]),
+            "main_app": data.names[main_app[i]],
+        })
+    return result
+
+
+def bursts(data, since, until):
+    """Periods of rapid switching (see BURST_* above), newest first, with totals."""
+    window = data.switch_range(since, until)
+    times = data.switch_time[window]
+    result = {"bursts": [], "count": 0, "switches_in_bursts": 0, "share_of_switches": 0.0,
+              "peak_switches_per_window": 0, "window_seconds": BURST_WINDOW_SECONDS}
+    if len(times) < BURST_MIN_SWITCHES:
+        return result
+
+    # Switches within BURST_WINDOW_SECONDS after each switch (inclusive of it)
+    reach = np.searchsorted(times, times + BURST_WINDOW_SECONDS, side="right")
+    density = reach - np.arange(len(times))
+    result["peak_switches_per_window"] = int(density.max())
+    dense = np.flatnonzero(density >= BURST_MIN_SWITCHES)
+    if not len(dense):
+        return result
+
+    # Merge overlapping dense windows [i, reach[i] - 1] into bursts
+    last = reach[dense] - 1
+    new = np.ones(len(dense), dtype=bool)
+    new[1:] = dense[1:] > np.maximum.accumulate(last)[:-1]
+    starts = np.flatnonzero(new)
+    burst_first = dense[starts]
+    burst_last = np.maximum.reduceat(last, starts)
+    switches = burst_last - burst_first + 1
+
+    in_bursts = int(switches.sum())
+    result.update({
+        "count": int(len(burst_first)),
+        "switches_in_bursts": in_bursts,
+        "share_of_switches": round(in_bursts / len(times), 4),
+    })
+    for i in range(len(burst_first) - 1, max(len(burst_first) - 1 - MAX_SEGMENTS, -1), -1):
+        result["bursts"].append({
+            "start_time": from_epoch(int(times[burst_first[i]])),
+            "end_time": from_epoch(int(times[burst_last[i]])),
+            "switches": int(switches[i]),
+        })
+    return result
+
+
+def compute_patterns(data, since, until):
+    """All four analyses for [since, until) as one JSON-ready dict."""
+    return {
+        "transitions": transitions(data, since, until),
+        "dwell": dwell(data, since, until),
+        "flow": flow(data, since, until),
+        "bursts": bursts(data, since, until),
+    }
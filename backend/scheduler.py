@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+In-process scheduler for the backend's background jobs.
+
+Maintenance (retention, vacuum, statistics) and cache warming run on one
+daemon thread, one job at a time, so request handlers never do that work
+themselves. Each Job has:
+
+  interval_seconds  run every so often (None: once, or when asked)
+  priority          among jobs that are due, the highest runs first
+  time_budget       wall-clock seconds a run may take
+  cpu_budget        CPU seconds a run may use, measured on the thread
+  jitter            fraction of the interval added or removed at random,
+                    so several backend workers do not run in lockstep
+
+A job is a callable taking should_stop, which it polls between units of
+work; should_stop() turns true once the run is over either budget or the
+scheduler is stopping, and the next run picks up where it left off.
+
+A job that falls due while requests are in flight (as counted by
+RequestActivity) waits for a quiet moment, for at most max_defer_seconds.
+On Linux the scheduler thread also lowers its own CPU priority. Threads
+started from a job inherit it, so a job must not be the first user of a
+thread pool shared with request handlers; shards.fan_out() keeps a
+separate pool per priority for this reason.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Niceness of the scheduler thread (Linux only: elsewhere it applies to
+# the whole process)
+NICE = 10
+
+# Longest a due job waits for requests to drain
+MAX_DEFER_SECONDS = 30.0
+
+
+def _timestamp(epoch):
+    return datetime.fromtimestamp(epoch).isoformat(timespec="seconds") if epoch else None
+
+
+class RequestActivity:
+    """Counts requests in flight; wait_idle() blocks until there are none."""
+
+    def __init__(self):
+        self._in_flight = 0
+        self._idle = threading.Condition()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def enter(self):
+        with self._idle:
+            self._in_flight += 1
+
+    def leave(self):
+        with self._idle:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        """True once nothing is in flight, False if timeout ran out first."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._in_flight, timeout)
+
+
+class ActivityMiddleware:
+    """
+    Pure ASGI middleware counting HTTP requests into a RequestActivity;
+    add with app.add_middleware(ActivityMiddleware, activity=...).
+    """
+
+    def __init__(self, app, activity):
+        self.app = app
+        self.activity = activity
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.activity.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.activity.leave()
+
+
+class Job:
+    """A unit of background work and the record of its runs."""
+
+    def __init__(self, name, fn, interval_seconds=None, priority=0, time_budget=None, cpu_budget=None,
+                 jitter=0.1, delay_seconds=0.0):
+        self.name = name
+        self.fn = fn
+        self.interval_seconds = interval_seconds
+        self.priority = priority
+        self.time_budget = time_budget
+        self.cpu_budget = cpu_budget
+        self.jitter = jitter
+        self.next_run = time.time() + self._jittered(delay_seconds)
+        self.state = "scheduled"
+        self.runs = 0
+        self.failures = 0
+        self.budget_stops = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_cpu = None
+        self.last_deferred = None
+        self.last_error = None
+        self.last_result = None
+
+    def _jittered(self, seconds):
+        return max(0.0, seconds * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def reschedule(self, now):
+        if self.interval_seconds is None:
+            self.next_run = None
+        else:
+            self.next_run = now + self._jittered(self.interval_seconds)
+
+    def status(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "interval_seconds": self.interval_seconds,
+            "priority": self.priority,
+            "time_budget_seconds": self.time_budget,
+            "cpu_budget_seconds": self.cpu_budget,
+            "next_run_at": _timestamp(self.next_run),
+            "runs": self.runs,
+            "failures": self.failures,
+            "budget_stops": self.budget_stops,
+            "last_started_at": _timestamp(self.last_started),
+            "last_duration_ms": self.last_duration and round(self.last_duration * 1000, 1),
+            "last_cpu_ms": self.last_cpu and round(self.last_cpu * 1000, 1),
+            "last_deferred_ms": self.last_deferred and round(self.last_deferred * 1000, 1),
+            "last_error": self.last_error,
+            "last_result": self.last_result,
+        }
+
+
+class Scheduler(threading.Thread):
+    """
+    Runs registered Jobs on a single background thread. Jobs are added with
+    add() before or after start(); run_now() moves one to the front.
+    """
+
+    def __init__(self, activity=None, max_defer_seconds=MAX_DEFER_SECONDS, nice=NICE,
+                 name="attentionos-scheduler"):
+        super().__init__(daemon=True, name=name)
+        self.activity = activity
+        self.max_defer_seconds = max_defer_seconds
+        self.nice = nice
+        self._jobs = {}
+        self._wake = threading.Condition()
+        self._stopping = False
+
+    def add(self, job):
+        with self._wake:
+            self._jobs[job.name] = job
+            self._wake.notify()
+        return job
+
+    def run_now(self, name):
+        """Make a job due at once; False if there is no such job."""
+        with self._wake:
+            job = self._jobs.get(name)
+            if job is None:
+                return False
+            if job.state not in ("waiting", "running"):
+                job.next_run = time.time()
+                job.state = "scheduled"
+            self._wake.notify()
+        return True
+
+    def status(self):
+        with self._wake:
+            return [job.status() for job in sorted(self._jobs.values(), key=lambda job: -job.priority)]
+
+    def _next_job(self):
+        """The job to run now, or (None, seconds until one is due)."""
+        now = time.time()
+        scheduled = [job for job in self._jobs.values() if job.next_run is not None]
+        due = [job for job in scheduled if job.next_run <= now]
+        if due:
+            return max(due, key=lambda job: (job.priority, -job.next_run)), 0
+        return None, min((job.next_run - now for job in scheduled), default=None)
+
+    def _lower_priority(self):
+        if self.nice and sys.platform.startswith("linux"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except (AttributeError, OSError):
+                pass
+
+    def run(self):
+        self._lower_priority()
+        while True:
+            with self._wake:
+                while True:
+                    if self._stopping:
+                        return
+                    job, wait = self._next_job()
+                    if job is not None:
+                        break
+                    self._wake.wait(wait)
+                job.state = "waiting"
+            self._run(job)
+
+    def _run(self, job):
+        deferred = time.monotonic()
+        # Short waits, so stop() is not held up by a busy server
+        while self.activity is not None and not self._stopping:
+            remaining = deferred + self.max_defer_seconds - time.monotonic()
+            if remaining <= 0 or self.activity.wait_idle(min(remaining, 0.5)):
+                break
+        if self._stopping:
+            return
+
+        started, cpu_started = time.monotonic(), time.thread_time()
+        over_budget = False
+
+        def should_stop():
+            nonlocal over_budget
+            if self._stopping:
+                return True
+            if (job.time_budget is not None and time.monotonic() - started > job.time_budget) or \
+                    (job.cpu_budget is not None and time.thread_time() - cpu_started > job.cpu_budget):
+                over_budget = True
+            return over_budget
+
+        job.state = "running"
+        job.last_started = time.time()
+        job.last_deferred = started - deferred
+        try:
+            job.last_result = job.fn(should_stop)
+            job.last_error = None
+        except Exception as e:
+            print(f"⚠️ Background job {job.name} failed: {e}")
+            job.failures += 1
+            job.last_error = str(e)
+        job.runs += 1
+        job.budget_stops += over_budget
+        job.last_duration = time.monotonic() - started
+        job.last_cpu = time.thread_time() - cpu_started
+        with self._wake:
+            job.state = "over budget" if over_budget else "failed" if job.last_error else "idle"
+            job.reschedule(time.time())
+
+    def stop(self):
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        if self.is_alive():
+            self.join()
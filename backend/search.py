@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Full-text search over activity history.
+
+Window titles and app names are indexed once per distinct string by the
+FTS5 tables from storage.create_search_index. A search matches those
+small indexes first and then sums the matching activity from covering
+indexes on (title_id|app_id, start_time, ...), so "how long did I spend
+on PROJ-123 this month" never scans activity_logs.
+
+Results are grouped per (app, window title), ranked by BM25 relevance
+and then by time spent, and paginated with limit/offset. Databases built
+by an SQLite without FTS5 fall back to LIKE over the dimension tables.
+"""
+
+import os
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import from_epoch, has_search_index
+
+MAX_LIMIT = 100
+
+# Sentinel for an open-ended time range in SQL comparisons
+_END_OF_TIME = 2 ** 62
+
+
+class SearchError(ValueError):
+    """Raised for queries with nothing searchable in them."""
+
+
+def query_terms(text):
+    """
+    Split user input into terms: one per whitespace-separated word, each a
+    list of the word's tokens, so "PROJ-123 login" -> [["PROJ", "123"], ["login"]].
+    """
+    terms = [re.findall(r"\w+", word) for word in (text or "").split()]
+    return [term for term in terms if term]
+
+
+def fts_query(terms):
+    """
+    FTS5 MATCH expression for query_terms(): every word must match, a word
+    with several tokens matches them as a phrase, and the last word is a
+    prefix so results appear while the user is still typing.
+    """
+    phrases = ['"' + " ".join(term) + '"' for term in terms]
+    phrases[-1] += " *"
+    return " AND ".join(phrases)
+
+
+def _matches(conn, terms):
+    """(title CTE, app CTE, parameters) selecting matching dimension keys and scores."""
+    if has_search_index(conn):
+        query = fts_query(terms)
+        titles = "SELECT rowid AS id, bm25(window_titles_fts) AS score FROM window_titles_fts WHERE window_titles_fts MATCH ?"
+        apps = "SELECT rowid AS id, bm25(apps_fts) AS score FROM apps_fts WHERE apps_fts MATCH ?"
+        return titles, apps, [query, query]
+
+    # No FTS5: substring match on the distinct strings, all scored equally
+    patterns = ["%" + "%".join(term) + "%" for term in terms]
+    where_title = " AND ".join("title LIKE ?" for _ in patterns)
+    where_app = " AND ".join("name LIKE ?" for _ in patterns)
+    titles = f"SELECT id, 0.0 AS score FROM window_titles WHERE {where_title}"
+    apps = f"SELECT id, 0.0 AS score FROM apps WHERE {where_app}"
+    return titles, apps, patterns + patterns
+
+
+def search_activity(conn, text, since=0, until=None, limit=20, offset=0):
+    """
+    Search activity whose window title or app name matches text, within
+    [since, until) by start time. Returns the requested page of grouped
+    results plus totals over every match.
+    """
+    terms = query_terms(text)
+    if not terms:
+        raise SearchError("query has no searchable words")
+    titles, apps, params = _matches(conn, terms)
+    until = _END_OF_TIME if until is None else until
+
+    # Rows matched through their title are counted there, so the app branch
+    # skips them and time is never counted twice
+    rows = conn.execute(f'''
+        WITH matched_titles AS ({titles}),
+             matched_apps AS ({apps}),
+             hits AS (
+                 SELECT l.app_id, l.title_id, m.score, l.start_time, l.end_time, l.duration_seconds
+                 FROM matched_titles m
+                 JOIN activity_logs l ON l.title_id = m.id
+                 WHERE l.start_time >= ? AND l.start_time < ?
+                 UNION ALL
+                 SELECT l.app_id, l.title_id, m.score, l.start_time, l.end_time, l.duration_seconds
+                 FROM matched_apps m
+                 JOIN activity_logs l ON l.app_id = m.id
+                 WHERE l.start_time >= ? AND l.start_time < ?
+                   AND (l.title_id IS NULL OR l.title_id NOT IN (SELECT id FROM matched_titles))
+             ),
+             grouped AS (
+                 SELECT app_id, title_id, MIN(score) AS score,
+                        COALESCE(SUM(duration_seconds), 0) AS seconds, COUNT(*) AS activities,
+                        MIN(start_time) AS first_seen, MAX(COALESCE(end_time, start_time)) AS last_seen
+                 FROM hits
+                 GROUP BY app_id, title_id
+             ),
+             ranked AS (
+                 SELECT *, COUNT(*) OVER () AS total_results,
+                        SUM(seconds) OVER () AS total_seconds,
+                        SUM(activities) OVER () AS total_activities
+                 FROM grouped
+                 ORDER BY score, seconds DESC, app_id, title_id
+                 LIMIT ? OFFSET ?
+             )
+        SELECT a.name AS app_name, w.title AS window_title, r.score, r.seconds, r.activities,
+               r.first_seen, r.last_seen, r.total_results, r.total_seconds, r.total_activities
+        FROM ranked r
+        JOIN apps a ON a.id = r.app_id
+        LEFT JOIN window_titles w ON w.id = r.title_id
+        ORDER BY r.score, r.seconds DESC, r.app_id, r.title_id
+    ''', (*params, since, until, since, until, limit, offset)).fetchall()
+
+    if not rows and offset:
+        # Past the last page: still report the totals
+        totals = search_activity(conn, text, since, until, limit=1)
+        return {**totals, "results": []}
+
+    first = rows[0] if rows else None
+    return {
+        "results": [
+            {
+                "app_name": row["app_name"],
+                "window_title": row["window_title"],
+                # bm25() is lower-is-better; flip it so higher means more relevant
+                "relevance": round(0.0 - row["score"], 6),
+                "seconds": row["seconds"],
+                "activities": row["activities"],
+                "first_seen": from_epoch(row["first_seen"]),
+                "last_seen": from_epoch(row["last_seen"]),
+            }
+            for row in rows
+        ],
+        "total_results": first["total_results"] if first else 0,
+        "total_seconds": first["total_seconds"] if first else 0,
+        "total_activities": first["total_activities"] if first else 0,
+    }
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Fast JSON encoding for the backend's large list endpoints.
+"""
+
+import json
+from json.encoder import encode_basestring_ascii
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard library
+    orjson = None
+
+# Rows fetched and encoded per chunk of a streamed response
+STREAM_BATCH_ROWS = 5000
+
+
+def dumps(value) -> bytes:
+    """Compact JSON encoding, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _encode_value(value) -> str:
+    """One JSON value, for when orjson is not installed."""
+    kind = type(value)
+    if kind is str:
+        return encode_basestring_ascii(value)
+    if kind is int:
+        return int.__repr__(value)
+    if value is None:
+        return "null"
+    return json.dumps(value)
+
+
+def row_encoder(columns):
+    """
+    Return encode(rows) -> bytes, the comma-separated JSON objects for a
+    batch of tuples with the given columns. The keys are encoded once into
+    a template and each row's values are substituted into it, so no dict
+    is built per row.
+    """
+    keys = [json.dumps(column).replace("%", "%%") for column in columns]
+    if orjson is not None:
+        template = ("{" + ",".join(f"{key}:%b" for key in keys) + "}").encode()
+        encode_value = orjson.dumps
+        return lambda rows: b",".join([template % tuple(map(encode_value, row)) for row in rows])
+    template = "{" + ",".join(f"{key}:%s" for key in keys) + "}"
+    return lambda rows: ",".join([template % tuple(map(_encode_value, row)) for row in rows]).encode()
+
+
+def stream_json_rows(conn, cursor, batch_rows: int = STREAM_BATCH_ROWS):
+    """
+    Yield a JSON array of objects straight from a tuple cursor.
+
+    Rows are pulled with fetchmany and encoded against the cursor's fixed
+    column list (see row_encoder), skipping sqlite3.Row objects and
+    FastAPI's jsonable_encoder. The connection is closed once the cursor
+    is drained (or the client goes away).
+    """
+    try:
+        encode = row_encoder([description[0] for description in cursor.description])
+        yield b"["
+        separator = b""
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            yield separator + encode(rows)
+            separator = b","
+        yield b"]"
+    finally:
+        conn.close()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Per-user database sharding and connection pooling for the backend.
+
+SQLite allows one writer per file, so with many users feeding one backend
+the single data/attentionos.db becomes the write bottleneck. With
+ATTENTIONOS_SHARDING=user (or =team) every user (or team) gets its own
+database file under ATTENTIONOS_SHARD_DIR, and writers for different
+shards never wait on each other. Data without a user - demo data, and
+everything recorded before sharding was enabled - stays in the default
+database, which is always shard "default".
+
+Connections come from a bounded LRU pool (ATTENTIONOS_POOL_SIZE, default
+64) so that serving thousands of shards keeps the number of open file
+handles bounded, and fan_out() runs a query against many shards in
+parallel for endpoints that aggregate across all of them.
+
+Only writers create shards: a read naming a shard without a database file
+raises UnknownShard rather than leaving an empty file behind, and at most
+ATTENTIONOS_MAX_SHARDS shard files are created (ShardLimitError).
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, get_native_id
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import Interner, ensure_schema
+
+DEFAULT_SHARD = "default"
+
+# "" (off), "user" or "team"; team mode reads a {user: team} JSON file
+SHARDING = os.getenv("ATTENTIONOS_SHARDING", "").lower()
+TEAM_MAP_PATH = os.getenv("ATTENTIONOS_TEAM_MAP", "")
+POOL_SIZE = int(os.getenv("ATTENTIONOS_POOL_SIZE", "64"))
+FAN_OUT_WORKERS = int(os.getenv("ATTENTIONOS_FAN_OUT_WORKERS", "8"))
+MAX_SHARDS = int(os.getenv("ATTENTIONOS_MAX_SHARDS", "1000"))
+
+
+class UnknownShard(LookupError):
+    """Raised when opening a database file that does not exist, without create=True."""
+
+
+class ShardLimitError(RuntimeError):
+    """Raised when creating a shard would pass the router's max_shards."""
+
+
+class PooledConnection:
+    """
+    A pooled sqlite3 connection. close() hands it back to the pool instead
+    of closing it, so code written against plain connections works as-is.
+    """
+
+    def __init__(self, pool, path, conn):
+        self._pool = pool
+        self._path = path
+        self._conn = conn
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._path, self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # e.g. a streamed response whose body was never iterated
+        if "_released" in self.__dict__:
+            self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections keyed by database path.
+
+    At most max_connections are open at once, idle or in use. Idle
+    connections are kept in LRU order; when the limit is reached, opening a
+    connection for another file closes the least recently used idle one,
+    and if every connection is busy the caller waits for one to be returned.
+    Each file gets ensure_schema() the first time this process opens it;
+    a file that does not exist yet is only created with create=True.
+    """
+
+    def __init__(self, max_connections=POOL_SIZE):
+        self.max_connections = max_connections
+        self._idle = OrderedDict()  # (path, serial) -> connection
+        self._open = 0
+        self._serial = 0
+        self._ready_paths = set()
+        self._schema_lock = Lock()
+        self._cond = Condition()
+
+    def connect(self, path, create=False):
+        """Return a PooledConnection to path; close() releases it."""
+        if not create and path not in self._ready_paths and not os.path.exists(path):
+            raise UnknownShard(path)
+        with self._cond:
+            while True:
+                for key in reversed(self._idle):
+                    if key[0] == path:
+                        return PooledConnection(self, path, self._idle.pop(key))
+                if self._open < self.max_connections:
+                    break
+                if self._idle:
+                    _, victim = self._idle.popitem(last=False)
+                    victim.close()
+                    self._open -= 1
+                    break
+                self._cond.wait()
+            self._open += 1
+
+        try:
+            conn = self._open_connection(path)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, path, conn)
+
+    def release(self, path, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._serial += 1
+            self._idle[(path, self._serial)] = conn
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection (busy ones close when released)."""
+        with self._cond:
+            while self._idle:
+                _, conn = self._idle.popitem(last=False)
+                conn.close()
+                self._open -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"open": self._open, "idle": len(self._idle), "max": self.max_connections}
+
+    def _open_connection(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Pooled connections move between threadpool threads, one at a time
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if path not in self._ready_paths:
+            with self._schema_lock:
+                if path not in self._ready_paths:
+                    ensure_schema(conn)
+                    self._ready_paths.add(path)
+        return conn
+
+
+def _load_team_map(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return {str(user): str(team) for user, team in json.load(f).items()}
+
+
+class ShardRouter:
+    """
+    Maps users to shard names and shard names to database files.
+
+    mode is "" (everything in the default database), "user" (one file per
+    user) or "team" (one file per team from team_map; users without a team
+    get their own file).
+    """
+
+    def __init__(self, default_path, shard_dir, mode=SHARDING, team_map=None, max_shards=MAX_SHARDS):
+        if mode not in ("", "user", "team"):
+            raise ValueError(f"ATTENTIONOS_SHARDING must be 'user' or 'team', not {mode!r}")
+        self.default_path = default_path
+        self.shard_dir = shard_dir
+        self.mode = mode
+        self.max_shards = max_shards
+        self.team_map = team_map if team_map is not None else (
+            _load_team_map(TEAM_MAP_PATH) if mode == "team" else {}
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.mode)
+
+    def shard_for(self, user_uid):
+        """Shard name holding a user's data."""
+        if not self.mode or not user_uid:
+            return DEFAULT_SHARD
+        user_uid = str(user_uid)
+        if self.mode == "team":
+            user_uid = self.team_map.get(user_uid, user_uid)
+        # Readable prefix plus a hash, so distinct ids never share a file name
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", user_uid)[:40]
+        return f"{safe}-{hashlib.sha1(user_uid.encode()).hexdigest()[:8]}"
+
+    def path_for(self, shard):
+        if shard == DEFAULT_SHARD:
+            return self.default_path
+        return os.path.join(self.shard_dir, f"{shard}.db")
+
+    def exists(self, shard):
+        return shard == DEFAULT_SHARD or os.path.exists(self.path_for(shard))
+
+    def check_new_shard(self, shard):
+        """Raise ShardLimitError if shard is new and max_shards already exist."""
+        if not self.exists(shard) and len(self.shards()) - 1 >= self.max_shards:
+            raise ShardLimitError(f"shard limit of {self.max_shards} reached")
+
+    def shards(self):
+        """Every existing shard name, default first."""
+        names = [DEFAULT_SHARD]
+        if self.mode:
+            names += sorted(
+                os.path.splitext(os.path.basename(path))[0]
+                for path in glob.glob(os.path.join(self.shard_dir, "*.db"))
+            )
+        return names
+
+
+class ShardState:
+    """Per-shard write lock and dimension-key cache, created on first use."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._states = {}
+
+    def get(self, shard):
+        with self._lock:
+            state = self._states.get(shard)
+            if state is None:
+                state = self._states[shard] = (Lock(), Interner())
+            return state
+
+
+_executors = {}
+_executor_lock = Lock()
+
+
+def _priority():
+    """The calling thread's niceness on Linux, where each thread has its own; else 0."""
+    if sys.platform.startswith("linux"):
+        try:
+            return os.getpriority(os.PRIO_PROCESS, get_native_id())
+        except (AttributeError, OSError):
+            pass
+    return 0
+
+
+def _set_priority(nice):
+    if sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, get_native_id(), nice)
+        except (AttributeError, OSError):
+            pass
+
+
+def _executor(max_workers):
+    """
+    The fan-out pool for the calling thread's priority. ThreadPoolExecutor
+    starts workers from whichever thread submits, and Linux threads inherit
+    their creator's niceness, so a single pool first used by a scheduler job
+    would run request handlers' fan-outs niced as well. Each priority gets
+    its own pool, with its workers set to that priority.
+    """
+    nice = _priority()
+    with _executor_lock:
+        executor = _executors.get(nice)
+        if executor is None:
+            executor = _executors[nice] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"shard-fan-out-{nice}",
+                initializer=_set_priority, initargs=(nice,))
+    return executor
+
+
+def fan_out(pool, router, fn, shards=None, max_workers=FAN_OUT_WORKERS):
+    """
+    Call fn(conn) on every shard in parallel and return [(shard, result)]
+    in shard order. Each call gets its own pooled connection, so SQLite
+    work on different files runs concurrently (sqlite3 releases the GIL
+    while a statement executes). The work runs at the caller's priority.
+    """
+    shards = router.shards() if shards is None else shards
+
+    def run(shard):
+        conn = pool.connect(router.path_for(shard))
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+
+    if len(shards) == 1:
+        return [(shards[0], run(shards[0]))]
+    return list(zip(shards, _executor(max_workers).map(run, shards)))
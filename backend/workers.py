@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Coordination between backend worker processes.
+
+Under `ATTENTIONOS_WORKERS=N` (or uvicorn --workers N) every worker runs
+the startup hook and has its own memory, so anything that must happen
+once, or that is expensive to compute, has to be shared through the
+filesystem:
+
+    interprocess_lock  - an exclusive file lock, e.g. around startup
+    SharedCache        - a small SQLite key/value store with TTLs, used for
+                         analytics rollups and AI responses; a lease makes
+                         concurrent misses on the same key compute it once
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks; SQLite still serialises writers
+    fcntl = None
+
+
+@contextmanager
+def interprocess_lock(path):
+    """Hold an exclusive advisory lock on path for the duration of the block."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class SharedCache:
+    """
+    Cross-process cache of JSON-serialisable values in a SQLite file.
+
+    Every worker opens the same file; WAL mode keeps lookups (a primary-key
+    read) from blocking on writers. Entries expire after their TTL and are
+    purged lazily.
+    """
+
+    # Seconds a worker may hold the lease on a key it is computing
+    LEASE_SECONDS = 120
+    POLL_SECONDS = 0.05
+    # Purge expired rows roughly once per this many writes
+    PURGE_EVERY = 256
+
+    def __init__(self, path):
+        self.path = path
+        self._writes = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        # Short-lived connections: cheap to open and safe from any thread
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ? AND value IS NOT NULL",
+                (key, time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl_seconds):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _try_lease(self, key):
+        """Claim the right to compute key; False if another worker holds it."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            # A lease is a row with no value; an expired row of either kind is fair game
+            claimed = conn.execute('''
+                INSERT INTO cache (key, value, expires_at) VALUES (?, NULL, ?)
+                ON CONFLICT(key) DO UPDATE SET value = NULL, expires_at = excluded.expires_at
+                WHERE cache.expires_at <= ?
+            ''', (key, now + self.LEASE_SECONDS, now)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return claimed == 1
+
+    def _release_lease(self, key):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND value IS NULL", (key,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_or_compute(self, key, compute, ttl_seconds, should_cache=None):
+        """
+        Return the cached value for key, computing and storing it on a miss.
+
+        Only one worker computes a given key at a time; the others wait for
+        its result (or take over if its lease runs out). should_cache(value)
+        can veto storing a result, e.g. an error fallback.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            if self._try_lease(key):
+                break
+            time.sleep(self.POLL_SECONDS)
+
+        try:
+            value = compute()
+        except Exception:
+            self._release_lease(key)
+            raise
+        if should_cache is None or should_cache(value):
+            self.set(key, value, ttl_seconds)
+        else:
+            self._release_lease(key)
+        return value
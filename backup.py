@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Online snapshots of an AttentionOS database.
+
+snapshot() copies a live database with SQLite's online backup API, a few
+hundred pages per step with a short sleep between steps, while the agent
+and the APIs keep reading and writing it. The source connection holds one
+read transaction for the whole copy: in WAL mode (set by
+storage.ensure_schema) that pins a consistent view without blocking
+writers, and keeps the backup from restarting every time the tracker
+commits. The copy is checked with PRAGMA quick_check and can be
+gzip-compressed.
+
+Usage: python backup.py [--db data/attentionos.db] [--out data/snapshots] [--compress] [--pages 256]
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pages copied per backup step (4 KB each by default) and the pause after
+# each, during which the source connection holds no locks of its own
+STEP_PAGES = 256
+STEP_SLEEP_SECONDS = 0.005
+
+# Level 1 is ~4x faster than the default 6 on database pages for ~20% more bytes
+GZIP_LEVEL = 1
+
+
+class SnapshotError(RuntimeError):
+    """Raised when a snapshot fails its integrity check."""
+
+
+def snapshot_name(db_path, compress=False, now=None):
+    """File name for a snapshot of db_path, e.g. attentionos-20260201-093000.db.gz."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    stamp = (now or datetime.now()).strftime("%Y%m%d-%H%M%S")
+    return f"{stem}-{stamp}.db" + (".gz" if compress else "")
+
+
+def _remove(path):
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def snapshot(db_path, dest_dir, compress=False, pages=STEP_PAGES, sleep=STEP_SLEEP_SECONDS,
+             progress=None, verify=True):
+    """
+    Copy the database at db_path into dest_dir without stopping its
+    writers. progress(copied_pages, total_pages) is called after every
+    step. Returns a summary of the snapshot; nothing is left behind in
+    dest_dir if it fails.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    path = os.path.join(dest_dir, snapshot_name(db_path, compress))
+    base, taken = path, 1
+    while os.path.exists(path) or os.path.exists(path.removesuffix(".gz") + ".partial"):
+        # Two snapshots within the same second
+        stem, dot, rest = os.path.basename(base).partition(".")
+        path = os.path.join(dest_dir, f"{stem}-{taken}{dot}{rest}")
+        taken += 1
+    partial = path.removesuffix(".gz") + ".partial"
+    started = time.perf_counter()
+
+    source = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    target = sqlite3.connect(partial)
+    try:
+        # Pin one consistent view of the source for every step
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+
+        def step(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+
+        source.backup(target, pages=pages, progress=step, sleep=sleep)
+        source.execute("COMMIT")
+        copied_seconds = time.perf_counter() - started
+
+        # A self-contained file: no -wal alongside it when opened
+        target.execute("PRAGMA journal_mode=DELETE")
+        page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        if verify:
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise SnapshotError(f"snapshot failed its integrity check: {check}")
+    except BaseException:
+        target.close()
+        _remove(partial)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    database_bytes = os.path.getsize(partial)
+    try:
+        if compress:
+            with open(partial, "rb") as raw, gzip.open(partial + ".gz", "wb", compresslevel=GZIP_LEVEL) as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+            os.replace(partial + ".gz", path)
+        else:
+            os.replace(partial, path)
+    finally:
+        _remove(partial)
+        _remove(partial + ".gz")
+
+    return {
+        "path": path,
+        "pages": page_count,
+        "database_bytes": database_bytes,
+        "bytes": os.path.getsize(path),
+        "compressed": compress,
+        "copy_seconds": round(copied_seconds, 3),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=os.path.join(BASE_DIR, "data", "attentionos.db"))
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "data", "snapshots"))
+    parser.add_argument("--compress", action="store_true", help="gzip the snapshot")
+    parser.add_argument("--pages", type=int, default=STEP_PAGES, help="pages copied per step")
+    parser.add_argument("--no-verify", action="store_true", help="skip PRAGMA quick_check")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"No database at {args.db}")
+
+    def report(copied, total):
+        sys.stdout.write(f"\r  copied {copied:,}/{total:,} pages ({copied / total:.0%})" if total else "")
+        sys.stdout.flush()
+
+    print(f"Snapshotting {args.db}")
+    result = snapshot(args.db, args.out, compress=args.compress, pages=args.pages,
+                      progress=report, verify=not args.no_verify)
+    size = f"{result['bytes'] / 1e6:.1f} MB"
+    if result["compressed"]:
+        size += f", {result['database_bytes'] / 1e6:.1f} MB uncompressed"
+    print(f"\nWrote {result['path']} ({size}) in {result['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
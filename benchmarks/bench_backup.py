@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: snapshot time and writer stalls while backing up a live database.
+
+Fills a temporary database with --rows activity rows, then snapshots it
+while a writer thread commits an insert every 5 ms, like the tracker and
+ingestion do. Compares copying the file (fast, but not a consistent
+snapshot of a database being written), the online backup in one step,
+backup.snapshot() in page steps, and backup.snapshot() with gzip.
+Reports snapshot time, the writer's worst and 99th-percentile commit
+latency during it, and the output size.
+
+Usage: python benchmarks/bench_backup.py [--rows 1000000] [--pages 256]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from threading import Event, Thread
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+from backup import snapshot
+from storage import Interner, ensure_schema
+
+APPS = ["VSCode", "Google Chrome", "Slack", "Terminal", "Figma", "Notion"]
+
+
+def build(path, rows):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    rng = random.Random(4)
+    titles = [interner.title(conn, f"Document {n}") for n in range(2000)]
+    apps = [interner.app(conn, app) for app in APPS]
+    start = int(time.time()) - rows * 30
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds, title_id) VALUES (?, ?, ?, ?, ?)",
+        ((rng.choice(apps), start + i * 30, start + i * 30 + 25, 25, rng.choice(titles)) for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Writer(Thread):
+    """Commits one activity row every interval and records how long each took."""
+
+    def __init__(self, path, interval=0.005):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.latencies = []
+        self._stop_event = Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        while not self._stop_event.wait(self.interval):
+            begin = time.perf_counter()
+            conn.execute(
+                "INSERT INTO activity_logs (app_id, start_time, duration_seconds) VALUES (1, ?, 5)",
+                (int(time.time()),),
+            )
+            conn.commit()
+            self.latencies.append(time.perf_counter() - begin)
+        conn.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def one_step_backup(db_path, out_dir):
+    target = os.path.join(out_dir, "one-step.db")
+    source, dest = sqlite3.connect(db_path), sqlite3.connect(target)
+    source.backup(dest)
+    source.close()
+    dest.close()
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, default=256)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        db_path = os.path.join(workdir, "live.db")
+        out_dir = os.path.join(workdir, "snapshots")
+        os.makedirs(out_dir)
+        build(db_path, args.rows)
+        print(f"{args.rows:,} activity rows, {os.path.getsize(db_path) / 1e6:.1f} MB; writer commits every 5 ms\n")
+        print(f"  {'strategy':<32}{'seconds':>9}{'write max ms':>14}{'write p99 ms':>14}{'p50 ms':>8}{'output MB':>11}")
+
+        strategies = [
+            ("file copy (inconsistent)", lambda: shutil.copy(db_path, os.path.join(out_dir, "copy.db"))),
+            ("online backup, one step", lambda: one_step_backup(db_path, out_dir)),
+            (f"snapshot(), {args.pages}-page steps", lambda: snapshot(db_path, out_dir, pages=args.pages)["path"]),
+            ("snapshot() + gzip", lambda: snapshot(db_path, out_dir, pages=args.pages, compress=True)["path"]),
+        ]
+        for label, take in strategies:
+            writer = Writer(db_path)
+            writer.start()
+            time.sleep(0.2)
+            begin = time.perf_counter()
+            output = take()
+            elapsed = time.perf_counter() - begin
+            time.sleep(0.1)
+            writer.stop()
+            ordered = sorted(writer.latencies)
+            p99 = ordered[int(len(ordered) * 0.99) - 1] * 1000
+            print(f"  {label:<32}{elapsed:>9.2f}{ordered[-1] * 1000:>14.1f}{p99:>14.1f}"
+                  f"{statistics.median(ordered) * 1000:>8.2f}{os.path.getsize(output) / 1e6:>11.1f}")
+            os.remove(output)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark: productivity categorisation, per lookup and per aggregate.
+
+Matching compares a rule-by-rule loop (one regex/list check per rule, as
+naive code would do) with the combined pattern, cold and memoised, over
+activities drawn from a realistic mix of apps and window titles. The
+aggregate part fills a database with --rows activities and compares time
+per category computed by categorising every row in Python against the
+indexed GROUP BY over stored categories.
+
+Usage: python benchmarks/bench_categories.py [--lookups 200000] [--rows 1000000]
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+from categories import DEFAULT_RULES, Categoriser, recategorise
+from storage import Interner, ensure_schema
+
+APPS = [("Google Chrome", "com.google.Chrome"), ("Safari", "com.apple.Safari"), ("VSCode", "com.microsoft.VSCode"),
+        ("Terminal", "com.apple.Terminal"), ("Slack", "com.tinyspeck.slackmacgap"), ("Spotify", "com.spotify.client"),
+        ("Finder", "com.apple.finder"), ("Figma", "com.figma.Desktop"), ("WhatsApp", "net.whatsapp.WhatsApp"),
+        ("SomeTool", "com.example.tool"), ("IDLE", None)]
+TITLE_WORDS = ["YouTube", "GitHub", "Reddit", "Docs", "Inbox", "Pull request", "main.py", "Jira", "News", "Stack Overflow"]
+
+
+ANCHORED_RULES = [
+    {"category": "productive", "title": "^PROJ-"},
+    {"category": "distracting", "title": "page 1$"},
+    {"category": "productive", "app": "Terminal", "title": "^(docs|github)"},
+]
+
+
+def activities(n, distinct_titles, seed=3):
+    rng = random.Random(seed)
+    titles = [f"{rng.choice(TITLE_WORDS)} - page {i}" for i in range(distinct_titles)]
+    return [(*rng.choice(APPS), rng.choice(titles)) for _ in range(n)]
+
+
+def naive_categorise(rules, app, bundle, title):
+    """Rule-by-rule matching, recompiling nothing but re-checking every rule."""
+    for rule in rules:
+        for field, value in (("app", app), ("bundle", bundle)):
+            names = rule.get(field)
+            if names is not None:
+                names = [names] if isinstance(names, str) else names
+                if (value or "").lower() not in [name.lower() for name in names]:
+                    break
+        else:
+            if rule.get("title") is None or re.search(rule["title"], title or "", re.IGNORECASE):
+                return rule["category"]
+    return "neutral"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def bench_matching(lookups):
+    sample = activities(lookups, distinct_titles=1000)
+    print(f"Matching {lookups:,} activities ({len(set(sample)):,} distinct), {len(DEFAULT_RULES)} rules")
+    print(f"  {'':<28}{'lookups/s':>12}")
+
+    _, seconds = timed(lambda: [naive_categorise(DEFAULT_RULES, app, bundle, title) for app, bundle, title in sample])
+    print(f"  {'rule-by-rule loop':<28}{lookups / seconds:>12,.0f}")
+
+    categoriser = Categoriser()
+    _, seconds = timed(lambda: [categoriser._match(app, title, bundle) for app, bundle, title in sample])
+    print(f"  {'combined pattern':<28}{lookups / seconds:>12,.0f}")
+
+    categoriser = Categoriser()
+    _, seconds = timed(lambda: [categoriser.categorise(app, title, bundle) for app, bundle, title in sample])
+    print(f"  {'combined + memoised':<28}{lookups / seconds:>12,.0f}")
+
+    # Sanity check: both approaches agree
+    assert all(naive_categorise(DEFAULT_RULES, app, bundle, title) == categoriser.categorise(app, title, bundle)
+               for app, bundle, title in sample[:5000])
+    # ... including title patterns anchored to the start or end of the title
+    anchored = Categoriser(ANCHORED_RULES)
+    assert anchored.categorise("Google Chrome", "PROJ-12 Jira") == "productive"
+    assert anchored.categorise("Google Chrome", "Re: PROJ-12") == "neutral"
+    assert all(naive_categorise(ANCHORED_RULES, app, bundle, title) == anchored.categorise(app, title, bundle)
+               for app, bundle, title in sample[:5000])
+    print()
+
+
+def bench_aggregate(path, rows):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner, categoriser = Interner(), Categoriser()
+    sample = activities(rows, distinct_titles=2000)
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, duration_seconds, title_id, bundle_key) VALUES (?, ?, ?, ?, ?)",
+        ((interner.app(conn, app), i, 60, interner.title(conn, title), interner.bundle(conn, bundle))
+         for i, (app, bundle, title) in enumerate(sample)),
+    )
+    conn.commit()
+    print(f"Time per category over {rows:,} activity rows")
+
+    _, seconds = timed(lambda: recategorise(conn, categoriser, interner))
+    print(f"  {'backfill (one-off)':<36}{seconds * 1000:>10.0f} ms")
+
+    def in_python():
+        totals = {}
+        for app, title, bundle, duration in conn.execute('''
+            SELECT a.name, w.title, b.identifier, l.duration_seconds
+            FROM activity_logs l
+            JOIN apps a ON a.id = l.app_id
+            LEFT JOIN window_titles w ON w.id = l.title_id
+            LEFT JOIN bundles b ON b.id = l.bundle_key
+        '''):
+            category = naive_categorise(DEFAULT_RULES, app, bundle, title)
+            totals[category] = totals.get(category, 0) + duration
+        return totals
+
+    def stored():
+        return dict(conn.execute('''
+            SELECT c.name, t.seconds
+            FROM (SELECT category_id, SUM(duration_seconds) AS seconds FROM activity_logs
+                  WHERE start_time >= 0 AND category_id IS NOT NULL GROUP BY category_id) t
+            JOIN categories c ON c.id = t.category_id
+        ''').fetchall())
+
+    python_totals, seconds = timed(in_python)
+    print(f"  {'categorise every row in Python':<36}{seconds * 1000:>10.0f} ms")
+    stored_totals, seconds = timed(stored)
+    print(f"  {'indexed GROUP BY on stored category':<36}{seconds * 1000:>10.0f} ms")
+    assert python_totals == stored_totals
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    bench_matching(args.lookups)
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        bench_aggregate(os.path.join(workdir, "categories.db"), args.rows)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
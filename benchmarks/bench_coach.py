@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark: coach answer latency per provider.
+
+Times LocalCoach on a week of synthetic sessions, patterns and categories
+for each kind of answer, then sends --requests questions to a simulated
+remote model whose latency is log-normal (median --median-ms, with a long
+tail) directly and through HedgedCoach with a --budget-ms budget, and
+reports latency percentiles and how many answers each provider gave.
+Finally it coaches --requests sessions one call each and packed into
+batches (pack_prompts), against a model whose call latency grows with
+the size of the reply.
+
+Usage: python benchmarks/bench_coach.py [--requests 40] [--median-ms 800] [--budget-ms 1500]
+                                       [--batch-size 8] [--concurrency 2]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "backend"))
+from coach import HedgedCoach, LocalCoach, RemoteCoach, pack_prompts, unpack_reply
+
+APPS = ["VSCode", "Google Chrome", "Slack", "Terminal", "Figma", "Notion"]
+QUESTIONS = ["Why was my focus low?", "What distracts me most?", "How do I get more flow?",
+             "When am I at my best?", "Where does my time go?", "How can I improve?"]
+
+
+def sample_data(seed=5):
+    rng = random.Random(seed)
+    now = datetime(2026, 10, 18, 18)
+    sessions = []
+    for i in range(7):
+        active = rng.randint(1800, 7200)
+        sessions.append({
+            "id": 7 - i,
+            "start_time": (now - timedelta(days=i, hours=rng.randint(0, 8))).isoformat(timespec="seconds"),
+            "total_active_seconds": active,
+            "total_idle_seconds": rng.randint(60, 900),
+            "app_switches": rng.randint(10, 120),
+            "focus_score": round(rng.uniform(35, 95), 2),
+        })
+    return {
+        "sessions": sessions,
+        "top_apps": [{"app_name": app, "total_seconds": rng.randint(600, 20000)} for app in APPS],
+        "patterns": {
+            "transitions": {"top": [{"from_app": "Slack", "to_app": "VSCode", "count": 42}]},
+            "flow": {"count": 9, "total_seconds": 21000, "longest_seconds": 4200, "share_of_active": 0.31},
+            "bursts": {"count": 14, "share_of_switches": 0.22},
+        },
+        "categories": [{"category": "productive", "seconds": 60000, "share": 0.62},
+                       {"category": "distracting", "seconds": 15000, "share": 0.16}],
+    }
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return (statistics.median(ordered) * 1000,
+            ordered[int(len(ordered) * 0.95) - 1] * 1000,
+            ordered[-1] * 1000)
+
+
+def bench_local(data, repeat=2000):
+    coach = LocalCoach()
+    session = {"focus_score": 61.5, "duration_minutes": 52, "active_time_minutes": 44,
+               "idle_time_minutes": 8, "app_switches": 37, "top_apps": APPS[:3], "session_date": "2026-10-18"}
+    cases = [("explain", session), ("deep-analysis", data)]
+    cases += [("chat", {**data, "messages": [{"role": "user", "content": q}]}) for q in QUESTIONS]
+    print(f"Local coach ({repeat:,} answers per kind)")
+    print(f"  {'kind':<16}{'µs/answer':>12}")
+    for kind in ("explain", "deep-analysis", "chat"):
+        inputs = [case for case in cases if case[0] == kind]
+        start = time.perf_counter()
+        for i in range(repeat):
+            _, case = inputs[i % len(inputs)]
+            assert coach.answer(kind, "", case, 500).text
+        print(f"  {kind:<16}{(time.perf_counter() - start) / repeat * 1e6:>12.1f}")
+    print()
+
+
+def bench_remote(data, requests, median_ms, budget_ms):
+    rng = random.Random(9)
+    # sigma 1.0 gives a p95 around 5x the median, like a loaded model API
+    latencies = [rng.lognormvariate(0, 1.0) * median_ms / 1000 for _ in range(requests)]
+
+    def generate(kind, prompt, max_output_tokens):
+        time.sleep(latencies[int(prompt)])
+        return "model answer"
+
+    remote = RemoteCoach(generate)
+    hedged = HedgedCoach(remote, LocalCoach(), budget_ms / 1000)
+    hedged.MAX_REMOTE_CALLS = requests
+    print(f"{requests} chat requests, remote median {median_ms} ms, budget {budget_ms} ms")
+    print(f"  {'provider':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}   answered by")
+    for name, coach in (("gemini", remote), ("hedged", hedged)):
+        def ask(i):
+            start = time.perf_counter()
+            answer = coach.answer("chat", str(i), {**data, "messages": [{"role": "user", "content": QUESTIONS[i % 6]}]}, 500)
+            return time.perf_counter() - start, answer.provider
+
+        with ThreadPoolExecutor(max_workers=requests) as pool:
+            results = list(pool.map(ask, range(requests)))
+        p50, p95, worst = percentiles([seconds for seconds, _ in results])
+        providers = [provider for _, provider in results]
+        split = ", ".join(f"{p} {providers.count(p)}" for p in sorted(set(providers)))
+        print(f"  {name:<12}{p50:>10.0f}{p95:>10.0f}{worst:>10.0f}   {split}")
+    hedged._executor.shutdown(wait=True)
+
+
+def bench_batch(requests, median_ms, batch_size, concurrency):
+    # Each call pays a fixed overhead plus generation time per answer in it
+    per_answer = median_ms / 4000
+
+    def generate(prompt, keys):
+        time.sleep(median_ms / 1000 + per_answer * len(keys))
+        return json.dumps({key: "model answer" for key in keys})
+
+    def coach_chunk(chunk):
+        return len(unpack_reply(generate(pack_prompts(chunk), list(chunk)), list(chunk)))
+
+    prompts = {str(i): f"session {i}" for i in range(requests)}
+    keys = list(prompts)
+    print(f"\nCoaching {requests} sessions, {concurrency} model calls in flight")
+    print(f"  {'strategy':<24}{'calls':>8}{'total ms':>10}")
+    for size in (1, batch_size):
+        chunks = [{key: prompts[key] for key in keys[i:i + size]} for i in range(0, len(keys), size)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            answered = sum(pool.map(coach_chunk, chunks))
+        assert answered == requests
+        label = "one call per session" if size == 1 else f"packed {size} per call"
+        print(f"  {label:<24}{len(chunks):>8}{(time.perf_counter() - start) * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--median-ms", type=int, default=800)
+    parser.add_argument("--budget-ms", type=int, default=1500)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    data = sample_data()
+    bench_local(data)
+    bench_remote(data, args.requests, args.median_ms, args.budget_ms)
+    bench_batch(args.requests, args.median_ms, args.batch_size, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
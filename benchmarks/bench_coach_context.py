@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: loading the coach context as history grows, and what keeping it
+current costs each write.
+
+For each history size, fills a temporary database with activity rows and
+half as many app switches, then times the aggregate queries deep analysis
+used to run (top apps and transitions over all rows) against
+coach_context.load_coach_context, which reads the trigger-maintained
+tables. Then times the tracker's write pattern (insert an activity row,
+close it, log a switch) with and without the coach context triggers.
+
+Usage: python benchmarks/bench_coach_context.py [--sizes 100000,1000000] [--writes 5000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from coach_context import load_coach_context
+from storage import Interner, ensure_schema
+
+APPS = ["VSCode", "Google Chrome", "Slack", "Terminal", "Figma", "Notion", "Mail", "Spotify",
+        "Zoom", "Xcode", "Finder", "Notes", "Discord", "Safari", "Preview", "Calendar"]
+
+FULL_SCAN_QUERIES = (
+    '''
+    SELECT a.name, u.total_seconds
+    FROM (SELECT app_id, SUM(duration_seconds) AS total_seconds FROM activity_logs
+          GROUP BY app_id ORDER BY total_seconds DESC LIMIT 10) u
+    JOIN apps a ON a.id = u.app_id
+    ''',
+    '''
+    SELECT from_app_id, to_app_id, COUNT(*) AS n FROM app_switches
+    WHERE from_app_id IS NOT NULL
+    GROUP BY from_app_id, to_app_id ORDER BY n DESC LIMIT 5
+    ''',
+)
+
+COACH_TRIGGERS = ("trg_activity_logs_coach_insert", "trg_activity_logs_coach_update",
+                  "trg_activity_logs_coach_delete", "trg_app_switches_coach_insert",
+                  "trg_app_switches_coach_delete")
+
+
+def build(path, rows):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    apps = [interner.app(conn, app) for app in APPS]
+    rng = random.Random(7)
+    start = int(time.time()) - rows * 60
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) VALUES (?, ?, ?, ?)",
+        ((app, start + i * 60, start + i * 60 + 45, 45) for i, app in
+         enumerate(rng.choice(apps) for _ in range(rows))),
+    )
+    conn.executemany(
+        "INSERT INTO app_switches (from_app_id, to_app_id, timestamp) VALUES (?, ?, ?)",
+        ((rng.choice(apps), rng.choice(apps), start + i * 120) for i in range(rows // 2)),
+    )
+    conn.executemany(
+        "INSERT INTO sessions (start_time, end_time, total_active_seconds, total_idle_seconds, app_switches, focus_score) "
+        "VALUES (?, ?, 3000, 600, 40, ?)",
+        ((start + i * 7200, start + i * 7200 + 3600, rng.uniform(40, 95)) for i in range(max(7, rows // 100))),
+    )
+    conn.commit()
+    conn.close()
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - begin)
+    return min(times) * 1000
+
+
+def tracker_writes(conn, count):
+    """The agent's pattern: open an activity row, close it, log the switch."""
+    begin = time.perf_counter()
+    for i in range(count):
+        row = conn.execute(
+            "INSERT INTO activity_logs (app_id, start_time, duration_seconds) VALUES (?, ?, 0)", (1 + i % 16, i)
+        ).lastrowid
+        conn.commit()
+        conn.execute("UPDATE activity_logs SET end_time = ?, duration_seconds = 30 WHERE id = ?", (i + 30, row))
+        conn.execute("INSERT INTO app_switches (from_app_id, to_app_id, timestamp) VALUES (?, ?, ?)",
+                     (1 + i % 16, 1 + (i + 1) % 16, i + 30))
+        conn.commit()
+    return (time.perf_counter() - begin) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100000,1000000", help="comma-separated activity row counts")
+    parser.add_argument("--writes", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        print(f"  {'activity rows':>14}{'full scans ms':>15}{'coach context ms':>18}{'speedup':>9}")
+        for rows in (int(size) for size in args.sizes.split(",")):
+            path = os.path.join(workdir, f"history-{rows}.db")
+            build(path, rows)
+            conn = sqlite3.connect(path)
+            scans = best_of(lambda: [conn.execute(query).fetchall() for query in FULL_SCAN_QUERIES])
+            context = best_of(lambda: load_coach_context(conn))
+            print(f"  {rows:>14,}{scans:>15.2f}{context:>18.3f}{scans / context:>8.0f}x")
+            conn.close()
+
+        print(f"\n  tracker write cycle (insert, close, switch), {args.writes:,} cycles")
+        for label, drop in (("with coach context triggers", False), ("without", True)):
+            path = os.path.join(workdir, f"writes-{int(drop)}.db")
+            build(path, 1000)
+            conn = sqlite3.connect(path)
+            if drop:
+                for trigger in COACH_TRIGGERS:
+                    conn.execute(f"DROP TRIGGER {trigger}")
+                conn.commit()
+            print(f"  {label:<30}{tracker_writes(conn, args.writes):>9.1f} µs per cycle")
+            conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
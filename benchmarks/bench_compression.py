@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes and latency saved by response compression.
+
+Builds a realistic /api/timeline payload, runs it through
+CompressionMiddleware as a single body and as a streamed body for each
+encoding/level, and estimates total response time (compress + transfer)
+on a few link speeds.
+
+Usage: python benchmarks/bench_compression.py [--rows 50000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import compression
+from compression import CompressionMiddleware
+
+APPS = ["Visual Studio Code", "Google Chrome", "Terminal", "Slack", "Figma", "Notion",
+        "Spotify", "WhatsApp", "Zoom", "IDLE"]
+
+# Link speeds in megabits per second
+LINKS = {"LAN 1 Gbps": 1000, "Wi-Fi 100 Mbps": 100, "VPN 10 Mbps": 10}
+
+STREAM_CHUNK = 64 * 1024
+
+
+def timeline_payload(rows):
+    rng = random.Random(3)
+    start = datetime(2026, 1, 1, 9, 0, 0)
+    items = []
+    for i in range(rows):
+        begin = start + timedelta(seconds=i * 40)
+        duration = rng.randint(5, 600)
+        items.append({
+            "id": rows - i,
+            "app_name": rng.choice(APPS),
+            "start_time": begin.isoformat(),
+            "end_time": (begin + timedelta(seconds=duration)).isoformat(),
+            "duration_seconds": duration,
+        })
+    return json.dumps(items, separators=(",", ":")).encode()
+
+
+async def run_through(middleware_kwargs, accept, chunks):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = CompressionMiddleware(app, **middleware_kwargs)
+    await middleware({"type": "http", "headers": [(b"accept-encoding", accept)]}, None, send)
+    return sum(len(m.get("body", b"")) for m in sent if m["type"] == "http.response.body")
+
+
+def measure(kwargs, accept, chunks, repeat=3):
+    best, size = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = asyncio.run(run_through(kwargs, accept, chunks))
+        best = min(best, time.perf_counter() - start)
+    return size, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    body = timeline_payload(args.rows)
+    streamed = [body[i:i + STREAM_CHUNK] for i in range(0, len(body), STREAM_CHUNK)]
+    print(f"/api/timeline payload: {args.rows:,} rows, {len(body) / 1e6:.2f} MB\n")
+
+    configs = [("identity", b"identity", {})]
+    for level in (1, 6, 9):
+        configs.append((f"gzip -{level}", b"gzip", {"gzip_level": level}))
+    if compression.brotli is not None:
+        for quality in (1, 4, 9):
+            configs.append((f"br q{quality}", b"br", {"brotli_quality": quality}))
+    else:
+        print("(brotli not installed; skipping br)\n")
+
+    header = f"{'encoding':<12}{'mode':<8}{'bytes':>12}{'ratio':>8}{'cpu ms':>9}"
+    header += "".join(f"{name:>16}" for name in LINKS)
+    print(header)
+    for name, accept, kwargs in configs:
+        for mode, chunks in (("single", [body]), ("stream", streamed)):
+            size, seconds = measure(kwargs, accept, chunks)
+            row = f"{name:<12}{mode:<8}{size:>12,}{len(body) / size:>7.1f}x{seconds * 1000:>9.1f}"
+            for mbps in LINKS.values():
+                total_ms = seconds * 1000 + size * 8 / (mbps * 1e6) * 1000
+                row += f"{total_ms:>14.1f}ms"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
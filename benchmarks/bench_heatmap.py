@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: day x hour focus heatmap against shipping every session.
+
+Fills a temporary database with --years of sessions (--per-day a day,
+each one to three hours long), then compares what the dashboard has to
+fetch to draw a heatmap over all of it: the full session list as JSON
+(what /api/sessions returns) against /api/analytics/heatmap's JSON and
+binary encodings, each timed and sized raw and gzipped. Also reports what
+the heatmap triggers add to saving a session.
+
+Usage: python benchmarks/bench_heatmap.py [--years 3] [--per-day 8]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from storage import ensure_schema, iso_column
+from heatmap import build_heatmap, encode_binary, load_cells, to_json
+
+INSERT = ("INSERT INTO sessions (start_time, end_time, total_active_seconds, total_idle_seconds, app_switches, "
+          "focus_score) VALUES (?, ?, ?, ?, ?, ?)")
+
+
+def sessions(years, per_day, seed=3):
+    rng = random.Random(seed)
+    day = int(time.time()) // 86400 * 86400 - int(years * 365) * 86400
+    for _ in range(int(years * 365)):
+        for hour in sorted(rng.sample(range(7, 23), per_day)):
+            start = day + hour * 3600 + rng.randrange(3600)
+            length = rng.randrange(3600, 3 * 3600)
+            active = int(length * rng.uniform(0.5, 0.95))
+            yield start, start + length, active, length - active, rng.randrange(5, 80), 100.0 * active / length
+        day += 86400
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - begin)
+    return result, statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--per-day", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        conn = sqlite3.connect(os.path.join(workdir, "heatmap.db"))
+        ensure_schema(conn)
+        rows = list(sessions(args.years, args.per_day))
+        _, with_triggers = timed(lambda: (conn.executemany(INSERT, rows), conn.rollback()), 1)
+        conn.execute("DROP TRIGGER trg_sessions_heatmap_insert")
+        _, without_triggers = timed(lambda: (conn.executemany(INSERT, rows), conn.rollback()), 1)
+        conn.close()
+        conn = sqlite3.connect(os.path.join(workdir, "heatmap.db"))
+        ensure_schema(conn)
+        conn.executemany(INSERT, rows)
+        conn.commit()
+        conn.row_factory = sqlite3.Row
+        print(f"{len(rows):,} sessions over {args.years:g} years\n")
+
+        def session_list():
+            return json.dumps([dict(row) for row in conn.execute(f'''
+                SELECT id, {iso_column("start_time")}, {iso_column("end_time")}, total_active_seconds,
+                       total_idle_seconds, app_switches, focus_score
+                FROM sessions ORDER BY start_time DESC
+            ''')]).encode()
+
+        print(f"  {'response':<24}{'ms':>8}{'bytes':>12}{'gzipped':>12}")
+        for label, build in (
+            ("all sessions (JSON)", session_list),
+            ("heatmap (JSON)", lambda: json.dumps(to_json(build_heatmap([load_cells(conn)]))).encode()),
+            ("heatmap (binary)", lambda: encode_binary(build_heatmap([load_cells(conn)]))),
+        ):
+            body, ms = timed(build)
+            print(f"  {label:<24}{ms:>8.1f}{len(body):>12,}{len(gzip.compress(body, 6)):>12,}")
+
+        print(f"\n  saving a session: {without_triggers / len(rows) * 1000:.1f} us without the heatmap "
+              f"trigger, {with_triggers / len(rows) * 1000:.1f} us with it")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
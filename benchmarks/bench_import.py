@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk import of activity history.
+
+Writes a synthetic export from another tracker (one activity row per app
+visit, several sessions a day, a few thousand distinct window titles) as
+CSV with epoch seconds and as NDJSON with ISO 8601 times, then imports
+each into a fresh database with importer.import_history, deriving
+switches and sessions, with indexes deferred and with them maintained row
+by row. For scale it also times:
+
+  sqlite only - the rows the CSV import wrote (apps and titles, activity,
+                derived switches and sessions), pre-built, replayed into a
+                fresh database with one executemany per table, then its
+                indexes, search index and interval index built and
+                committed: SQLite's share of an import, with no parsing
+                or deriving
+  row by row  - the tracker's own write path (main.start_new_session,
+                update_session, log_app_switch) on a sample of the rows
+
+Target: the CSV import, derivation and index rebuild included, runs at
+half or more of the sqlite-only records/s (Python's work costs no more
+than SQLite's), and at least 100x the row by row rate. Exits with status
+1 if it misses. Absolute rates depend on the machine; the shares do not.
+
+Usage: python benchmarks/bench_import.py [--rows 500000] [--sample 2000] [--dir /tmp]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+from importer import import_history
+from storage import INTERVAL_TABLES, SEARCHABLE_DIMENSIONS, ensure_schema, interval_end
+
+APPS = ["VSCode", "Google Chrome", "Slack", "Terminal", "Figma", "Notion", "Mail", "Spotify",
+        "Zoom", "Xcode", "Finder", "Notes", "Discord", "Safari", "Preview", "IDLE"]
+
+TARGET_SQLITE_SHARE = 0.5
+
+REPLAYED = ("apps", "window_titles", "bundles", "categories", "activity_logs", "app_switches", "sessions")
+TARGET_SPEEDUP = 100
+
+
+def history(rows, seed=7):
+    """(app, start, end, title, bundle) rows in time order, with overnight gaps."""
+    rng = random.Random(seed)
+    stamp = 1_700_000_000
+    for i in range(rows):
+        app = rng.choice(APPS)
+        duration = int(rng.expovariate(1 / 150)) + 5
+        title = "" if app == "IDLE" else f"{app} — PROJ-{rng.randrange(4000)}"
+        bundle = "" if app == "IDLE" else f"com.example.{app.lower().replace(' ', '')}"
+        yield app, stamp, stamp + duration, title, bundle
+        stamp += duration
+        if rng.random() < 0.004:
+            stamp += rng.randrange(3600, 14 * 3600)
+
+
+def write_inputs(workdir, rows):
+    csv_path = os.path.join(workdir, "history.csv")
+    with open(csv_path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["app_name", "start_time", "end_time", "window_title", "bundle_id"])
+        writer.writerows(history(rows))
+    ndjson_path = os.path.join(workdir, "history.ndjson")
+    with open(ndjson_path, "w") as handle:
+        for app, start, end, title, bundle in history(rows):
+            handle.write(json.dumps({
+                "app_name": app, "start_time": datetime.fromtimestamp(start).isoformat(),
+                "duration_seconds": end - start, "window_title": title, "bundle_id": bundle,
+            }) + "\n")
+    return csv_path, ndjson_path
+
+
+def fresh(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    return conn
+
+
+def sqlite_only(source_path, path):
+    """Seconds to write the rows of an imported database again, from Python tuples."""
+    source = sqlite3.connect(source_path)
+    tables = {table: source.execute(f"SELECT * FROM {table}").fetchall() for table in REPLAYED}
+    source.close()
+    conn = fresh(path)
+    conn.execute("BEGIN IMMEDIATE")
+    placeholders = ", ".join("?" for _ in REPLAYED)
+    schema = conn.execute(
+        f"SELECT name, type, sql FROM sqlite_master WHERE tbl_name IN ({placeholders}) "
+        f"AND sql IS NOT NULL AND type IN ('index', 'trigger')", REPLAYED
+    ).fetchall()
+    begin = time.perf_counter()
+    for name, kind, _ in schema:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    for table, rows in tables.items():
+        if rows:
+            conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' for _ in rows[0])})", rows)
+    for _, _, sql in schema:
+        conn.execute(sql)
+    for table in SEARCHABLE_DIMENSIONS:
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+    for table in INTERVAL_TABLES:
+        conn.execute(f"INSERT INTO {table}_intervals SELECT id, start_time, {interval_end(table)} FROM {table} "
+                     f"WHERE start_time IS NOT NULL")
+    conn.commit()
+    seconds = time.perf_counter() - begin
+    conn.close()
+    return seconds
+
+
+def row_by_row(path, sample):
+    fresh(path).close()
+    os.environ["ATTENTIONOS_DB_PATH"] = path
+    import main as agent
+    agent.DB_PATH = path
+    begin = time.perf_counter()
+    previous = None
+    for app, start, end, title, bundle in history(sample):
+        record = agent.start_new_session(app, start, title, bundle)
+        agent.update_session(record, end, end - start)
+        agent.log_app_switch(previous, app, start)
+        previous = app
+    return sample / (time.perf_counter() - begin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--sample", type=int, default=2000, help="rows written by the row by row path")
+    parser.add_argument("--dir", help="where to create the databases (default: the system temp dir)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-", dir=args.dir)
+    try:
+        csv_path, ndjson_path = write_inputs(workdir, args.rows)
+        slow = row_by_row(os.path.join(workdir, "row-by-row.db"), args.sample)
+
+        print(f"  {'input':<8}{'indexes':<10}{'seconds':>9}{'index s':>9}{'records/s':>11}"
+              f"{'vs sqlite':>11}{'vs row by row':>15}  derived")
+        results = {}
+        for label, path, fmt in (("csv", csv_path, "csv"), ("ndjson", ndjson_path, "ndjson")):
+            for defer in (True, False):
+                db_path = os.path.join(workdir, f"{label}-{defer}.db")
+                conn = fresh(db_path)
+                with open(path, "rb") as handle:
+                    result = import_history(conn, handle, fmt, defer_indexes=defer)
+                conn.close()
+                if not results:
+                    base = args.rows / sqlite_only(db_path, os.path.join(workdir, "sqlite-only.db"))
+                results[label, defer] = rate = result["records_per_second"]
+                derived = ", ".join(f"{count:,} {table}" for table, count in result["derived"].items())
+                print(f"  {label:<8}{'deferred' if defer else 'kept':<10}{result['seconds']:>9.2f}"
+                      f"{result['index_seconds']:>9.2f}{rate:>11,}{rate / base:>10.0%}{rate / slow:>14,.0f}x  {derived}")
+                os.remove(db_path)
+
+        print(f"\n  {args.rows:,} records; sqlite only {base:,.0f} records/s, row by row {slow:,.0f} rows/s")
+        rate = results["csv", True]
+        met = rate >= TARGET_SQLITE_SHARE * base and rate >= TARGET_SPEEDUP * slow
+        print(f"  target for csv with deferred indexes: {TARGET_SQLITE_SHARE:.0%} of sqlite only and "
+              f"{TARGET_SPEEDUP}x row by row: {'met' if met else 'MISSED'}")
+    finally:
+        shutil.rmtree(workdir)
+    sys.exit(0 if met else 1)
+
+
+if __name__ == "__main__":
+    main()
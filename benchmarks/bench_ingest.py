@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark: multi-device ingestion throughput.
+
+  direct     - ingest_batch() on batches of mixed events, first pass and replay
+  end-to-end - a synthetic agent database shipped by uploader.Uploader to a
+               local stand-in server (http.server wrapping ingest_batch)
+
+Usage: python benchmarks/bench_ingest.py [--events 200000] [--devices 4]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from storage import Interner, ensure_schema
+from ingest import decode_body, ingest_batch
+from uploader import Uploader
+
+APPS = ["VSCode", "Terminal", "Chrome", "Slack", "Figma", "Notion", "Spotify", "WhatsApp", "IDLE"]
+BATCH = 5000
+
+
+def synthetic_batches(device, events, rng):
+    """Yield ingest payloads of BATCH events each (activity/switch/timeline mix)."""
+    start = 1_760_000_000
+    for offset in range(0, events, BATCH):
+        activity, switches, timeline = [], [], []
+        for i in range(offset, min(offset + BATCH, events)):
+            app = rng.choice(APPS)
+            stamp = start + i * 10
+            kind = i % 3
+            if kind == 0:
+                activity.append({"id": i, "app_name": app, "start_time": stamp, "end_time": stamp + 9,
+                                 "duration_seconds": 9, "window_title": f"{app} - doc {i % 50}",
+                                 "bundle_id": f"com.example.{app.lower()}"})
+            elif kind == 1:
+                switches.append({"id": i, "from_app": rng.choice(APPS), "to_app": app, "timestamp": stamp})
+            else:
+                timeline.append({"id": i, "timestamp": stamp, "app_name": app, "is_idle": app == "IDLE",
+                                 "window_title": None, "bundle_id": None})
+        yield {"device_id": device, "user_id": device.split("-")[0], "batch_id": f"{device}:{offset}",
+               "activity": activity, "switches": switches, "timeline": timeline}
+
+
+def bench_direct(path, events, devices):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    rng = random.Random(1)
+    batches = [b for d in range(devices) for b in synthetic_batches(f"user{d}-laptop", events // devices, rng)]
+
+    for label in ("first pass", "replay"):
+        start = time.perf_counter()
+        written = sum(ingest_batch(conn, batch, interner)["written"] for batch in batches)
+        elapsed = time.perf_counter() - start
+        total = sum(len(b["activity"]) + len(b["switches"]) + len(b["timeline"]) for b in batches)
+        print(f"  {label:<11}{total:>10,} events {elapsed:>7.2f}s {total / elapsed:>12,.0f} events/s"
+              f"  ({written:,} rows written)")
+    conn.close()
+
+
+def build_agent_db(path, events):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    rng = random.Random(2)
+    start = 1_760_000_000
+    app_ids = [interner.app(conn, app) for app in APPS]
+    third = events // 3
+    conn.executemany("INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) VALUES (?, ?, ?, ?)",
+                     [(rng.choice(app_ids), start + i * 10, start + i * 10 + 9, 9) for i in range(third)])
+    conn.executemany("INSERT INTO app_switches (from_app_id, to_app_id, timestamp) VALUES (?, ?, ?)",
+                     [(rng.choice(app_ids), rng.choice(app_ids), start + i * 10) for i in range(third)])
+    conn.executemany("INSERT INTO timeline (timestamp, app_id, is_idle) VALUES (?, ?, 0)",
+                     [(start + i * 30, rng.choice(app_ids)) for i in range(events - 2 * third)])
+    conn.commit()
+    conn.close()
+
+
+def serve(server_db):
+    """Start a stand-in ingestion server on a free localhost port."""
+    interner, lock = Interner(), Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            payload = decode_body(body, self.headers.get("Content-Encoding", ""))
+            with lock:
+                conn = sqlite3.connect(server_db)
+                ingest_batch(conn, payload, interner)
+                conn.close()
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    conn = sqlite3.connect(server_db)
+    ensure_schema(conn)
+    conn.close()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_end_to_end(workdir, events):
+    agent_db = os.path.join(workdir, "agent.db")
+    server_db = os.path.join(workdir, "server.db")
+    build_agent_db(agent_db, events)
+    server = serve(server_db)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/ingest"
+        uploader = Uploader(agent_db, url, device_id="bench-device", batch_size=BATCH)
+        start = time.perf_counter()
+        uploader.flush()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    conn = sqlite3.connect(server_db)
+    landed = sum(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                 for t in ("activity_logs", "app_switches", "timeline"))
+    conn.close()
+    print(f"  uploaded {landed:,}/{events:,} events in {elapsed:.2f}s ({landed / elapsed:,.0f} events/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--devices", type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        print(f"Direct ingest_batch ({args.devices} devices, batches of {BATCH}):")
+        bench_direct(os.path.join(workdir, "direct.db"), args.events, args.devices)
+        print("\nEnd-to-end Uploader -> stand-in server:")
+        bench_end_to_end(workdir, args.events)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
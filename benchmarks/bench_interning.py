@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GROUP BY on interned integer keys vs repeated TEXT columns.
+
+Builds a database in the legacy text layout, times the top-apps and
+switch-pattern aggregations used by /api/ai/deep-analysis, migrates it
+with storage.ensure_schema() and times the integer-key versions.
+
+Usage: python benchmarks/bench_interning.py [--rows 500000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import ensure_schema
+
+APPS = [
+    "Visual Studio Code", "Google Chrome", "Terminal", "Slack", "Figma",
+    "Notion", "Safari", "Spotify", "WhatsApp", "Zoom", "Xcode", "Finder",
+    "Microsoft Teams", "Discord", "Preview", "Notes", "IDLE",
+]
+TITLES = [f"{app} - project-{i} - feature/branch-{i % 40}" for app in APPS for i in range(60)]
+
+LEGACY_QUERIES = {
+    "top apps": '''
+        SELECT app_name, SUM(duration_seconds) as total_seconds
+        FROM activity_logs GROUP BY app_name ORDER BY total_seconds DESC LIMIT 10
+    ''',
+    "switch patterns": '''
+        SELECT from_app, to_app, COUNT(*) as switch_count
+        FROM app_switches WHERE from_app IS NOT NULL
+        GROUP BY from_app, to_app ORDER BY switch_count DESC LIMIT 10
+    ''',
+    "time per title": '''
+        SELECT window_title, SUM(duration_seconds) FROM activity_logs GROUP BY window_title
+    ''',
+}
+
+INTERNED_QUERIES = {
+    "top apps": '''
+        SELECT a.name, u.total_seconds FROM (
+            SELECT app_id, SUM(duration_seconds) as total_seconds
+            FROM activity_logs GROUP BY app_id ORDER BY total_seconds DESC LIMIT 10
+        ) u JOIN apps a ON a.id = u.app_id
+    ''',
+    "switch patterns": '''
+        SELECT f.name, t.name, p.switch_count FROM (
+            SELECT from_app_id, to_app_id, COUNT(*) as switch_count
+            FROM app_switches WHERE from_app_id IS NOT NULL
+            GROUP BY from_app_id, to_app_id ORDER BY switch_count DESC LIMIT 10
+        ) p JOIN apps f ON f.id = p.from_app_id JOIN apps t ON t.id = p.to_app_id
+    ''',
+    "time per title": '''
+        SELECT w.title, u.total FROM (
+            SELECT title_id, SUM(duration_seconds) AS total FROM activity_logs GROUP BY title_id
+        ) u LEFT JOIN window_titles w ON w.id = u.title_id
+    ''',
+}
+
+
+def build_legacy_db(path, rows):
+    """Create a database in the pre-interning text layout."""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, app_name TEXT NOT NULL,
+            start_time TEXT NOT NULL, end_time TEXT, duration_seconds INTEGER,
+            window_title TEXT, bundle_id TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE app_switches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, from_app TEXT,
+            to_app TEXT NOT NULL, timestamp TEXT NOT NULL
+        )
+    ''')
+    rng = random.Random(42)
+    activity, switches = [], []
+    prev = None
+    for i in range(rows):
+        app = rng.choice(APPS)
+        stamp = f"2026-01-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:00"
+        activity.append((app, stamp, stamp, rng.randint(5, 600),
+                         rng.choice(TITLES), f"com.example.{app.lower().replace(' ', '')}"))
+        switches.append((prev, app, stamp))
+        prev = app
+    conn.executemany("INSERT INTO activity_logs (app_name, start_time, end_time, duration_seconds, "
+                     "window_title, bundle_id) VALUES (?, ?, ?, ?, ?, ?)", activity)
+    conn.executemany("INSERT INTO app_switches (from_app, to_app, timestamp) VALUES (?, ?, ?)", switches)
+    conn.commit()
+    conn.close()
+
+
+def time_query(conn, sql, repeat):
+    """Return the best wall time (ms) of running sql repeat times."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        legacy_path = os.path.join(workdir, "legacy.db")
+        interned_path = os.path.join(workdir, "interned.db")
+        print(f"Building legacy database with {args.rows:,} rows...")
+        build_legacy_db(legacy_path, args.rows)
+        shutil.copy(legacy_path, interned_path)
+
+        conn = sqlite3.connect(interned_path)
+        start = time.perf_counter()
+        ensure_schema(conn)
+        print(f"Migration took {time.perf_counter() - start:.2f}s")
+        conn.execute("VACUUM")
+        conn.close()
+
+        legacy = sqlite3.connect(legacy_path)
+        interned = sqlite3.connect(interned_path)
+        print(f"\n{'query':<18}{'text (ms)':>12}{'int (ms)':>12}{'speedup':>10}")
+        for name, sql in LEGACY_QUERIES.items():
+            text_ms = time_query(legacy, sql, args.repeat)
+            int_ms = time_query(interned, INTERNED_QUERIES[name], args.repeat)
+            print(f"{name:<18}{text_ms:>12.1f}{int_ms:>12.1f}{text_ms / int_ms:>9.1f}x")
+        legacy.close()
+        interned.close()
+
+        print(f"\nFile size: {os.path.getsize(legacy_path) / 1e6:.1f} MB text, "
+              f"{os.path.getsize(interned_path) / 1e6:.1f} MB interned")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
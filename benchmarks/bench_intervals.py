@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: point-in-time and overlap queries over activity history.
+
+Fills a temporary database with --rows back-to-back activities of
+varying length spread over years, grouped into sessions, then asks
+"what was running at T" at the start, middle and end of the history and
+"what overlaps this hour" in the middle, two ways: the start_time B-tree
+(start_time <= T AND end_time > T, which reads every row starting before
+T) and activity_at() / activity_overlapping() through the R*Tree
+interval index. Also reports the one-off index build and what the index
+triggers add to the tracker's per-tick UPDATE of end_time.
+
+Usage: python benchmarks/bench_intervals.py [--rows 1000000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from storage import INTERVAL_TABLES, create_interval_index, ensure_schema
+from intervals import activity_at, activity_overlapping
+
+START = 1_600_000_000
+SESSION_ROWS = 200
+
+
+def build(path, rows):
+    """Fills the tables with the interval index dropped; returns the end of the last activity."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    ensure_schema(conn)
+    for table in INTERVAL_TABLES:
+        for operation in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER trg_{table}_intervals_{operation}")
+        conn.execute(f"DROP TABLE {table}_intervals")
+    conn.execute("INSERT INTO apps (id, name) VALUES (1, 'VSCode'), (2, 'Slack'), (3, 'Google Chrome')")
+
+    rng = random.Random(5)
+    activity, sessions = [], []
+    stamp = session_start = last = START
+    for i in range(rows):
+        duration = int(rng.expovariate(1 / 120)) + 1
+        activity.append((rng.randint(1, 3), stamp, stamp + duration, duration))
+        stamp = last = stamp + duration
+        if (i + 1) % SESSION_ROWS == 0:
+            sessions.append((session_start, stamp))
+            stamp += rng.randrange(600, 8 * 3600)
+            session_start = stamp
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) VALUES (?, ?, ?, ?)", activity
+    )
+    conn.executemany("INSERT INTO sessions (start_time, end_time) VALUES (?, ?)", sessions)
+    conn.commit()
+    return last
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - begin)
+    return result, statistics.median(samples) * 1000
+
+
+def scan(conn, start, end):
+    """Ids of activity overlapping [start, end) using only the start_time index."""
+    return [row[0] for row in conn.execute(
+        "SELECT id FROM activity_logs WHERE start_time < ? AND MAX(COALESCE(end_time, start_time), start_time + 1) > ? "
+        "ORDER BY start_time, id", (end, start)
+    )]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        path = os.path.join(workdir, "intervals.db")
+        end = build(path, args.rows)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        print(f"{args.rows:,} activity rows over {(end - START) / 86400 / 365:.1f} years\n")
+
+        def create():
+            create_interval_index(conn)
+            conn.commit()
+
+        _, ms = timed(create, 1)
+        print(f"  build interval index (one-off)  {ms:>9.1f} ms\n")
+
+        print(f"  {'query':<30}{'B-tree scan':>13}{'R*Tree':>11}{'rows':>7}")
+        middle = START + (end - START) // 2
+        queries = [(f"at {label}", at, at + 1, lambda at=at: activity_at(conn, at))
+                   for label, at in (("start", START + 60), ("middle", middle), ("end", end - 60))]
+        queries.append(("overlapping an hour (middle)", middle, middle + 3600,
+                        lambda: activity_overlapping(conn, middle, middle + 3600)))
+        for label, start, stop, query in queries:
+            expected, scan_ms = timed(lambda: scan(conn, start, stop))
+            found, tree_ms = timed(query)
+            assert [row["id"] for row in found["activity"]] == expected, label
+            print(f"  {label:<30}{scan_ms:>10.2f} ms{tree_ms:>8.2f} ms{len(expected):>7}")
+
+        # The tracker's write on every tick of an open row, with and without the triggers
+        ids = [random.randint(1, args.rows) for _ in range(2000)]
+
+        def ticks():
+            for id_ in ids:
+                conn.execute("UPDATE activity_logs SET end_time = end_time + 1 WHERE id = ?", (id_,))
+            conn.commit()
+
+        _, with_index = timed(ticks, 3)
+        conn.execute("DROP TRIGGER trg_activity_logs_intervals_update")
+        _, without_index = timed(ticks, 3)
+        print(f"\n  end_time UPDATE per tick        {without_index / len(ids) * 1000:>7.1f} us without index, "
+              f"{with_index / len(ids) * 1000:.1f} us with")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: focus-pattern engine on years of history.
+
+Fills a temporary database with --years of synthetic activity (an app
+visit and a switch every few minutes through the working day), then times
+the first load into NumPy arrays, an incremental refresh after the agent
+updates its open row, and compute_patterns() over several ranges.
+
+Usage: python benchmarks/bench_patterns.py [--years 3] [--visits-per-day 300]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from storage import Interner, data_version, ensure_schema
+from patterns import PatternEngine, compute_patterns
+
+APPS = ["VSCode", "Terminal", "Chrome", "Slack", "Figma", "Notion", "Spotify", "WhatsApp",
+        "Zoom", "Mail", "Calendar", "Finder", "Safari", "Xcode", "Discord", "IDLE"]
+TABLES = ("activity_logs", "app_switches")
+DAY = 24 * 3600
+
+
+def build(path, years, visits_per_day):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    app_ids = np.array([interner.app(conn, app) for app in APPS])
+    rng = np.random.default_rng(5)
+
+    days = int(years * 365)
+    total = days * visits_per_day
+    # Working day from 09:00; visit lengths are long-tailed (mostly short, some deep work)
+    durations = np.minimum(rng.lognormal(4.5, 1.2, total).astype(np.int64) + 5, 3 * 3600)
+    day_index = np.repeat(np.arange(days), visits_per_day)
+    day_start = 1_700_000_000 + day_index * DAY + 9 * 3600
+    offsets = np.cumsum(durations) - durations
+    offsets -= np.repeat(offsets[::visits_per_day], visits_per_day)
+    starts = day_start + offsets
+    apps = app_ids[rng.integers(0, len(APPS), total)]
+
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) VALUES (?, ?, ?, ?)",
+        zip(apps.tolist(), starts.tolist(), (starts + durations).tolist(), durations.tolist()),
+    )
+    conn.executemany(
+        "INSERT INTO app_switches (from_app_id, to_app_id, timestamp) VALUES (?, ?, ?)",
+        zip(apps[:-1].tolist(), apps[1:].tolist(), starts[1:].tolist()),
+    )
+    conn.commit()
+    return conn, int(starts[-1])
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--visits-per-day", type=int, default=300)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        conn, last = build(os.path.join(workdir, "patterns.db"), args.years, args.visits_per_day)
+        rows = conn.execute("SELECT COUNT(*) FROM activity_logs").fetchone()[0]
+        print(f"{args.years:g} years, {rows:,} activity rows, {rows - 1:,} switches\n")
+
+        engine = PatternEngine()
+        start = time.perf_counter()
+        data = engine.data(conn, "bench", data_version(conn, TABLES))
+        print(f"  first load into arrays       {(time.perf_counter() - start) * 1000:>8.1f} ms")
+
+        # The agent extends its open row every few seconds
+        conn.execute("UPDATE activity_logs SET duration_seconds = duration_seconds + 5 "
+                     "WHERE id = (SELECT MAX(id) FROM activity_logs)")
+        conn.commit()
+        start = time.perf_counter()
+        data = engine.data(conn, "bench", data_version(conn, TABLES))
+        print(f"  refresh after agent update   {(time.perf_counter() - start) * 1000:>8.1f} ms\n")
+
+        for label, since in (("last week", last - 7 * DAY), ("last 30 days", last - 30 * DAY),
+                             ("last year", last - 365 * DAY), ("all history", 0)):
+            _, ms = timed(lambda: compute_patterns(data, since, None))
+            print(f"  compute_patterns {label:<13}{ms:>8.1f} ms")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
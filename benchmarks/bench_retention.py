@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark: how retention affects the tracker's writes.
+
+Fills a temporary database with --days of 30-second timeline ticks, then
+expires everything older than 14 days two ways while a writer thread
+inserts a tick every 5 ms, like a busy tracker: one DELETE followed by a
+full VACUUM, and retention.apply_retention (hourly rollup, adaptive
+batches, incremental vacuum). Reports how long each took, the writer's
+worst and 99th-percentile insert latency, and the file size afterwards.
+
+Usage: python benchmarks/bench_retention.py [--days 180]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from threading import Event, Thread
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+from retention import apply_retention, validate_policies
+from storage import Interner, ensure_schema
+
+APPS = ["VSCode", "Google Chrome", "Slack", "Terminal", "IDLE"]
+
+
+def build(path, days, now):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    apps = [interner.app(conn, app) for app in APPS]
+    start = now - days * 86400
+    conn.executemany(
+        "INSERT INTO timeline (timestamp, app_id, is_idle, title_id) VALUES (?, ?, ?, ?)",
+        ((start + i * 30, apps[i // 20 % len(apps)], int(i // 20 % len(apps) == 4),
+          interner.title(conn, f"Window {i % 500}")) for i in range(days * 2880)),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Writer(Thread):
+    """Inserts one timeline row every interval and records how long each took."""
+
+    def __init__(self, path, interval=0.005):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.latencies = []
+        self._stop_event = Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        while not self._stop_event.wait(self.interval):
+            begin = time.perf_counter()
+            conn.execute("INSERT INTO timeline (timestamp, app_id, is_idle) VALUES (?, 1, 0)", (int(time.time()),))
+            conn.commit()
+            self.latencies.append(time.perf_counter() - begin)
+        conn.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def measure(path, expire):
+    writer = Writer(path)
+    writer.start()
+    time.sleep(0.2)
+    begin = time.perf_counter()
+    expire()
+    elapsed = time.perf_counter() - begin
+    time.sleep(0.2)
+    writer.stop()
+    ordered = sorted(writer.latencies)
+    p99 = ordered[int(len(ordered) * 0.99) - 1]
+    return elapsed, max(ordered) * 1000, p99 * 1000, statistics.median(ordered) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=180)
+    args = parser.parse_args()
+
+    now = int(time.time())
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        template = os.path.join(workdir, "template.db")
+        build(template, args.days, now)
+        print(f"{args.days * 2880:,} timeline rows over {args.days} days, "
+              f"{os.path.getsize(template) / 1e6:.1f} MB; expiring all but the last 14 days\n")
+        print(f"  {'strategy':<30}{'total s':>9}{'write max ms':>14}{'write p99 ms':>14}{'p50 ms':>8}{'file MB':>9}")
+
+        def naive(path):
+            def expire():
+                conn = sqlite3.connect(path, timeout=60)
+                conn.execute("DELETE FROM timeline WHERE timestamp < ?", (now - 14 * 86400,))
+                conn.commit()
+                conn.execute("VACUUM")
+                conn.close()
+            return expire
+
+        def batched(path):
+            def expire():
+                conn = sqlite3.connect(path, timeout=60)
+                apply_retention(conn, validate_policies({}), now=now)
+                conn.close()
+            return expire
+
+        for label, strategy in (("DELETE + VACUUM", naive), ("apply_retention (batched)", batched)):
+            path = os.path.join(workdir, "run.db")
+            shutil.copy(template, path)
+            elapsed, worst, p99, p50 = measure(path, strategy(path))
+            sqlite3.connect(path).execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            print(f"  {label:<30}{elapsed:>9.2f}{worst:>14.1f}{p99:>14.1f}{p50:>8.2f}{os.path.getsize(path) / 1e6:>9.1f}")
+            os.remove(path)
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full-text search over activity history.
+
+Fills a temporary database with --rows activities spread over a year,
+whose window titles mention --tickets distinct tickets ("PROJ-123 ...")
+among other pages, then answers "how long did I spend on ticket X" three
+ways: a LIKE '%...%' scan joining every activity row to its title, LIKE
+over the distinct titles only, and search_activity() through the FTS5
+index. Also reports how long the one-off index rebuild takes.
+
+Usage: python benchmarks/bench_search.py [--rows 1000000] [--tickets 5000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from storage import Interner, ensure_schema
+from search import search_activity
+
+APPS = ["Google Chrome", "VSCode", "Slack", "Terminal", "Figma", "Notion"]
+PAGES = ["Inbox", "Pull request", "Standup notes", "Design review", "YouTube", "Docs", "Calendar"]
+
+
+def build(path, rows, tickets):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    ensure_schema(conn)
+    interner = Interner()
+    rng = random.Random(11)
+    titles = [f"PROJ-{n} {rng.choice(PAGES)} - Jira" for n in range(tickets)]
+    titles += [f"{page} {n}" for page in PAGES for n in range(tickets // 2)]
+    start = int(time.time()) - 365 * 86400
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds, title_id) VALUES (?, ?, ?, ?, ?)",
+        ((interner.app(conn, rng.choice(APPS)), start + i * 30, start + i * 30 + 25, 25,
+          interner.title(conn, rng.choice(titles))) for i in range(rows)),
+    )
+    conn.commit()
+    return conn
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - begin)
+    return result, statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--tickets", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        conn = build(os.path.join(workdir, "search.db"), args.rows, args.tickets)
+        distinct = conn.execute("SELECT COUNT(*) FROM window_titles").fetchone()[0]
+        print(f"{args.rows:,} activity rows, {distinct:,} distinct window titles\n")
+
+        _, ms = timed(lambda: conn.execute("INSERT INTO window_titles_fts(window_titles_fts) VALUES ('rebuild')"), 1)
+        print(f"  rebuild title index (one-off)     {ms:>9.1f} ms\n")
+
+        ticket = f"PROJ-{args.tickets // 2}"
+        print(f'  "how long on {ticket}?"')
+        full_scan, ms = timed(lambda: conn.execute('''
+            SELECT SUM(l.duration_seconds) FROM activity_logs l
+            JOIN window_titles w ON w.id = l.title_id
+            WHERE w.title LIKE ?
+        ''', (f"%{ticket} %",)).fetchone()[0])
+        print(f"  LIKE over every activity row      {ms:>9.1f} ms")
+
+        dimension_scan, ms = timed(lambda: conn.execute('''
+            SELECT SUM(l.duration_seconds) FROM activity_logs l
+            WHERE l.title_id IN (SELECT id FROM window_titles WHERE title LIKE ?)
+        ''', (f"%{ticket} %",)).fetchone()[0])
+        print(f"  LIKE over distinct titles         {ms:>9.1f} ms")
+
+        found, ms = timed(lambda: search_activity(conn, ticket))
+        print(f"  FTS5 search_activity()            {ms:>9.1f} ms")
+        assert full_scan == dimension_scan == found["total_seconds"], (full_scan, dimension_scan, found)
+
+        _, ms = timed(lambda: search_activity(conn, "pull req", limit=20))
+        print(f'  FTS5 prefix query "pull req"      {ms:>9.1f} ms')
+        conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
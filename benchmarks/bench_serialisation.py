@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: list-endpoint serialisation, default path vs ATTENTIONOS_FAST_JSON.
+
+Fills a database with activity_logs rows and serialises the /api/timeline
+query both ways:
+  default - sqlite3.Row -> rows_to_dict -> jsonable_encoder -> json.dumps
+            (what JSONResponse does; jsonable_encoder only if FastAPI is installed)
+  fast    - tuple cursor -> serialization.stream_json_rows (orjson if installed)
+
+Usage: python benchmarks/bench_serialisation.py [--rows 1000000]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from storage import Interner, ensure_schema, iso_column
+import serialization
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+TIMELINE_QUERY = f'''
+    SELECT l.id, a.name AS app_name, {iso_column("l.start_time")}, {iso_column("l.end_time")},
+           l.duration_seconds
+    FROM activity_logs l
+    JOIN apps a ON a.id = l.app_id
+    ORDER BY l.start_time DESC
+'''
+
+APPS = ["VSCode", "Terminal", "Chrome", "Slack", "Figma", "Notion", "Spotify", "WhatsApp", "Idle"]
+
+
+def build_db(path, rows):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    interner = Interner()
+    app_ids = [interner.app(conn, app) for app in APPS]
+    rng = random.Random(7)
+    start = 1_760_000_000
+    batch = []
+    for i in range(rows):
+        duration = rng.randint(5, 600)
+        batch.append((rng.choice(app_ids), start + i * 30, start + i * 30 + duration, duration))
+        if len(batch) == 100_000:
+            conn.executemany("INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) "
+                             "VALUES (?, ?, ?, ?)", batch)
+            batch.clear()
+    conn.executemany("INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) "
+                     "VALUES (?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def default_path(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    content = [dict(row) for row in conn.execute(TIMELINE_QUERY).fetchall()]
+    conn.close()
+    if jsonable_encoder is not None:
+        content = jsonable_encoder(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(path):
+    conn = sqlite3.connect(path)
+    cursor = conn.execute(TIMELINE_QUERY)
+    return b"".join(serialization.stream_json_rows(conn, cursor))
+
+
+def measure(fn, path, repeat):
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(path)
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        path = os.path.join(workdir, "bench.db")
+        print(f"Building database with {args.rows:,} activity rows...")
+        build_db(path, args.rows)
+
+        print(f"encoder: {'orjson' if serialization.orjson else 'json (orjson not installed)'}, "
+              f"jsonable_encoder: {'yes' if jsonable_encoder else 'no (FastAPI not installed)'}\n")
+        default_s, default_body = measure(default_path, path, args.repeat)
+        fast_s, fast_body = measure(fast_path, path, args.repeat)
+        assert json.loads(default_body) == json.loads(fast_body), "paths disagree"
+
+        print(f"{'path':<10}{'time (s)':>10}{'MB':>8}")
+        print(f"{'default':<10}{default_s:>10.2f}{len(default_body) / 1e6:>8.1f}")
+        print(f"{'fast':<10}{fast_s:>10.2f}{len(fast_body) / 1e6:>8.1f}")
+        print(f"\nspeedup: {default_s / fast_s:.1f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single database vs per-user shards under concurrent ingestion.
+
+Several threads ingest batches for many users at once, the way concurrent
+/api/ingest requests do, first into one shared database and then into one
+shard per user. Also times a fan-out count across all shards through the
+bounded connection pool.
+
+Usage: python benchmarks/bench_sharding.py [--users 32] [--threads 8] [--batches 8]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend"))
+from ingest import ingest_batch
+from shards import DEFAULT_SHARD, ConnectionPool, ShardRouter, ShardState, fan_out
+
+APPS = ["VSCode", "Terminal", "Chrome", "Slack", "Figma", "Notion", "Spotify", "WhatsApp"]
+EVENTS_PER_BATCH = 2000
+
+
+def make_batch(user, n):
+    start = 1_760_000_000 + n * EVENTS_PER_BATCH * 10
+    return {
+        "device_id": f"{user}-laptop", "user_id": user, "batch_id": f"{user}:{n}",
+        "activity": [
+            {"id": n * EVENTS_PER_BATCH + i, "app_name": APPS[i % len(APPS)],
+             "start_time": start + i * 10, "end_time": start + i * 10 + 9, "duration_seconds": 9}
+            for i in range(EVENTS_PER_BATCH)
+        ],
+    }
+
+
+def run(workdir, mode, users, threads, batches, pool_size):
+    pool = ConnectionPool(max_connections=pool_size)
+    router = ShardRouter(os.path.join(workdir, f"{mode or 'single'}.db"),
+                         os.path.join(workdir, f"{mode or 'single'}-shards"), mode=mode)
+    state = ShardState()
+    # As the backend does at startup; fan_out() reads the default shard too
+    pool.connect(router.path_for(DEFAULT_SHARD), create=True).close()
+    work = [make_batch(f"user{u}", n) for n in range(batches) for u in range(users)]
+
+    def ingest(payload):
+        shard = router.shard_for(payload["user_id"])
+        lock, interner = state.get(shard)
+        with lock:
+            conn = pool.connect(router.path_for(shard), create=True)
+            try:
+                return ingest_batch(conn, payload, interner)["written"]
+            finally:
+                conn.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        written = sum(executor.map(ingest, work))
+    ingest_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    counted = sum(n for _, n in fan_out(
+        pool, router, lambda conn: conn.execute("SELECT COUNT(*) FROM activity_logs").fetchone()[0]
+    ))
+    query_ms = (time.perf_counter() - start) * 1000
+    open_connections = pool.stats()["open"]
+    pool.close_all()
+    assert counted == written
+    return written, ingest_seconds, query_ms, open_connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=8, help="batches per user")
+    parser.add_argument("--pool-size", type=int, default=16)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    try:
+        print(f"{args.users} users x {args.batches} batches x {EVENTS_PER_BATCH} events, "
+              f"{args.threads} threads, pool of {args.pool_size}\n")
+        print(f"{'layout':<14}{'events':>10}{'ingest s':>10}{'events/s':>12}{'count ms':>10}{'open fds':>10}")
+        for label, mode in (("single db", ""), ("user shards", "user")):
+            written, seconds, query_ms, open_connections = run(
+                workdir, mode, args.users, args.threads, args.batches, args.pool_size
+            )
+            print(f"{label:<14}{written:>10,}{seconds:>10.2f}{written / seconds:>12,.0f}"
+                  f"{query_ms:>10.1f}{open_connections:>10}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
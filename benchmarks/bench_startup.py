@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold import time of the agent and backend modules.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters,
+reports the median total import time per target, and lists the slowest
+imports (cumulative microseconds, as -X importtime reports them) from the
+last run. Targets whose dependencies are not installed are reported and
+skipped.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# name -> (working directory, module to import)
+TARGETS = {
+    "agent (main.py)": (ROOT, "main"),
+    "agent api (api.py)": (ROOT, "api"),
+    "backend (backend/main.py)": (os.path.join(ROOT, "backend"), "main"),
+}
+
+
+def import_profile(cwd, module):
+    """Import module in a fresh interpreter; return [(cumulative_us, name)] or raise."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), name.rstrip()))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for label, (cwd, module) in TARGETS.items():
+        print(f"{label}")
+        try:
+            totals, entries = [], []
+            for _ in range(args.runs):
+                entries = import_profile(cwd, module)
+                # The target itself is the last (outermost) entry
+                totals.append(entries[-1][0])
+        except RuntimeError as e:
+            print(f"  skipped: {e}\n")
+            continue
+
+        print(f"  median import time: {statistics.median(totals) / 1000:.1f} ms "
+              f"(min {min(totals) / 1000:.1f}, {args.runs} runs)")
+        for cumulative, name in sorted(entries, reverse=True)[1:args.top + 1]:
+            print(f"  {cumulative / 1000:>9.1f} ms  {name.strip()}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
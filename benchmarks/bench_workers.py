@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: backend request throughput by number of worker processes.
+
+Starts backend/main.py under uvicorn with 1, 2, 4, ... workers (up to the
+CPU count) against a throwaway database, then drives it with keep-alive
+HTTP clients for a fixed time and reports requests/s and latency.
+
+Usage: python benchmarks/bench_workers.py [--seconds 10] [--clients 32]
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# A read-heavy mix like the dashboard's: lists, the rollup and health checks
+PATHS = [
+    "/api/sessions",
+    "/api/analytics/summary?window=week",
+    "/api/analytics/summary?window=all",
+    "/api/app-switches",
+    "/api/health",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_backend(workers, port, data_dir):
+    env = dict(os.environ, ATTENTIONOS_DB_PATH=os.path.join(data_dir, "attentionos.db"))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(ROOT, "backend"),
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"backend with {workers} workers did not start")
+
+
+def client(port, until):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, i = [], 0
+    while time.time() < until:
+        start = time.perf_counter()
+        conn.request("GET", PATHS[i % len(PATHS)], headers={"Accept-Encoding": "gzip"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    conn.close()
+    return latencies
+
+
+def run(workers, seconds, clients):
+    data_dir = tempfile.mkdtemp(prefix="attentionos-bench-")
+    port = free_port()
+    process = start_backend(workers, port, data_dir)
+    try:
+        # Warm every worker's pool and the shared rollup cache
+        client(port, time.time() + 1)
+        until = time.time() + seconds
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            latencies = sorted(l for ls in executor.map(lambda _: client(port, until), range(clients)) for l in ls)
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(data_dir)
+    return len(latencies) / seconds, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+
+    print(f"{args.clients} clients, {args.seconds:.0f}s per run, {os.cpu_count()} CPUs\n")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for workers in counts:
+        throughput, p50, p99 = run(workers, args.seconds, args.clients)
+        print(f"{workers:>8}{throughput:>10,.0f}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
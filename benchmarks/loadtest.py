@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Load test: many agents writing while many dashboards poll.
+
+Starts the backend (backend/main.py, under uvicorn) and the agent API
+(api.py) on free ports against a throwaway database, with the local coach
+standing in for Gemini so the AI endpoints run offline. Then, from a few
+client processes, runs for --seconds:
+
+  agents         write like main.py's tracker loop, straight into the
+                 database: every tick the open activity row is extended,
+                 or closed with an app switch and a new row opened; every
+                 6th tick logs a timeline entry, and every 120th a session
+                 summary. The real loop ticks every 5 s; --tick-ms speeds
+                 it up.
+  remote agents  POST gzip batches to /api/ingest like uploader.py
+  dashboards     poll the dashboard's endpoint mix (lists with ETags,
+                 analytics, search, AI tips and analysis, agent status)
+                 with --think-ms between requests
+
+and samples CPU, RSS and open files of both servers from /proc. Reports
+throughput, p50/p95/p99 latency and errors per operation, "database is
+locked" failures separately, and resource usage. Linux only.
+
+Usage: python benchmarks/loadtest.py [--seconds 30] [--agents 8] [--dashboards 24]
+       [--remote-agents 0] [--workers 1] [--json results.json]
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+from storage import Interner
+
+APPS = ["VSCode", "Google Chrome", "Slack", "Terminal", "Figma", "Notion", "Mail", "Spotify", "Zoom", "IDLE"]
+SEARCH_TERMS = ["VSCode", "Chrome", "PROJ", "Design", "Slack"]
+
+# (weight, method, server, path); bodies for POSTs come from request_body()
+DASHBOARD_MIX = [
+    (10, "GET", "backend", "/api/sessions"),
+    (8, "GET", "backend", "/api/timeline"),
+    (4, "GET", "backend", "/api/app-switches"),
+    (8, "GET", "backend", "/api/analytics/summary?window=week"),
+    (4, "GET", "backend", "/api/analytics/patterns?window=week"),
+    (4, "GET", "backend", "/api/analytics/categories?window=week"),
+    (3, "GET", "backend", "/api/search?q={term}"),
+    (2, "POST", "backend", "/api/ai/explain"),
+    (1, "POST", "backend", "/api/ai/deep-analysis"),
+    (6, "GET", "agent", "/api/agent/status"),
+    (6, "GET", "agent", "/api/agent/focus-score"),
+]
+
+AGENT_TIMELINE_EVERY = 6
+AGENT_SESSION_EVERY = 120
+AGENT_SWITCH_PROBABILITY = 0.2
+REMOTE_BATCH_EVENTS = 200
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port, path, process, label):
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{label} exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{label} did not start")
+
+
+def start_servers(data_dir, workers):
+    """Backend and agent API on free ports; returns {name: (process, port)}."""
+    env = dict(
+        os.environ,
+        ATTENTIONOS_DB_PATH=os.path.join(data_dir, "attentionos.db"),
+        ATTENTIONOS_COACH="local",
+        GEMINI_API_KEY="",
+    )
+    servers = {}
+    for name, app_dir, module, health in (
+        ("backend", os.path.join(ROOT, "backend"), "main:app", "/api/health"),
+        ("agent", ROOT, "api:app", "/"),
+    ):
+        port = free_port()
+        command = [sys.executable, "-m", "uvicorn", module, "--app-dir", app_dir,
+                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+        if name == "backend":
+            command += ["--workers", str(workers)]
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+        servers[name] = (process, port)
+        try:
+            # The backend creates the schema and demo data the agent API reads
+            wait_until_up(port, health, process, name)
+        except RuntimeError:
+            stop_servers(servers)
+            raise
+    return servers
+
+
+def stop_servers(servers):
+    for process, _ in servers.values():
+        process.terminate()
+    for process, _ in servers.values():
+        process.wait()
+
+
+# --- resource sampling ------------------------------------------------------
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_tree(pid):
+    """pid and all its descendants (uvicorn workers are children of the supervisor)."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as handle:
+                    parents[int(entry)] = int(handle.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                pass
+    tree, frontier = [pid], [pid]
+    while frontier:
+        children = [child for child, parent in parents.items() if parent in frontier]
+        tree += children
+        frontier = children
+    return tree
+
+
+def read_usage(pids):
+    """(cpu seconds, rss bytes, open fds) summed over pids; vanished ones are skipped."""
+    cpu = rss = fds = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as handle:
+                fields = handle.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as handle:
+                rss += int(handle.read().split()[1]) * PAGE_SIZE
+            fds += len(os.listdir(f"/proc/{pid}/fd"))
+        except OSError:
+            continue
+        # utime and stime are fields 14 and 15 of stat; fields[0] is field 3
+        cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, rss, fds
+
+
+def database_bytes(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+class Sampler(Thread):
+    """Samples each server's CPU %, RSS and open fds, and the database size."""
+
+    def __init__(self, servers, db_path, interval=0.5):
+        super().__init__(daemon=True)
+        self.servers = {name: process.pid for name, (process, _) in servers.items()}
+        self.db_path = db_path
+        self.interval = interval
+        self.samples = defaultdict(list)
+        self.database = []
+        self._stop_event = Event()
+
+    def run(self):
+        trees = {name: process_tree(pid) for name, pid in self.servers.items()}
+        previous = {name: (read_usage(pids)[0], time.perf_counter()) for name, pids in trees.items()}
+        while not self._stop_event.wait(self.interval):
+            for name, pids in trees.items():
+                cpu, rss, fds = read_usage(pids)
+                now = time.perf_counter()
+                last_cpu, last_time = previous[name]
+                previous[name] = (cpu, now)
+                self.samples[name].append((100 * (cpu - last_cpu) / (now - last_time), rss, fds))
+            self.database.append(database_bytes(self.db_path))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# --- simulated clients ------------------------------------------------------
+
+def is_lock_error(text):
+    return "locked" in text or "busy" in text
+
+
+class Recorder:
+    """Latencies and failures per operation, for one client process."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.locked = defaultdict(int)
+        self.messages = {}
+
+    def time(self, label, fn):
+        begin = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.errors[label] += 1
+            if isinstance(e, sqlite3.OperationalError) and is_lock_error(str(e)):
+                self.locked[label] += 1
+            self.messages.setdefault(label, f"{type(e).__name__}: {e}"[:200])
+            return
+        self.latencies[label].append(time.perf_counter() - begin)
+
+    def result(self):
+        return {"latencies": dict(self.latencies), "errors": dict(self.errors),
+                "locked": dict(self.locked), "messages": self.messages}
+
+
+class HTTPFailure(Exception):
+    pass
+
+
+def agent(index, db_path, until, tick, recorder):
+    """main.py's tracker loop: one connection per write, as in the agent."""
+    rng = random.Random(index)
+    interner = Interner()
+    state = {"app": None, "record": None, "opened": 0}
+    session_start = ticks = 0
+
+    def connect():
+        # main.py opens connections with the default 5 s busy timeout
+        return sqlite3.connect(db_path)
+
+    def write(sql_fn):
+        conn = connect()
+        try:
+            result = sql_fn(conn)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+
+    def open_activity(now):
+        app = rng.choice(APPS)
+        title = f"{app} - document {rng.randrange(40)}"
+
+        def run(conn):
+            if state["app"] is not None:
+                conn.execute("UPDATE activity_logs SET end_time = ?, duration_seconds = ? WHERE id = ?",
+                             (now, now - state["opened"], state["record"]))
+            conn.execute("INSERT INTO app_switches (from_app_id, to_app_id, timestamp) VALUES (?, ?, ?)",
+                         (interner.app(conn, state["app"]), interner.app(conn, app), now))
+            return conn.execute(
+                "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds, title_id) "
+                "VALUES (?, ?, NULL, 0, ?)", (interner.app(conn, app), now, interner.title(conn, title)),
+            ).lastrowid
+
+        state["record"] = write(run)
+        state["app"], state["opened"] = app, now
+
+    def extend(now):
+        write(lambda conn: conn.execute("UPDATE activity_logs SET end_time = ?, duration_seconds = ? WHERE id = ?",
+                                        (now, now - state["opened"], state["record"])))
+
+    def timeline(now):
+        write(lambda conn: conn.execute(
+            "INSERT INTO timeline (timestamp, app_id, is_idle) VALUES (?, ?, ?)",
+            (now, interner.app(conn, state["app"]), int(state["app"] == "IDLE"))))
+
+    def session(now):
+        def run(conn):
+            idle = interner.app(conn, "IDLE")
+            active = conn.execute("SELECT COALESCE(SUM(duration_seconds), 0) FROM activity_logs "
+                                  "WHERE app_id != ? AND start_time >= ?", (idle, session_start)).fetchone()[0]
+            idle_seconds = conn.execute("SELECT COALESCE(SUM(duration_seconds), 0) FROM activity_logs "
+                                        "WHERE app_id = ? AND start_time >= ?", (idle, session_start)).fetchone()[0]
+            switches = conn.execute("SELECT COUNT(*) FROM app_switches WHERE timestamp >= ?",
+                                    (session_start,)).fetchone()[0]
+            total = active + idle_seconds
+            conn.execute(
+                "INSERT INTO sessions (start_time, end_time, total_active_seconds, total_idle_seconds, "
+                "app_switches, focus_score) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_start, now, active, idle_seconds, switches, 100 * active / total if total else 0.0),
+            )
+        write(run)
+
+    session_start = int(time.time())
+    recorder.time("agent: open activity + switch", lambda: open_activity(int(time.time())))
+    while time.time() < until:
+        time.sleep(tick)
+        now = int(time.time())
+        ticks += 1
+        if rng.random() < AGENT_SWITCH_PROBABILITY:
+            recorder.time("agent: open activity + switch", lambda: open_activity(now))
+        else:
+            recorder.time("agent: extend activity", lambda: extend(now))
+        if ticks % AGENT_TIMELINE_EVERY == 0:
+            recorder.time("agent: timeline entry", lambda: timeline(now))
+        if ticks % AGENT_SESSION_EVERY == 0:
+            recorder.time("agent: session summary", lambda: session(now))
+            session_start = now
+
+
+def http_call(conn, method, path, body=None, headers=None):
+    """One request on a keep-alive connection; returns (status, body bytes)."""
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    if response.status >= 500:
+        raise HTTPFailure(data.decode("utf-8", "replace"))
+    return response.status, response.getheader("ETag"), data
+
+
+def remote_agent(index, port, until, interval, recorder):
+    """An uploading agent: gzip batches of fresh events to /api/ingest."""
+    rng = random.Random(1000 + index)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    device, next_id = f"loadtest-{index}", 1
+    while time.time() < until:
+        now = int(time.time())
+        activity, switches, timeline = [], [], []
+        for _ in range(REMOTE_BATCH_EVENTS // 3):
+            app = rng.choice(APPS)
+            activity.append({"id": next_id, "app_name": app, "start_time": now, "end_time": now + 5,
+                             "duration_seconds": 5, "window_title": f"{app} - remote", "bundle_id": None})
+            switches.append({"id": next_id, "from_app": rng.choice(APPS), "to_app": app, "timestamp": now})
+            timeline.append({"id": next_id, "timestamp": now, "app_name": app, "is_idle": app == "IDLE",
+                             "window_title": None, "bundle_id": None})
+            next_id += 1
+        payload = {"device_id": device, "user_id": None, "batch_id": f"{device}:{next_id}",
+                   "activity": activity, "switches": switches, "timeline": timeline, "sessions": []}
+        body = gzip.compress(json.dumps(payload).encode())
+        headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+        def post():
+            try:
+                http_call(conn, "POST", "/api/ingest", body, headers)
+            except HTTPFailure as e:
+                if is_lock_error(str(e)):
+                    recorder.locked["POST /api/ingest"] += 1
+                raise
+        recorder.time("POST /api/ingest", post)
+        time.sleep(interval)
+    conn.close()
+
+
+def request_body(path, rng):
+    if path == "/api/ai/explain":
+        minutes = rng.uniform(20, 120)
+        return json.dumps({
+            "focus_score": round(rng.uniform(30, 95), 1), "duration_minutes": minutes,
+            "active_time_minutes": minutes * 0.8, "idle_time_minutes": minutes * 0.2,
+            "app_switches": rng.randrange(5, 80), "top_apps": rng.sample(APPS[:-1], 3),
+        })
+    return None
+
+
+def dashboard(index, ports, until, think, recorder):
+    """A browser tab polling the dashboard's mix, revalidating with ETags."""
+    rng = random.Random(2000 + index)
+    conns = {name: http.client.HTTPConnection("127.0.0.1", port, timeout=60) for name, port in ports.items()}
+    etags = {}
+    weights = [weight for weight, *_ in DASHBOARD_MIX]
+    while time.time() < until:
+        _, method, server, path = rng.choices(DASHBOARD_MIX, weights)[0]
+        url = path.format(term=rng.choice(SEARCH_TERMS))
+        label = f"{method} {path.split('?')[0]}"
+        headers = {"Accept-Encoding": "gzip"}
+        if url in etags:
+            headers["If-None-Match"] = etags[url]
+        body = request_body(path, rng)
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+
+        def call():
+            try:
+                _, etag, _ = http_call(conns[server], method, url, body, headers)
+            except HTTPFailure as e:
+                if is_lock_error(str(e)):
+                    recorder.locked[label] += 1
+                raise
+            except (http.client.HTTPException, OSError):
+                conns[server].close()
+                raise
+            if etag:
+                etags[url] = etag
+        recorder.time(label, call)
+        time.sleep(think)
+    for conn in conns.values():
+        conn.close()
+
+
+def run_clients(share):
+    """One client process: its share of agents, remote agents and dashboards as threads."""
+    recorder = Recorder()
+    until = share["until"]
+    jobs = (
+        [lambda i=i: agent(i, share["db_path"], until, share["tick"], recorder) for i in share["agents"]]
+        + [lambda i=i: remote_agent(i, share["ports"]["backend"], until, share["upload_interval"], recorder)
+           for i in share["remote_agents"]]
+        + [lambda i=i: dashboard(i, share["ports"], until, share["think"], recorder) for i in share["dashboards"]]
+    )
+    if jobs:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            for future in [executor.submit(job) for job in jobs]:
+                future.result()
+    return recorder.result()
+
+
+# --- report -----------------------------------------------------------------
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarise(results, seconds):
+    latencies, errors, locked, messages = defaultdict(list), defaultdict(int), defaultdict(int), {}
+    for result in results:
+        for label, message in result["messages"].items():
+            messages.setdefault(label, message)
+        for label, values in result["latencies"].items():
+            latencies[label] += values
+        for label, count in result["errors"].items():
+            errors[label] += count
+        for label, count in result["locked"].items():
+            locked[label] += count
+    operations = {}
+    for label in sorted(set(latencies) | set(errors)):
+        ordered = sorted(latencies[label])
+        operations[label] = {
+            "count": len(ordered),
+            "per_second": len(ordered) / seconds,
+            "p50_ms": percentile(ordered, 0.50) * 1000 if ordered else None,
+            "p95_ms": percentile(ordered, 0.95) * 1000 if ordered else None,
+            "p99_ms": percentile(ordered, 0.99) * 1000 if ordered else None,
+            "errors": errors[label],
+            "locked": locked[label],
+            "first_error": messages.get(label),
+        }
+    return operations
+
+
+def print_report(operations, resources, database):
+    def ms(value):
+        return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"  {'operation':<34}{'count':>8}{'per s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'locked':>8}")
+    for label, op in operations.items():
+        print(f"  {label:<34}{op['count']:>8,}{op['per_second']:>9.1f}{ms(op['p50_ms'])}{ms(op['p95_ms'])}"
+              f"{ms(op['p99_ms'])}{op['errors']:>8}{op['locked']:>8}")
+    total = sum(op["count"] for op in operations.values())
+    print(f"\n  {total:,} operations, {sum(op['errors'] for op in operations.values())} errors, "
+          f"{sum(op['locked'] for op in operations.values())} 'database is locked'")
+    for label, op in operations.items():
+        if op["first_error"]:
+            print(f"    {label}: {op['first_error']}")
+    print()
+
+    print(f"  {'server':<10}{'cpu % mean':>12}{'cpu % max':>11}{'rss MB max':>12}{'fds max':>9}")
+    for name, usage in resources.items():
+        print(f"  {name:<10}{usage['cpu_mean']:>12.0f}{usage['cpu_max']:>11.0f}"
+              f"{usage['rss_max'] / 1e6:>12.1f}{usage['fds_max']:>9}")
+    print(f"\n  database + WAL: {database['start'] / 1e6:.1f} MB -> {database['end'] / 1e6:.1f} MB "
+          f"(max {database['max'] / 1e6:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--tick-ms", type=float, default=50, help="agent loop interval (the real agent: 5000)")
+    parser.add_argument("--remote-agents", type=int, default=0)
+    parser.add_argument("--upload-interval", type=float, default=1.0, help="seconds between remote batches")
+    parser.add_argument("--dashboards", type=int, default=24)
+    parser.add_argument("--think-ms", type=float, default=200, help="pause between a dashboard's requests")
+    parser.add_argument("--workers", type=int, default=1, help="backend worker processes")
+    parser.add_argument("--client-processes", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="attentionos-loadtest-")
+    db_path = os.path.join(data_dir, "attentionos.db")
+    try:
+        servers = start_servers(data_dir, args.workers)
+        try:
+            ports = {name: port for name, (_, port) in servers.items()}
+            print(f"backend ({args.workers} worker{'s' if args.workers > 1 else ''}) on :{ports['backend']}, "
+                  f"agent API on :{ports['agent']}; {args.agents} agents every {args.tick_ms:.0f} ms, "
+                  f"{args.remote_agents} remote agents, {args.dashboards} dashboards "
+                  f"({args.think_ms:.0f} ms think time); {args.seconds:.0f}s\n")
+
+            processes = max(1, args.client_processes)
+            until = time.time() + args.seconds
+            shares = [{
+                "db_path": db_path, "ports": ports, "until": until,
+                "tick": args.tick_ms / 1000, "think": args.think_ms / 1000,
+                "upload_interval": args.upload_interval,
+                "agents": range(p, args.agents, processes),
+                "remote_agents": range(p, args.remote_agents, processes),
+                "dashboards": range(p, args.dashboards, processes),
+            } for p in range(processes)]
+
+            database_start = database_bytes(db_path)
+            sampler = Sampler(servers, db_path)
+            sampler.start()
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.map(run_clients, shares)
+            sampler.stop()
+        finally:
+            stop_servers(servers)
+
+        operations = summarise(results, args.seconds)
+        resources = {
+            name: {
+                "cpu_mean": sum(s[0] for s in samples) / len(samples),
+                "cpu_max": max(s[0] for s in samples),
+                "rss_max": max(s[1] for s in samples),
+                "fds_max": max(s[2] for s in samples),
+            }
+            for name, samples in sampler.samples.items() if samples
+        }
+        database = {"start": database_start, "end": database_bytes(db_path),
+                    "max": max(sampler.database, default=database_start)}
+        print_report(operations, resources, database)
+        if args.json:
+            with open(args.json, "w") as handle:
+                json.dump({"config": vars(args), "operations": operations, "resources": resources,
+                           "database": database}, handle, indent=2)
+            print(f"\n  results written to {args.json}")
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
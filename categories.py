@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Productivity categories for AttentionOS.
+
+Every activity and timeline row is tagged with a category (productive,
+neutral, distracting, idle, or any name a user's rules introduce) when it
+is written, so category totals are plain indexed GROUP BY queries.
+
+Rules live in a JSON file (data/categories.json by default) shared by the
+agent and the backend:
+
+    {
+        "default": "neutral",
+        "rules": [
+            {"category": "idle", "app": "IDLE"},
+            {"category": "distracting", "app": ["Google Chrome", "Safari"],
+             "title": "youtube|reddit"},
+            {"category": "productive", "bundle": "com.microsoft.VSCode"},
+            ...
+        ]
+    }
+
+"app" and "bundle" are exact names (a string or a list, case-insensitive)
+and "title" is a regular expression searched in the window title; a rule
+with several fields needs all of them to match. The first matching rule
+wins, and rows no rule matches get the default category.
+
+All rules are compiled into one alternation over the lines
+"app\nbundle\ntitle", in MULTILINE mode so that ^ and $ in a title pattern
+anchor to the title, as they would searching the title alone. A lookup is
+a single regex match whatever the number of rules, and results are
+memoised per (app, title, bundle).
+"""
+
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+# Fact tables that carry a category_id column
+CATEGORISED_TABLES = ("activity_logs", "timeline")
+
+DEFAULT_CATEGORY = "neutral"
+
+BROWSERS = ["Google Chrome", "Chrome", "Safari", "Brave Browser", "Firefox", "Arc", "Microsoft Edge"]
+
+DEFAULT_RULES = [
+    {"category": "idle", "app": ["IDLE", "Idle"]},
+    {"category": "distracting", "app": BROWSERS,
+     "title": r"youtube|reddit|twitter|x\.com|instagram|tiktok|facebook|netflix|twitch"},
+    {"category": "productive", "app": BROWSERS,
+     "title": r"github|gitlab|stack ?overflow|docs|documentation|jira|linear|localhost"},
+    {"category": "productive", "app": ["VSCode", "Visual Studio Code", "Code", "Cursor", "Terminal", "iTerm2",
+                                       "Warp", "Xcode", "PyCharm", "Figma", "Notion", "Obsidian",
+                                       "Chrome - Docs", "Chrome - GitHub"]},
+    {"category": "productive", "bundle": ["com.microsoft.VSCode", "com.apple.Terminal", "com.googlecode.iterm2",
+                                          "com.apple.dt.Xcode", "com.jetbrains.pycharm", "com.figma.Desktop"]},
+    {"category": "neutral", "app": BROWSERS + ["Finder", "Notes", "Preview", "Spotify", "Music", "Mail",
+                                               "Calendar", "Zoom"]},
+    {"category": "distracting", "app": ["WhatsApp", "Slack", "Discord", "Messages", "Telegram", "Twitter",
+                                        "YouTube", "Reddit", "Instagram", "TikTok"]},
+]
+
+# Separates the fields of the string the combined pattern is matched
+# against; a line break, so ^ (MULTILINE) matches where the title starts
+_SEP = "\n"
+_ANY_FIELD = f"[^{_SEP}]*"
+
+# Bumped when the same rules can match differently, e.g. anchored titles
+MATCHER_VERSION = 2
+
+# Memoised lookups per Categoriser; distinct (app, title, bundle) triples
+# beyond this are re-matched, which is still a single regex call
+CACHE_SIZE = 8192
+
+
+class RuleError(ValueError):
+    """Raised for rule sets that are malformed or fail to compile."""
+
+
+def _names(value):
+    """Exact-name alternation for an "app"/"bundle" field (None = any value)."""
+    if value is None:
+        return _ANY_FIELD
+    names = [value] if isinstance(value, str) else list(value)
+    if not names or not all(isinstance(name, str) and name for name in names):
+        raise RuleError("app/bundle must be a non-empty string or list of strings")
+    return "(?:" + "|".join(re.escape(name) for name in names) + ")"
+
+
+def _title(pattern):
+    if pattern is None:
+        return ""
+    try:
+        re.compile(pattern)
+    except (re.error, TypeError) as e:
+        raise RuleError(f"invalid title pattern {pattern!r}: {e}") from e
+    return f".*?(?:{pattern})"
+
+
+class Categoriser:
+    """A compiled rule set: categorise(app, title, bundle) -> category name."""
+
+    def __init__(self, rules=None, default=DEFAULT_CATEGORY):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.default = default
+        if not isinstance(self.rules, list):
+            raise RuleError("rules must be a list")
+
+        branches = []
+        self._categories = []
+        for i, rule in enumerate(self.rules):
+            if not isinstance(rule, dict) or not isinstance(rule.get("category"), str):
+                raise RuleError(f"rule {i} needs a category")
+            if not {"app", "bundle", "title"} & rule.keys():
+                raise RuleError(f"rule {i} needs at least one of app, bundle, title")
+            branches.append(
+                f"(?P<r{i}>{_names(rule.get('app'))}{_SEP}{_names(rule.get('bundle'))}{_SEP}"
+                f"{_title(rule.get('title'))})"
+            )
+            self._categories.append(rule["category"])
+
+        try:
+            self._pattern = re.compile("|".join(branches) or "(?!)",
+                                       re.IGNORECASE | re.DOTALL | re.MULTILINE)
+        except re.error as e:
+            raise RuleError(f"rules do not compile together: {e}") from e
+        self._lookup = lru_cache(maxsize=CACHE_SIZE)(self._match)
+
+        # Identifies the rule set, so stored categories can be checked against it
+        # (the matcher version makes rows stored by an older matcher re-checked)
+        canonical = json.dumps({"default": default, "rules": self.rules, "matcher": MATCHER_VERSION}, sort_keys=True)
+        self.fingerprint = hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+    def _match(self, app_name, window_title, bundle_id):
+        subject = _SEP.join((
+            (app_name or "").replace(_SEP, " "),
+            (bundle_id or "").replace(_SEP, " "),
+            window_title or "",
+        ))
+        # Alternatives are tried in order, so the first matching rule wins;
+        # its outer group is the last one to close
+        match = self._pattern.match(subject)
+        if match is None:
+            return self.default
+        return self._categories[int(match.lastgroup[1:])]
+
+    def categorise(self, app_name, window_title=None, bundle_id=None):
+        """Return the category of one activity."""
+        return self._lookup(app_name, window_title or None, bundle_id or None)
+
+    def to_dict(self):
+        return {"default": self.default, "rules": self.rules, "fingerprint": self.fingerprint}
+
+
+_default_categoriser = None
+
+
+def default_categoriser():
+    """A shared Categoriser for the built-in rules."""
+    global _default_categoriser
+    if _default_categoriser is None:
+        _default_categoriser = Categoriser()
+    return _default_categoriser
+
+
+class RulesFile:
+    """
+    The rules JSON file behind a Categoriser, re-read when it changes.
+
+    get() costs one stat() call while the file is unchanged, so writers can
+    call it for every row; a missing file means the built-in rules.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._categoriser = default_categoriser()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            if mtime is None:
+                self._categoriser = default_categoriser()
+            else:
+                try:
+                    with open(self.path) as handle:
+                        config = json.load(handle)
+                    self._categoriser = Categoriser(config.get("rules"), config.get("default", DEFAULT_CATEGORY))
+                except (OSError, ValueError, AttributeError) as e:
+                    # Keep the previous rules rather than failing every write
+                    print(f"⚠️ Ignoring category rules in {self.path}: {e}")
+            self._mtime = mtime
+        return self._categoriser
+
+    def save(self, rules, default=DEFAULT_CATEGORY):
+        """Validate and atomically replace the rules; return the new Categoriser."""
+        categoriser = Categoriser(rules, default)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({"default": default, "rules": rules}, handle, indent=2)
+        os.replace(tmp_path, self.path)
+        return categoriser
+
+
+def recategorise(conn, categoriser, interner, only_missing=False):
+    """
+    Store categoriser's category on every activity and timeline row (or only
+    on rows that have none) and return the number of rows changed.
+
+    Each distinct (app, title, bundle) combination is matched once in
+    Python; the rows are then updated with one set-based UPDATE per table.
+    The rule fingerprint is recorded so sync_categories can tell when the
+    stored categories are out of date.
+    """
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS category_map (
+                app_id INTEGER NOT NULL,
+                title_key INTEGER NOT NULL,
+                bundle_key INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                PRIMARY KEY (app_id, title_key, bundle_key)
+            )
+        ''')
+        conn.execute("DELETE FROM temp.category_map")
+
+        # Dimension tables are small next to the fact tables; resolving keys
+        # from dicts is cheaper than joining them into the DISTINCT
+        apps = dict(conn.execute("SELECT id, name FROM apps"))
+        titles = dict(conn.execute("SELECT id, title FROM window_titles"))
+        bundles = dict(conn.execute("SELECT id, identifier FROM bundles"))
+
+        changed = 0
+        for table in CATEGORISED_TABLES:
+            combos = conn.execute(f'''
+                SELECT DISTINCT app_id, title_id, bundle_key FROM {table}
+                {"WHERE category_id IS NULL" if only_missing else ""}
+            ''').fetchall()
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.category_map VALUES (?, ?, ?, ?)",
+                [(app_id, title_id or 0, bundle_key or 0, interner.category(conn, categoriser.categorise(
+                    apps.get(app_id), titles.get(title_id), bundles.get(bundle_key))))
+                 for app_id, title_id, bundle_key in combos],
+            )
+            changed += conn.execute(f'''
+                UPDATE {table} SET category_id = m.category_id
+                FROM temp.category_map m
+                WHERE m.app_id = {table}.app_id
+                  AND m.title_key = COALESCE({table}.title_id, 0)
+                  AND m.bundle_key = COALESCE({table}.bundle_key, 0)
+                  AND {table}.category_id IS NOT m.category_id
+            ''').rowcount
+
+        conn.execute(
+            "INSERT INTO settings (key, value) VALUES ('category_rules', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (categoriser.fingerprint,),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Keys interned inside the rolled-back transaction no longer exist
+        interner.clear()
+        raise
+    return changed
+
+
+def sync_categories(conn, categoriser, interner):
+    """
+    Bring stored categories up to date at startup: everything if the rules
+    changed since they were last applied, otherwise just uncategorised rows
+    (e.g. written before the category column existed).
+    """
+    row = conn.execute("SELECT value FROM settings WHERE key = 'category_rules'").fetchone()
+    current = row is not None and row[0] == categoriser.fingerprint
+    return recategorise(conn, categoriser, interner, only_missing=current)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Response compression middleware shared by the agent API and the backend.
+
+Negotiates Content-Encoding from the request's Accept-Encoding header
+(brotli when the optional `brotli` package is installed, otherwise gzip),
+skips small or already-encoded responses, and compresses streaming bodies
+chunk by chunk so large responses never have to be buffered whole.
+
+Configuration (environment variables, all optional):
+    ATTENTIONOS_COMPRESSION=0          disable compression entirely
+    ATTENTIONOS_COMPRESS_MIN_BYTES     smallest body worth compressing (1024)
+    ATTENTIONOS_GZIP_LEVEL             zlib level 1-9 (6)
+    ATTENTIONOS_BROTLI_QUALITY         brotli quality 0-11 (4)
+"""
+
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is always available
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("ATTENTIONOS_COMPRESSION", "1") != "0"
+MIN_BYTES = int(os.getenv("ATTENTIONOS_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("ATTENTIONOS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("ATTENTIONOS_BROTLI_QUALITY", "4"))
+
+# Only text-like payloads compress well enough to be worth the CPU, plus
+# the backend's binary heatmap, whose empty hours are long runs of one value
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"application/x-ndjson",
+    b"application/javascript",
+    b"application/vnd.attentionos.heatmap",
+    b"text/",
+)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the best supported encoding from an Accept-Encoding value.
+    Returns "br", "gzip" or None.
+    """
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    """Incremental compressor with a uniform interface for gzip and brotli."""
+
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31 produces a gzip header and trailer
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data, final):
+        if self._brotli is not None:
+            out = self._brotli.process(data) if data else b""
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware; add with app.add_middleware(CompressionMiddleware).
+
+    Single-chunk responses are compressed only if they are at least
+    minimum_size bytes. Streaming responses (more_body=True) are always
+    compressed, with a sync flush per chunk so clients receive data as it
+    is produced.
+    """
+
+    def __init__(self, app, minimum_size=MIN_BYTES, gzip_level=GZIP_LEVEL,
+                 brotli_quality=BROTLI_QUALITY, enabled=COMPRESSION_ENABLED):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept = b""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value
+                break
+        encoding = negotiate_encoding(accept.decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """Wraps the ASGI send callable for a single response."""
+
+    def __init__(self, send, encoding, config):
+        self._send = send
+        self._encoding = encoding
+        self._config = config
+        self._start = None
+        self._compressor = None
+        self._passthrough = False
+
+    @staticmethod
+    def _should_compress(status, headers):
+        if status < 200 or status in (204, 304):
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows the size
+            self._start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._start is not None:
+            start, self._start = self._start, None
+            headers = list(start.get("headers", []))
+            compress = self._should_compress(start["status"], headers) and (
+                more_body or len(body) >= self._config.minimum_size
+            )
+            if not compress:
+                self._passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+
+            headers = [(k, v) for k, v in headers if k != b"content-length"]
+            headers.append((b"content-encoding", self._encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            self._compressor = _Compressor(
+                self._encoding, self._config.gzip_level, self._config.brotli_quality
+            )
+            payload = self._compressor.compress(body, final=not more_body)
+            if not more_body:
+                headers.append((b"content-length", str(len(payload)).encode()))
+            await self._send({**start, "headers": headers})
+            await self._send({"type": "http.response.body", "body": payload, "more_body": more_body})
+            return
+
+        if self._passthrough:
+            await self._send(message)
+            return
+
+        payload = self._compressor.compress(body, final=not more_body)
+        await self._send({"type": "http.response.body", "body": payload, "more_body": more_body})
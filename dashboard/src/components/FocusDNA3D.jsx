@@ -376,7 +376,18 @@ function HelixStrandCurve({ points, color }) {
 // MAIN DNA HELIX
 // ============================================
 
-function HolographicDNA({ averageFocusScore = 75 }) {
+// Focus scores of the most recent hours with sessions, oldest first
+function recentHourlyFocus(heatmap, count) {
+    if (!heatmap) return []
+    const scores = []
+    for (let i = heatmap.focusScore.length - 1; i >= 0 && scores.length < count; i--) {
+        // 255 marks hours without sessions
+        if (heatmap.focusScore[i] !== 255) scores.push(heatmap.focusScore[i])
+    }
+    return scores.reverse()
+}
+
+function HolographicDNA({ averageFocusScore = 75, hourlyFocus = [] }) {
     const helixRef = useRef()
     const [hovered, setHovered] = useState(false)
 
@@ -399,8 +410,10 @@ function HolographicDNA({ averageFocusScore = 75 }) {
             const x2 = Math.cos(angle + Math.PI) * radius
             const z2 = Math.sin(angle + Math.PI) * radius
 
-            // Color based on simulated focus score
-            const focusScore = 50 + Math.random() * 50
+            // Color based on the hour's focus score, simulated when there is no heatmap
+            const focusScore = hourlyFocus.length
+                ? hourlyFocus[Math.floor(t * hourlyFocus.length)]
+                : 50 + Math.random() * 50
             let color
             if (focusScore >= 80) {
                 color = '#a78bfa' // Purple - high
@@ -419,7 +432,7 @@ function HolographicDNA({ averageFocusScore = 75 }) {
             })
         }
         return groups
-    }, [])
+    }, [hourlyFocus])
 
     // Extract strand points for curves
     const strand1Points = useMemo(() => helixData.map(d => d.strand1), [helixData])
@@ -523,17 +536,14 @@ function CameraSway() {
 // MAIN EXPORT COMPONENT
 // ============================================
 
-export default function FocusDNA3D({ sessions }) {
-    const averageFocusScore = useMemo(() => {
-        if (!sessions || sessions.length === 0) return 75
-        const avg = sessions.reduce((sum, s) => sum + (s.focus_score || 0), 0) / sessions.length
-        return Math.round(avg)
-    }, [sessions])
+export default function FocusDNA3D({ averageFocus, sessionCount, flowShare, heatmap }) {
+    const averageFocusScore = sessionCount > 0 ? Math.round(averageFocus || 0) : 75
+    const hourlyFocus = useMemo(() => recentHourlyFocus(heatmap, 80), [heatmap])
 
     // Dynamic bloom based on focus score
     const bloomIntensity = 3 + (averageFocusScore / 100) * 2
 
-    if (!sessions || sessions.length === 0) {
+    if (!sessionCount) {
         return (
             <div style={{
                 height: '700px',
@@ -584,7 +594,7 @@ export default function FocusDNA3D({ sessions }) {
                 <fog attach="fog" args={['#050510', 12, 40]} />
 
                 {/* MAIN DNA HELIX */}
-                <HolographicDNA averageFocusScore={averageFocusScore} />
+                <HolographicDNA averageFocusScore={averageFocusScore} hourlyFocus={hourlyFocus} />
 
                 {/* PARTICLE FIELD */}
                 <ParticleField count={500} />
@@ -690,6 +700,16 @@ export default function FocusDNA3D({ sessions }) {
                 }}>
                     Focus Index
                 </div>
+                {flowShare != null && (
+                    <div style={{
+                        fontSize: '0.7rem',
+                        color: 'rgba(167, 139, 250, 0.8)',
+                        letterSpacing: '0.1em',
+                        marginTop: '1rem'
+                    }}>
+                        {Math.round(flowShare * 100)}% IN FLOW
+                    </div>
+                )}
             </div>
 
             {/* LEGEND */}
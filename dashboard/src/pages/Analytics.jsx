@@ -1,8 +1,8 @@
 import { useEffect, useState } from 'react'
 import { motion } from 'framer-motion'
 import { LineChart, Line, AreaChart, Area, BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer } from 'recharts'
-import { fetchSessions } from '../utils/api'
-import { calculateStats, formatTime } from '../utils/helpers'
+import { fetchAnalyticsSummary, fetchFocusHeatmap, fetchFocusPatterns } from '../utils/api'
+import { formatTime } from '../utils/helpers'
 import FocusDNA from '../components/FocusDNA'
 import FocusDNA3D from '../components/FocusDNA3D'
 import EmptyState from '../components/EmptyState'
@@ -52,19 +52,29 @@ function StoryInsight({ emoji, headline, detail, color = 'var(--color-accent)',
 }
 
 function Analytics() {
-    const [sessions, setSessions] = useState([])
+    const [summary, setSummary] = useState(null)
+    const [patterns, setPatterns] = useState(null)
+    const [heatmap, setHeatmap] = useState(null)
     const [loading, setLoading] = useState(true)
 
     useEffect(() => {
-        fetchSessions()
+        fetchAnalyticsSummary()
             .then(data => {
-                setSessions(data)
+                setSummary(data)
                 setLoading(false)
             })
             .catch(err => {
                 console.error(err)
                 setLoading(false)
             })
+
+        // Flow and switching patterns are optional extras for the insights
+        fetchFocusPatterns('week')
+            .then(setPatterns)
+            .catch(err => console.error(err))
+        fetchFocusHeatmap({ window: 'week' })
+            .then(setHeatmap)
+            .catch(err => console.error(err))
     }, [])
 
     if (loading) {
@@ -80,7 +90,7 @@ function Analytics() {
         )
     }
 
-    if (sessions.length === 0) {
+    if (!summary || summary.total_sessions === 0) {
         return (
             <EmptyState
                 icon="📈"
@@ -90,22 +100,21 @@ function Analytics() {
         )
     }
 
-    const stats = calculateStats(sessions)
-    const recentSessions = sessions.slice(0, 10).reverse()
-
-    // Trend analysis
-    const isImproving = recentSessions.length >= 3 &&
-        recentSessions[recentSessions.length - 1].focus_score > recentSessions[0].focus_score
-
-    // Average session length
-    const avgDuration = sessions.reduce((sum, s) => sum + s.total_active_seconds + s.total_idle_seconds, 0) / sessions.length
-
-    // Find patterns
-    const avgSwitches = sessions.reduce((sum, s) => sum + s.app_switches, 0) / sessions.length
+    // Aggregates are computed server-side; recent_sessions is oldest-first
+    const stats = {
+        avgFocusScore: summary.avg_focus_score,
+        avgActiveTime: summary.avg_active_seconds,
+        totalSessions: summary.total_sessions,
+        bestSession: summary.best_session,
+        worstSession: summary.worst_session
+    }
+    const recentSessions = summary.recent_sessions
+    const isImproving = summary.is_improving
+    const avgSwitches = summary.avg_app_switches
 
     // Chart data
     const focusTrendData = recentSessions.map((session, index) => ({
-        name: `#${sessions.length - recentSessions.length + index + 1}`,
+        name: `#${stats.totalSessions - recentSessions.length + index + 1}`,
         focus: Math.round(session.focus_score),
         active: Math.round(session.total_active_seconds / 60),
         idle: Math.round(session.total_idle_seconds / 60),
@@ -192,11 +201,36 @@ function Analytics() {
                     detail={avgSwitches > 20 ? "Try batching similar tasks to reduce context switching" : "Good context discipline!"}
                     delay={0.6}
                 />
+
+                {patterns && patterns.flow.count > 0 && (
+                    <StoryInsight
+                        emoji="🌊"
+                        headline={`${formatTime(patterns.flow.total_seconds)} in flow this week`}
+                        detail={`${patterns.flow.count} deep-work stretches, longest ${formatTime(patterns.flow.longest_seconds)}`}
+                        color="#a78bfa"
+                        delay={0.65}
+                    />
+                )}
+
+                {patterns && patterns.bursts.count > 0 && (
+                    <StoryInsight
+                        emoji="⚡"
+                        headline={`${patterns.bursts.count} switching bursts this week`}
+                        detail={`${Math.round(patterns.bursts.share_of_switches * 100)}% of your app switches happened in rapid clusters`}
+                        color="#f59e0b"
+                        delay={0.7}
+                    />
+                )}
             </div>
 
             {/* 3D Focus DNA Helix */}
             <div style={{ marginBottom: '2rem' }}>
-                <FocusDNA3D sessions={sessions} />
+                <FocusDNA3D
+                    averageFocus={stats.avgFocusScore}
+                    sessionCount={stats.totalSessions}
+                    flowShare={patterns?.flow.share_of_active}
+                    heatmap={heatmap}
+                />
             </div>
 
             {/* Focus Trend Chart */}
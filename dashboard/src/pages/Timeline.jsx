@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
-import { fetchTimeline } from '../utils/api'
-import { formatDateTime, formatTime, getAppIcon } from '../utils/helpers'
+import { fetchTimeline, searchActivity } from '../utils/api'
+import { formatDateTime, formatTime, getAppIcon, getCategoryColor } from '../utils/helpers'
 import EmptyState from '../components/EmptyState'
 
 function Timeline() {
@@ -10,6 +10,7 @@ function Timeline() {
     const [loading, setLoading] = useState(true)
     const [searchTerm, setSearchTerm] = useState('')
     const [filterApp, setFilterApp] = useState('all')
+    const [searchSummary, setSearchSummary] = useState(null)
 
     useEffect(() => {
         fetchTimeline()
@@ -40,6 +41,20 @@ function Timeline() {
         setFilteredActivities(filtered)
     }, [searchTerm, filterApp, activities])
 
+    // Time spent on matching window titles across all history, from the server's search index
+    useEffect(() => {
+        if (!searchTerm.trim()) {
+            setSearchSummary(null)
+            return
+        }
+        const timer = setTimeout(() => {
+            searchActivity(searchTerm, { limit: 1 })
+                .then(setSearchSummary)
+                .catch(() => setSearchSummary(null))
+        }, 250)
+        return () => clearTimeout(timer)
+    }, [searchTerm])
+
     if (loading) {
         return (
             <motion.div
@@ -97,7 +112,7 @@ function Timeline() {
                 >
                     <input
                         type="text"
-                        placeholder="Search applications..."
+                        placeholder="Search apps and window titles..."
                         className="search-input"
                         value={searchTerm}
                         onChange={(e) => setSearchTerm(e.target.value)}
@@ -114,6 +129,14 @@ function Timeline() {
                     </select>
                 </motion.div>
 
+                {searchSummary && searchSummary.total_results > 0 && (
+                    <div className="page-subtitle" style={{ marginBottom: '1rem' }}>
+                        ⏱️ {formatTime(searchSummary.total_seconds)} across {searchSummary.total_activities} activities
+                        matching “{searchSummary.query}”
+                        {searchSummary.results[0]?.window_title && ` · top: ${searchSummary.results[0].window_title}`}
+                    </div>
+                )}
+
                 {filteredActivities.length === 0 ? (
                     <div className="empty-state">
                         <div className="empty-state-icon">🔍</div>
@@ -138,7 +161,20 @@ function Timeline() {
                                     {getAppIcon(activity.app_name)}
                                 </div>
                                 <div className="timeline-info">
-                                    <div className="timeline-app">{activity.app_name}</div>
+                                    <div className="timeline-app">
+                                        {activity.app_name}
+                                        {activity.category && (
+                                            <span style={{
+                                                marginLeft: '0.5rem',
+                                                fontSize: '0.7rem',
+                                                color: getCategoryColor(activity.category),
+                                                textTransform: 'uppercase',
+                                                letterSpacing: '0.05em'
+                                            }}>
+                                                {activity.category}
+                                            </span>
+                                        )}
+                                    </div>
                                     <div className="timeline-time">
                                         {formatDateTime(activity.start_time)} → {formatDateTime(activity.end_time)}
                                     </div>
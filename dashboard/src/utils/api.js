@@ -17,3 +17,51 @@ export async function fetchAppSwitches() {
     if (!response.ok) throw new Error('Failed to fetch app switches')
     return response.json()
 }
+
+export async function fetchAnalyticsSummary(window = 'all') {
+    const response = await fetch(`${API_BASE_URL}/api/analytics/summary?window=${window}`)
+    if (!response.ok) throw new Error('Failed to fetch analytics summary')
+    return response.json()
+}
+
+export async function fetchFocusPatterns(window = 'week') {
+    const response = await fetch(`${API_BASE_URL}/api/analytics/patterns?window=${window}`)
+    if (!response.ok) throw new Error('Failed to fetch focus patterns')
+    return response.json()
+}
+
+export async function searchActivity(query, { window = 'all', limit = 20, offset = 0 } = {}) {
+    const params = new URLSearchParams({ q: query, window, limit, offset })
+    const response = await fetch(`${API_BASE_URL}/api/search?${params}`)
+    if (!response.ok) throw new Error('Failed to search activity')
+    return response.json()
+}
+
+const HEATMAP_MEDIA_TYPE = 'application/vnd.attentionos.heatmap'
+
+// Day x hour focus heatmap, decoded from the backend's typed-array layout
+// (see backend/heatmap.py). Matrices are flat, day-major, days * hours long.
+export async function fetchFocusHeatmap({ window = 'all', since, until } = {}) {
+    const params = new URLSearchParams(since === undefined ? { window } : { since })
+    if (until !== undefined) params.set('until', until)
+    const response = await fetch(`${API_BASE_URL}/api/analytics/heatmap?${params}`, {
+        headers: { Accept: HEATMAP_MEDIA_TYPE },
+    })
+    if (!response.ok) throw new Error('Failed to fetch focus heatmap')
+    const buffer = await response.arrayBuffer()
+    const view = new DataView(buffer)
+    const hours = view.getUint16(6, true)
+    const days = view.getUint32(12, true)
+    const cells = days * hours
+    // Switches per active hour are sent in hundredths; 65535 marks hours without sessions
+    const density = new Uint16Array(buffer, 16 + 4 * cells, cells)
+    return {
+        firstDay: new Date(view.getInt32(8, true) * 86400000).toISOString().slice(0, 10),
+        days,
+        hours,
+        activeSeconds: new Uint32Array(buffer, 16, cells),
+        switchDensity: Float32Array.from(density, value => (value === 65535 ? NaN : value / 100)),
+        // 255 marks hours without sessions
+        focusScore: new Uint8Array(buffer, 16 + 6 * cells, cells),
+    }
+}
@@ -16,31 +16,54 @@ export function formatTime(seconds) {
 
 export function formatDateTime(dateTimeStr) {
     if (!dateTimeStr) return '-'
-    const [date, time] = dateTimeStr.split(' ')
+    const [date, time] = dateTimeStr.split(/[ T]/)
     return time ? time.substring(0, 5) : dateTimeStr
 }
 
 export function formatDate(dateTimeStr) {
     if (!dateTimeStr) return '-'
-    const [date] = dateTimeStr.split(' ')
+    const [date] = dateTimeStr.split(/[ T]/)
     return date
 }
 
+// First matching pattern wins; compiled once and looked up per distinct app name
+const APP_ICONS = [
+    [/^IDLE$/, '💤'],
+    [/Chrome/, '🌐'],
+    [/Brave/, '🦁'],
+    [/Safari/, '🧭'],
+    [/Code|VS/, '💻'],
+    [/Terminal/, '⌨️'],
+    [/Slack/, '💬'],
+    [/Zoom/, '📹'],
+    [/Music|Spotify/, '🎵'],
+    [/WhatsApp/, '📱'],
+    [/Notes/, '📝'],
+    [/Antigravity/, '🤖'],
+]
+const APP_ICON_PATTERN = new RegExp(APP_ICONS.map(([pattern]) => `(${pattern.source})`).join('|'))
+const appIconCache = new Map()
+
 export function getAppIcon(appName) {
     if (!appName) return '📦'
-    if (appName === 'IDLE') return '💤'
-    if (appName.includes('Chrome')) return '🌐'
-    if (appName.includes('Brave')) return '🦁'
-    if (appName.includes('Safari')) return '🧭'
-    if (appName.includes('Code') || appName.includes('VS')) return '💻'
-    if (appName.includes('Terminal')) return '⌨️'
-    if (appName.includes('Slack')) return '💬'
-    if (appName.includes('Zoom')) return '📹'
-    if (appName.includes('Music') || appName.includes('Spotify')) return '🎵'
-    if (appName.includes('WhatsApp')) return '📱'
-    if (appName.includes('Notes')) return '📝'
-    if (appName.includes('Antigravity')) return '🤖'
-    return '📦'
+    let icon = appIconCache.get(appName)
+    if (icon === undefined) {
+        const match = APP_ICON_PATTERN.exec(appName)
+        icon = match ? APP_ICONS[match.slice(1).findIndex(group => group !== undefined)][1] : '📦'
+        appIconCache.set(appName, icon)
+    }
+    return icon
+}
+
+const CATEGORY_COLORS = {
+    productive: '#10b981',
+    neutral: '#94a3b8',
+    distracting: '#f43f5e',
+    idle: '#64748b',
+}
+
+export function getCategoryColor(category) {
+    return CATEGORY_COLORS[category] || '#a78bfa'
 }
 
 export function getFocusColor(score) {
@@ -48,28 +71,3 @@ export function getFocusColor(score) {
     if (score >= 60) return 'var(--warning)'
     return 'var(--danger)'
 }
-
-export function calculateStats(sessions) {
-    if (!sessions || sessions.length === 0) {
-        return {
-            avgFocusScore: 0,
-            avgActiveTime: 0,
-            totalSessions: 0,
-            bestSession: null,
-            worstSession: null
-        }
-    }
-
-    const totalFocusScore = sessions.reduce((sum, s) => sum + s.focus_score, 0)
-    const totalActiveTime = sessions.reduce((sum, s) => sum + s.total_active_seconds, 0)
-
-    const sorted = [...sessions].sort((a, b) => b.focus_score - a.focus_score)
-
-    return {
-        avgFocusScore: totalFocusScore / sessions.length,
-        avgActiveTime: totalActiveTime / sessions.length,
-        totalSessions: sessions.length,
-        bestSession: sorted[0],
-        worstSession: sorted[sorted.length - 1]
-    }
-}
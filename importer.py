@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Bulk import of activity history from other trackers.
+
+import_history() streams CSV, JSON or NDJSON records into activity_logs,
+app_switches, timeline and sessions. Each record is one row, using the
+field names of the upload batches in backend/ingest.py:
+
+    activity  app_name, start_time, end_time, duration_seconds, window_title, bundle_id
+    switch    from_app, to_app, timestamp
+    timeline  timestamp, app_name, is_idle, window_title, bundle_id
+    session   start_time, end_time, total_active_seconds, total_idle_seconds,
+              app_switches, focus_score
+
+A "type" field (a column in CSV) says which kind a record is, activity
+when absent. Times are epoch seconds or ISO 8601 (local time unless
+an offset is given), and activity needs an end time or a duration. JSON
+input is an array of records, read one element at a time, or a single
+upload batch object. Other trackers' column names can be mapped onto
+these with `columns`.
+
+When the input has no switches or no sessions, they are derived from the
+activity rows the way the tracker would have written them: a switch
+whenever the app changes, and a new session after a gap of more than
+SESSION_GAP_SECONDS. The idle time of a derived session is its IDLE rows
+plus the shorter gaps.
+
+An import is one transaction. Rows are written with executemany in
+batches of BATCH_ROWS. The fact tables' indexes and triggers are dropped
+for the load and recreated before commit, which builds each index in one
+sorted pass instead of one B-tree insert per row. The change counters,
+coach context and focus heatmap are then updated once for the whole
+import. Other connections keep seeing the old data, indexes included,
+until the commit. Writers wait for the write lock meanwhile, so stop the tracker
+before a long import into its database.
+
+Imported rows belong to a device named "import:<source>", so the
+uploader never ships them. A file imported twice under the same source
+is skipped by the SHA-256 of its contents.
+
+Usage: python importer.py history.csv [more.ndjson ...] [--db data/attentionos.db] [--source toggl]
+                          [--map app_name=Application ...] [--no-derive] [--keep-indexes]
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from categories import RulesFile, default_categoriser
+from storage import (DIMENSIONS, FACT_TABLES, INTERVAL_TABLES, SEARCHABLE_DIMENSIONS, Interner,
+                     add_to_focus_heatmap, ensure_schema, interval_end)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FORMATS = ("csv", "json", "ndjson")
+EXTENSIONS = {".csv": "csv", ".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# Rows per executemany call
+BATCH_ROWS = 50_000
+
+# A gap between activity rows longer than this starts a new derived session
+SESSION_GAP_SECONDS = 30 * 60
+
+# Page cache while importing (negative = KiB), so index builds sort in memory
+IMPORT_CACHE_KIB = 256 * 1024
+
+READ_CHUNK = 1 << 20
+
+# Values of a record's "type"; upload batch key -> type
+KINDS = ("activity", "switch", "timeline", "session")
+BATCH_KEYS = {"activity": "activity", "switches": "switch", "timeline": "timeline", "sessions": "session"}
+
+INSERTS = {
+    "activity": ("activity_logs", '''
+        INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds,
+                                   title_id, bundle_key, device_key, category_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''),
+    "switch": ("app_switches", '''
+        INSERT INTO app_switches (from_app_id, to_app_id, timestamp, device_key) VALUES (?, ?, ?, ?)
+    '''),
+    "timeline": ("timeline", '''
+        INSERT INTO timeline (timestamp, app_id, is_idle, title_id, bundle_key, device_key, category_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''),
+    "session": ("sessions", '''
+        INSERT INTO sessions (start_time, end_time, total_active_seconds, total_idle_seconds,
+                              app_switches, focus_score, device_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''),
+}
+
+
+class HistoryImportError(ValueError):
+    """Raised for input that cannot be imported; nothing is written."""
+
+
+def detect_format(name):
+    """Format for a file name by its extension (a trailing .gz is ignored), or None."""
+    stem = name[:-3] if name.endswith(".gz") else name
+    return EXTENSIONS.get(os.path.splitext(stem)[1].lower())
+
+
+def parse_time(value):
+    """Epoch seconds from epoch seconds (number or text) or ISO 8601 text."""
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        pass
+    try:
+        return int(float(value))
+    except ValueError:
+        raise HistoryImportError(f"not a time: {value!r}") from None
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return int(value.strip().lower() in ("1", "true", "yes", "y", "t"))
+    return int(bool(value))
+
+
+class _Hashing(io.RawIOBase):
+    """Binary reader that hashes everything read through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        self.sha256.update(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _rename(records, columns):
+    """Apply a field -> source column mapping to dict records."""
+    renames = [(source, field) for field, source in columns.items() if source != field]
+    for record in records:
+        for source, field in renames:
+            if source in record:
+                record[field] = record.pop(source)
+        yield record
+
+
+def _csv_records(text, columns):
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    by_source = {source: field for field, source in (columns or {}).items()}
+    header = [by_source.get(name.strip(), name.strip()) for name in header]
+    for row in reader:
+        if row:
+            yield dict(zip(header, row))
+
+
+def _ndjson_records(text):
+    loads = json.loads
+    for line in text:
+        if line.strip():
+            yield loads(line)
+
+
+def _json_records(text):
+    """Elements of a top-level array one at a time, or the events of a batch object."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = text.read(READ_CHUNK)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def skip():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip()
+    if buffer[pos:pos + 1] == "{":
+        # An upload batch: bounded in size, so read whole
+        batch = json.loads(buffer[pos:] + text.read())
+        for key, kind in BATCH_KEYS.items():
+            for record in batch.get(key) or ():
+                yield {**record, "type": kind}
+        return
+    if buffer[pos:pos + 1] != "[":
+        raise HistoryImportError("JSON input must be an array of records or an upload batch object")
+    pos += 1
+    while True:
+        skip()
+        if pos >= len(buffer):
+            raise HistoryImportError("JSON array is not closed")
+        if buffer[pos] == "]":
+            return
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise
+            fill()  # the element runs past the buffered text
+            continue
+        yield record
+
+
+def read_records(stream, fmt, columns=None):
+    """Records (dicts) from a binary stream in the given format."""
+    if fmt not in FORMATS:
+        raise HistoryImportError(f"format must be one of {', '.join(FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+    if fmt == "csv":
+        return _csv_records(text, columns)
+    records = _ndjson_records(text) if fmt == "ndjson" else _json_records(text)
+    return _rename(records, columns) if columns else records
+
+
+def _session_row(start, end, active, idle, switches, device_key):
+    focus = active / (active + idle) * 100 if active + idle else 0.0
+    return (start, end, active, idle, switches, focus, device_key)
+
+
+def derive_from_activity(rows, idle_app_id, device_key, on_switches=None, batch_rows=BATCH_ROWS):
+    """
+    Switches and sessions from (app_id, start, end, duration) activity rows
+    in start-time order, as the tracker would have logged them. Switch rows
+    are handed to on_switches in batches (None skips them); returns the
+    session rows.
+    """
+    switches, sessions = [], []
+    session_start = last_end = app = None
+    active = idle = count = 0
+    for app_id, start, end, duration in rows:
+        if last_end is None or start - last_end > SESSION_GAP_SECONDS:
+            if last_end is not None:
+                sessions.append(_session_row(session_start, last_end, active, idle, count, device_key))
+            session_start, last_end, app = start, end, None
+            active = idle = count = 0
+        elif start > last_end:
+            idle += start - last_end
+        if app_id != app:
+            if on_switches is not None:
+                switches.append((app, app_id, start, device_key))
+                if len(switches) >= batch_rows:
+                    on_switches(switches)
+                    switches = []
+            count += 1
+            app = app_id
+        if app_id == idle_app_id:
+            idle += duration
+        else:
+            active += duration
+        if end > last_end:
+            last_end = end
+    if last_end is not None:
+        sessions.append(_session_row(session_start, last_end, active, idle, count, device_key))
+    if switches and on_switches is not None:
+        on_switches(switches)
+    return sessions
+
+
+def _max_ids(conn, tables):
+    return {table: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            for table in tables}
+
+
+def _schema(conn, kind, tables):
+    """(name, sql) of the indexes or triggers defined on tables."""
+    placeholders = ", ".join("?" for _ in tables)
+    return conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = ? AND sql IS NOT NULL "
+        f"AND tbl_name IN ({placeholders}) ORDER BY name",
+        (kind, *tables),
+    ).fetchall()
+
+
+def _apply_coach_deltas(conn, first):
+    """What the coach context triggers would have added for rows past `first` ids."""
+    conn.execute('''
+        INSERT INTO coach_app_totals (app_id, seconds)
+        SELECT app_id, SUM(duration_seconds) FROM activity_logs
+        WHERE id > ? AND duration_seconds != 0
+        GROUP BY app_id
+        ON CONFLICT (app_id) DO UPDATE SET seconds = seconds + excluded.seconds
+    ''', (first["activity_logs"],))
+    conn.execute('''
+        INSERT INTO coach_transitions (from_app_id, to_app_id, switches)
+        SELECT from_app_id, to_app_id, COUNT(*) FROM app_switches
+        WHERE id > ? AND from_app_id IS NOT NULL
+        GROUP BY from_app_id, to_app_id
+        ON CONFLICT (from_app_id, to_app_id) DO UPDATE SET switches = switches + excluded.switches
+    ''', (first["app_switches"],))
+    conn.execute('''
+        INSERT INTO coach_app_totals (app_id, switches_out)
+        SELECT from_app_id, COUNT(*) FROM app_switches
+        WHERE id > ? AND from_app_id IS NOT NULL
+        GROUP BY from_app_id
+        ON CONFLICT (app_id) DO UPDATE SET switches_out = switches_out + excluded.switches_out
+    ''', (first["app_switches"],))
+
+
+def import_history(conn, stream, fmt, interner=None, categoriser=None, source="import", user_uid=None,
+                   columns=None, derive=True, defer_indexes=True, digest=None, batch_rows=BATCH_ROWS):
+    """
+    Import the records in a binary stream in one transaction; returns
+    counts and throughput. `columns` maps field names to the input's own
+    (e.g. {"app_name": "Application"}). `digest` is the input's SHA-256
+    if already known, which lets a duplicate be skipped before reading;
+    otherwise it is computed while reading and checked before commit.
+    Raises HistoryImportError for malformed input, with nothing written.
+    """
+    started = time.perf_counter()
+    interner = interner or Interner()
+    categoriser = categoriser or default_categoriser()
+    hashing = _Hashing(stream)
+    records = read_records(io.BufferedReader(hashing, READ_CHUNK), fmt, columns)
+    device_uid = f"import:{source}"
+
+    conn.commit()
+    cache_kib = conn.execute("PRAGMA cache_size").fetchone()[0]
+    conn.execute(f"PRAGMA cache_size = -{IMPORT_CACHE_KIB}")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO devices (device_uid, user_uid) VALUES (?, ?) "
+            "ON CONFLICT(device_uid) DO UPDATE SET user_uid = COALESCE(excluded.user_uid, user_uid)",
+            (device_uid, user_uid),
+        )
+        device_key = conn.execute("SELECT id FROM devices WHERE device_uid = ?", (device_uid,)).fetchone()[0]
+
+        def seen(sha256):
+            return conn.execute(
+                "SELECT 1 FROM ingest_batches WHERE device_key = ? AND batch_id = ?",
+                (device_key, f"sha256:{sha256}"),
+            ).fetchone() is not None
+
+        if digest is not None and seen(digest):
+            conn.rollback()
+            return {"status": "duplicate", "source": source, "digest": digest}
+
+        first = _max_ids(conn, FACT_TABLES + SEARCHABLE_DIMENSIONS)
+        indexes = _schema(conn, "index", FACT_TABLES) if defer_indexes else []
+        # Includes the search index triggers: new titles are indexed in one
+        # statement at the end, several times faster than one at a time
+        triggers = _schema(conn, "trigger", FACT_TABLES + SEARCHABLE_DIMENSIONS)
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+
+        counts = {kind: 0 for kind in KINDS}
+        pending = {kind: [] for kind in KINDS}
+        keys = {}
+        in_order, last_start = True, float("-inf")
+        number = 0
+
+        def dimensions(app, title, bundle):
+            key = (app, title, bundle)
+            found = keys.get(key)
+            if found is None:
+                found = keys[key] = (
+                    interner.app(conn, app), interner.title(conn, title), interner.bundle(conn, bundle),
+                    interner.category(conn, categoriser.categorise(app, title, bundle)),
+                )
+            return found
+
+        def flush(kind):
+            rows = pending[kind]
+            conn.executemany(INSERTS[kind][1], rows)
+            counts[kind] += len(rows)
+            rows.clear()
+
+        for number, record in enumerate(records, 1):
+            try:
+                get = record.get
+                kind = get("type") or "activity"
+                if kind == "activity":
+                    start = parse_time(record["start_time"])
+                    end, duration = get("end_time"), get("duration_seconds")
+                    if end not in (None, ""):
+                        end = parse_time(end)
+                        duration = end - start if duration in (None, "") else int(duration)
+                    else:
+                        duration = int(duration)
+                        end = start + duration
+                    app_id, title_id, bundle_key, category_id = dimensions(
+                        record["app_name"], get("window_title") or None, get("bundle_id") or None)
+                    if start < last_start:
+                        in_order = False
+                    last_start = start
+                    row = (app_id, start, end, duration, title_id, bundle_key, device_key, category_id)
+                elif kind == "switch":
+                    row = (interner.app(conn, get("from_app") or None), interner.app(conn, record["to_app"]),
+                           parse_time(record["timestamp"]), device_key)
+                elif kind == "timeline":
+                    app_id, title_id, bundle_key, category_id = dimensions(
+                        record["app_name"], get("window_title") or None, get("bundle_id") or None)
+                    row = (parse_time(record["timestamp"]), app_id,
+                           _flag(get("is_idle", 0)), title_id, bundle_key, device_key, category_id)
+                elif kind == "session":
+                    active, idle = int(record["total_active_seconds"]), int(record["total_idle_seconds"])
+                    focus = get("focus_score")
+                    if focus in (None, ""):
+                        focus = active / (active + idle) * 100 if active + idle else 0.0
+                    row = (parse_time(record["start_time"]), parse_time(record["end_time"]), active, idle,
+                           int(get("app_switches") or 0), float(focus), device_key)
+                else:
+                    raise HistoryImportError(f"unknown type {kind!r}; expected one of {', '.join(KINDS)}")
+            except HistoryImportError as e:
+                raise HistoryImportError(f"record {number}: {e}") from None
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                detail = f"missing {e}" if isinstance(e, KeyError) else str(e)
+                raise HistoryImportError(f"record {number}: {detail}") from None
+            rows = pending[kind]
+            rows.append(row)
+            if len(rows) >= batch_rows:
+                flush(kind)
+        for kind in KINDS:
+            flush(kind)
+
+        sha256 = hashing.sha256.hexdigest()
+        if seen(sha256):
+            conn.rollback()
+            return {"status": "duplicate", "source": source, "digest": sha256}
+
+        derived = {"app_switches": 0, "sessions": 0}
+        if derive and counts["activity"] and not (counts["switch"] and counts["session"]):
+            def insert_switches(rows):
+                conn.executemany(INSERTS["switch"][1], rows)
+                derived["app_switches"] += len(rows)
+
+            order = "id" if in_order else "start_time, id"
+            sessions = derive_from_activity(
+                conn.execute(f"SELECT app_id, start_time, end_time, duration_seconds FROM activity_logs "
+                             f"WHERE id > ? ORDER BY {order}", (first["activity_logs"],)),
+                interner.app(conn, "IDLE"), device_key,
+                None if counts["switch"] else insert_switches, batch_rows,
+            )
+            if not counts["session"]:
+                conn.executemany(INSERTS["session"][1], sessions)
+                derived["sessions"] += len(sessions)
+
+        index_started = time.perf_counter()
+        for _, sql in indexes:
+            conn.execute(sql)
+        index_seconds = time.perf_counter() - index_started
+        for _, sql in triggers:
+            conn.execute(sql)
+        for table in SEARCHABLE_DIMENSIONS:
+            if any(name == f"trg_{table}_fts_insert" for name, _ in triggers):
+                column = DIMENSIONS[table]
+                conn.execute(f"INSERT INTO {table}_fts (rowid, {column}) SELECT id, {column} FROM {table} WHERE id > ?",
+                             (first[table],))
+        # Likewise the interval index, whose triggers went with the fact tables'
+        for table in INTERVAL_TABLES:
+            if any(name == f"trg_{table}_intervals_insert" for name, _ in triggers):
+                conn.execute(f"INSERT INTO {table}_intervals (id, start_time, end_time) "
+                             f"SELECT id, start_time, {interval_end(table)} FROM {table} "
+                             f"WHERE id > ? AND start_time IS NOT NULL", (first[table],))
+
+        _apply_coach_deltas(conn, first)
+        add_to_focus_heatmap(conn, first["sessions"])
+        written = {INSERTS[kind][0]: count for kind, count in counts.items()}
+        touched = [table for table in FACT_TABLES if written[table] or derived.get(table)]
+        if touched:
+            placeholders = ", ".join("?" for _ in touched)
+            conn.execute(
+                f"UPDATE change_counters SET version = version + 1, "
+                f"modified_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE table_name IN ({placeholders})",
+                touched,
+            )
+        conn.execute(
+            "INSERT INTO ingest_batches (device_key, batch_id, received_at, events) VALUES (?, ?, ?, ?)",
+            (device_key, f"sha256:{sha256}", int(time.time()), number),
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        # Keys interned inside the rolled-back transaction no longer exist
+        interner.clear()
+        if isinstance(e, (UnicodeDecodeError, ValueError, csv.Error)) and not isinstance(e, HistoryImportError):
+            raise HistoryImportError(f"could not read {fmt} input: {e}") from e
+        raise
+    finally:
+        conn.execute(f"PRAGMA cache_size = {cache_kib}")
+
+    seconds = time.perf_counter() - started
+    return {
+        "status": "success",
+        "source": source,
+        "digest": sha256,
+        "records": number,
+        "written": written,
+        "derived": derived,
+        "indexes_deferred": bool(indexes),
+        "index_seconds": round(index_seconds, 3),
+        "seconds": round(seconds, 3),
+        "records_per_second": round(number / seconds) if seconds else 0,
+    }
+
+
+def _file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as handle:
+        opened = gzip.open(handle) if path.endswith(".gz") else handle
+        while chunk := opened.read(READ_CHUNK):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+", help="input files (.csv, .json, .ndjson/.jsonl, optionally .gz; - for stdin)")
+    parser.add_argument("--db", default=os.getenv("ATTENTIONOS_DB_PATH", os.path.join(BASE_DIR, "data", "attentionos.db")))
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--source", default="import", help="name of the tracker the history comes from")
+    parser.add_argument("--user", help="user the imported device belongs to")
+    parser.add_argument("--map", action="append", default=[], metavar="FIELD=COLUMN",
+                        help="read FIELD from the input's COLUMN, e.g. app_name=Application")
+    parser.add_argument("--no-derive", action="store_true", help="do not derive missing switches and sessions")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="maintain indexes row by row (faster for small imports into large databases)")
+    args = parser.parse_args()
+
+    columns = {}
+    for item in args.map:
+        field, sep, column = item.partition("=")
+        if not sep:
+            sys.exit(f"--map expects FIELD=COLUMN, got {item!r}")
+        columns[field] = column
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    conn = sqlite3.connect(args.db)
+    ensure_schema(conn)
+    categoriser = RulesFile(os.getenv("ATTENTIONOS_CATEGORY_RULES",
+                                      os.path.join(BASE_DIR, "data", "categories.json"))).get()
+    interner = Interner()
+    try:
+        for path in args.files:
+            fmt = args.format or detect_format(path)
+            if fmt is None:
+                sys.exit(f"Cannot tell the format of {path}; pass --format")
+            stdin = path == "-"
+            handle = sys.stdin.buffer if stdin else open(path, "rb")
+            try:
+                stream = gzip.open(handle) if path.endswith(".gz") else handle
+                result = import_history(conn, stream, fmt, interner, categoriser, source=args.source,
+                                        user_uid=args.user, columns=columns or None, derive=not args.no_derive,
+                                        defer_indexes=not args.keep_indexes,
+                                        digest=None if stdin else _file_digest(path))
+            except HistoryImportError as e:
+                sys.exit(f"{path}: {e}")
+            finally:
+                if not stdin:
+                    handle.close()
+            if result["status"] == "duplicate":
+                print(f"{path}: already imported from {args.source}, skipped")
+                continue
+            written = ", ".join(f"{count:,} {table}" for table, count in result["written"].items() if count)
+            derived = ", ".join(f"{count:,} {table}" for table, count in result["derived"].items() if count)
+            print(f"{path}: {result['records']:,} records in {result['seconds']:.2f}s "
+                  f"({result['records_per_second']:,}/s): {written or 'nothing'}"
+                  + (f"; derived {derived}" if derived else ""))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,15 +12,28 @@ import time
 import sqlite3
 import os
 from datetime import datetime
-from threading import Lock, Thread
-from AppKit import NSWorkspace
-from Quartz import CGWindowListCopyWindowInfo, kCGWindowListOptionOnScreenOnly, kCGNullWindowID
-from pynput import mouse, keyboard
+from threading import Event, Lock, Thread
+from storage import Interner, ensure_schema, to_epoch
+from categories import RulesFile, sync_categories
+from retention import RetentionError, RetentionWorker, describe, ensure_incremental_vacuum, load_policies, run_retention
+
+# PyObjC (AppKit, Quartz), pynput, uvicorn and the uploader are imported
+# inside the functions that use them: they dominate the agent's import
+# time, and loading them there lets the API server start in parallel.
 
 
 # Database path configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "data", "attentionos.db")
+DB_PATH = os.getenv("ATTENTIONOS_DB_PATH", os.path.join(BASE_DIR, "data", "attentionos.db"))
+
+# Productivity category rules, shared with the backend (see categories.py)
+CATEGORY_RULES_PATH = os.getenv("ATTENTIONOS_CATEGORY_RULES", os.path.join(BASE_DIR, "data", "categories.json"))
+category_rules = RulesFile(CATEGORY_RULES_PATH)
+
+# Retention: policies file shared with the backend (see retention.py) and
+# how often expired rows are rolled up and deleted (0 turns it off)
+RETENTION_POLICY_PATH = os.getenv("ATTENTIONOS_RETENTION_POLICY", os.path.join(BASE_DIR, "data", "retention.json"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("ATTENTIONOS_RETENTION_INTERVAL", "3600"))
 
 # Global variables for idle detection
 last_activity_time = datetime.now()
@@ -31,6 +44,19 @@ IDLE_THRESHOLD_SECONDS = 60
 last_timeline_log = datetime.now()
 TIMELINE_INTERVAL_SECONDS = 30
 
+# App names, window titles and bundle IDs are stored as integer keys
+interner = Interner()
+
+# Upload mode: ship buffered events to a central backend (off when URL is unset)
+UPLOAD_URL = os.getenv("ATTENTIONOS_UPLOAD_URL", "")
+UPLOAD_INTERVAL_SECONDS = int(os.getenv("ATTENTIONOS_UPLOAD_INTERVAL", "60"))
+
+# How long to wait for the API server to report that it is listening
+API_STARTUP_TIMEOUT_SECONDS = 10
+
+# Seconds between iterations of the tracking loop
+TICK_SECONDS = 5
+
 
 def on_activity():
     """Callback when keyboard or mouse activity is detected."""
@@ -41,6 +67,8 @@ def on_activity():
 
 def start_input_listeners():
     """Start background listeners for keyboard and mouse activity."""
+    from pynput import mouse, keyboard
+    
     # Mouse listener
     mouse_listener = mouse.Listener(
         on_move=lambda x, y: on_activity(),
@@ -66,71 +94,17 @@ def is_idle():
 
 
 def init_database():
-    """Initialize SQLite database and create tables if needed."""
+    """Initialize SQLite database and create or upgrade tables."""
     # Create data directory if it doesn't exist
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # PHASE 1: Activity logs (extended with window metadata)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            app_name TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT,
-            duration_seconds INTEGER,
-            window_title TEXT,
-            bundle_id TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS app_switches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            from_app TEXT,
-            to_app TEXT NOT NULL,
-            timestamp TEXT NOT NULL
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            start_time TEXT,
-            end_time TEXT,
-            total_active_seconds INTEGER,
-            total_idle_seconds INTEGER,
-            app_switches INTEGER,
-            focus_score REAL
-        )
-    ''')
-    
-    # PHASE 2: Timeline logging (every 30 seconds)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS timeline (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            app_name TEXT NOT NULL,
-            is_idle INTEGER NOT NULL,
-            window_title TEXT,
-            bundle_id TEXT
-        )
-    ''')
-    
-    # Add columns to existing tables if they don't exist (for upgrades)
-    try:
-        cursor.execute('ALTER TABLE activity_logs ADD COLUMN window_title TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cursor.execute('ALTER TABLE activity_logs ADD COLUMN bundle_id TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    conn.commit()
+    ensure_schema(conn)
+    # Categorise rows from before the category column or a rules change
+    sync_categories(conn, category_rules.get(), interner)
+    # One-off rewrite of older files, before tracking starts writing
+    if ensure_incremental_vacuum(conn):
+        print("Enabled incremental vacuum")
     conn.close()
     print(f"Database initialized: {DB_PATH}\n")
 
@@ -141,9 +115,12 @@ def start_new_session(app_name, start_time, window_title='', bundle_id=''):
     cursor = conn.cursor()
     
     cursor.execute('''
-        INSERT INTO activity_logs (app_name, start_time, end_time, duration_seconds, window_title, bundle_id)
-        VALUES (?, ?, NULL, 0, ?, ?)
-    ''', (app_name, start_time, window_title, bundle_id))
+        INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds, title_id, bundle_key,
+                                   category_id)
+        VALUES (?, ?, NULL, 0, ?, ?, ?)
+    ''', (interner.app(conn, app_name), start_time,
+          interner.title(conn, window_title), interner.bundle(conn, bundle_id),
+          interner.category(conn, category_rules.get().categorise(app_name, window_title, bundle_id))))
     
     record_id = cursor.lastrowid
     conn.commit()
@@ -175,9 +152,11 @@ def log_timeline_entry(timestamp, app_name, is_idle, window_title='', bundle_id=
     cursor = conn.cursor()
     
     cursor.execute('''
-        INSERT INTO timeline (timestamp, app_name, is_idle, window_title, bundle_id)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (timestamp, app_name, is_idle, window_title, bundle_id))
+        INSERT INTO timeline (timestamp, app_id, is_idle, title_id, bundle_key, category_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (timestamp, interner.app(conn, app_name), is_idle,
+          interner.title(conn, window_title), interner.bundle(conn, bundle_id),
+          interner.category(conn, category_rules.get().categorise(app_name, window_title, bundle_id))))
     
     conn.commit()
     conn.close()
@@ -189,9 +168,9 @@ def log_app_switch(from_app, to_app, timestamp):
     cursor = conn.cursor()
     
     cursor.execute('''
-        INSERT INTO app_switches (from_app, to_app, timestamp)
+        INSERT INTO app_switches (from_app_id, to_app_id, timestamp)
         VALUES (?, ?, ?)
-    ''', (from_app, to_app, timestamp))
+    ''', (interner.app(conn, from_app), interner.app(conn, to_app), timestamp))
     
     conn.commit()
     conn.close()
@@ -199,6 +178,7 @@ def log_app_switch(from_app, to_app, timestamp):
 
 def get_active_app():
     """Get the name of the currently active application."""
+    from AppKit import NSWorkspace
     workspace = NSWorkspace.sharedWorkspace()
     active_app = workspace.activeApplication()
     return active_app['NSApplicationName']
@@ -207,6 +187,7 @@ def get_active_app():
 def get_bundle_id():
     """Get the bundle identifier of the currently active application."""
     try:
+        from AppKit import NSWorkspace
         workspace = NSWorkspace.sharedWorkspace()
         active_app = workspace.activeApplication()
         return active_app.get('NSApplicationBundleIdentifier', '')
@@ -221,6 +202,8 @@ def get_window_title():
     PHASE 3: Window metadata capture.
     """
     try:
+        from Quartz import CGWindowListCopyWindowInfo, kCGWindowListOptionOnScreenOnly, kCGNullWindowID
+        
         # Get list of all on-screen windows
         window_list = CGWindowListCopyWindowInfo(
             kCGWindowListOptionOnScreenOnly,
@@ -251,27 +234,52 @@ def get_app_metadata():
     return app_name, window_title, bundle_id
 
 
+class SystemClock:
+    """Real time for the tracking loop; soak.py runs main() on a virtual clock instead."""
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class MacProbe:
+    """What the tracking loop observes: input activity (pynput) and the frontmost app (PyObjC)."""
+
+    def start(self):
+        start_input_listeners()
+        print("Idle detection enabled (60s threshold)")
+
+    def is_idle(self):
+        return is_idle()
+
+    def app_metadata(self):
+        return get_app_metadata()
+
+
 def save_session_summary(session_start, session_end):
-    """Compute and save session summary statistics."""
+    """Compute and save session summary statistics (times in epoch seconds)."""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    idle_app_id = interner.app(conn, 'IDLE')
     
     # Get total active time (all apps except IDLE)
     cursor.execute('''
         SELECT COALESCE(SUM(duration_seconds), 0)
         FROM activity_logs
-        WHERE app_name != 'IDLE'
+        WHERE app_id != ?
         AND start_time >= ?
-    ''', (session_start,))
+    ''', (idle_app_id, session_start))
     total_active_seconds = cursor.fetchone()[0]
     
     # Get total idle time
     cursor.execute('''
         SELECT COALESCE(SUM(duration_seconds), 0)
         FROM activity_logs
-        WHERE app_name = 'IDLE'
+        WHERE app_id = ?
         AND start_time >= ?
-    ''', (session_start,))
+    ''', (idle_app_id, session_start))
     total_idle_seconds = cursor.fetchone()[0]
     
     # Get app switch count
@@ -308,32 +316,70 @@ def save_session_summary(session_start, session_end):
     }
 
 
-def start_api_server():
+def start_api_server(ready):
     """
     PHASE 4: Start FastAPI server in background thread.
-    Runs on port 8001.
+    Runs on port 8001 and sets ready once it is accepting connections.
     """
     import uvicorn
     from api import app
     
+    class Server(uvicorn.Server):
+        async def startup(self, *args, **kwargs):
+            await super().startup(*args, **kwargs)
+            if self.started:
+                ready.set()
+    
     print("[API] Starting FastAPI server on http://localhost:8001")
-    uvicorn.run(app, host="0.0.0.0", port=8001, log_level="error")
+    Server(uvicorn.Config(app, host="0.0.0.0", port=8001, log_level="error")).run()
 
 
-def main():
-    """Main loop that tracks app sessions and idle state."""
+def main(probe=None, clock=None):
+    """
+    Main loop that tracks app sessions and idle state, until Ctrl+C.
+    probe and clock default to MacProbe and SystemClock.
+    """
+    probe = probe or MacProbe()
+    clock = clock or SystemClock()
     init_database()
     
     # Start input listeners for idle detection
-    start_input_listeners()
-    print("Idle detection enabled (60s threshold)")
+    probe.start()
+    
+    uploader = None
+    if UPLOAD_URL:
+        from uploader import Uploader
+        uploader = Uploader(
+            DB_PATH,
+            UPLOAD_URL,
+            device_id=os.getenv("ATTENTIONOS_DEVICE_ID"),
+            user_id=os.getenv("ATTENTIONOS_USER_ID"),
+            token=os.getenv("ATTENTIONOS_INGEST_TOKEN"),
+            interval_seconds=UPLOAD_INTERVAL_SECONDS,
+        )
+        uploader.start()
+        print(f"Upload mode enabled: {UPLOAD_URL} every {UPLOAD_INTERVAL_SECONDS}s (device {uploader.device_id})")
+    
+    retention = None
+    if RETENTION_INTERVAL_SECONDS > 0:
+        try:
+            policies = load_policies(RETENTION_POLICY_PATH)
+        except RetentionError as e:
+            print(f"⚠️ Retention disabled: {e}")
+        else:
+            def expire(should_stop):
+                # In upload mode, rows not yet shipped are kept whatever their age
+                result = run_retention(DB_PATH, policies, should_stop, upload_mode=bool(UPLOAD_URL))
+                print(f"  [Retention] {describe(result)}")
+            retention = RetentionWorker(expire, RETENTION_INTERVAL_SECONDS)
+            retention.start()
+            print(f"Retention enabled: every {RETENTION_INTERVAL_SECONDS}s ({RETENTION_POLICY_PATH})")
     
     print("Starting active application tracker...")
     print("Press Ctrl+C to stop.\n")
     
     # Record session start time
-    program_start_time = datetime.now()
-    program_start_str = program_start_time.strftime("%Y-%m-%d %H:%M:%S")
+    program_start_time = clock.now()
     
     current_record_id = None
     last_app = None
@@ -341,26 +387,28 @@ def main():
     
     # PHASE 2: Timeline logging variables
     global last_timeline_log
+    last_timeline_log = program_start_time
     
     try:
         while True:
-            current_time = datetime.now()
+            current_time = clock.now()
             timestamp_str = current_time.strftime("%Y-%m-%d %H:%M:%S")
+            timestamp = to_epoch(current_time)
             
             # Determine current state (idle or active app)
-            if is_idle():
+            if probe.is_idle():
                 current_state = "IDLE"
                 window_title = ''
                 bundle_id = ''
             else:
                 # PHASE 3: Get app metadata including window title
-                current_state, window_title, bundle_id = get_app_metadata()
+                current_state, window_title, bundle_id = probe.app_metadata()
             
             # PHASE 2: Log to timeline every 30 seconds
             seconds_since_last_log = (current_time - last_timeline_log).total_seconds()
             if seconds_since_last_log >= TIMELINE_INTERVAL_SECONDS:
                 is_idle_int = 1 if current_state == "IDLE" else 0
-                log_timeline_entry(timestamp_str, current_state, is_idle_int, window_title, bundle_id)
+                log_timeline_entry(timestamp, current_state, is_idle_int, window_title, bundle_id)
                 last_timeline_log = current_time
                 print(f"  [Timeline] Logged: {current_state} (idle={is_idle_int})")
             
@@ -369,15 +417,15 @@ def main():
                 if current_record_id is not None:
                     # Close the previous session
                     duration = int((current_time - session_start_time).total_seconds())
-                    update_session(current_record_id, timestamp_str, duration)
+                    update_session(current_record_id, timestamp, duration)
                     print(f"[{timestamp_str}] Closed: {last_app} ({duration}s)")
                 
                 # Log the app switch
-                log_app_switch(last_app, current_state, timestamp_str)
+                log_app_switch(last_app, current_state, timestamp)
                 
                 # Start new session with window metadata
                 session_start_time = current_time
-                current_record_id = start_new_session(current_state, timestamp_str, window_title, bundle_id)
+                current_record_id = start_new_session(current_state, timestamp, window_title, bundle_id)
                 last_app = current_state
                 
                 if current_state == "IDLE":
@@ -387,30 +435,30 @@ def main():
             else:
                 # Same state - update duration
                 duration = int((current_time - session_start_time).total_seconds())
-                update_session(current_record_id, timestamp_str, duration)
+                update_session(current_record_id, timestamp, duration)
                 
                 if current_state == "IDLE":
                     print(f"[{timestamp_str}] Idle: {duration}s")
                 else:
                     print(f"[{timestamp_str}] Active: {current_state} ({duration}s)")
             
-            time.sleep(5)
+            clock.sleep(TICK_SECONDS)
     
     except KeyboardInterrupt:
         # Gracefully close the last session
         if current_record_id is not None:
-            current_time = datetime.now()
+            current_time = clock.now()
             timestamp_str = current_time.strftime("%Y-%m-%d %H:%M:%S")
+            timestamp = to_epoch(current_time)
             duration = int((current_time - session_start_time).total_seconds())
-            update_session(current_record_id, timestamp_str, duration)
+            update_session(current_record_id, timestamp, duration)
             print(f"\n[{timestamp_str}] Closed: {last_app} ({duration}s)")
         
         # Save session summary
-        program_end_time = datetime.now()
-        program_end_str = program_end_time.strftime("%Y-%m-%d %H:%M:%S")
+        program_end_time = clock.now()
         
         print("\nComputing session summary...")
-        stats = save_session_summary(program_start_str, program_end_str)
+        stats = save_session_summary(to_epoch(program_start_time), to_epoch(program_end_time))
         
         print(f"Session Summary:")
         print(f"  Active time: {stats['active']}s")
@@ -418,6 +466,13 @@ def main():
         print(f"  App switches: {stats['switches']}")
         print(f"  Focus score: {stats['focus_score']:.2f}%")
         
+        if retention is not None:
+            retention.stop()
+        
+        if uploader is not None:
+            print("\nUploading remaining events...")
+            uploader.stop()
+        
         print("\nStopping tracker. Goodbye!")
 
 
@@ -433,11 +488,16 @@ if __name__ == "__main__":
     print()
     
     # PHASE 4: Start API server in background thread
-    api_thread = Thread(target=start_api_server, daemon=True)
+    api_ready = Event()
+    api_thread = Thread(target=start_api_server, args=(api_ready,), daemon=True)
     api_thread.start()
     
-    # Small delay to let API server start
-    time.sleep(2)
+    # Wait until uvicorn is accepting connections instead of a fixed delay
+    deadline = time.monotonic() + API_STARTUP_TIMEOUT_SECONDS
+    while not api_ready.wait(0.05):
+        if not api_thread.is_alive() or time.monotonic() > deadline:
+            print("[API] Warning: API server did not start; tracking continues without it")
+            break
     
     # Start main tracking agent (blocks until Ctrl+C)
     main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+On-demand profiling for the agent and the backend, without restarting them.
+
+profile_cpu() samples the Python stacks of every thread in the process
+(the tracker loop, uvicorn's event loop, request handlers in the thread
+pool, background workers) from a separate thread at a fixed interval,
+for a given number of seconds, and aggregates them into folded stacks:
+
+    MainThread;main (main.py:310);get_app_metadata (main.py:190) 42
+
+one line per distinct stack with its sample count, the input format of
+flamegraph.pl, inferno and speedscope. In "cpu" mode only threads that
+used CPU since the previous sample are counted (measured with per-thread
+CPU clocks where the platform has them, otherwise by leaving out threads
+parked in a known stdlib wait); "wall" mode counts every thread, so time
+spent blocked on SQLite or the network shows too. Nothing is installed in
+the interpreter: sampling reads sys._current_frames(), so the profiled
+code runs at full speed and the cost is the sampler thread's own.
+
+AllocationTracker wraps tracemalloc: start tracing, take snapshots while
+the process runs, and diff two of them to see which lines keep
+allocating, e.g. growth in the tracker loop or in a request handler.
+
+Kept free of FastAPI imports; the agent API (api.py) and the backend
+expose both under /api/admin/profile.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_INTERVAL_SECONDS = 0.01
+MIN_INTERVAL_SECONDS = 0.001
+MAX_DURATION_SECONDS = 300
+MAX_STACK_DEPTH = 128
+
+# Stdlib functions a thread sits in while it waits for work; used to drop
+# idle threads in cpu mode when per-thread CPU clocks are not available
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+    ("base_events.py", "_run_once"),
+}
+
+TRACEMALLOC_FRAMES = 10
+KEPT_SNAPSHOTS = 5
+GROUP_BY = ("lineno", "filename", "traceback")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_cpu_lock = threading.Lock()
+
+
+class ProfilerError(ValueError):
+    """Raised for profiling requests that cannot be served as asked."""
+
+
+class ProfilerBusy(ProfilerError):
+    """Raised when a CPU profile is already running in this process."""
+
+
+def _where(filename):
+    """Path relative to the repository, or the last two components elsewhere."""
+    path = os.path.abspath(filename)
+    if path.startswith(ROOT + os.sep):
+        return os.path.relpath(path, ROOT)
+    return os.path.join(*path.split(os.sep)[-2:]) if os.sep in path else path
+
+
+def _label(code, cache):
+    label = cache.get(code)
+    if label is None:
+        # ';' separates frames and ' ' the count in the folded format
+        name = f"{code.co_name} ({_where(code.co_filename)}:{code.co_firstlineno})"
+        label = cache[code] = name.replace(";", ",")
+    return label
+
+
+def _stack(frame, cache):
+    """Frame labels of a thread's stack, outermost first."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_label(frame.f_code, cache))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _cpu_clock(thread_id):
+    """Reader for a thread's CPU time, or None where the platform has none."""
+    if not hasattr(time, "pthread_getcpuclockid"):
+        return None
+    try:
+        clock = time.pthread_getcpuclockid(thread_id)
+        time.clock_gettime(clock)
+    except (OSError, OverflowError):
+        return None
+    return lambda: time.clock_gettime(clock)
+
+
+def profile_cpu(seconds, interval=DEFAULT_INTERVAL_SECONDS, mode="cpu"):
+    """
+    Sample every thread's stack for `seconds`; returns the folded stack
+    counts and what it cost. Blocks the calling thread for the duration,
+    and only one profile runs per process at a time (ProfilerBusy).
+    """
+    if mode not in ("cpu", "wall"):
+        raise ProfilerError("mode must be 'cpu' or 'wall'")
+    if not 0 < seconds <= MAX_DURATION_SECONDS:
+        raise ProfilerError(f"seconds must be between 0 and {MAX_DURATION_SECONDS}")
+    interval = max(interval, MIN_INTERVAL_SECONDS)
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfilerBusy("a CPU profile is already running in this process")
+    try:
+        return _sample(seconds, interval, mode)
+    finally:
+        _cpu_lock.release()
+
+
+def _sample(seconds, interval, mode):
+    me = threading.get_ident()
+    stacks, labels, clocks, used = Counter(), {}, {}, {}
+    samples = sampling_seconds = 0.0
+    started = time.perf_counter()
+    deadline = started + seconds
+
+    while True:
+        begin = time.perf_counter()
+        if begin >= deadline:
+            break
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            if mode == "cpu":
+                if thread_id not in clocks:
+                    clocks[thread_id] = _cpu_clock(thread_id)
+                clock = clocks[thread_id]
+                if clock is not None:
+                    try:
+                        now = clock()
+                    except OSError:  # the thread has exited
+                        continue
+                    previous, used[thread_id] = used.get(thread_id), now
+                    if previous is None or now <= previous:
+                        continue
+                elif _is_idle(frame):
+                    continue
+            root = names.get(thread_id, f"thread-{thread_id}").replace(";", ",").replace(" ", "_")
+            stacks[";".join([root] + _stack(frame, labels))] += 1
+        samples += 1
+        spent = time.perf_counter() - begin
+        sampling_seconds += spent
+        time.sleep(max(0.0, min(interval - spent, deadline - time.perf_counter())))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "pid": os.getpid(),
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "interval_ms": round(interval * 1000, 3),
+        "samples": int(samples),
+        "stack_samples": sum(stacks.values()),
+        # Share of one core the sampler thread itself used
+        "overhead": round(sampling_seconds / elapsed, 4) if elapsed else 0.0,
+        "stacks": stacks,
+    }
+
+
+def folded(profile):
+    """The profile's stacks in folded format, heaviest first."""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+
+def summarise(profile, limit=20):
+    """JSON-friendly view: the heaviest functions by self and total samples, and the stacks."""
+    total = profile["stack_samples"] or 1
+    own, inclusive = Counter(), Counter()
+    for stack, count in profile["stacks"].items():
+        frames = stack.split(";")[1:]
+        if frames:
+            own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+
+    def top(counter):
+        return [{"frame": frame, "samples": count, "share": round(count / total, 4)}
+                for frame, count in counter.most_common(limit)]
+
+    summary = {key: value for key, value in profile.items() if key != "stacks"}
+    summary.update(top_self=top(own), top_total=top(inclusive), folded=folded(profile))
+    return summary
+
+
+class AllocationTracker:
+    """
+    tracemalloc snapshots and diffs for one process. Snapshots are kept in
+    memory under increasing ids, the newest KEPT_SNAPSHOTS of them.
+    """
+
+    def __init__(self, keep=KEPT_SNAPSHOTS):
+        self.keep = keep
+        self._snapshots = {}
+        self._next_id = 1
+        self._started_here = False
+        self._lock = threading.Lock()
+
+    def status(self):
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "pid": os.getpid(),
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": [{"id": id_, "taken_at": taken_at} for id_, (taken_at, _) in self._snapshots.items()],
+        }
+
+    def start(self, frames=TRACEMALLOC_FRAMES):
+        """Start tracing allocations (with up to `frames` frames each) if not already."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, int(frames)))
+                self._started_here = True
+            return self.status()
+
+    def stop(self):
+        """Stop tracing (if it was started here) and drop the kept snapshots."""
+        with self._lock:
+            self._snapshots.clear()
+            if self._started_here:
+                tracemalloc.stop()
+                self._started_here = False
+            return self.status()
+
+    def _take(self):
+        if not tracemalloc.is_tracing():
+            raise ProfilerError("allocation tracing is off; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        id_ = self._next_id
+        self._next_id += 1
+        self._snapshots[id_] = (datetime.now().isoformat(timespec="seconds"), snapshot)
+        while len(self._snapshots) > self.keep:
+            del self._snapshots[min(self._snapshots)]
+        return id_, snapshot
+
+    def _get(self, id_):
+        if id_ not in self._snapshots:
+            raise ProfilerError(f"no snapshot {id_}; kept: {sorted(self._snapshots)}")
+        return self._snapshots[id_][1]
+
+    @staticmethod
+    def _check(group_by):
+        if group_by not in GROUP_BY:
+            raise ProfilerError(f"group_by must be one of {', '.join(GROUP_BY)}")
+
+    @staticmethod
+    def _where(traceback, group_by):
+        frames = [f"{_where(frame.filename)}:{frame.lineno}" for frame in traceback]
+        # Tracebacks are innermost first; report the allocating line first too
+        return frames if group_by == "traceback" else frames[0]
+
+    def snapshot(self, limit=20, group_by="lineno"):
+        """Take a snapshot; returns its id and the largest allocation sites."""
+        self._check(group_by)
+        with self._lock:
+            id_, snapshot = self._take()
+        stats = snapshot.statistics(group_by)
+        return {
+            **self.status(),
+            "id": id_,
+            "total_bytes": sum(stat.size for stat in stats),
+            "top": [{"where": self._where(stat.traceback, group_by), "bytes": stat.size, "count": stat.count}
+                    for stat in stats[:limit]],
+        }
+
+    def diff(self, base, target=None, limit=20, group_by="lineno"):
+        """
+        Allocation changes from snapshot `base` to `target` (a new snapshot
+        when None), largest change first.
+        """
+        self._check(group_by)
+        with self._lock:
+            old = self._get(base)
+            if target is None:
+                target, new = self._take()
+            else:
+                new = self._get(target)
+        stats = new.compare_to(old, group_by)
+        return {
+            "pid": os.getpid(),
+            "base": base,
+            "target": target,
+            "growth_bytes": sum(stat.size_diff for stat in stats),
+            "top": [{"where": self._where(stat.traceback, group_by), "bytes_diff": stat.size_diff,
+                     "count_diff": stat.count_diff, "bytes": stat.size, "count": stat.count}
+                    for stat in stats[:limit]],
+        }
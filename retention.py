@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Data retention for AttentionOS.
+
+Raw rows older than a table's retention period are summed into an hourly
+rollup table (see storage.ROLLUP_TABLES) and deleted. Policies live in a
+JSON file (data/retention.json by default) shared by the agent and the
+backend; tables it leaves out keep their defaults:
+
+    {
+        "timeline":      {"keep_raw_days": 14, "rollup": true},
+        "app_switches":  {"keep_raw_days": 365, "rollup": true},
+        "activity_logs": {"keep_raw_days": null, "keep_rollup_days": null}
+    }
+
+keep_raw_days null keeps raw rows forever, rollup false deletes them
+without a summary, and keep_rollup_days (null = forever) bounds the
+rollups themselves. activity_logs is kept by default: search, categories
+and focus patterns read it.
+
+Work is done in small transactions sized to hold the write lock for about
+TARGET_BATCH_MS, with a pause between them, so the tracker's own writes
+never wait long. Freed pages are then returned to the OS with
+auto_vacuum=INCREMENTAL passes of a few hundred pages each.
+"""
+
+import json
+import sqlite3
+import time
+from contextlib import nullcontext
+from threading import Event, Thread
+
+DEFAULT_POLICIES = {
+    "timeline": {"keep_raw_days": 14, "rollup": True, "keep_rollup_days": None},
+    "app_switches": {"keep_raw_days": 365, "rollup": True, "keep_rollup_days": None},
+    "activity_logs": {"keep_raw_days": None, "rollup": True, "keep_rollup_days": None},
+}
+
+# Per fact table: time column, rollup table, and the statement folding the
+# rows listed in temp.retention_batch into it. Hours are epoch-aligned.
+ROLLUPS = {
+    "timeline": ("timestamp", "timeline_hourly", '''
+        INSERT INTO timeline_hourly (hour, app_id, is_idle, category_key, device_key, ticks)
+        SELECT timestamp - timestamp % 3600, app_id, is_idle,
+               COALESCE(category_id, 0), COALESCE(device_key, 0), COUNT(*)
+        FROM timeline
+        WHERE id IN (SELECT id FROM temp.retention_batch)
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (hour, app_id, is_idle, category_key, device_key)
+        DO UPDATE SET ticks = ticks + excluded.ticks
+    '''),
+    "app_switches": ("timestamp", "app_switches_hourly", '''
+        INSERT INTO app_switches_hourly (hour, from_app_key, to_app_id, device_key, switches)
+        SELECT timestamp - timestamp % 3600, COALESCE(from_app_id, 0), to_app_id,
+               COALESCE(device_key, 0), COUNT(*)
+        FROM app_switches
+        WHERE id IN (SELECT id FROM temp.retention_batch)
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (hour, from_app_key, to_app_id, device_key)
+        DO UPDATE SET switches = switches + excluded.switches
+    '''),
+    "activity_logs": ("start_time", "activity_hourly", '''
+        INSERT INTO activity_hourly (hour, app_id, category_key, device_key, activities, seconds)
+        SELECT start_time - start_time % 3600, app_id,
+               COALESCE(category_id, 0), COALESCE(device_key, 0),
+               COUNT(*), COALESCE(SUM(duration_seconds), 0)
+        FROM activity_logs
+        WHERE id IN (SELECT id FROM temp.retention_batch)
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (hour, app_id, category_key, device_key)
+        DO UPDATE SET activities = activities + excluded.activities,
+                      seconds = seconds + excluded.seconds
+    '''),
+}
+
+# Write-lock budget per transaction; batch sizes adapt to stay near it
+TARGET_BATCH_MS = 10
+MIN_BATCH_ROWS = 50
+MAX_BATCH_ROWS = 5000
+PAUSE_SECONDS = 0.02
+
+# Pages released per incremental_vacuum pass (4 KB each by default)
+VACUUM_PAGES = 256
+
+
+class RetentionError(ValueError):
+    """Raised for malformed retention policies."""
+
+
+def _days(policy, table, field):
+    value = policy.get(field)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+        raise RetentionError(f"{table}.{field} must be a positive number of days or null")
+    return value
+
+
+def validate_policies(config):
+    """Merge a policy dict over DEFAULT_POLICIES, rejecting anything malformed."""
+    if not isinstance(config, dict):
+        raise RetentionError("retention policies must be a JSON object")
+    policies = {table: dict(policy) for table, policy in DEFAULT_POLICIES.items()}
+    for table, policy in config.items():
+        if table not in ROLLUPS:
+            raise RetentionError(f"no retention for table {table!r}; choose from {sorted(ROLLUPS)}")
+        if not isinstance(policy, dict):
+            raise RetentionError(f"policy for {table} must be an object")
+        unknown = set(policy) - set(DEFAULT_POLICIES[table])
+        if unknown:
+            raise RetentionError(f"unknown fields for {table}: {sorted(unknown)}")
+        policies[table].update(policy)
+        _days(policies[table], table, "keep_raw_days")
+        _days(policies[table], table, "keep_rollup_days")
+        if not isinstance(policies[table]["rollup"], bool):
+            raise RetentionError(f"{table}.rollup must be true or false")
+    return policies
+
+
+def load_policies(path):
+    """Policies from the JSON file at path (the defaults if it is missing)."""
+    try:
+        with open(path) as handle:
+            config = json.load(handle)
+    except FileNotFoundError:
+        config = {}
+    except ValueError as e:
+        raise RetentionError(f"{path} is not valid JSON: {e}") from e
+    return validate_policies(config)
+
+
+def ensure_incremental_vacuum(conn):
+    """
+    Switch a database created before auto_vacuum=INCREMENTAL over to it.
+    This rewrites the file with a full VACUUM, so it runs once, at a
+    moment when a pause is acceptable; returns True if it did.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES, pause_seconds=PAUSE_SECONDS, should_stop=None, lock=None):
+    """Return free pages to the OS a few at a time; returns the number freed."""
+    freed = 0
+    conn.commit()
+    while not (should_stop and should_stop()):
+        with lock or nullcontext():
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                break
+            # execute() would step the pragma once, freeing a single page;
+            # executescript() runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        freed += min(free, pages)
+        time.sleep(pause_seconds)
+    # In WAL mode the file only shrinks once the log is checkpointed
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return freed
+
+
+def _unsent_guard(conn, table, upload_mode):
+    """
+    Upload mode: never delete rows the uploader has not shipped yet. A
+    table it has never shipped from has no upload_state row, so nothing
+    in it is deletable.
+    """
+    if not upload_mode:
+        return "", ()
+    row = conn.execute("SELECT last_id FROM upload_state WHERE table_name = ?", (table,)).fetchone()
+    return "AND id <= ?", (row[0] if row else 0,)
+
+
+def _expire_raw(conn, table, policy, cutoff, stats, should_stop, lock, upload_mode):
+    time_column, _, rollup_sql = ROLLUPS[table]
+    guard, guard_params = _unsent_guard(conn, table, upload_mode)
+    batch = MIN_BATCH_ROWS * 4
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_batch (id INTEGER PRIMARY KEY)")
+
+    while not (should_stop and should_stop()):
+        with lock or nullcontext():
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM temp.retention_batch")
+                picked = conn.execute(f'''
+                    INSERT INTO temp.retention_batch
+                    SELECT id FROM {table}
+                    WHERE {time_column} < ? {guard}
+                    ORDER BY {time_column}
+                    LIMIT ?
+                ''', (cutoff, *guard_params, batch)).rowcount
+                if picked:
+                    if policy["rollup"]:
+                        conn.execute(rollup_sql)
+                    conn.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM temp.retention_batch)")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if not picked:
+            break
+        stats["rows"] += picked
+        stats["batches"] += 1
+        stats["max_batch_ms"] = max(stats["max_batch_ms"], round(elapsed_ms, 2))
+        # Aim the next batch at the lock budget
+        if elapsed_ms > TARGET_BATCH_MS:
+            batch = max(MIN_BATCH_ROWS, batch // 2)
+        elif elapsed_ms < TARGET_BATCH_MS / 2:
+            batch = min(MAX_BATCH_ROWS, batch * 2)
+        time.sleep(PAUSE_SECONDS)
+
+
+def _expire_rollups(conn, table, cutoff, stats, should_stop, lock):
+    """Drop rollup rows before cutoff, one day of buckets per transaction."""
+    rollup_table = ROLLUPS[table][1]
+    while not (should_stop and should_stop()):
+        with lock or nullcontext():
+            oldest = conn.execute(f"SELECT MIN(hour) FROM {rollup_table}").fetchone()[0]
+            if oldest is None or oldest >= cutoff:
+                break
+            stats["rollup_rows"] += conn.execute(
+                f"DELETE FROM {rollup_table} WHERE hour < ?", (min(cutoff, oldest + 86400),)
+            ).rowcount
+            conn.commit()
+        time.sleep(PAUSE_SECONDS)
+
+
+def apply_retention(conn, policies, now=None, should_stop=None, lock=None, upload_mode=False):
+    """
+    Expire raw rows and rollups per policies, then vacuum what they freed.
+    lock (e.g. the backend's per-shard write lock) is held for each batch
+    only. upload_mode (an agent shipping rows to a backend) keeps every raw
+    row past the uploader's cursor. Returns per-table statistics.
+    """
+    now = int(time.time()) if now is None else now
+    conn.commit()
+    result = {"tables": {}, "pages_freed": 0}
+    for table, policy in policies.items():
+        stats = {"rows": 0, "batches": 0, "max_batch_ms": 0.0, "rollup_rows": 0}
+        if policy["keep_raw_days"] is not None:
+            cutoff = now - int(policy["keep_raw_days"] * 86400)
+            _expire_raw(conn, table, policy, cutoff, stats, should_stop, lock, upload_mode)
+        if policy["keep_rollup_days"] is not None:
+            cutoff = now - int(policy["keep_rollup_days"] * 86400)
+            _expire_rollups(conn, table, cutoff, stats, should_stop, lock)
+        result["tables"][table] = stats
+    result["pages_freed"] = incremental_vacuum(conn, should_stop=should_stop, lock=lock)
+    return result
+
+
+def run_retention(db_path, policies, should_stop=None, now=None, upload_mode=False):
+    """apply_retention on the database at db_path, converting it to incremental vacuum first."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if ensure_incremental_vacuum(conn):
+            print(f"[Retention] Enabled incremental vacuum on {db_path}")
+        return apply_retention(conn, policies, now=now, should_stop=should_stop, upload_mode=upload_mode)
+    finally:
+        conn.close()
+
+
+def describe(result):
+    """One-line summary of an apply_retention result."""
+    parts = []
+    for table, stats in result["tables"].items():
+        if stats["rows"]:
+            parts.append(f"{table}: {stats['rows']} rows in {stats['batches']} batches (max {stats['max_batch_ms']} ms)")
+        if stats["rollup_rows"]:
+            parts.append(f"{ROLLUPS[table][1]}: {stats['rollup_rows']} rows")
+    return "; ".join(parts or ["nothing to expire"]) + f"; {result['pages_freed']} pages freed"
+
+
+class RetentionWorker(Thread):
+    """
+    Background thread calling job(should_stop) once at start and then every
+    interval_seconds, e.g. with run_retention for the agent's database.
+    """
+
+    def __init__(self, job, interval_seconds, name="attentionos-retention"):
+        super().__init__(daemon=True, name=name)
+        self.job = job
+        self.interval_seconds = interval_seconds
+        self._stop_event = Event()
+
+    def run(self):
+        while True:
+            try:
+                self.job(self._stop_event.is_set)
+            except Exception as e:
+                print(f"⚠️ Retention run failed: {e}")
+            if self._stop_event.wait(self.interval_seconds):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
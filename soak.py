@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Accelerated soak test for the tracking agent.
+
+Runs main.main() unmodified against a throwaway database, with a
+simulated probe in place of PyObjC/pynput and a virtual clock in place of
+real time: every 5-second tick of the loop is executed, but the clock's
+sleep() only advances virtual time, so 30 days of tracking (518,400
+ticks) take minutes. The simulated user works weekdays from about 9 to 6
+with a lunch break, switches apps every few minutes, steps away now and
+then, opens new window titles every day, and leaves the machine idle at
+night and at weekends. Retention runs every virtual hour on virtual time,
+as the agent's background worker would.
+
+While it runs it samples, every --sample-minutes of virtual time: the
+process RSS, open file descriptors, database + WAL size, and the wall
+time of each tick (one loop iteration without its sleep). At the end each
+metric is checked against a budget for its level and for its trend after
+a warm-up, comparing the median of the first and last quarters of the
+run. It exits with status 1 if any budget is exceeded.
+
+The database goes to /dev/shm where there is one: every tick commits,
+and on a disk the fsyncs alone would stretch 30 days into hours. Use
+--dir to soak on a real disk.
+
+Usage: python soak.py [--days 30] [--budget tick_p99_ms=20 ...] [--dir /tmp] [--json soak.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Level budgets (max) and trend budgets (growth from the first to the last
+# quarter of the run after warm-up; db_mb_per_day is a least-squares slope)
+DEFAULT_BUDGETS = {
+    "rss_mb": 250.0,
+    "rss_growth_pct": 10.0,
+    "fds": 64,
+    "fds_growth": 2,
+    "tick_p99_ms": 50.0,
+    "tick_growth_pct": 50.0,
+    "db_mb": 200.0,
+    "db_mb_per_day": 1.0,
+}
+
+WARMUP_DAYS = 1
+RETENTION_EVERY = timedelta(hours=1)
+
+# Apps the simulated user works in, with relative weights and title stems
+WORK_APPS = [
+    ("VSCode", 30, ["main.py — attentionos", "storage.py — attentionos", "README.md — attentionos"]),
+    ("Google Chrome", 25, ["PROJ-{ticket} · Jira", "Pull request #{ticket} · GitHub", "Stack Overflow"]),
+    ("Terminal", 12, ["zsh — 120×40", "python — 120×40"]),
+    ("Slack", 12, ["#team — Slack", "#incidents — Slack", "Direct message — Slack"]),
+    ("Figma", 6, ["Dashboard v{ticket} — Figma"]),
+    ("Notion", 6, ["Sprint notes — Notion", "Design doc PROJ-{ticket} — Notion"]),
+    ("Mail", 5, ["Inbox (3) — Mail"]),
+    ("Spotify", 4, ["Spotify Premium"]),
+]
+BUNDLES = {app: f"com.example.{app.lower().replace(' ', '')}" for app, _, _ in WORK_APPS}
+
+
+class VirtualClock:
+    """
+    The tracking loop's clock: now() is virtual time, and sleep() advances
+    it instantly after handing the tick's wall time to on_tick. Raises
+    KeyboardInterrupt once `end` is reached, so main() shuts down exactly
+    as it does on Ctrl+C.
+    """
+
+    def __init__(self, start, end, on_tick):
+        self._now = start
+        self.end = end
+        self.on_tick = on_tick
+        self._tick_started = time.perf_counter()
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self.on_tick(self._now, time.perf_counter() - self._tick_started)
+        self._now += timedelta(seconds=seconds)
+        if self._now >= self.end:
+            raise KeyboardInterrupt
+        self._tick_started = time.perf_counter()
+
+
+class SimulatedProbe:
+    """A simulated user at the keyboard, driven by the virtual clock."""
+
+    def __init__(self, clock, seed=7):
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self._until = None
+        self._state = None
+
+    def start(self):
+        pass
+
+    def _working(self, now):
+        if now.weekday() >= 5:
+            return self.rng.random() < 0.02
+        hour = now.hour + now.minute / 60
+        return 9 <= hour < 12 or 13 <= hour < 18 or (19.5 <= hour < 21 and now.day % 3 == 0)
+
+    def _next(self, now):
+        rng = self.rng
+        if not self._working(now):
+            return ("IDLE", "", ""), timedelta(minutes=15)
+        if rng.random() < 0.06:
+            # Coffee, a meeting, a phone call
+            return ("IDLE", "", ""), timedelta(minutes=rng.uniform(2, 20))
+        app, _, titles = rng.choices(WORK_APPS, [weight for _, weight, _ in WORK_APPS])[0]
+        # A few new tickets a day keep adding window titles, as real work does
+        ticket = now.toordinal() * 10 + rng.randrange(4)
+        title = rng.choice(titles).format(ticket=ticket)
+        return (app, title, BUNDLES[app]), timedelta(seconds=rng.expovariate(1 / 180))
+
+    def _current(self):
+        now = self.clock.now()
+        if self._until is None or now >= self._until:
+            self._state, dwell = self._next(now)
+            self._until = now + dwell
+        return self._state
+
+    def is_idle(self):
+        return self._current()[0] == "IDLE"
+
+    def app_metadata(self):
+        return self._current()
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_fds():
+    for directory in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(directory):
+            return len(os.listdir(directory))
+    return 0
+
+
+def database_bytes(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+class Recorder:
+    """Collects one sample per interval of virtual time and runs retention on schedule."""
+
+    def __init__(self, db_path, start, sample_every, retention, progress):
+        self.db_path = db_path
+        self.start = start
+        self.sample_every = sample_every
+        self.retention = retention
+        self.progress = progress
+        self.samples = []
+        self.retention_ms = []
+        self._ticks = []
+        self._next_sample = start + sample_every
+        self._next_retention = start + RETENTION_EVERY
+        self._last_day = -1
+
+    def on_tick(self, now, seconds):
+        self._ticks.append(seconds)
+        if now >= self._next_retention:
+            begin = time.perf_counter()
+            self.retention(int(now.timestamp()))
+            self.retention_ms.append((time.perf_counter() - begin) * 1000)
+            self._next_retention += RETENTION_EVERY
+        if now >= self._next_sample:
+            self.sample(now)
+            self._next_sample += self.sample_every
+
+    def sample(self, now):
+        ticks = sorted(self._ticks) or [0.0]
+        self._ticks = []
+        day = (now - self.start).total_seconds() / 86400
+        self.samples.append({
+            "day": round(day, 4),
+            "rss_mb": rss_bytes() / 1e6,
+            "fds": open_fds(),
+            "db_mb": database_bytes(self.db_path) / 1e6,
+            "ticks": len(ticks),
+            "tick_p50_ms": ticks[len(ticks) // 2] * 1000,
+            "tick_p99_ms": ticks[min(len(ticks) - 1, int(len(ticks) * 0.99))] * 1000,
+            "tick_max_ms": ticks[-1] * 1000,
+        })
+        if int(day) != self._last_day:
+            self._last_day = int(day)
+            self.progress(self.samples[-1])
+
+
+def slope_per_day(points):
+    """Least-squares slope of (day, value) points."""
+    if len(points) < 2:
+        return 0.0
+    days = [day for day, _ in points]
+    mean_day, mean_value = statistics.fmean(days), statistics.fmean(value for _, value in points)
+    spread = sum((day - mean_day) ** 2 for day in days)
+    return sum((day - mean_day) * (value - mean_value) for day, value in points) / spread if spread else 0.0
+
+
+def growth(values):
+    """(median of the first quarter, median of the last quarter) of a series."""
+    quarter = max(1, len(values) // 4)
+    return statistics.median(values[:quarter]), statistics.median(values[-quarter:])
+
+
+def check_budgets(samples, budgets, warmup_days=WARMUP_DAYS):
+    """A list of (check, measured, budget, ok) rows for the run."""
+    steady = [s for s in samples if s["day"] >= warmup_days] or samples
+    checks = []
+
+    def check(name, measured, budget):
+        checks.append((name, measured, budget, budget is None or measured <= budget))
+
+    check("rss_mb", max(s["rss_mb"] for s in samples), budgets["rss_mb"])
+    first, last = growth([s["rss_mb"] for s in steady])
+    check("rss_growth_pct", 100 * (last - first) / first if first else 0.0, budgets["rss_growth_pct"])
+    check("fds", max(s["fds"] for s in samples), budgets["fds"])
+    first, last = growth([s["fds"] for s in steady])
+    check("fds_growth", last - first, budgets["fds_growth"])
+    check("tick_p99_ms", statistics.median(s["tick_p99_ms"] for s in steady), budgets["tick_p99_ms"])
+    first, last = growth([s["tick_p50_ms"] for s in steady])
+    check("tick_growth_pct", 100 * (last - first) / first if first else 0.0, budgets["tick_growth_pct"])
+    check("db_mb", max(s["db_mb"] for s in samples), budgets["db_mb"])
+    check("db_mb_per_day", slope_per_day([(s["day"], s["db_mb"]) for s in steady]), budgets["db_mb_per_day"])
+    return checks
+
+
+def parse_budgets(overrides):
+    budgets = dict(DEFAULT_BUDGETS)
+    for override in overrides or []:
+        name, _, value = override.partition("=")
+        if name not in budgets:
+            sys.exit(f"Unknown budget {name!r}; choose from {', '.join(budgets)}")
+        budgets[name] = None if value in ("", "none") else float(value)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--sample-minutes", type=float, default=60, help="virtual minutes between samples")
+    parser.add_argument("--budget", action="append", metavar="NAME=VALUE",
+                        help=f"override a budget ({', '.join(DEFAULT_BUDGETS)}); 'none' disables it")
+    parser.add_argument("--policy", help="retention policy JSON (default: the built-in policies)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the samples and checks to this file")
+    parser.add_argument("--dir", default="/dev/shm" if os.path.isdir("/dev/shm") else None,
+                        help="where to create the soak database (default: /dev/shm if present)")
+    parser.add_argument("--keep", action="store_true", help="keep the soak database and print its path")
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget)
+
+    workdir = tempfile.mkdtemp(prefix="attentionos-soak-", dir=args.dir)
+    db_path = os.path.join(workdir, "attentionos.db")
+    # Before importing the agent: it reads these at import time
+    os.environ["ATTENTIONOS_DB_PATH"] = db_path
+    os.environ["ATTENTIONOS_CATEGORY_RULES"] = os.path.join(workdir, "categories.json")
+    os.environ["ATTENTIONOS_RETENTION_INTERVAL"] = "0"
+    os.environ.pop("ATTENTIONOS_UPLOAD_URL", None)
+    sys.path.insert(0, BASE_DIR)
+    import main as agent
+    from retention import load_policies, run_retention
+
+    policies = load_policies(args.policy or os.path.join(workdir, "retention.json"))
+    out = sys.stdout
+
+    def progress(sample):
+        print(f"  day {sample['day']:>5.1f}  rss {sample['rss_mb']:>6.1f} MB  fds {sample['fds']:>3}  "
+              f"db {sample['db_mb']:>6.2f} MB  tick p50 {sample['tick_p50_ms']:>5.2f} ms  "
+              f"p99 {sample['tick_p99_ms']:>6.2f} ms", file=out, flush=True)
+
+    # Virtual time ends now, so retention cutoffs line up with the data
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=args.days)
+    recorder = Recorder(db_path, start, timedelta(minutes=args.sample_minutes),
+                        lambda now: run_retention(db_path, policies, now=now), progress)
+    clock = VirtualClock(start, end, recorder.on_tick)
+
+    print(f"Soaking the tracker for {args.days:g} virtual days "
+          f"({int(args.days * 86400 / agent.TICK_SECONDS):,} ticks) in {workdir}\n", flush=True)
+    began = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            agent.main(probe=SimulatedProbe(clock, args.seed), clock=clock)
+        elapsed = time.perf_counter() - began
+        recorder.sample(clock.now())
+
+        checks = check_budgets(recorder.samples, budgets)
+        retention = sorted(recorder.retention_ms) or [0.0]
+        print(f"\n{args.days:g} virtual days in {elapsed:.0f}s ({args.days * 86400 / elapsed:,.0f}x real time); "
+              f"retention runs: {len(recorder.retention_ms)}, max {retention[-1]:.0f} ms\n")
+        print(f"  {'check':<18}{'measured':>12}{'budget':>10}")
+        for name, measured, budget, ok in checks:
+            limit = "-" if budget is None else f"{budget:g}"
+            print(f"  {name:<18}{measured:>12.2f}{limit:>10}  {'ok' if ok else 'OVER BUDGET'}")
+        if args.json:
+            with open(args.json, "w") as handle:
+                json.dump({"days": args.days, "seconds": elapsed, "budgets": budgets, "samples": recorder.samples,
+                           "retention_ms": recorder.retention_ms,
+                           "checks": [dict(zip(("check", "measured", "budget", "ok"), c)) for c in checks]},
+                          handle, indent=2)
+        failed = [name for name, _, _, ok in checks if not ok]
+        print(f"\n{'FAILED: ' + ', '.join(failed) if failed else 'All budgets met'}")
+    finally:
+        if args.keep:
+            print(f"Soak database kept in {workdir}")
+        else:
+            shutil.rmtree(workdir)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
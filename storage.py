@@ -0,0 +1,930 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite schema for AttentionOS.
+
+The tracking agent (main.py, api.py) and the backend (backend/main.py)
+read and write the same data/attentionos.db file, so the table layout and
+its migrations live here in one place.
+
+App names, window titles, bundle identifiers and productivity categories
+are stored once in small dimension tables and referenced from the fact
+tables by integer key.
+Timestamps are stored as integer Unix epoch seconds; the APIs convert them
+back to local ISO 8601 strings on the way out (see iso_column).
+Every write to a fact table bumps a per-table counter in change_counters,
+which the read endpoints use as a cheap HTTP validator (see data_version);
+a second counter, rewrites, only counts updates to rows older than the
+latest RECENT_ROWS, for caches that re-read just the newest rows.
+App names and window titles are full-text indexed (see create_search_index).
+Activity and session time spans are indexed by R*Trees for point-in-time
+and overlap queries (see create_interval_index).
+Raw rows past their retention period are folded into hourly rollup tables
+and deleted (see retention.py).
+Per-app totals and app-to-app switch counts behind the AI coach are kept
+current by triggers (see create_coach_context_triggers), and so is the
+day x hour focus heatmap (see create_focus_heatmap_triggers).
+"""
+
+import sqlite3
+from datetime import datetime
+
+# Bumped whenever the layout changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 9
+
+FACT_TABLES = ("sessions", "activity_logs", "app_switches", "timeline")
+
+# Updates to rows with ids within this many of the newest (the agent's open
+# row, a device's latest upload) do not count as rewrites
+RECENT_ROWS = 128
+
+# Hourly summaries of fact rows removed by retention.py. Missing keys are
+# stored as 0 rather than NULL so each bucket has exactly one row.
+ROLLUP_TABLES = ("activity_hourly", "app_switches_hourly", "timeline_hourly")
+
+# All-history aggregates read by the AI coach, maintained by triggers. They
+# have one row per app or app pair, so reading them costs the same however
+# much history the fact tables hold.
+COACH_CONTEXT_TABLES = ("coach_app_totals", "coach_transitions")
+
+# Dimension tables with an FTS5 index named <table>_fts (see create_search_index)
+SEARCHABLE_DIMENSIONS = ("apps", "window_titles")
+
+# Fact tables with an R*Tree over their time spans named <table>_intervals
+# (see create_interval_index)
+INTERVAL_TABLES = ("activity_logs", "sessions")
+
+# Dimension table -> column holding the interned string
+DIMENSIONS = {
+    "apps": "name",
+    "window_titles": "title",
+    "bundles": "identifier",
+    "categories": "name",
+}
+
+
+def create_tables(cursor):
+    """Create all tables in the current layout if they don't exist."""
+    for table, column in DIMENSIONS.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                {column} TEXT NOT NULL UNIQUE
+            )
+        ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            start_time INTEGER NOT NULL,
+            end_time INTEGER,
+            duration_seconds INTEGER,
+            title_id INTEGER REFERENCES window_titles(id),
+            bundle_key INTEGER REFERENCES bundles(id),
+            device_key INTEGER REFERENCES devices(id),
+            source_id INTEGER,
+            category_id INTEGER REFERENCES categories(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_switches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_app_id INTEGER REFERENCES apps(id),
+            to_app_id INTEGER NOT NULL REFERENCES apps(id),
+            timestamp INTEGER NOT NULL,
+            device_key INTEGER REFERENCES devices(id),
+            source_id INTEGER
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_time INTEGER,
+            end_time INTEGER,
+            total_active_seconds INTEGER,
+            total_idle_seconds INTEGER,
+            app_switches INTEGER,
+            focus_score REAL,
+            device_key INTEGER REFERENCES devices(id),
+            source_id INTEGER
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timeline (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp INTEGER NOT NULL,
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            is_idle INTEGER NOT NULL,
+            title_id INTEGER REFERENCES window_titles(id),
+            bundle_key INTEGER REFERENCES bundles(id),
+            device_key INTEGER REFERENCES devices(id),
+            source_id INTEGER,
+            category_id INTEGER REFERENCES categories(id)
+        )
+    ''')
+
+    # Remote agents feeding a central backend (see backend/ingest.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            id INTEGER PRIMARY KEY,
+            device_uid TEXT NOT NULL UNIQUE,
+            user_uid TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_batches (
+            device_key INTEGER NOT NULL REFERENCES devices(id),
+            batch_id TEXT NOT NULL,
+            received_at INTEGER NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (device_key, batch_id)
+        )
+    ''')
+
+    # Agent side: highest local row id already shipped per table (see uploader.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_state (
+            table_name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_hourly (
+            hour INTEGER NOT NULL,
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            category_key INTEGER NOT NULL,
+            device_key INTEGER NOT NULL,
+            activities INTEGER NOT NULL,
+            seconds INTEGER NOT NULL,
+            PRIMARY KEY (hour, app_id, category_key, device_key)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_switches_hourly (
+            hour INTEGER NOT NULL,
+            from_app_key INTEGER NOT NULL,
+            to_app_id INTEGER NOT NULL REFERENCES apps(id),
+            device_key INTEGER NOT NULL,
+            switches INTEGER NOT NULL,
+            PRIMARY KEY (hour, from_app_key, to_app_id, device_key)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timeline_hourly (
+            hour INTEGER NOT NULL,
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            is_idle INTEGER NOT NULL,
+            category_key INTEGER NOT NULL,
+            device_key INTEGER NOT NULL,
+            ticks INTEGER NOT NULL,
+            PRIMARY KEY (hour, app_id, is_idle, category_key, device_key)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS coach_app_totals (
+            app_id INTEGER PRIMARY KEY REFERENCES apps(id),
+            seconds INTEGER NOT NULL DEFAULT 0,
+            switches_out INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS coach_transitions (
+            from_app_id INTEGER NOT NULL REFERENCES apps(id),
+            to_app_id INTEGER NOT NULL REFERENCES apps(id),
+            switches INTEGER NOT NULL,
+            PRIMARY KEY (from_app_id, to_app_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Session metrics per local day and hour, maintained by triggers. day
+    # counts local calendar days since 1970-01-01. Cells hold sums (focus as
+    # focus score x active seconds), so ranges and shards combine by adding
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS focus_heatmap (
+            day INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            active_seconds REAL NOT NULL DEFAULT 0,
+            idle_seconds REAL NOT NULL DEFAULT 0,
+            switches REAL NOT NULL DEFAULT 0,
+            focus_weighted REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, hour)
+        ) WITHOUT ROWID
+    ''')
+
+    # Small key/value store, e.g. the fingerprint of the category rules last applied
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_counters (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            modified_at INTEGER NOT NULL,
+            rewrites INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def create_indexes(cursor):
+    """Create the indexes backing time-range queries."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_start ON activity_logs(start_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_app_switches_timestamp ON app_switches(timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_timeline_timestamp ON timeline(timestamp)")
+
+    # Category totals read only these indexes (categories.py)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_category "
+        "ON activity_logs(category_id, start_time, duration_seconds)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_timeline_category ON timeline(category_id, timestamp)")
+
+    # Search hits (see create_search_index) are summed from these alone
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_title "
+        "ON activity_logs(title_id, start_time, app_id, duration_seconds, end_time)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_app "
+        "ON activity_logs(app_id, start_time, title_id, duration_seconds, end_time)"
+    )
+
+    # Idempotent ingestion: a device's event can only land once. Local rows
+    # have NULL device_key and never conflict (NULLs are distinct).
+    for table in FACT_TABLES:
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_source ON {table}(device_key, source_id)"
+        )
+
+
+def create_triggers(cursor):
+    """Keep change_counters in step with every insert, update and delete."""
+    for table in FACT_TABLES:
+        cursor.execute(
+            "INSERT OR IGNORE INTO change_counters (table_name, version, modified_at) "
+            "VALUES (?, 0, CAST(strftime('%s', 'now') AS INTEGER))", (table,)
+        )
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE change_counters
+                    SET version = version + 1,
+                        modified_at = CAST(strftime('%s', 'now') AS INTEGER)
+                    WHERE table_name = '{table}';
+                END
+            ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rewrite
+            AFTER UPDATE ON {table}
+            WHEN old.id < (SELECT MAX(id) FROM {table}) - {RECENT_ROWS}
+            BEGIN
+                UPDATE change_counters SET rewrites = rewrites + 1 WHERE table_name = '{table}';
+            END
+        ''')
+
+
+def create_coach_context_triggers(cursor):
+    """
+    Keep coach_app_totals and coach_transitions equal to aggregates over all
+    of activity_logs and app_switches. An activity row adds its duration when
+    inserted and moves it when the agent closes or extends it, so the totals
+    are current as soon as a row is written, whoever writes it.
+    """
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_activity_logs_coach_insert AFTER INSERT ON activity_logs
+        WHEN COALESCE(new.duration_seconds, 0) != 0
+        BEGIN
+            INSERT INTO coach_app_totals (app_id, seconds) VALUES (new.app_id, new.duration_seconds)
+            ON CONFLICT (app_id) DO UPDATE SET seconds = seconds + excluded.seconds;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_activity_logs_coach_update
+        AFTER UPDATE OF app_id, duration_seconds ON activity_logs
+        WHEN new.app_id != old.app_id
+          OR COALESCE(new.duration_seconds, 0) != COALESCE(old.duration_seconds, 0)
+        BEGIN
+            UPDATE coach_app_totals SET seconds = seconds - COALESCE(old.duration_seconds, 0)
+            WHERE app_id = old.app_id;
+            INSERT INTO coach_app_totals (app_id, seconds) VALUES (new.app_id, COALESCE(new.duration_seconds, 0))
+            ON CONFLICT (app_id) DO UPDATE SET seconds = seconds + excluded.seconds;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_activity_logs_coach_delete AFTER DELETE ON activity_logs
+        WHEN COALESCE(old.duration_seconds, 0) != 0
+        BEGIN
+            UPDATE coach_app_totals SET seconds = seconds - old.duration_seconds WHERE app_id = old.app_id;
+        END
+    ''')
+
+    # Switch rows are only ever inserted and deleted; the first switch of a
+    # session has no from_app_id and is not a transition
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_app_switches_coach_insert AFTER INSERT ON app_switches
+        WHEN new.from_app_id IS NOT NULL
+        BEGIN
+            INSERT INTO coach_transitions (from_app_id, to_app_id, switches)
+            VALUES (new.from_app_id, new.to_app_id, 1)
+            ON CONFLICT (from_app_id, to_app_id) DO UPDATE SET switches = switches + 1;
+            INSERT INTO coach_app_totals (app_id, switches_out) VALUES (new.from_app_id, 1)
+            ON CONFLICT (app_id) DO UPDATE SET switches_out = switches_out + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_app_switches_coach_delete AFTER DELETE ON app_switches
+        WHEN old.from_app_id IS NOT NULL
+        BEGIN
+            UPDATE coach_transitions SET switches = switches - 1
+            WHERE from_app_id = old.from_app_id AND to_app_id = old.to_app_id;
+            UPDATE coach_app_totals SET switches_out = switches_out - 1 WHERE app_id = old.from_app_id;
+        END
+    ''')
+
+
+def rebuild_coach_context(cursor):
+    """Recompute the coach context tables from scratch (one scan of each fact table)."""
+    cursor.execute("DELETE FROM coach_app_totals")
+    cursor.execute("DELETE FROM coach_transitions")
+    cursor.execute('''
+        INSERT INTO coach_transitions (from_app_id, to_app_id, switches)
+        SELECT from_app_id, to_app_id, COUNT(*) FROM app_switches
+        WHERE from_app_id IS NOT NULL
+        GROUP BY from_app_id, to_app_id
+    ''')
+    cursor.execute('''
+        INSERT INTO coach_app_totals (app_id, seconds, switches_out)
+        SELECT app_id, SUM(seconds), SUM(switches_out) FROM (
+            SELECT app_id, COALESCE(SUM(duration_seconds), 0) AS seconds, 0 AS switches_out
+            FROM activity_logs GROUP BY app_id
+            UNION ALL
+            SELECT from_app_id, 0, SUM(switches) FROM coach_transitions GROUP BY from_app_id
+        )
+        GROUP BY app_id
+    ''')
+
+
+def _session_spans(row, sign, where):
+    """SELECT of the heatmap inputs for sessions `row` (new, old or a table) matching where."""
+    source = "" if row in ("new", "old") else f" FROM {row}"
+    return f'''
+        SELECT {row}.start_time AS start_time, {interval_end(row)} AS end_time,
+               COALESCE({row}.total_active_seconds, 0) AS active, COALESCE({row}.total_idle_seconds, 0) AS idle,
+               COALESCE({row}.app_switches, 0) AS switches, COALESCE({row}.focus_score, 0) AS focus,
+               {sign} AS sign{source}
+        WHERE {row}.start_time IS NOT NULL AND {where}
+    '''
+
+
+def _add_to_focus_heatmap(spans):
+    """
+    Statement adding each session in spans to the focus_heatmap cells of
+    the local hours it overlaps, in proportion to the overlap (sign -1
+    takes it away again).
+    """
+    return f'''
+        INSERT INTO focus_heatmap (day, hour, sessions, active_seconds, idle_seconds, switches, focus_weighted)
+        WITH RECURSIVE cells (hour_start, start_time, end_time, active, idle, switches, focus, sign) AS (
+            SELECT start_time - strftime('%M', start_time, 'unixepoch', 'localtime') * 60
+                              - strftime('%S', start_time, 'unixepoch', 'localtime'),
+                   start_time, end_time, active, idle, switches, focus, sign
+            FROM ({spans})
+            UNION ALL
+            SELECT hour_start + 3600, start_time, end_time, active, idle, switches, focus, sign
+            FROM cells WHERE hour_start + 3600 < end_time
+        ),
+        shares AS (
+            SELECT hour_start, sign, active, idle, switches, focus,
+                   sign * (MIN(hour_start + 3600, end_time) - MAX(hour_start, start_time))
+                        / CAST(end_time - start_time AS REAL) AS share
+            FROM cells
+        )
+        SELECT CAST(julianday(hour_start, 'unixepoch', 'localtime', 'start of day') - 2440587.5 AS INTEGER),
+               CAST(strftime('%H', hour_start, 'unixepoch', 'localtime') AS INTEGER),
+               SUM(sign), SUM(share * active), SUM(share * idle), SUM(share * switches),
+               SUM(share * active * focus)
+        FROM shares
+        GROUP BY 1, 2
+        ON CONFLICT (day, hour) DO UPDATE SET
+            sessions = sessions + excluded.sessions,
+            active_seconds = active_seconds + excluded.active_seconds,
+            idle_seconds = idle_seconds + excluded.idle_seconds,
+            switches = switches + excluded.switches,
+            focus_weighted = focus_weighted + excluded.focus_weighted
+    '''
+
+
+def create_focus_heatmap_triggers(cursor):
+    """
+    Keep focus_heatmap equal to the sessions spread over the local hours
+    they cover: a session adds its share of active and idle time, switches
+    and focus to each hour it overlaps when it is saved, and moves it if
+    it is changed. Hours are bucketed in the writing process's time zone,
+    like iso_column renders them.
+    """
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_heatmap_insert AFTER INSERT ON sessions
+        BEGIN
+            {_add_to_focus_heatmap(_session_spans("new", 1, "1"))};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_heatmap_update
+        AFTER UPDATE OF start_time, end_time, total_active_seconds, total_idle_seconds, app_switches, focus_score
+        ON sessions
+        BEGIN
+            {_add_to_focus_heatmap(_session_spans("old", -1, "1"))};
+            {_add_to_focus_heatmap(_session_spans("new", 1, "1"))};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_heatmap_delete AFTER DELETE ON sessions
+        BEGIN
+            {_add_to_focus_heatmap(_session_spans("old", -1, "1"))};
+        END
+    ''')
+
+
+def add_to_focus_heatmap(cursor, after_id=0):
+    """Add sessions with ids above after_id to focus_heatmap, e.g. after a load without triggers."""
+    cursor.execute(_add_to_focus_heatmap(_session_spans("sessions", 1, "sessions.id > ?")), (after_id,))
+
+
+def rebuild_focus_heatmap(cursor):
+    """Recompute focus_heatmap from scratch (one scan of sessions)."""
+    cursor.execute("DELETE FROM focus_heatmap")
+    add_to_focus_heatmap(cursor)
+
+
+def create_search_index(cursor):
+    """
+    Create FTS5 indexes over app names and window titles, built from the
+    existing rows and kept current by triggers.
+
+    They index the dimension tables rather than the fact tables: each
+    distinct title is tokenised once, and writes only touch the index when
+    a title is seen for the first time. Returns False (and creates
+    nothing) if this SQLite build lacks FTS5.
+    """
+    for table in SEARCHABLE_DIMENSIONS:
+        column, fts = DIMENSIONS[table], f"{table}_fts"
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone() is None:
+            try:
+                # unicode61 splits "PROJ-123 - Jira" into proj/123/jira; the prefix
+                # indexes make "as-you-type" queries on 2-3 characters cheap
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE {fts} USING fts5(
+                        {column}, content='{table}', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                    )
+                ''')
+            except sqlite3.OperationalError:
+                return False
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            END
+        ''')
+    return True
+
+
+def has_search_index(conn):
+    """Whether the FTS5 indexes from create_search_index exist in this database."""
+    names = [f"{table}_fts" for table in SEARCHABLE_DIMENSIONS]
+    placeholders = ", ".join("?" for _ in names)
+    found = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({placeholders})", names
+    ).fetchone()[0]
+    return found == len(names)
+
+
+def interval_end(row):
+    """
+    SQL expression for the exclusive end of a row's time span. A row covers
+    [start_time, end) and always at least its first second, so a row the
+    tracker has only just opened (end_time NULL or equal to start_time)
+    is found at its start.
+    """
+    return f"MAX(COALESCE({row}.end_time, {row}.start_time), {row}.start_time + 1)"
+
+
+def create_interval_index(cursor):
+    """
+    Create R*Tree indexes over the time spans of activity and sessions,
+    built from the existing rows and kept current by triggers.
+
+    A B-tree on start_time cannot bound where a span containing a given
+    instant begins, so "what was running at 14:32" reads every earlier
+    row; the R*Tree answers that, and "what overlaps this meeting", in
+    logarithmic time. Its 32-bit float coordinates are rounded outward, so
+    readers re-check hits against the rows themselves (see
+    backend/intervals.py). Rows without a start time are left out.
+    Returns False (and creates nothing) if this SQLite build lacks R*Tree.
+    """
+    for table in INTERVAL_TABLES:
+        rtree = f"{table}_intervals"
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (rtree,)).fetchone() is None:
+            try:
+                cursor.execute(f"CREATE VIRTUAL TABLE {rtree} USING rtree(id, start_time, end_time)")
+            except sqlite3.OperationalError:
+                return False
+            cursor.execute(
+                f"INSERT INTO {rtree} (id, start_time, end_time) "
+                f"SELECT id, start_time, {interval_end(table)} FROM {table} WHERE start_time IS NOT NULL"
+            )
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_intervals_insert AFTER INSERT ON {table}
+            WHEN new.start_time IS NOT NULL
+            BEGIN
+                INSERT INTO {rtree} (id, start_time, end_time)
+                VALUES (new.id, new.start_time, {interval_end("new")});
+            END
+        ''')
+        # The tracker moves end_time forward on every tick of an open row.
+        # At today's epochs the stored bounds step in 128 s, so most ticks
+        # leave the rounded-up end covering the row and write nothing; an
+        # end that moves back leaves the entry loose, which readers tolerate
+        end = interval_end("new")
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_intervals_update
+            AFTER UPDATE OF start_time, end_time ON {table}
+            BEGIN
+                UPDATE {rtree} SET start_time = new.start_time, end_time = {end}
+                WHERE id = new.id AND new.start_time IS NOT NULL
+                  AND (new.start_time IS NOT old.start_time OR end_time < {end});
+                INSERT INTO {rtree} (id, start_time, end_time)
+                SELECT new.id, new.start_time, {end} WHERE old.start_time IS NULL AND new.start_time IS NOT NULL;
+                DELETE FROM {rtree} WHERE id = new.id AND new.start_time IS NULL;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_intervals_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM {rtree} WHERE id = old.id;
+            END
+        ''')
+    return True
+
+
+def has_interval_index(conn):
+    """Whether the R*Tree indexes from create_interval_index exist in this database."""
+    names = [f"{table}_intervals" for table in INTERVAL_TABLES]
+    placeholders = ", ".join("?" for _ in names)
+    found = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({placeholders})", names
+    ).fetchone()[0]
+    return found == len(names)
+
+
+def _columns(cursor, table):
+    """Return the column names of a table (empty if it doesn't exist)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _migrate_to_dimensions(cursor):
+    """
+    Version 1: move app names, window titles and bundle IDs out of the
+    fact tables into dimension tables. Row ids are preserved.
+    """
+    legacy = {
+        table: _columns(cursor, table)
+        for table in ("activity_logs", "app_switches", "timeline")
+    }
+
+    # Rename the text-based tables out of the way first
+    for table, columns in legacy.items():
+        if columns:
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+
+    create_tables(cursor)
+
+    def text_or_null(table, column):
+        return column if column in legacy[table] else "NULL"
+
+    # Fill the dimension tables from every distinct string in use
+    sources = []
+    for table in ("activity_logs", "timeline"):
+        if legacy[table]:
+            sources.append(("apps", table, "app_name"))
+            sources.append(("window_titles", table, text_or_null(table, "window_title")))
+            sources.append(("bundles", table, text_or_null(table, "bundle_id")))
+    if legacy["app_switches"]:
+        sources.append(("apps", "app_switches", "from_app"))
+        sources.append(("apps", "app_switches", "to_app"))
+
+    for dimension, table, column in sources:
+        if column == "NULL":
+            continue
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {dimension} ({DIMENSIONS[dimension]})
+            SELECT DISTINCT {column} FROM {table}_legacy
+            WHERE {column} IS NOT NULL AND {column} != ''
+        ''')
+
+    # Copy facts across, swapping strings for their surrogate keys
+    if legacy["activity_logs"]:
+        cursor.execute(f'''
+            INSERT INTO activity_logs (id, app_id, start_time, end_time,
+                                       duration_seconds, title_id, bundle_key)
+            SELECT l.id, a.id, l.start_time, l.end_time, l.duration_seconds, w.id, b.id
+            FROM activity_logs_legacy l
+            JOIN apps a ON a.name = l.app_name
+            LEFT JOIN window_titles w ON w.title = {text_or_null("activity_logs", "window_title")}
+            LEFT JOIN bundles b ON b.identifier = {text_or_null("activity_logs", "bundle_id")}
+        ''')
+        cursor.execute("DROP TABLE activity_logs_legacy")
+
+    if legacy["timeline"]:
+        cursor.execute(f'''
+            INSERT INTO timeline (id, timestamp, app_id, is_idle, title_id, bundle_key)
+            SELECT l.id, l.timestamp, a.id, l.is_idle, w.id, b.id
+            FROM timeline_legacy l
+            JOIN apps a ON a.name = l.app_name
+            LEFT JOIN window_titles w ON w.title = {text_or_null("timeline", "window_title")}
+            LEFT JOIN bundles b ON b.identifier = {text_or_null("timeline", "bundle_id")}
+        ''')
+        cursor.execute("DROP TABLE timeline_legacy")
+
+    if legacy["app_switches"]:
+        cursor.execute('''
+            INSERT INTO app_switches (id, from_app_id, to_app_id, timestamp)
+            SELECT l.id, f.id, t.id, l.timestamp
+            FROM app_switches_legacy l
+            LEFT JOIN apps f ON f.name = l.from_app
+            JOIN apps t ON t.name = l.to_app
+        ''')
+        cursor.execute("DROP TABLE app_switches_legacy")
+
+
+def _epoch_sql(column):
+    """SQL converting a legacy local-time text timestamp to epoch seconds."""
+    return (f"CASE WHEN typeof({column}) = 'text' "
+            f"THEN CAST(strftime('%s', {column}, 'utc') AS INTEGER) ELSE {column} END")
+
+
+def _migrate_to_epoch(cursor):
+    """
+    Version 2: convert TEXT timestamps to integer epoch seconds.
+
+    Both '2026-02-01 10:00:00' (agent) and '2026-02-01T10:00:00' (demo
+    data) are read as local time. Tables are rebuilt so that the columns
+    get INTEGER affinity.
+    """
+    time_columns = {
+        "sessions": ["start_time", "end_time"],
+        "activity_logs": ["start_time", "end_time"],
+        "app_switches": ["timestamp"],
+        "timeline": ["timestamp"],
+    }
+    existing = {table: _columns(cursor, table) for table in time_columns}
+
+    for table, columns in existing.items():
+        if columns:
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+
+    create_tables(cursor)
+
+    for table, columns in existing.items():
+        if not columns:
+            continue
+        select = ", ".join(
+            _epoch_sql(column) if column in time_columns[table] else column
+            for column in columns
+        )
+        cursor.execute(f'''
+            INSERT INTO {table} ({", ".join(columns)})
+            SELECT {select} FROM {table}_legacy
+        ''')
+        cursor.execute(f"DROP TABLE {table}_legacy")
+
+
+def _add_change_counters(cursor):
+    """Version 3: add the change_counters table (triggers are created in ensure_schema)."""
+    create_tables(cursor)
+
+
+def _add_device_columns(cursor):
+    """Version 4: tag fact rows with the device and source row they came from."""
+    create_tables(cursor)
+    for table in FACT_TABLES:
+        columns = _columns(cursor, table)
+        if "device_key" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN device_key INTEGER REFERENCES devices(id)")
+        if "source_id" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN source_id INTEGER")
+
+
+def _add_categories(cursor):
+    """
+    Version 5: add category_id to activity_logs and timeline. Existing rows
+    are categorised by categories.sync_categories, which needs the rules.
+    """
+    create_tables(cursor)
+    for table in ("activity_logs", "timeline"):
+        if "category_id" not in _columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+
+
+def _add_rollups(cursor):
+    """Version 6: add the hourly rollup tables written by retention.py."""
+    create_tables(cursor)
+
+
+def _add_coach_context(cursor):
+    """Version 7: add the coach context tables, filled from the existing rows."""
+    create_tables(cursor)
+    rebuild_coach_context(cursor)
+
+
+def _add_focus_heatmap(cursor):
+    """Version 8: add the focus heatmap, filled from the existing sessions."""
+    create_tables(cursor)
+    rebuild_focus_heatmap(cursor)
+
+
+def _add_rewrite_counters(cursor):
+    """Version 9: count updates to older rows separately (triggers are created in ensure_schema)."""
+    if "rewrites" not in _columns(cursor, "change_counters"):
+        cursor.execute("ALTER TABLE change_counters ADD COLUMN rewrites INTEGER NOT NULL DEFAULT 0")
+
+
+# Ordered (version, migration) pairs applied to databases older than SCHEMA_VERSION
+MIGRATIONS = [
+    (1, _migrate_to_dimensions),
+    (2, _migrate_to_epoch),
+    (3, _add_change_counters),
+    (4, _add_device_columns),
+    (5, _add_categories),
+    (6, _add_rollups),
+    (7, _add_coach_context),
+    (8, _add_focus_heatmap),
+    (9, _add_rewrite_counters),
+]
+
+
+def ensure_schema(conn):
+    """
+    Create or upgrade the database to SCHEMA_VERSION.
+
+    Runs inside a single IMMEDIATE transaction so that the agent and the
+    backend can both call it at startup without racing each other.
+    """
+    conn.commit()
+    # Lets retention.py hand freed pages back to the OS a few at a time.
+    # Only takes effect on a new file; older ones are converted by retention.py
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # WAL lets dashboard reads proceed while the agent or ingestion writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+
+        if version == 0 and not any(_columns(cursor, table) for table in FACT_TABLES):
+            # Fresh database: no legacy data to carry over
+            create_tables(cursor)
+            version = SCHEMA_VERSION
+        else:
+            for target, migration in MIGRATIONS:
+                if version < target:
+                    migration(cursor)
+                    version = target
+
+        # Indexes and triggers go last: table rebuilds above drop them
+        create_indexes(cursor)
+        create_triggers(cursor)
+        create_coach_context_triggers(cursor)
+        create_focus_heatmap_triggers(cursor)
+        create_search_index(cursor)
+        create_interval_index(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class Interner:
+    """
+    In-process cache from dimension strings to their integer keys.
+
+    Each distinct app name / title / bundle ID costs one INSERT OR IGNORE
+    the first time it is seen; every later lookup is a dict hit.
+    Dimension rows are never deleted, so cached keys stay valid.
+    """
+
+    def __init__(self):
+        self._cache = {table: {} for table in DIMENSIONS}
+
+    def intern(self, conn, table, value):
+        """Return the key for value in a dimension table, inserting it if new."""
+        if not value:
+            return None
+
+        cache = self._cache[table]
+        key = cache.get(value)
+        if key is None:
+            column = DIMENSIONS[table]
+            cursor = conn.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (value,))
+            if cursor.rowcount == 1:
+                key = cursor.lastrowid
+            else:
+                # Already there, e.g. written by another process
+                key = conn.execute(
+                    f"SELECT id FROM {table} WHERE {column} = ?", (value,)
+                ).fetchone()[0]
+            cache[value] = key
+        return key
+
+    def clear(self):
+        """Forget cached keys, e.g. after rolling back a transaction that interned."""
+        for cache in self._cache.values():
+            cache.clear()
+
+    def app(self, conn, name):
+        return self.intern(conn, "apps", name)
+
+    def title(self, conn, title):
+        return self.intern(conn, "window_titles", title)
+
+    def bundle(self, conn, identifier):
+        return self.intern(conn, "bundles", identifier)
+
+    def category(self, conn, name):
+        return self.intern(conn, "categories", name)
+
+
+def to_epoch(value):
+    """Convert a datetime (naive means local time) to integer epoch seconds."""
+    return int(value.timestamp())
+
+
+def from_epoch(epoch):
+    """Convert epoch seconds to a local ISO 8601 string (None passes through)."""
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch).isoformat()
+
+
+def iso_column(column, alias=None):
+    """
+    SQL select expression rendering an epoch column as local ISO 8601 text.
+
+    Keeps the read endpoints returning the same strings as before, while
+    WHERE and ORDER BY clauses compare integers on the qualified column.
+    """
+    alias = alias or column.split(".")[-1]
+    return f"strftime('%Y-%m-%dT%H:%M:%S', {column}, 'unixepoch', 'localtime') AS {alias}"
+
+
+def data_version(conn, tables):
+    """
+    Return (version, modified_at) for a set of fact tables.
+
+    version is a string that changes whenever any of the tables is written;
+    modified_at is the epoch second of the latest write. Reading them is a
+    single primary-key lookup, regardless of how much data the tables hold.
+    """
+    placeholders = ", ".join("?" for _ in tables)
+    rows = conn.execute(
+        f"SELECT table_name, version, modified_at FROM change_counters "
+        f"WHERE table_name IN ({placeholders}) ORDER BY table_name",
+        tuple(tables),
+    ).fetchall()
+    version = "-".join(f"{row[0]}.{row[1]}" for row in rows)
+    modified_at = max((row[2] for row in rows), default=0)
+    return version, modified_at
+
+
+def rewrite_count(conn, table):
+    """How many times rows of table older than the newest RECENT_ROWS have been updated."""
+    row = conn.execute("SELECT rewrites FROM change_counters WHERE table_name = ?", (table,)).fetchone()
+    return row[0] if row else 0
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Agent API tests: python -m pytest test_api.py
+
+Only the admin checks are covered here; test_agent.sh exercises the
+agent end to end.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import api
+
+ADMIN_AUTH = {"Authorization": "Bearer admin-secret"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "admin-secret")
+    return TestClient(api.app)
+
+
+def request_from(host, headers=None):
+    """A bare request from host, for checks TestClient cannot fake."""
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": (host, 50000),
+    })
+
+
+def test_admin_requires_token(client):
+    assert client.get("/api/admin/profile/memory").status_code == 401
+    assert client.get("/api/admin/profile/memory", headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert client.get("/api/admin/profile/memory", headers=ADMIN_AUTH).status_code == 200
+
+
+def test_admin_without_token_accepts_loopback_only(client, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "")
+    # TestClient's client host is "testclient"
+    assert client.get("/api/admin/profile/memory").status_code == 401
+    assert api.admin_denied(request_from("127.0.0.1")) is None
+    assert api.admin_denied(request_from("::1")) is None
+    assert api.admin_denied(request_from("192.168.1.20", ADMIN_AUTH)).status_code == 401
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Backend tests: python -m pytest test_backend.py
+
+Runs the FastAPI app in-process against a throwaway data directory, with
+the local coach and background maintenance switched off.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix="attentionos-test-")
+os.environ.update({
+    "ATTENTIONOS_DB_PATH": os.path.join(DATA_DIR, "attentionos.db"),
+    "ATTENTIONOS_COACH": "local",
+    "ATTENTIONOS_ADMIN_TOKEN": "admin-secret",
+    "ATTENTIONOS_INGEST_TOKEN": "ingest-secret",
+    "ATTENTIONOS_RETENTION_INTERVAL": "0",
+    "ATTENTIONOS_WARM_INTERVAL": "0",
+    "ATTENTIONOS_OPTIMIZE_INTERVAL": "0",
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import heatmap
+import main
+from coach import CoachAnswer, HedgedCoach
+from ingest import MAX_DECODED_BYTES, BatchTooLarge, IngestError, decode_body
+from patterns import PatternEngine
+from shards import DEFAULT_SHARD, ConnectionPool, ShardRouter, UnknownShard
+from storage import data_version, ensure_schema, rewrite_count
+
+INGEST_AUTH = {"Authorization": "Bearer ingest-secret"}
+ADMIN_AUTH = {"Authorization": "Bearer admin-secret"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        # Let the startup demo data land before tests look at the data
+        deadline = time.monotonic() + 30
+        while not any(job["name"] == "demo-data" and job["runs"] for job in main.scheduler.status()):
+            assert time.monotonic() < deadline, "demo data was not generated"
+            time.sleep(0.05)
+        yield client
+
+
+def request_from(host, headers=None):
+    """A bare request from host, for checks TestClient cannot fake."""
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": (host, 50000),
+    })
+
+
+def device_rows(device_id):
+    """Rows per fact table that came from device_id."""
+    conn = main.get_db_connection()
+    try:
+        return {table: conn.execute(
+            f"SELECT COUNT(*) FROM {table} JOIN devices d ON d.id = device_key WHERE d.device_uid = ?",
+            (device_id,)).fetchone()[0] for table in ("activity_logs", "app_switches", "timeline", "sessions")}
+    finally:
+        conn.close()
+
+
+def make_batch(device_id, batch_id="batch-1", **overrides):
+    batch = {
+        "device_id": device_id, "batch_id": batch_id,
+        "activity": [{"id": 1, "app_name": "Code", "start_time": 1700000000, "end_time": 1700000600,
+                      "duration_seconds": 600, "window_title": "main.py", "bundle_id": None}],
+        "switches": [{"id": 1, "from_app": None, "to_app": "Code", "timestamp": 1700000000}],
+        "timeline": [{"id": 1, "timestamp": 1700000000, "app_name": "Code", "is_idle": False}],
+        "sessions": [{"id": 1, "start_time": 1700000000, "end_time": 1700000600, "total_active_seconds": 600,
+                      "total_idle_seconds": 0, "app_switches": 1, "focus_score": 100.0}],
+    }
+    batch.update(overrides)
+    return batch
+
+
+def post_batch(client, batch, headers=INGEST_AUTH):
+    body = gzip.compress(json.dumps(batch).encode())
+    return client.post("/api/ingest", content=body, headers={"Content-Encoding": "gzip", **headers})
+
+
+# ============================================
+# HTTP CACHING
+# ============================================
+
+def test_lists_revalidate_with_etags(client):
+    first = client.get("/api/sessions")
+    etag = first.headers["ETag"]
+    assert client.get("/api/sessions", headers={"If-None-Match": etag}).status_code == 304
+    post_batch(client, make_batch("etag"))
+    changed = client.get("/api/sessions", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == len(first.json()) + 1
+    assert client.get("/api/sessions", headers={"If-None-Match": changed.headers["ETag"]}).status_code == 304
+
+
+# ============================================
+# INGESTION
+# ============================================
+
+def test_ingest_requires_token(client):
+    assert post_batch(client, make_batch("auth"), headers={}).status_code == 401
+    assert post_batch(client, make_batch("auth"), headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert post_batch(client, make_batch("auth")).status_code == 200
+
+
+def test_ingest_without_token_accepts_loopback_only(client, monkeypatch):
+    monkeypatch.setattr(main, "INGEST_TOKEN", "")
+    # TestClient's client host is "testclient"
+    assert post_batch(client, make_batch("open"), headers={}).status_code == 401
+    main.require_token(request_from("127.0.0.1"), "", "denied")
+    main.require_token(request_from("::1"), "", "denied")
+    with pytest.raises(HTTPException) as denied:
+        main.require_token(request_from("192.168.1.20"), "", "denied")
+    assert denied.value.status_code == 401
+
+
+def test_ingest_is_idempotent(client):
+    first = post_batch(client, make_batch("replay")).json()
+    assert first == {"status": "success", "events": 4, "written": 4}
+    assert post_batch(client, make_batch("replay")).json()["status"] == "duplicate"
+    # The same events in a new batch are recognised by (device, source id);
+    # only the activity row is rewritten, as open rows are
+    assert post_batch(client, make_batch("replay", batch_id="batch-2")).json()["written"] == 1
+    assert device_rows("replay") == {"activity_logs": 1, "app_switches": 1, "timeline": 1, "sessions": 1}
+
+
+def test_ingest_updates_open_activity(client):
+    post_batch(client, make_batch("open-row"))
+    batch = make_batch("open-row", batch_id="batch-2")
+    batch["activity"][0].update(end_time=1700000900, duration_seconds=900)
+    assert post_batch(client, batch).json()["written"] == 1
+
+
+@pytest.mark.parametrize("kind, field, value", [
+    ("activity", "start_time", "2023-11-14T22:13:20"),
+    ("activity", "end_time", 1700000600.5),
+    ("activity", "id", None),
+    ("activity", "app_name", 42),
+    ("switches", "timestamp", True),
+    ("timeline", "is_idle", "no"),
+    ("sessions", "total_active_seconds", "600"),
+    ("sessions", "focus_score", "high"),
+])
+def test_ingest_rejects_mistyped_fields(client, kind, field, value):
+    batch = make_batch(f"typed-{kind}-{field}")
+    batch[kind][0][field] = value
+    response = post_batch(client, batch)
+    assert response.status_code == 400
+    assert field in response.json()["detail"]
+    # Nothing was written, so the batch id is still unseen
+    assert post_batch(client, make_batch(f"typed-{kind}-{field}")).json()["written"] == 4
+
+
+def test_ingest_rejects_malformed_batches(client):
+    assert post_batch(client, make_batch("shape", activity={"id": 1})).status_code == 400
+    assert post_batch(client, make_batch("shape", switches=[17])).status_code == 400
+    assert post_batch(client, make_batch("shape", batch_id=7)).status_code == 400
+    assert post_batch(client, ["not", "a", "batch"]).status_code == 400
+
+
+def test_ingest_limits_body_size(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_INGEST_BYTES", 1024)
+    response = client.post("/api/ingest", content=b" " * 2048, headers=INGEST_AUTH)
+    assert response.status_code == 413
+
+
+def test_ingest_limits_decompressed_size(client):
+    bomb = gzip.compress(b" " * (MAX_DECODED_BYTES + 1))
+    response = client.post("/api/ingest", content=bomb, headers={"Content-Encoding": "gzip", **INGEST_AUTH})
+    assert response.status_code == 413
+
+
+def test_decode_body_limits():
+    assert decode_body(gzip.compress(b"[1, 2]"), "gzip", max_size=6) == [1, 2]
+    with pytest.raises(BatchTooLarge):
+        decode_body(gzip.compress(b"[1,  2]"), "gzip", max_size=6)
+    with pytest.raises(BatchTooLarge):
+        decode_body(b"[1,  2]", "identity", max_size=6)
+    with pytest.raises(IngestError):
+        decode_body(gzip.compress(b"[1, 2]")[:-8], "gzip")
+
+
+def test_decode_body_limits_brotli():
+    brotli = pytest.importorskip("brotli")
+    assert decode_body(brotli.compress(b"[1, 2]"), "br", max_size=6) == [1, 2]
+    with pytest.raises(BatchTooLarge):
+        decode_body(brotli.compress(b" " * (8 * 1024 * 1024)), "br", max_size=1024)
+
+
+# ============================================
+# SHARDING
+# ============================================
+
+@pytest.fixture
+def sharded(monkeypatch, tmp_path):
+    """Route the app to per-user shards under tmp_path, at most two of them."""
+    router = ShardRouter(main.router.default_path, str(tmp_path), mode="user", max_shards=2)
+    monkeypatch.setattr(main, "router", router)
+    return router
+
+
+def test_reads_do_not_create_shards(client, sharded):
+    assert client.get("/api/sessions", params={"user": "ghost"}).status_code == 404
+    assert client.get("/api/analytics/summary", params={"user": "ghost"}).status_code == 404
+    assert not sharded.exists(sharded.shard_for("ghost"))
+    assert sharded.shards() == [DEFAULT_SHARD]
+
+
+def test_ingest_creates_shards_up_to_the_limit(client, sharded):
+    for user in ("alice", "bob"):
+        assert post_batch(client, make_batch(f"{user}-laptop", user_id=user)).status_code == 200
+        assert len(client.get("/api/sessions", params={"user": user}).json()) == 1
+    # A third user would pass max_shards; known users keep uploading
+    assert post_batch(client, make_batch("carol-laptop", user_id="carol")).status_code == 507
+    assert not sharded.exists(sharded.shard_for("carol"))
+    assert post_batch(client, make_batch("alice-laptop", batch_id="batch-2", user_id="alice")).status_code == 200
+
+
+def test_pool_opens_only_existing_files(tmp_path):
+    pool = ConnectionPool(max_connections=2)
+    path = str(tmp_path / "missing.db")
+    with pytest.raises(UnknownShard):
+        pool.connect(path)
+    assert not os.path.exists(path)
+    pool.connect(path, create=True).close()
+    pool.connect(path).close()
+    pool.close_all()
+
+
+# ============================================
+# ADMIN ENDPOINTS
+# ============================================
+
+def test_admin_requires_token(client):
+    assert client.get("/api/admin/jobs").status_code == 401
+    assert client.get("/api/admin/jobs", headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert client.get("/api/admin/jobs", headers=INGEST_AUTH).status_code == 401
+    assert client.get("/api/admin/jobs", headers=ADMIN_AUTH).status_code == 200
+
+
+def test_admin_without_token_accepts_loopback_only(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+    assert client.get("/api/admin/jobs").status_code == 401
+    # Without a token configured, a bearer header proves nothing either
+    assert client.get("/api/admin/jobs", headers={"Authorization": "Bearer "}).status_code == 401
+    main.require_admin(request_from("127.0.0.1"))
+    with pytest.raises(HTTPException) as denied:
+        main.require_admin(request_from("10.0.0.8", {"Authorization": "Bearer admin-secret"}))
+    assert denied.value.status_code == 401
+
+
+# ============================================
+# FOCUS HEATMAP
+# ============================================
+
+def test_heatmap_binary_layout():
+    shape = (2, heatmap.HOURS)
+    sessions = np.zeros(shape)
+    sessions[0, 9] = 30
+    active = np.zeros(shape)
+    # Thirty users' busy hour merged across shards, past uint16
+    active[0, 9] = 30 * 3000
+    cells = {"first_day": 19675, "days": 2, "sessions": sessions, "active_seconds": active,
+             "focus_weighted": active * 80, "switches": np.where(sessions > 0, 250.0, 0.0)}
+    body = heatmap.encode_binary(cells)
+    n = 2 * heatmap.HOURS
+    assert len(body) == heatmap.HEADER.size + 7 * n
+    assert heatmap.HEADER.unpack_from(body) == (heatmap.MAGIC, 2, heatmap.HOURS, 19675, 2)
+    offset = heatmap.HEADER.size
+    assert np.frombuffer(body, "<u4", n, offset)[9] == 90000
+    density = np.frombuffer(body, "<u2", n, offset + 4 * n)
+    assert density[9] == 1000 and density[10] == heatmap.NO_DENSITY
+    focus = np.frombuffer(body, np.uint8, n, offset + 6 * n)
+    assert focus[9] == 80 and focus[10] == heatmap.NO_FOCUS
+
+
+def test_heatmap_endpoint_formats(client):
+    cells = client.get("/api/analytics/heatmap").json()
+    body = client.get("/api/analytics/heatmap", headers={"Accept": heatmap.MEDIA_TYPE})
+    assert body.headers["content-type"].startswith(heatmap.MEDIA_TYPE)
+    _, version, hours, _, days = heatmap.HEADER.unpack_from(body.content)
+    assert (version, hours, days) == (2, 24, cells["days"])
+    assert len(body.content) == heatmap.HEADER.size + 7 * days * hours
+
+
+# ============================================
+# CATEGORY RULES
+# ============================================
+
+def test_category_rules_need_admin(client):
+    rules = client.get("/api/categories").json()
+    config = {"rules": [{"category": "distracting", "app": ["Code"]}], "default": "neutral"}
+    assert client.put("/api/categories", json=config).status_code == 401
+    assert client.put("/api/categories", json=config, headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert client.get("/api/categories").json()["fingerprint"] == rules["fingerprint"]
+
+    post_batch(client, make_batch("categories"))
+    try:
+        response = client.put("/api/categories", json=config, headers=ADMIN_AUTH)
+        assert response.status_code == 200
+        assert response.json()["recategorised"] > 0
+        assert client.get("/api/categories").json()["fingerprint"] == response.json()["fingerprint"]
+    finally:
+        client.put("/api/categories", json={"rules": rules["rules"], "default": rules["default"]},
+                   headers=ADMIN_AUTH)
+
+
+# ============================================
+# AI COACH
+# ============================================
+
+class FixedCoach:
+    """A provider that answers with text after waiting for release (if given)."""
+
+    def __init__(self, name, text="answer", release=None, error=None):
+        self.name = name
+        self.text = text
+        self.release = release
+        self.error = error
+        self.calls = 0
+
+    def answer(self, kind, prompt, data, max_output_tokens):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return CoachAnswer(self.text, self.name)
+
+
+@pytest.mark.parametrize("remote, provider", [
+    (FixedCoach("gemini"), "gemini"),
+    (FixedCoach("gemini", text=""), "local"),
+    (FixedCoach("gemini", error=RuntimeError("quota")), "local"),
+])
+def test_hedged_coach_falls_back_to_local(remote, provider):
+    coach = HedgedCoach(remote, FixedCoach("local"), budget_seconds=1)
+    assert coach.answer("chat", "prompt", {}, 100).provider == provider
+
+
+def test_hedged_coach_answers_locally_past_its_budget():
+    release = threading.Event()
+    coach = HedgedCoach(FixedCoach("gemini", release=release), FixedCoach("local"), budget_seconds=0.05)
+    try:
+        assert coach.answer("chat", "prompt", {}, 100).provider == "local"
+    finally:
+        release.set()
+
+
+def test_hedged_coach_caps_remote_calls():
+    release = threading.Event()
+    remote = FixedCoach("gemini", release=release)
+    coach = HedgedCoach(remote, FixedCoach("local"), budget_seconds=0.01)
+    try:
+        for _ in range(HedgedCoach.MAX_REMOTE_CALLS + 3):
+            assert coach.answer("chat", "prompt", {}, 100).provider == "local"
+        # Only the first MAX_REMOTE_CALLS reached the remote coach
+        deadline = time.monotonic() + 5
+        while remote.calls < HedgedCoach.MAX_REMOTE_CALLS and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert remote.calls == HedgedCoach.MAX_REMOTE_CALLS
+    finally:
+        release.set()
+
+
+# ============================================
+# FOCUS PATTERNS
+# ============================================
+
+def pattern_db(tmp_path, rows):
+    conn = sqlite3.connect(tmp_path / "patterns.db")
+    ensure_schema(conn)
+    conn.execute("INSERT INTO apps (id, name) VALUES (1, 'Code')")
+    conn.executemany(
+        "INSERT INTO activity_logs (app_id, start_time, end_time, duration_seconds) VALUES (1, ?, ?, 60)",
+        [(1700000000 + 60 * i, 1700000060 + 60 * i) for i in range(rows)])
+    conn.commit()
+    return conn
+
+
+def load_patterns(engine, conn, key="db"):
+    return engine.data(conn, key, data_version(conn, ("activity_logs", "app_switches")))
+
+
+def test_patterns_pick_up_updates_to_old_rows(tmp_path):
+    conn = pattern_db(tmp_path, 1000)
+    engine = PatternEngine()
+    assert load_patterns(engine, conn).duration[10] == 60
+    # Like a late upsert of a device's open row, far behind the newest rows
+    conn.execute("UPDATE activity_logs SET duration_seconds = 90 WHERE id = 11")
+    conn.commit()
+    assert load_patterns(engine, conn).duration[10] == 90
+    # The agent extending its open row stays an incremental refresh
+    conn.execute("UPDATE activity_logs SET duration_seconds = 120 WHERE id = 1000")
+    conn.commit()
+    assert rewrite_count(conn, "activity_logs") == 1
+    assert load_patterns(engine, conn).duration[-1] == 120
+
+
+def test_pattern_cache_is_bounded(tmp_path):
+    conn = pattern_db(tmp_path, 10)
+    engine = PatternEngine(max_databases=2)
+    for key in ("a", "b", "a", "c"):
+        load_patterns(engine, conn, key)
+    assert list(engine._states) == ["a", "c"]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Upload mode for the AttentionOS agent.
+
+The agent keeps writing to its local data/attentionos.db, which doubles as
+the upload buffer. A background thread periodically reads rows it hasn't
+shipped yet, packs them into gzip-compressed JSON batches and POSTs them to
+a central backend's /api/ingest endpoint. Per-table progress is kept in the
+upload_state table, so nothing is lost across restarts or network outages.
+
+Enabled from main.py when ATTENTIONOS_UPLOAD_URL is set.
+"""
+
+import gzip
+import hashlib
+import json
+import socket
+import sqlite3
+import urllib.error
+import urllib.request
+from threading import Event, Thread
+
+# Per table: columns shipped for each event (local ids become source ids)
+UPLOAD_QUERIES = {
+    "activity": ("activity_logs", '''
+        SELECT l.id, a.name AS app_name, l.start_time, l.end_time, l.duration_seconds,
+               w.title AS window_title, b.identifier AS bundle_id
+        FROM activity_logs l
+        JOIN apps a ON a.id = l.app_id
+        LEFT JOIN window_titles w ON w.id = l.title_id
+        LEFT JOIN bundles b ON b.id = l.bundle_key
+        WHERE l.id > ? AND l.device_key IS NULL
+        ORDER BY l.id LIMIT ?
+    '''),
+    "switches": ("app_switches", '''
+        SELECT s.id, f.name AS from_app, t.name AS to_app, s.timestamp
+        FROM app_switches s
+        LEFT JOIN apps f ON f.id = s.from_app_id
+        JOIN apps t ON t.id = s.to_app_id
+        WHERE s.id > ? AND s.device_key IS NULL
+        ORDER BY s.id LIMIT ?
+    '''),
+    "timeline": ("timeline", '''
+        SELECT t.id, t.timestamp, a.name AS app_name, t.is_idle,
+               w.title AS window_title, b.identifier AS bundle_id
+        FROM timeline t
+        JOIN apps a ON a.id = t.app_id
+        LEFT JOIN window_titles w ON w.id = t.title_id
+        LEFT JOIN bundles b ON b.id = t.bundle_key
+        WHERE t.id > ? AND t.device_key IS NULL
+        ORDER BY t.id LIMIT ?
+    '''),
+    "sessions": ("sessions", '''
+        SELECT id, start_time, end_time, total_active_seconds, total_idle_seconds,
+               app_switches, focus_score
+        FROM sessions
+        WHERE id > ? AND device_key IS NULL
+        ORDER BY id LIMIT ?
+    '''),
+}
+
+
+class Uploader(Thread):
+    """Background thread shipping locally buffered events in batches."""
+
+    def __init__(self, db_path, url, device_id=None, user_id=None, token=None,
+                 interval_seconds=60, batch_size=5000, timeout_seconds=30):
+        super().__init__(daemon=True, name="attentionos-uploader")
+        self.db_path = db_path
+        self.url = url
+        self.device_id = device_id or socket.gethostname()
+        self.user_id = user_id
+        self.token = token
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.timeout_seconds = timeout_seconds
+        self._stop_event = Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            self.flush()
+
+    def stop(self):
+        """Stop the background loop and ship whatever is still buffered."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+
+    def flush(self):
+        """Upload batches until the local buffer is drained or a POST fails."""
+        while True:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            try:
+                payload, cursors, full = self._collect(conn)
+                if not any(payload[key] for key in UPLOAD_QUERIES):
+                    return
+                if not self._post(payload):
+                    return
+                conn.executemany(
+                    "INSERT INTO upload_state (table_name, last_id) VALUES (?, ?) "
+                    "ON CONFLICT(table_name) DO UPDATE SET last_id = excluded.last_id",
+                    cursors.items(),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            if not full:
+                return
+
+    def _collect(self, conn):
+        """Read the next unshipped rows of every table into one payload."""
+        state = dict(conn.execute("SELECT table_name, last_id FROM upload_state").fetchall())
+        payload = {"device_id": self.device_id, "user_id": self.user_id}
+        cursors, full = {}, False
+
+        for key, (table, query) in UPLOAD_QUERIES.items():
+            last_id = state.get(table, 0)
+            rows = [dict(row) for row in conn.execute(query, (last_id, self.batch_size))]
+            payload[key] = rows
+            full = full or len(rows) == self.batch_size
+            if rows:
+                newest = rows[-1]["id"]
+                # The newest activity row may still be open (its end_time keeps
+                # moving), so leave it behind the cursor to be re-sent next time;
+                # the backend upserts it.
+                if table == "activity_logs" and len(rows) < self.batch_size:
+                    newest -= 1
+                cursors[table] = max(newest, last_id)
+
+        # Identical payloads get identical ids, so the backend can skip replays
+        body = json.dumps({k: payload[k] for k in UPLOAD_QUERIES}, sort_keys=True)
+        payload["batch_id"] = hashlib.sha256(f"{self.device_id}:{body}".encode()).hexdigest()
+        return payload, cursors, full
+
+    def _post(self, payload):
+        """POST one gzip-compressed batch; returns True on success."""
+        headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            self.url,
+            data=gzip.compress(json.dumps(payload, separators=(",", ":")).encode(), compresslevel=6),
+            headers=headers,
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+                return 200 <= response.status < 300
+        except (urllib.error.URLError, OSError) as e:
+            print(f"[Upload] Warning: batch upload failed, will retry: {e}")
+            return False